@@ -101,10 +101,15 @@ class TipoMovimientoAdmin(admin.ModelAdmin):
 @admin.register(models.Movimiento)
 class MovimientoAdmin(admin.ModelAdmin):
     """Gestión centralizada de Despachos y Tramos."""
-    list_display = ('numero_despacho', 'id_movimiento', 'get_tipo_movimiento', 'estado', 'fecha_movimiento', 'usuario_responsable', 'motorista_asignado', 'get_despacho_padre')
+    list_display = ('numero_despacho', 'id_movimiento', 'get_tipo_movimiento', 'estado', 'fecha_movimiento', 'usuario_responsable', 'motorista_asignado', 'get_despacho_padre', 'despacho_raiz', 'profundidad')
     list_filter = ('estado', 'tipo_movimiento', 'fecha_movimiento')
     search_fields = ('id_movimiento', 'observacion', 'origen', 'destino')
     list_per_page = 20
+    # Una sola consulta para la página: sin N+1 por tipo, personas ni el despacho de cada tramo.
+    list_select_related = ('tipo_movimiento', 'usuario_responsable', 'motorista_asignado', 'despacho_raiz')
+    # Con millones de movimientos, un <select> con todos no es viable.
+    raw_id_fields = ('movimiento_padre', 'motorista_asignado', 'usuario_responsable')
+    readonly_fields = ('despacho_raiz', 'ruta', 'profundidad')
 
     @admin.display(description='Tipo')
     def get_tipo_movimiento(self, obj):
@@ -112,4 +117,64 @@ class MovimientoAdmin(admin.ModelAdmin):
 
     @admin.display(description='Despacho Padre')
     def get_despacho_padre(self, obj):
-        return obj.movimiento_padre_id
\ No newline at end of file
+        return obj.movimiento_padre_id
+
+
+@admin.register(models.DespachoActivo)
+class DespachoActivoAdmin(admin.ModelAdmin):
+    """Despacho pendiente que ocupa a cada motorista (sólo lectura; lo mantienen las señales)."""
+    list_display = ('motorista', 'despacho', 'desde')
+    list_select_related = ('motorista', 'despacho')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(models.ResumenDiarioMovimiento)
+class ResumenDiarioMovimientoAdmin(admin.ModelAdmin):
+    """Resumen diario pre-agregado que alimenta los reportes (sólo lectura)."""
+    list_display = ('fecha', 'estado', 'tipo_movimiento', 'motorista', 'total')
+    list_filter = ('estado', 'tipo_movimiento', 'fecha')
+    list_select_related = ('tipo_movimiento', 'motorista')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(models.Vencimiento)
+class VencimientoAdmin(admin.ModelAdmin):
+    """Índice de vencimientos de documentos con su alerta (sólo lectura; lo mantienen las señales)."""
+    list_display = ('fecha', 'nivel', 'tipo', 'moto', 'motorista')
+    list_filter = ('nivel', 'tipo')
+    date_hierarchy = 'fecha'
+    list_select_related = ('moto', 'motorista')
+    ordering = ('nivel', 'fecha')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(models.TrabajoReporte)
+class TrabajoReporteAdmin(admin.ModelAdmin):
+    """Cola de reportes PDF generados en segundo plano."""
+    list_display = ('id', 'tipo', 'desde', 'hasta', 'solicitado_por', 'estado', 'progreso', 'fecha_solicitud', 'fecha_termino')
+    list_filter = ('estado', 'tipo')
+    list_select_related = ('solicitado_por',)
+    readonly_fields = ('clave', 'fecha_solicitud', 'fecha_inicio', 'fecha_termino')
+
+
+@admin.register(models.Contador)
+class ContadorAdmin(admin.ModelAdmin):
+    """Contadores persistentes (versiones de caché y totales precalculados)."""
+    list_display = ('clave', 'valor', 'actualizado')
+    search_fields = ('clave',)
+    readonly_fields = ('clave', 'valor', 'actualizado')
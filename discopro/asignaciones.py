@@ -0,0 +1,72 @@
+from django.db.models import OuterRef, Subquery
+
+from . import versiones
+from .models import AsignacionFarmacia, AsignacionMoto, Motorista, Moto
+
+TAMANO_LOTE_REPARACION = 1000
+
+
+# --- ASIGNACIÓN VIGENTE ---
+
+def farmacia_vigente():
+    """
+    Subconsulta (por OuterRef('pk') de un Motorista) con la farmacia de su
+    asignación abierta (sin fechaTermino) más reciente.
+    """
+    return AsignacionFarmacia.objects.filter(
+        motorista=OuterRef('pk'), fechaTermino__isnull=True
+    ).order_by('-fechaAsignacion', '-idAsignacionFarmacia').values('farmacia')[:1]
+
+
+def motorista_vigente():
+    """Subconsulta (por OuterRef('pk') de una Moto) con el motorista de su asignación abierta más reciente."""
+    return AsignacionMoto.objects.filter(
+        moto=OuterRef('pk'), fechaTermino__isnull=True
+    ).order_by('-fechaAsignacion', '-idAsignacionMoto').values('motorista')[:1]
+
+
+# --- ACTUALIZACIÓN ---
+# Cada actualización es un único UPDATE ... SET = (subconsulta): el puntero se
+# recalcula desde las asignaciones en la misma sentencia que lo escribe, sin
+# una ventana entre leer y escribir en la que otra asignación pueda colarse.
+
+def actualizar_farmacia_actual(motorista_ids):
+    ids = [pk for pk in motorista_ids if pk is not None]
+    if not ids:
+        return 0
+    return Motorista.objects.filter(pk__in=ids).update(farmacia_actual=Subquery(farmacia_vigente()))
+
+
+def actualizar_motorista_actual(patentes):
+    patentes = [pk for pk in patentes if pk is not None]
+    if not patentes:
+        return 0
+    return Moto.objects.filter(pk__in=patentes).update(motorista_actual=Subquery(motorista_vigente()))
+
+
+# --- REPARACIÓN ---
+
+def _desviados(modelo, campo, vigente):
+    filas = modelo.objects.annotate(_vigente=Subquery(vigente)).values_list('pk', f'{campo}_id', '_vigente')
+    return [(pk, actual, correcto) for pk, actual, correcto in filas.iterator(chunk_size=TAMANO_LOTE_REPARACION) if actual != correcto]
+
+
+def reparar():
+    """
+    Recalcula los punteros farmacia_actual / motorista_actual desde las
+    asignaciones y corrige los que se hayan desviado (cargas masivas, cambios
+    hechos directamente en la base). Devuelve [(modelo, pk, anterior, correcto)].
+    """
+    diferencias = []
+    for modelo, campo, vigente, actualizar in (
+        (Motorista, 'farmacia_actual', farmacia_vigente(), actualizar_farmacia_actual),
+        (Moto, 'motorista_actual', motorista_vigente(), actualizar_motorista_actual),
+    ):
+        desviados = _desviados(modelo, campo, vigente)
+        for inicio in range(0, len(desviados), TAMANO_LOTE_REPARACION):
+            actualizar([pk for pk, _, _ in desviados[inicio:inicio + TAMANO_LOTE_REPARACION]])
+        diferencias.extend((modelo.__name__, pk, actual, correcto) for pk, actual, correcto in desviados)
+        if desviados:
+            # update() no emite señales: los listados y detalles deben ver los punteros corregidos.
+            versiones.incrementar(modelo)
+    return diferencias
@@ -0,0 +1,163 @@
+import logging
+import threading
+import unicodedata
+from bisect import bisect_left
+
+from django.core.signals import request_started
+from django.db import DatabaseError
+from django.db.models.signals import post_delete, post_save
+
+from . import contadores
+from .models import Farmacia, Motorista, Moto, TipoMovimiento, Usuario
+
+logger = logging.getLogger(__name__)
+
+RESULTADOS_POR_PAGINA = 20
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes, para comparar prefijos sin importar acentos."""
+    texto = unicodedata.normalize('NFKD', str(texto or '').lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def _palabras(texto):
+    palabras = normalizar(texto).replace('.', '').replace('-', ' ').split()
+    return [palabra for palabra in palabras if palabra]
+
+
+class FuenteAutocompletar:
+    """
+    Índice en memoria (por proceso) de una tabla para el autocompletado: lista
+    ordenada de (palabra, pk) donde se buscan prefijos con bisect. Se construye
+    con una sola consulta y se reconstruye cuando cambia su versión (un
+    contador que las señales incrementan al guardar/eliminar filas).
+    """
+    def __init__(self, nombre, modelo, campos, etiqueta, campos_busqueda=None):
+        self.nombre = nombre
+        self.modelo = modelo
+        self.campos = campos
+        self.etiqueta = etiqueta
+        self.campos_busqueda = campos_busqueda or campos
+        self.version = None
+        self.palabras = []
+        self.etiquetas = {}
+        self.orden = []
+        self._candado = threading.Lock()
+
+    @property
+    def clave_version(self):
+        return f'autocompletar:{self.nombre}'
+
+    def construir(self, version):
+        palabras, etiquetas = [], {}
+        filas = self.modelo.objects.values_list('pk', *self.campos).iterator(chunk_size=2000)
+        for pk, *valores in filas:
+            datos = dict(zip(self.campos, valores))
+            etiquetas[pk] = self.etiqueta(datos)
+            for campo in self.campos_busqueda:
+                palabras.extend((palabra, pk) for palabra in _palabras(datos[campo]))
+                # RUT/patente también se buscan "pegados" (12345678-9 -> 123456789).
+                compacto = normalizar(datos[campo]).replace('.', '').replace('-', '').replace(' ', '')
+                if compacto:
+                    palabras.append((compacto, pk))
+        palabras.sort()
+        self.palabras = palabras
+        self.etiquetas = etiquetas
+        self.orden = sorted(etiquetas, key=lambda pk: normalizar(etiquetas[pk]))
+        self.version = version
+
+    def vigente(self):
+        """Reconstruye el índice si otro proceso (o este) modificó la tabla."""
+        version = contadores.obtener(self.clave_version)
+        if version != self.version:
+            with self._candado:
+                if version != self.version:
+                    self.construir(version)
+        return self
+
+    def _prefijo(self, prefijo):
+        encontrados = set()
+        for indice in range(bisect_left(self.palabras, (prefijo,)), len(self.palabras)):
+            palabra, pk = self.palabras[indice]
+            if not palabra.startswith(prefijo):
+                break
+            encontrados.add(pk)
+        return encontrados
+
+    def buscar(self, texto, pagina=1, por_pagina=RESULTADOS_POR_PAGINA):
+        """Devuelve ([(pk, etiqueta)], hay_mas) de la página pedida, ordenado por etiqueta."""
+        self.vigente()
+        palabras = _palabras(texto)
+        if palabras:
+            coincidencias = None
+            for palabra in palabras:
+                encontrados = self._prefijo(palabra)
+                coincidencias = encontrados if coincidencias is None else coincidencias & encontrados
+            candidatos = sorted(coincidencias, key=lambda pk: normalizar(self.etiquetas[pk]))
+        else:
+            candidatos = self.orden
+        inicio = (pagina - 1) * por_pagina
+        seleccion = candidatos[inicio:inicio + por_pagina]
+        return [(pk, self.etiquetas[pk]) for pk in seleccion], len(candidatos) > inicio + por_pagina
+
+
+def _nombre(*partes):
+    return " ".join(parte for parte in partes if parte)
+
+
+FUENTES = {
+    fuente.nombre: fuente for fuente in (
+        FuenteAutocompletar(
+            'motoristas', Motorista, ('nombres', 'apellido_paterno', 'apellido_materno', 'rut'),
+            lambda d: _nombre(d['nombres'], d['apellido_paterno']),
+        ),
+        FuenteAutocompletar(
+            'farmacias', Farmacia, ('nombre',),
+            lambda d: d['nombre'],
+        ),
+        FuenteAutocompletar(
+            'usuarios', Usuario, ('first_name', 'last_name', 'username', 'rut'),
+            lambda d: f"{d['first_name']} {d['last_name']} ({d['username']})",
+        ),
+        FuenteAutocompletar(
+            'motos', Moto, ('patente', 'marca', 'modelo'),
+            lambda d: f"{d['patente']} - {d['marca']} {d['modelo']}",
+        ),
+        FuenteAutocompletar(
+            'tipos_movimiento', TipoMovimiento, ('nombre',),
+            lambda d: d['nombre'],
+        ),
+    )
+}
+
+
+# --- INVALIDACIÓN Y PRECALENTADO ---
+
+def _invalidar(sender, update_fields=None, **kwargs):
+    for fuente in FUENTES.values():
+        if fuente.modelo is not sender:
+            continue
+        # Guardados parciales que no tocan campos indexados (p. ej. last_login al iniciar sesión).
+        if update_fields and not set(update_fields) & set(fuente.campos):
+            continue
+        contadores.incrementar(fuente.clave_version)
+
+
+def calentar(**kwargs):
+    """Construye todos los índices con la primera petición que atiende el proceso."""
+    request_started.disconnect(calentar, dispatch_uid='autocompletar_calentar')
+    try:
+        for fuente in FUENTES.values():
+            fuente.vigente()
+    except DatabaseError:
+        # Sin base de datos lista (p. ej. sin migrar) se construirán al primer uso.
+        logger.warning("No se pudieron precalentar los índices de autocompletado.", exc_info=True)
+
+
+def conectar_senales():
+    for fuente in FUENTES.values():
+        uid = f'autocompletar_{fuente.nombre}'
+        post_save.connect(_invalidar, sender=fuente.modelo, dispatch_uid=f'{uid}_guardar')
+        post_delete.connect(_invalidar, sender=fuente.modelo, dispatch_uid=f'{uid}_eliminar')
+    request_started.connect(calentar, dispatch_uid='autocompletar_calentar')
@@ -0,0 +1,131 @@
+import re
+
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery
+from django.db.models.expressions import RawSQL
+
+from . import versiones
+from .models import DocumentoBusquedaMovimiento, Movimiento
+from .utils import upsert
+
+TABLA_DOCUMENTOS = DocumentoBusquedaMovimiento._meta.db_table
+TABLA_FTS = 'discopro_movimiento_fts'
+TAMANO_LOTE_INDEXACION = 1000
+
+# Largo mínimo de palabra que indexa InnoDB por defecto (innodb_ft_min_token_size).
+LARGO_MINIMO_FULLTEXT = 3
+
+_CAMPOS_DOCUMENTO = (
+    'pk', 'despacho_raiz_id', 'numero_despacho', 'origen', 'destino',
+    'usuario_responsable__first_name', 'usuario_responsable__last_name',
+    'motorista_asignado__nombres', 'motorista_asignado__apellido_paterno',
+)
+
+
+# --- DOCUMENTOS ---
+
+def componer_contenido(pk, numero_despacho, origen, destino, *nombres):
+    """Texto indexado de un movimiento: identificadores, lugares y personas."""
+    partes = [str(pk), numero_despacho, origen, destino, *nombres]
+    return " ".join(parte for parte in partes if parte)
+
+
+def indexar(movimientos, tamano_lote=TAMANO_LOTE_INDEXACION):
+    """
+    (Re)genera los documentos de búsqueda de los movimientos del queryset, por
+    lotes y con upsert. Devuelve cuántos documentos se escribieron.
+    """
+    total = 0
+    lote = []
+    filas = movimientos.order_by().values_list(*_CAMPOS_DOCUMENTO)
+    for pk, raiz_id, numero, origen, destino, *nombres in filas.iterator(chunk_size=tamano_lote):
+        lote.append(DocumentoBusquedaMovimiento(
+            movimiento_id=pk, raiz_id=raiz_id or pk,
+            contenido=componer_contenido(pk, numero, origen, destino, *nombres)
+        ))
+        if len(lote) >= tamano_lote:
+            total += _guardar(lote)
+            lote = []
+    if lote:
+        total += _guardar(lote)
+    return total
+
+
+def _guardar(documentos):
+    upsert(DocumentoBusquedaMovimiento, documentos, 'movimiento', ['raiz', 'contenido'])
+    return len(documentos)
+
+
+def reconstruir_indice(tamano_lote=TAMANO_LOTE_INDEXACION):
+    """Regenera todos los documentos y, en SQLite, reconstruye la tabla FTS5 desde ellos."""
+    total = indexar(Movimiento.objects.all(), tamano_lote)
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+    # Los resultados de búsqueda del listado pueden cambiar: nueva versión de sus páginas.
+    versiones.incrementar(Movimiento)
+    return total
+
+
+# --- CONSULTA ---
+
+def terminos(texto):
+    """Palabras de la búsqueda, separadas igual que las separa el índice."""
+    return re.findall(r'\w+', (texto or '').lower())
+
+
+def _documentos_coincidentes(palabras):
+    """Queryset de documentos que contienen todas las palabras como prefijo, con `relevancia` (mayor = mejor)."""
+    documentos = DocumentoBusquedaMovimiento.objects.all()
+    if connection.vendor == 'sqlite':
+        consulta = " ".join(f'"{palabra}"*' for palabra in palabras)
+        return documentos.annotate(
+            relevancia=RawSQL(
+                # `movimiento_id` sin calificar: la tabla de documentos puede llevar otro alias si esto va en una subconsulta.
+                f"SELECT -bm25({TABLA_FTS}) FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s AND rowid = movimiento_id",
+                [consulta]
+            )
+        ).filter(movimiento_id__in=RawSQL(f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s", [consulta]))
+
+    if connection.vendor == 'mysql':
+        largas = [palabra for palabra in palabras if len(palabra) >= LARGO_MINIMO_FULLTEXT]
+        cortas = [palabra for palabra in palabras if len(palabra) < LARGO_MINIMO_FULLTEXT]
+        for palabra in cortas:
+            documentos = documentos.filter(contenido__icontains=palabra)
+        if not largas:
+            return documentos.annotate(relevancia=F('movimiento_id'))
+        consulta = " ".join(f'+{palabra}*' for palabra in largas)
+        return documentos.annotate(
+            relevancia=RawSQL("MATCH(contenido) AGAINST (%s IN BOOLEAN MODE)", [consulta])
+        ).filter(relevancia__gt=0)
+
+    condicion = Q()
+    for palabra in palabras:
+        condicion &= Q(contenido__icontains=palabra)
+    return documentos.filter(condicion).annotate(relevancia=F('movimiento_id'))
+
+
+def filtrar_por_texto(queryset, texto, por_relevancia=False):
+    """
+    Restringe un queryset de despachos a los que coinciden con `texto`, ya sea
+    por sus propios datos o por los de alguno de sus tramos. Con
+    `por_relevancia`, además los ordena del más al menos relevante (la mejor
+    coincidencia entre el despacho y sus tramos).
+    """
+    palabras = terminos(texto)
+    if not palabras:
+        return queryset
+    documentos = _documentos_coincidentes(palabras)
+    queryset = queryset.filter(pk__in=documentos.values('raiz_id'))
+    if por_relevancia:
+        mejor = documentos.filter(raiz_id=OuterRef('pk')).order_by('-relevancia').values('relevancia')[:1]
+        queryset = queryset.annotate(relevancia=Subquery(mejor)).order_by('-relevancia', '-pk')
+    return queryset
+
+
+def buscar_despachos(texto, limite=20):
+    """IDs de los despachos que mejor coinciden con `texto`, del más al menos relevante."""
+    if not terminos(texto):
+        return []
+    despachos = filtrar_por_texto(Movimiento.objects.filter(movimiento_padre__isnull=True), texto, por_relevancia=True)
+    return list(despachos.values_list('pk', flat=True)[:limite])
@@ -0,0 +1,230 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Contador, Farmacia, Motorista, Moto, Movimiento, Usuario
+
+PREFIJO_CACHE = 'contador:'
+# Se incrementa si cambia el formato de las claves/valores cacheados:
+# las entradas de la versión anterior dejan de leerse sin tener que borrarlas.
+# (2: se cachea (valor, actualizado) en vez de sólo el valor.)
+VERSION_CACHE = 2
+
+# Acota cuánto puede durar un valor obsoleto si una lectura concurrente
+# re-cachea el valor previo justo antes del commit de un incremento.
+TIMEOUT_CACHE = 300
+
+
+def _clave_cache(clave):
+    return f'{PREFIJO_CACHE}{clave}'
+
+
+def incrementar(clave, delta=1):
+    """Suma `delta` al contador `clave` (creándolo si no existe) e invalida su caché al confirmar."""
+    with transaction.atomic():
+        actualizadas = Contador.objects.filter(clave=clave).update(valor=F('valor') + delta, actualizado=timezone.now())
+        if not actualizadas:
+            try:
+                with transaction.atomic():
+                    Contador.objects.create(clave=clave, valor=delta)
+            except IntegrityError:
+                Contador.objects.filter(clave=clave).update(valor=F('valor') + delta, actualizado=timezone.now())
+    transaction.on_commit(lambda: cache.delete(_clave_cache(clave), version=VERSION_CACHE))
+
+
+def incrementar_al_confirmar(*claves):
+    """
+    Suma 1 a los contadores `claves` cuando se confirme la transacción en curso.
+    Todas las claves pedidas durante la transacción se suman juntas, una vez
+    cada una, en un solo UPDATE fuera de ella: las filas más escritas (la
+    versión de Movimiento, la del mes y la del año en curso) quedan bloqueadas
+    sólo lo que dura esa sentencia y no mientras termina la transacción.
+    Sólo para contadores de versión: si la transacción se revierte, sus claves
+    se suman con la siguiente que se confirme (una invalidación de más).
+    """
+    conexion = transaction.get_connection()
+    if not hasattr(conexion, '_contadores_pendientes'):
+        conexion._contadores_pendientes = set()
+    conexion._contadores_pendientes.update(claves)
+    transaction.on_commit(_incrementar_pendientes)
+
+
+def _incrementar_pendientes():
+    pendientes = transaction.get_connection()._contadores_pendientes
+    claves = sorted(pendientes)
+    pendientes.clear()
+    if not claves:
+        return
+    with transaction.atomic():
+        existentes = set(Contador.objects.filter(clave__in=claves).values_list('clave', flat=True))
+        Contador.objects.bulk_create(
+            [Contador(clave=clave) for clave in claves if clave not in existentes], ignore_conflicts=True
+        )
+        Contador.objects.filter(clave__in=claves).update(valor=F('valor') + 1, actualizado=timezone.now())
+    cache.delete_many([_clave_cache(clave) for clave in claves], version=VERSION_CACHE)
+
+
+def fijar(clave, valor):
+    """Deja el contador `clave` en `valor` (creándolo si no existe) e invalida su caché al confirmar."""
+    Contador.objects.update_or_create(clave=clave, defaults={'valor': valor})
+    transaction.on_commit(lambda: cache.delete(_clave_cache(clave), version=VERSION_CACHE))
+
+
+def eliminar(clave):
+    """Borra el contador `clave` (vuelve a leerse como 0)."""
+    Contador.objects.filter(clave=clave).delete()
+    transaction.on_commit(lambda: cache.delete(_clave_cache(clave), version=VERSION_CACHE))
+
+
+def obtener_con_fecha(claves):
+    """
+    {clave: (valor, actualizado)} de varios contadores con una lectura de caché
+    (y una consulta sólo por los faltantes). Los inexistentes valen (0, None).
+    """
+    claves = list(claves)
+    en_cache = cache.get_many([_clave_cache(clave) for clave in claves], version=VERSION_CACHE)
+    valores = {clave: en_cache[_clave_cache(clave)] for clave in claves if _clave_cache(clave) in en_cache}
+
+    faltantes = [clave for clave in claves if clave not in valores]
+    if faltantes:
+        desde_bd = {
+            clave: (valor, actualizado)
+            for clave, valor, actualizado in Contador.objects.filter(clave__in=faltantes).values_list('clave', 'valor', 'actualizado')
+        }
+        nuevos = {clave: desde_bd.get(clave, (0, None)) for clave in faltantes}
+        cache.set_many({_clave_cache(clave): valor for clave, valor in nuevos.items()}, TIMEOUT_CACHE, version=VERSION_CACHE)
+        valores.update(nuevos)
+    return valores
+
+
+def obtener_varios(claves):
+    """Valores de varios contadores con una lectura de caché (y una consulta sólo por los faltantes)."""
+    return {clave: valor for clave, (valor, _) in obtener_con_fecha(claves).items()}
+
+
+def obtener(clave):
+    return obtener_varios([clave])[clave]
+
+
+# --- CONTADORES DEL DASHBOARD ---
+
+TOTAL_FARMACIAS = 'total:farmacias'
+TOTAL_MOTORISTAS = 'total:motoristas'
+TOTAL_MOTOS = 'total:motos'
+TOTAL_USUARIOS = 'total:usuarios'
+TOTAL_DESPACHOS = 'total:despachos'
+PREFIJO_DESPACHOS_ESTADO = 'despachos:estado:'
+PREFIJO_PENDIENTES_MOTORISTA = 'pendientes:motorista:'
+# Día (ordinal) de la última revisión de alertas de vencimiento (ver `discopro.vencimientos`).
+REVISION_VENCIMIENTOS = 'vencimientos:revision'
+
+# Modelos cuyo total se lleva con altas/bajas (señales post_save/post_delete).
+TOTALES_POR_MODELO = {
+    Farmacia: TOTAL_FARMACIAS,
+    Motorista: TOTAL_MOTORISTAS,
+    Moto: TOTAL_MOTOS,
+    Usuario: TOTAL_USUARIOS,
+}
+
+# Claves mostradas en el dashboard: se leen juntas con un solo get_many.
+CLAVES_DASHBOARD = {
+    'total_farmacias': TOTAL_FARMACIAS,
+    'total_motoristas': TOTAL_MOTORISTAS,
+    'total_motos': TOTAL_MOTOS,
+    'total_usuarios': TOTAL_USUARIOS,
+    'total_movimientos': TOTAL_DESPACHOS,
+    'despachos_pendientes': f'{PREFIJO_DESPACHOS_ESTADO}pendiente',
+    'revision_vencimientos': REVISION_VENCIMIENTOS,
+}
+
+
+def clave_pendientes_motorista(motorista_id):
+    return f'{PREFIJO_PENDIENTES_MOTORISTA}{motorista_id}'
+
+
+def claves_movimiento(movimiento_padre_id, estado, motorista_id):
+    """
+    Contadores a los que aporta (con +1) un movimiento con estos valores. Sólo
+    cuentan los despachos (movimientos raíz); los tramos no suman.
+    """
+    if movimiento_padre_id is not None:
+        return []
+    claves = [TOTAL_DESPACHOS, f'{PREFIJO_DESPACHOS_ESTADO}{estado}']
+    if estado == 'pendiente' and motorista_id is not None:
+        claves.append(clave_pendientes_motorista(motorista_id))
+    return claves
+
+
+def traspasar(anteriores, nuevas):
+    """Descuenta las claves `anteriores` y suma las `nuevas` (sólo las que cambian)."""
+    diferencia = Counter(nuevas)
+    diferencia.subtract(Counter(anteriores))
+    for clave, delta in sorted(diferencia.items()):
+        if delta:
+            incrementar(clave, delta)
+
+
+def dashboard():
+    """Cifras del dashboard, con los nombres de variable que usa la plantilla."""
+    valores = obtener_varios(CLAVES_DASHBOARD.values())
+    return {nombre: valores[clave] for nombre, clave in CLAVES_DASHBOARD.items()}
+
+
+def pendientes_por_motorista(motorista_ids):
+    """Despachos pendientes de cada motorista: {motorista_id: total}."""
+    motorista_ids = list(motorista_ids)
+    valores = obtener_varios(clave_pendientes_motorista(pk) for pk in motorista_ids)
+    return {pk: valores[clave_pendientes_motorista(pk)] for pk in motorista_ids}
+
+
+def calcular_contadores():
+    """Valor correcto de todos los contadores del dashboard, calculado desde las tablas."""
+    valores = {clave: modelo.objects.count() for modelo, clave in TOTALES_POR_MODELO.items()}
+
+    despachos = Movimiento.objects.filter(movimiento_padre__isnull=True)
+    valores[TOTAL_DESPACHOS] = 0
+    for estado, _ in Movimiento.ESTADO_CHOICES:
+        valores[f'{PREFIJO_DESPACHOS_ESTADO}{estado}'] = 0
+    for fila in despachos.values('estado').annotate(total=Count('pk')).order_by():
+        valores[f'{PREFIJO_DESPACHOS_ESTADO}{fila["estado"]}'] = fila['total']
+        valores[TOTAL_DESPACHOS] += fila['total']
+
+    pendientes = despachos.filter(estado='pendiente', motorista_asignado__isnull=False)
+    for fila in pendientes.values('motorista_asignado').annotate(total=Count('pk')).order_by():
+        valores[clave_pendientes_motorista(fila['motorista_asignado'])] = fila['total']
+    return valores
+
+
+def reconciliar():
+    """
+    Recalcula los contadores del dashboard y corrige los que se hayan desviado
+    (cargas masivas, `loaddata`, ediciones directas en la base de datos...).
+    Devuelve las diferencias encontradas: [(clave, valor_anterior, valor_correcto)].
+    """
+    prefijos = Q()
+    for prefijo in ('total:', PREFIJO_DESPACHOS_ESTADO, PREFIJO_PENDIENTES_MOTORISTA):
+        prefijos |= Q(clave__startswith=prefijo)
+
+    with transaction.atomic():
+        correctos = calcular_contadores()
+        actuales = dict(Contador.objects.select_for_update().filter(prefijos).values_list('clave', 'valor'))
+        diferencias = []
+        for clave in sorted(set(correctos) | set(actuales)):
+            anterior, correcto = actuales.get(clave, 0), correctos.get(clave, 0)
+            if anterior != correcto:
+                diferencias.append((clave, anterior, correcto))
+
+        sobrantes = [clave for clave in actuales if clave not in correctos]
+        Contador.objects.filter(clave__in=sobrantes).delete()
+        for clave, valor in correctos.items():
+            if clave not in actuales:
+                Contador.objects.create(clave=clave, valor=valor)
+            elif actuales[clave] != valor:
+                Contador.objects.filter(clave=clave).update(valor=valor, actualizado=timezone.now())
+
+        claves_cache = [_clave_cache(clave) for clave in set(correctos) | set(actuales)]
+        transaction.on_commit(lambda: cache.delete_many(claves_cache, version=VERSION_CACHE))
+    return diferencias
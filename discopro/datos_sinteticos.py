@@ -0,0 +1,380 @@
+"""
+Generador de datos sintéticos para pruebas de carga.
+
+Inserta con bulk_create por lotes y PKs explícitas (MySQL no devuelve las PKs
+de un bulk_create, y los tramos necesitan la de su despacho). bulk_create no
+emite señales: cada objeto calcula sus claves de orden natural antes de
+insertarse, y los datos derivados (asignación actual, resumen diario, índice
+de búsqueda, contadores, versiones de caché) se recalculan al final.
+"""
+import datetime
+import random
+import unicodedata
+from bisect import bisect_right
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import contadores, versiones
+from .despachos import calcular_avance
+from .autocompletar import FUENTES
+from .models import (
+    AsignacionFarmacia, AsignacionMoto, Comuna, Farmacia, Motorista, Moto,
+    Movimiento, Rol, TipoMovimiento, Usuario,
+)
+from .reportes import invalidar_reportes
+from .rut import formatear_rut
+
+TAMANO_LOTE = 5000
+
+NOMBRES = (
+    'Juan', 'José', 'Luis', 'Carlos', 'Jorge', 'Pedro', 'Diego', 'Felipe', 'Matías', 'Sebastián',
+    'Cristián', 'Rodrigo', 'Francisco', 'Pablo', 'Nicolás', 'Ignacio', 'Tomás', 'Benjamín', 'Víctor', 'Manuel',
+    'María', 'Ana', 'Carolina', 'Camila', 'Valentina', 'Francisca', 'Daniela', 'Javiera', 'Constanza', 'Paula',
+    'Fernanda', 'Catalina', 'Claudia', 'Patricia', 'Andrea', 'Macarena', 'Sofía', 'Isidora', 'Antonia', 'Josefa',
+)
+APELLIDOS = (
+    'González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez', 'Sepúlveda',
+    'Morales', 'Rodríguez', 'López', 'Fuentes', 'Hernández', 'Torres', 'Araya', 'Flores', 'Espinoza', 'Valenzuela',
+    'Castillo', 'Tapia', 'Reyes', 'Gutiérrez', 'Castro', 'Pizarro', 'Álvarez', 'Vásquez', 'Sánchez', 'Fernández',
+    'Ramírez', 'Carrasco', 'Gómez', 'Cortés', 'Herrera', 'Núñez', 'Jara', 'Vergara', 'Rivera', 'Figueroa',
+)
+CALLES = (
+    'Av. Providencia', 'Av. Libertador Bernardo O\'Higgins', 'Av. Vicuña Mackenna', 'Av. Irarrázaval',
+    'Av. Grecia', 'Av. Tobalaba', 'Av. Apoquindo', 'Av. Pajaritos', 'Gran Avenida', 'Av. Recoleta',
+    'Av. Independencia', 'Av. Matta', 'Av. Departamental', 'Av. La Florida', 'Av. Los Leones',
+    'Manuel Montt', 'Pedro de Valdivia', 'José Pedro Alessandri', 'Santa Rosa', 'San Diego',
+    'Los Alerces', 'Los Aromos', 'El Roble', 'Las Acacias', 'Los Jazmines', 'Pasaje Los Copihues',
+)
+CADENAS_FARMACIA = ('Cruz Verde', 'Salcobrand', 'Ahumada', 'Dr. Simi', 'Knop', 'Farmacia Popular')
+MOTOS = {
+    'Honda': ('CG 150', 'XR 150L', 'Wave 110', 'CB 190R'),
+    'Yamaha': ('YBR 125', 'FZ 150', 'XTZ 125'),
+    'Suzuki': ('GN 125', 'GSX 150', 'AX 100'),
+    'Bajaj': ('Pulsar 180', 'Boxer 150'),
+    'Zongshen': ('ZS 150', 'ZS 200GY'),
+}
+COLORES = ('Rojo', 'Negro', 'Blanco', 'Azul', 'Gris', 'Verde')
+OBSERVACIONES = (
+    'Cliente no se encontraba, se deja aviso.', 'Entregar en conserjería.', 'Receta retenida.',
+    'Dirección con numeración difícil de ubicar.', 'Producto refrigerado.', 'Llamar antes de llegar.',
+)
+# Letras de patentes chilenas (sin vocales ni letras confundibles).
+LETRAS_PATENTE = 'BCDFGHJKLPRSTVWXYZ'
+
+# Distribuciones (peso relativo).
+PESOS_TIPO_DESPACHO = {'Directo': 60, 'Receta médica': 20, 'Reenvío': 8, 'Traspaso': 7, 'Fallido': 5}
+PESOS_TIPO_TRAMO = {'Reenvío': 40, 'Traspaso': 30, 'Fallido': 20, 'Directo': 10}
+PESOS_TRAMOS_POR_DESPACHO = {0: 55, 1: 30, 2: 12, 3: 3}
+PESOS_DIA_SEMANA = (1.0, 1.0, 1.0, 1.0, 1.1, 0.8, 0.45)  # lunes a domingo
+PESOS_HORA = {8: 2, 9: 5, 10: 8, 11: 10, 12: 10, 13: 8, 14: 7, 15: 7, 16: 8, 17: 9, 18: 9, 19: 7, 20: 5, 21: 3, 22: 1}
+TIPOS_MOVIMIENTO_BASE = ('Directo', 'Receta médica', 'Fallido', 'Reenvío', 'Traspaso')
+
+
+def _sin_tildes(texto):
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+
+
+def formatear_patente(indice):
+    """Patente de moto (3 letras y 2 dígitos) correspondiente al índice."""
+    letras, numero = divmod(indice, 100)
+    base = len(LETRAS_PATENTE)
+    return (
+        LETRAS_PATENTE[letras // base ** 2 % base] + LETRAS_PATENTE[letras // base % base]
+        + LETRAS_PATENTE[letras % base] + f"{numero:02d}"
+    )
+
+
+def _siguiente_pk(modelo):
+    return (modelo.objects.aggregate(maximo=Max('pk'))['maximo'] or 0) + 1
+
+
+class Selector:
+    """Elección ponderada reproducible (pesos acumulados + bisect) sobre una secuencia."""
+    def __init__(self, rng, valores, pesos):
+        self.rng = rng
+        self.valores = list(valores)
+        self.acumulados = list(accumulate(pesos))
+        self.total = self.acumulados[-1]
+
+    def __call__(self):
+        return self.valores[bisect_right(self.acumulados, self.rng.random() * self.total)]
+
+
+class GeneradorDatos:
+    """
+    Genera un conjunto de datos realista y reproducible a partir de `semilla`.
+    Los registros se agregan a los existentes (identificadores únicos a partir
+    de las PKs actuales). `informar(mensaje)` recibe el avance.
+    """
+    def __init__(self, semilla=1, tamano_lote=TAMANO_LOTE, informar=None):
+        self.rng = random.Random(semilla)
+        self.tamano_lote = tamano_lote
+        self.informar = informar or (lambda mensaje: None)
+        self.zona = timezone.get_current_timezone()
+        self.hoy = timezone.localdate()
+        self.comunas = list(Comuna.objects.values_list('pk', 'nombreComuna'))
+        if not self.comunas:
+            raise ValueError("No hay comunas cargadas: cargue primero regiones, provincias y comunas.")
+
+    # --- UTILIDADES ---
+
+    def _insertar(self, modelo, objetos):
+        for inicio in range(0, len(objetos), self.tamano_lote):
+            with transaction.atomic():
+                modelo.objects.bulk_create(objetos[inicio:inicio + self.tamano_lote])
+
+    def _fecha_hora(self, dia, hora=None):
+        hora = self.rng.randint(8, 21) if hora is None else hora
+        return datetime.datetime.combine(
+            dia, datetime.time(hora, self.rng.randrange(60), self.rng.randrange(60)), tzinfo=self.zona
+        )
+
+    def _dia_pasado(self, anios):
+        return self.hoy - datetime.timedelta(days=self.rng.randrange(max(int(anios * 365), 1)))
+
+    def _persona(self):
+        return self.rng.choice(NOMBRES), self.rng.choice(APELLIDOS), self.rng.choice(APELLIDOS)
+
+    def _direccion(self):
+        return f"{self.rng.choice(CALLES)} {self.rng.randint(10, 9999)}"
+
+    def _telefono(self):
+        return f"+569{self.rng.randint(10000000, 99999999)}"
+
+    def _ruts(self, modelo, pk, cantidad, base):
+        ocupados = set(modelo.objects.exclude(rut=None).values_list('rut', flat=True))
+        ruts, numero = [], base + pk
+        while len(ruts) < cantidad:
+            rut = formatear_rut(numero)
+            if rut not in ocupados:
+                ruts.append(rut)
+            numero += 1
+        return ruts
+
+    # --- MAESTROS ---
+
+    def tipos_movimiento(self):
+        existentes = set(TipoMovimiento.objects.values_list('nombre', flat=True))
+        TipoMovimiento.objects.bulk_create([
+            TipoMovimiento(nombre=nombre) for nombre in TIPOS_MOVIMIENTO_BASE if nombre not in existentes
+        ])
+        return dict(TipoMovimiento.objects.values_list('nombre', 'pk'))
+
+    def usuarios(self, cantidad, clave=None):
+        pk = _siguiente_pk(Usuario)
+        roles = list(Rol.objects.values_list('pk', flat=True)) or [None]
+        password = make_password(clave) if clave else make_password(None)
+        ocupados = set(Usuario.objects.values_list('username', flat=True))
+        ruts = self._ruts(Usuario, pk, cantidad, 15_000_000)
+        objetos = []
+        for i in range(cantidad):
+            nombre, apellido, _ = self._persona()
+            username = _sin_tildes(f"{nombre}.{apellido}{pk + i}").lower().replace(' ', '')
+            if username in ocupados:
+                username = f"{username}.{i}"
+            usuario = Usuario(
+                pk=pk + i, username=username, first_name=nombre, last_name=apellido,
+                email=f"{username}@discopro.cl", password=password, rut=ruts[i],
+                telefono=self._telefono(), rol_id=self.rng.choice(roles), is_active=self.rng.random() < 0.95,
+            )
+            usuario.actualizar_claves_orden()
+            objetos.append(usuario)
+        self._insertar(Usuario, objetos)
+        self.informar(f"Usuarios: {cantidad}")
+        return [usuario.pk for usuario in objetos]
+
+    def farmacias(self, cantidad):
+        pk = _siguiente_pk(Farmacia)
+        objetos = []
+        for i in range(cantidad):
+            comuna_id, comuna = self.rng.choice(self.comunas)
+            farmacia = Farmacia(
+                pk=pk + i, nombre=f"{self.rng.choice(CADENAS_FARMACIA)} {comuna} {pk + i}",
+                direccion=self._direccion(), comuna_id=comuna_id,
+                horario_apertura=datetime.time(self.rng.choice((8, 9, 10))),
+                horario_cierre=datetime.time(self.rng.choice((20, 21, 22, 23))),
+                telefono=f"+562{self.rng.randint(20000000, 29999999)}",
+                latitud=round(-33.45 + self.rng.uniform(-0.2, 0.2), 6),
+                longitud=round(-70.66 + self.rng.uniform(-0.2, 0.2), 6),
+            )
+            farmacia.actualizar_claves_orden()
+            objetos.append(farmacia)
+        self._insertar(Farmacia, objetos)
+        self.informar(f"Farmacias: {cantidad}")
+        return [(farmacia.pk, farmacia.nombre) for farmacia in objetos]
+
+    def motoristas(self, cantidad):
+        pk = _siguiente_pk(Motorista)
+        ruts = self._ruts(Motorista, pk, cantidad, 8_000_000)
+        estado = Selector(self.rng, (Motorista.ESTADO_ACTIVO, Motorista.ESTADO_INACTIVO, Motorista.ESTADO_LICENCIA), (85, 10, 5))
+        objetos = []
+        for i in range(cantidad):
+            nombre, paterno, materno = self._persona()
+            ultimo_control = self._dia_pasado(1)
+            motorista = Motorista(
+                pk=pk + i, rut=ruts[i], nombres=nombre, apellido_paterno=paterno, apellido_materno=materno,
+                fecha_nacimiento=datetime.date(self.rng.randint(1965, 2004), self.rng.randint(1, 12), self.rng.randint(1, 28)),
+                direccion=self._direccion(), comuna_id=self.rng.choice(self.comunas)[0], telefono=self._telefono(),
+                correo=_sin_tildes(f"{nombre}.{paterno}{pk + i}@correo.cl").lower(),
+                incluye_moto_personal=self.rng.random() < 0.2, estado=estado(),
+                fecha_ultimo_control=ultimo_control, fecha_proximo_control=ultimo_control + datetime.timedelta(days=365),
+            )
+            motorista.actualizar_claves_orden()
+            objetos.append(motorista)
+        self._insertar(Motorista, objetos)
+        self.informar(f"Motoristas: {cantidad}")
+        return [motorista.pk for motorista in objetos]
+
+    def motos(self, cantidad):
+        inicio = Moto.objects.count()
+        ocupadas = set(Moto.objects.values_list('patente', flat=True))
+        objetos, indice = [], inicio
+        while len(objetos) < cantidad:
+            patente = formatear_patente(indice)
+            indice += 1
+            if patente in ocupadas:
+                continue
+            marca = self.rng.choice(list(MOTOS))
+            moto = Moto(
+                patente=patente, marca=marca, modelo=self.rng.choice(MOTOS[marca]), color=self.rng.choice(COLORES),
+                anio=self.rng.randint(2012, self.hoy.year), numero_chasis=f"9C2{self.rng.randrange(10 ** 14):014d}",
+                propietario=Moto.PROPIETARIO_EMPRESA if self.rng.random() < 0.8 else Moto.PROPIETARIO_MOTORISTA,
+            )
+            moto.actualizar_claves_orden()
+            objetos.append(moto)
+        self._insertar(Moto, objetos)
+        self.informar(f"Motos: {cantidad}")
+        return [moto.patente for moto in objetos]
+
+    def asignaciones(self, motoristas, farmacias, motos, anios):
+        """Historial de 1 a 3 asignaciones por motorista/moto; las anteriores cerradas con fechaTermino."""
+        de_farmacia, de_moto = [], []
+        for motorista_id in motoristas:
+            fechas = sorted(self._dia_pasado(anios) for _ in range(self.rng.randint(1, 3)))
+            for i, dia in enumerate(fechas):
+                termino = fechas[i + 1] if i + 1 < len(fechas) else (None if self.rng.random() < 0.9 else self.hoy)
+                de_farmacia.append(AsignacionFarmacia(
+                    motorista_id=motorista_id, farmacia_id=self.rng.choice(farmacias)[0],
+                    fechaAsignacion=self._fecha_hora(dia), fechaTermino=termino,
+                ))
+        for patente, motorista_id in zip(motos, self.rng.sample(motoristas, min(len(motos), len(motoristas)))):
+            fechas = sorted(self._dia_pasado(anios) for _ in range(self.rng.randint(1, 2)))
+            for i, dia in enumerate(fechas):
+                ultima = i + 1 == len(fechas)
+                de_moto.append(AsignacionMoto(
+                    moto_id=patente, motorista_id=motorista_id if ultima else self.rng.choice(motoristas),
+                    fechaAsignacion=self._fecha_hora(dia), fechaTermino=None if ultima else fechas[i + 1],
+                    estado="Asignada" if ultima else "Finalizada",
+                ))
+        self._insertar(AsignacionFarmacia, de_farmacia)
+        self._insertar(AsignacionMoto, de_moto)
+        self.informar(f"Asignaciones: {len(de_farmacia)} de farmacia, {len(de_moto)} de moto")
+
+    # --- MOVIMIENTOS ---
+
+    def _despachos_por_dia(self, despachos, anios):
+        """Reparte los despachos en los días del período: más los días hábiles y con volumen creciente."""
+        dias = [self.hoy - datetime.timedelta(days=n) for n in range(int(anios * 365) - 1, -1, -1)]
+        pesos = [
+            PESOS_DIA_SEMANA[dia.weekday()] * (0.5 + i / len(dias))
+            for i, dia in enumerate(dias)
+        ]
+        total, acumulado, asignados = sum(pesos), 0.0, 0
+        for dia, peso in zip(dias, pesos):
+            # Redondeo acumulado: la suma por día da exactamente `despachos`.
+            acumulado += despachos * peso / total
+            cantidad, asignados = round(acumulado) - asignados, round(acumulado)
+            if cantidad:
+                yield dia, cantidad
+
+    def _estado_despacho(self, dia):
+        antiguedad = (self.hoy - dia).days
+        if antiguedad == 0:
+            pesos = (55, 40, 5)
+        elif antiguedad == 1:
+            pesos = (15, 78, 7)
+        else:
+            pesos = (1, 91, 8)
+        return self.rng.choices(('pendiente', 'completado', 'anulado'), weights=pesos)[0]
+
+    def movimientos(self, total, anios, motoristas, farmacias, usuarios, tipos):
+        """
+        Genera `total` movimientos (despachos y sus tramos) en los últimos
+        `anios` años, en orden cronológico y por lotes. Devuelve (despachos, tramos).
+        """
+        tipo_despacho = Selector(self.rng, [tipos[n] for n in PESOS_TIPO_DESPACHO], PESOS_TIPO_DESPACHO.values())
+        tipo_tramo = Selector(self.rng, [tipos[n] for n in PESOS_TIPO_TRAMO], PESOS_TIPO_TRAMO.values())
+        cantidad_tramos = Selector(self.rng, PESOS_TRAMOS_POR_DESPACHO, PESOS_TRAMOS_POR_DESPACHO.values())
+        # Carga desigual entre motoristas: unos pocos concentran muchos despachos.
+        motorista = Selector(self.rng, motoristas, [self.rng.lognormvariate(0, 0.6) for _ in motoristas])
+        hora = Selector(self.rng, PESOS_HORA, PESOS_HORA.values())
+        promedio_tramos = sum(n * p for n, p in PESOS_TRAMOS_POR_DESPACHO.items()) / sum(PESOS_TRAMOS_POR_DESPACHO.values())
+
+        ahora = timezone.now()
+        pk = _siguiente_pk(Movimiento)
+        lote, despachos, tramos = [], 0, 0
+        # Un motorista tiene a lo más un despacho pendiente (ver DespachoActivo).
+        con_pendiente = set()
+        for dia, cantidad in self._despachos_por_dia(round(total / (1 + promedio_tramos)), anios):
+            for fecha in sorted(min(self._fecha_hora(dia, hora()), ahora) for _ in range(cantidad)):
+                if despachos + tramos >= total:
+                    break
+                estado = self._estado_despacho(dia)
+                asignado = None if estado == 'pendiente' and self.rng.random() < 0.1 else motorista()
+                if estado == 'pendiente' and asignado is not None:
+                    if asignado in con_pendiente:
+                        asignado = None
+                    else:
+                        con_pendiente.add(asignado)
+                despacho = Movimiento(
+                    pk=pk, numero_despacho=f"DSP-{pk:09d}", tipo_movimiento_id=tipo_despacho(),
+                    fecha_movimiento=fecha, usuario_responsable_id=self.rng.choice(usuarios),
+                    observacion=self.rng.choice(OBSERVACIONES) if self.rng.random() < 0.05 else None,
+                    estado=estado, origen=self.rng.choice(farmacias)[1], destino=self._direccion(),
+                    motorista_asignado_id=asignado,
+                )
+                despacho.actualizar_claves_orden()
+                lote.append(despacho)
+                pk += 1
+                despachos += 1
+
+                n_tramos = min(cantidad_tramos(), total - despachos - tramos)
+                tramos_despacho = []
+                for i in range(n_tramos):
+                    ultimo = i + 1 == n_tramos
+                    tramo = Movimiento(
+                        pk=pk, tipo_movimiento_id=tipo_tramo(),
+                        fecha_movimiento=min(fecha + datetime.timedelta(minutes=self.rng.randint(20, 90) * (i + 1)), ahora),
+                        usuario_responsable_id=despacho.usuario_responsable_id,
+                        estado=estado if ultimo else 'completado', origen=self.rng.choice(farmacias)[1],
+                        destino=despacho.destino, motorista_asignado_id=despacho.motorista_asignado_id,
+                    )
+                    tramo.ubicar_bajo(despacho)
+                    tramo.actualizar_claves_orden()
+                    tramos_despacho.append(tramo)
+                    pk += 1
+                    tramos += 1
+                calcular_avance(despacho, tramos_despacho)
+                lote += tramos_despacho
+
+                if len(lote) >= self.tamano_lote:
+                    self._insertar(Movimiento, lote)
+                    lote = []
+                    self.informar(f"Movimientos: {despachos + tramos}/{total}")
+        if lote:
+            self._insertar(Movimiento, lote)
+        self.informar(f"Movimientos: {despachos} despachos y {tramos} tramos")
+        return despachos, tramos
+
+    # --- CACHÉS ---
+
+    def invalidar_caches(self, anios):
+        """Quedan obsoletos los índices de autocompletado, las páginas condicionales y los reportes del período."""
+        for fuente in FUENTES.values():
+            contadores.incrementar(fuente.clave_version)
+        versiones.incrementar(*versiones.MODELOS_VERSIONADOS)
+        invalidar_reportes(*(self.hoy - datetime.timedelta(days=n) for n in range(int(anios * 365))))
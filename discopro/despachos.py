@@ -0,0 +1,375 @@
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Max, Q, Value, When
+from django.db.models.functions import Coalesce, Concat, Floor, Substr
+
+from . import busqueda
+from .models import DIGITOS_RUTA, DespachoActivo, Motorista, Movimiento, segmento_ruta
+
+TAMANO_LOTE_REPARACION = 1000
+
+
+class MotoristaOcupado(ValidationError):
+    """El motorista ya tiene otro despacho pendiente (su fila en DespachoActivo es de otro despacho)."""
+
+    def __init__(self, motorista, despacho=None):
+        nro = f" ({despacho.numero_despacho})" if despacho is not None else ""
+        super().__init__(
+            f"El motorista {motorista} ya tiene un despacho pendiente activo{nro}. "
+            "Termine ese trabajo antes de asignarle uno nuevo distinto.",
+            code='motorista_ocupado',
+        )
+
+
+# --- DESPACHO ACTIVO POR MOTORISTA ---
+
+def raiz(movimiento):
+    """PK del despacho (la raíz de su árbol) al que pertenece el movimiento."""
+    return movimiento.despacho_raiz_id or movimiento.pk
+
+
+def ocupacion(motorista_id, despacho_id, estado):
+    """(motorista_id, despacho_id) si el movimiento ocupa a su motorista, o None."""
+    if motorista_id is None or estado != 'pendiente':
+        return None
+    return motorista_id, despacho_id
+
+
+def ocupacion_de(movimiento):
+    return ocupacion(movimiento.motorista_asignado_id, raiz(movimiento), movimiento.estado)
+
+
+def despacho_que_ocupa(motorista_id, excepto=None):
+    """El otro despacho que ocupa al motorista (una lectura por clave primaria), o None."""
+    activo = DespachoActivo.objects.filter(motorista_id=motorista_id).select_related('despacho').first()
+    if activo is None or activo.despacho_id == excepto:
+        return None
+    return activo.despacho
+
+
+def ocupar(motorista_id, despacho_id):
+    """
+    Toma el motorista para el despacho. Se lee su fila con bloqueo, de modo que
+    un liberar() concurrente del mismo motorista espera a que este guardado
+    termine. Si no hay fila, la clave primaria decide entre dos guardados
+    simultáneos: el segundo INSERT falla y, si la fila ganadora es de otro
+    despacho, se lanza MotoristaOcupado (y se revierte el guardado).
+    """
+    with transaction.atomic():
+        actual = DespachoActivo.objects.select_for_update().filter(
+            motorista_id=motorista_id
+        ).values_list('despacho_id', flat=True).first()
+        if actual == despacho_id:
+            return
+        if actual is None:
+            try:
+                with transaction.atomic():
+                    DespachoActivo.objects.create(motorista_id=motorista_id, despacho_id=despacho_id)
+                return
+            except IntegrityError:
+                # Lectura con bloqueo: en MySQL ve la fila que otra transacción acaba de confirmar.
+                actual = DespachoActivo.objects.select_for_update().filter(
+                    motorista_id=motorista_id
+                ).values_list('despacho_id', flat=True).first()
+                if actual == despacho_id:
+                    return
+    raise MotoristaOcupado(
+        Motorista.objects.filter(pk=motorista_id).first() or motorista_id,
+        Movimiento.objects.filter(pk=actual).first() if actual else None,
+    )
+
+
+def liberar(motorista_id, despacho_id):
+    """
+    Suelta el motorista si ya no le quedan movimientos pendientes en el despacho.
+    La fila se bloquea antes de contar los pendientes: un guardado concurrente
+    que vuelve a ocuparlo (ver ocupar) la tiene tomada hasta confirmar, y la
+    lectura con bloqueo de los pendientes ve entonces su movimiento.
+    """
+    with transaction.atomic():
+        activo = DespachoActivo.objects.select_for_update().filter(
+            motorista_id=motorista_id, despacho_id=despacho_id
+        ).values_list('pk', flat=True).first()
+        if activo is None:
+            return
+        pendientes = Movimiento.objects.filter(motorista_asignado_id=motorista_id, estado='pendiente').filter(
+            Q(pk=despacho_id) | Q(despacho_raiz_id=despacho_id)
+        )
+        if not pendientes.select_for_update().exists():
+            DespachoActivo.objects.filter(motorista_id=motorista_id, despacho_id=despacho_id).delete()
+
+
+def traspasar(anterior, actual):
+    """Aplica el cambio de ocupación de un movimiento guardado o eliminado."""
+    if anterior and anterior != actual:
+        liberar(*anterior)
+    if actual:
+        ocupar(*actual)
+
+
+# --- ÁRBOL DEL DESPACHO ---
+
+def subarbol(movimiento):
+    """
+    Queryset de los movimientos que cuelgan (a cualquier nivel) de `movimiento`:
+    de un despacho, por el índice de la raíz; de un tramo, por prefijo de ruta.
+    """
+    if movimiento.despacho_raiz_id is None:
+        return Movimiento.objects.filter(despacho_raiz_id=movimiento.pk)
+    return Movimiento.objects.filter(ruta__startswith=movimiento.ruta + segmento_ruta(movimiento.pk))
+
+
+def en_profundidad(movimientos, raiz_id):
+    """Ordena los movimientos (ya leídos, por fecha) en profundidad: cada tramo seguido de los suyos."""
+    hijos = defaultdict(list)
+    for movimiento in movimientos:
+        hijos[movimiento.movimiento_padre_id].append(movimiento)
+    ordenados, pila = [], hijos[raiz_id][::-1]
+    while pila:
+        movimiento = pila.pop()
+        ordenados.append(movimiento)
+        pila += hijos[movimiento.pk][::-1]
+    return ordenados
+
+
+def tramos_de(movimiento, *relacionados):
+    """Todos los tramos bajo el movimiento en una consulta, en profundidad (ver `en_profundidad`)."""
+    tramos = subarbol(movimiento).select_related(*relacionados).order_by('fecha_movimiento', 'pk')
+    return en_profundidad(tramos, movimiento.pk)
+
+
+def mover_descendientes(movimiento, ruta_anterior, raiz_anterior):
+    """
+    Tras cambiar de padre un movimiento, sus descendientes heredan la nueva
+    raíz, ruta y profundidad con un UPDATE por prefijo de ruta. Como pasan de
+    despacho, se recalculan el avance de ambos y la ocupación de sus motoristas.
+    """
+    anterior = ruta_anterior + segmento_ruta(movimiento.pk)
+    nueva = movimiento.ruta + segmento_ruta(movimiento.pk)
+    raiz_actual = raiz(movimiento)
+    if anterior == nueva:
+        return
+    movidos = Movimiento.objects.filter(ruta__startswith=anterior).update(
+        ruta=Concat(Value(nueva), Substr('ruta', len(anterior) + 1)),
+        despacho_raiz=raiz_actual,
+        profundidad=F('profundidad') + (len(nueva) - len(anterior)) // (DIGITOS_RUTA + 1),
+    )
+    if not movidos or raiz_anterior == raiz_actual:
+        return
+    busqueda.indexar(Movimiento.objects.filter(ruta__startswith=nueva))
+    if raiz_anterior == movimiento.pk:
+        # Era un despacho y pasó a ser tramo: su avance vuelve a cero.
+        Movimiento.objects.filter(pk=movimiento.pk).update(
+            **{campo: 0 for campo in ('total_tramos', *CONTADOR_POR_ESTADO.values(), 'avance')},
+            ultimo_tramo=None, motorista_actual=None,
+        )
+        _reparar_lote_avance([raiz_actual])
+    else:
+        _reparar_lote_avance([raiz_anterior, raiz_actual])
+    pendientes = Movimiento.objects.filter(
+        ruta__startswith=nueva, estado='pendiente', motorista_asignado__isnull=False
+    ).values_list('motorista_asignado_id', flat=True).distinct()
+    for motorista_id in pendientes:
+        traspasar((motorista_id, raiz_anterior), (motorista_id, raiz_actual))
+
+
+# --- AVANCE DEL DESPACHO ---
+
+# Contador del despacho que suma cada estado de tramo.
+CONTADOR_POR_ESTADO = {
+    'pendiente': 'tramos_pendientes',
+    'completado': 'tramos_completados',
+    'anulado': 'tramos_anulados',
+}
+
+
+def aporte(raiz_id, estado):
+    """(despacho_id, estado) con que un tramo suma al avance de su despacho, o None si es un despacho."""
+    if raiz_id is None:
+        return None
+    return raiz_id, estado
+
+
+def aporte_de(movimiento):
+    return aporte(movimiento.despacho_raiz_id, movimiento.estado)
+
+
+def porcentaje(completados, anulados, total):
+    vigentes = total - anulados
+    return completados * 100 // vigentes if vigentes > 0 else 0
+
+
+def ajustar_avance(anterior, actual):
+    """
+    Traspasa el aporte de un tramo guardado o eliminado (ver `aporte`) con
+    UPDATE de incremento, que no pierden cambios de guardados simultáneos.
+    """
+    if anterior == actual:
+        return
+    for cambio, signo in ((anterior, -1), (actual, 1)):
+        if cambio is None:
+            continue
+        despacho_id, estado = cambio
+        campos = {'total_tramos': F('total_tramos') + signo}
+        if estado in CONTADOR_POR_ESTADO:
+            campo = CONTADOR_POR_ESTADO[estado]
+            campos[campo] = F(campo) + signo
+        Movimiento.objects.filter(pk=despacho_id).update(**campos)
+
+
+def refrescar_avance(despacho_id):
+    """
+    Recalcula en el despacho el porcentaje (desde sus contadores), la fecha
+    del último tramo y el motorista actual: el del último tramo o, si no
+    tiene, el del despacho. Una lectura por índice y un UPDATE; corre tras
+    `ajustar_avance`, cuyo UPDATE ya bloqueó la fila del despacho.
+    """
+    ultimo = Movimiento.objects.filter(despacho_raiz_id=despacho_id).order_by(
+        '-fecha_movimiento', '-pk'
+    ).values_list('fecha_movimiento', 'motorista_asignado_id').first()
+    fecha, motorista_id = ultimo or (None, None)
+    vigentes = F('total_tramos') - F('tramos_anulados')
+    Movimiento.objects.filter(pk=despacho_id).update(
+        ultimo_tramo=fecha,
+        motorista_actual=motorista_id if motorista_id is not None else F('motorista_asignado'),
+        avance=Case(When(total_tramos__gt=F('tramos_anulados'), then=Floor(F('tramos_completados') * 100 / vigentes)), default=0),
+    )
+
+
+def calcular_avance(despacho, tramos):
+    """Llena el avance de un despacho sin guardar desde sus tramos en memoria (cargas masivas)."""
+    por_estado = {campo: 0 for campo in CONTADOR_POR_ESTADO.values()}
+    for tramo in tramos:
+        if tramo.estado in CONTADOR_POR_ESTADO:
+            por_estado[CONTADOR_POR_ESTADO[tramo.estado]] += 1
+    for campo, valor in por_estado.items():
+        setattr(despacho, campo, valor)
+    despacho.total_tramos = len(tramos)
+    despacho.avance = porcentaje(despacho.tramos_completados, despacho.tramos_anulados, despacho.total_tramos)
+    ultimo = max(tramos, key=lambda tramo: tramo.fecha_movimiento, default=None)
+    despacho.ultimo_tramo = ultimo.fecha_movimiento if ultimo else None
+    despacho.motorista_actual_id = (ultimo and ultimo.motorista_asignado_id) or despacho.motorista_asignado_id
+
+
+# --- REPARACIÓN ---
+
+def ocupaciones_esperadas():
+    """
+    {motorista_id: [despacho_id, ...]} desde los movimientos pendientes, con
+    los despachos de cada motorista en orden. Más de uno es un conflicto que
+    sólo pueden haber dejado cargas masivas o cambios directos en la base.
+    """
+    filas = Movimiento.objects.filter(estado='pendiente', motorista_asignado__isnull=False).annotate(
+        _despacho=Coalesce('despacho_raiz_id', 'pk')
+    ).values_list('motorista_asignado_id', '_despacho').distinct().order_by('motorista_asignado_id', '_despacho')
+    esperadas = {}
+    for motorista_id, despacho_id in filas.iterator(chunk_size=TAMANO_LOTE_REPARACION):
+        esperadas.setdefault(motorista_id, []).append(despacho_id)
+    return esperadas
+
+
+@transaction.atomic
+def reparar():
+    """
+    Recalcula DespachoActivo desde los movimientos pendientes. Si un motorista
+    quedó con varios despachos pendientes, conserva el que ya tenía tomado (o
+    el más antiguo). Devuelve (diferencias, conflictos): [(motorista_id,
+    anterior, correcto)] y {motorista_id: [despacho_id, ...]}.
+    """
+    esperadas = ocupaciones_esperadas()
+    actuales = dict(DespachoActivo.objects.values_list('motorista_id', 'despacho_id'))
+
+    correctas = {}
+    for motorista_id, despachos in esperadas.items():
+        actual = actuales.get(motorista_id)
+        correctas[motorista_id] = actual if actual in despachos else despachos[0]
+
+    diferencias = [
+        (motorista_id, actuales.get(motorista_id), correctas.get(motorista_id))
+        for motorista_id in sorted(set(actuales) | set(correctas))
+        if actuales.get(motorista_id) != correctas.get(motorista_id)
+    ]
+    cambiados = [motorista_id for motorista_id, _, _ in diferencias]
+    for inicio in range(0, len(cambiados), TAMANO_LOTE_REPARACION):
+        DespachoActivo.objects.filter(motorista_id__in=cambiados[inicio:inicio + TAMANO_LOTE_REPARACION]).delete()
+    DespachoActivo.objects.bulk_create(
+        [DespachoActivo(motorista_id=motorista_id, despacho_id=correcto) for motorista_id, _, correcto in diferencias if correcto],
+        batch_size=TAMANO_LOTE_REPARACION,
+    )
+    conflictos = {motorista_id: despachos for motorista_id, despachos in esperadas.items() if len(despachos) > 1}
+    return diferencias, conflictos
+
+
+def avances_esperados(despacho_ids):
+    """{despacho_id: {campo: valor}} recalculado desde los tramos de los despachos dados."""
+    conteos = {
+        fila.pop('despacho_raiz_id'): fila
+        for fila in Movimiento.objects.filter(despacho_raiz_id__in=despacho_ids).values('despacho_raiz_id').annotate(
+            total_tramos=Count('pk'), ultimo_tramo=Max('fecha_movimiento'),
+            **{campo: Count('pk', filter=Q(estado=estado)) for estado, campo in CONTADOR_POR_ESTADO.items()},
+        ).order_by()
+    }
+    ultimos = {}
+    filas = Movimiento.objects.filter(despacho_raiz_id__in=despacho_ids).order_by(
+        'despacho_raiz_id', 'fecha_movimiento', 'pk'
+    ).values_list('despacho_raiz_id', 'motorista_asignado_id')
+    for despacho_id, motorista_id in filas:
+        ultimos[despacho_id] = motorista_id
+
+    esperados = {}
+    for despacho_id, motorista_id in Movimiento.objects.filter(pk__in=despacho_ids).values_list('pk', 'motorista_asignado_id'):
+        valores = conteos.get(despacho_id) or {
+            'total_tramos': 0, 'ultimo_tramo': None, **{campo: 0 for campo in CONTADOR_POR_ESTADO.values()}
+        }
+        valores['avance'] = porcentaje(valores['tramos_completados'], valores['tramos_anulados'], valores['total_tramos'])
+        valores['motorista_actual_id'] = ultimos.get(despacho_id) or motorista_id
+        esperados[despacho_id] = valores
+    return esperados
+
+
+def reparar_avance():
+    """
+    Recalcula el avance de todos los despachos desde sus tramos, por lotes
+    (cada uno en su transacción), y corrige sólo los que difieren. Devuelve
+    los PKs corregidos.
+    """
+    corregidos, ultimo = [], 0
+    while True:
+        lote = list(Movimiento.objects.filter(movimiento_padre__isnull=True, pk__gt=ultimo).order_by('pk').values_list(
+            'pk', flat=True
+        )[:TAMANO_LOTE_REPARACION])
+        if not lote:
+            return corregidos
+        corregidos += _reparar_lote_avance(lote)
+        ultimo = lote[-1]
+
+
+@transaction.atomic
+def _reparar_lote_avance(despacho_ids):
+    campos = [Movimiento._meta.get_field(nombre) for nombre in Movimiento.CAMPOS_AVANCE]
+    esperados = avances_esperados(despacho_ids)
+    cambiados = []
+    for despacho in Movimiento.objects.filter(pk__in=despacho_ids).only(*Movimiento.CAMPOS_AVANCE):
+        valores = esperados[despacho.pk]
+        if any(getattr(despacho, campo.attname) != valores[campo.attname] for campo in campos):
+            for campo in campos:
+                setattr(despacho, campo.attname, valores[campo.attname])
+            cambiados.append(despacho)
+    Movimiento.objects.bulk_update(cambiados, Movimiento.CAMPOS_AVANCE, batch_size=TAMANO_LOTE_REPARACION)
+    return [despacho.pk for despacho in cambiados]
+
+
+class OcupacionMotoristaMixin:
+    """
+    Para vistas que guardan movimientos: si otro despacho tomó al motorista
+    entre la validación del formulario y el guardado, se muestra como error
+    del formulario en vez de un error 500 (el guardado ya se revirtió).
+    """
+    def form_valid(self, form):
+        try:
+            return super().form_valid(form)
+        except MotoristaOcupado as error:
+            form.add_error('motorista_asignado' if 'motorista_asignado' in form.fields else None, error)
+            return self.form_invalid(form)
@@ -0,0 +1,182 @@
+import csv
+import re
+import zipfile
+from collections import defaultdict
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from .models import Movimiento
+
+TAMANO_LOTE_EXPORTACION = 1000
+
+# Columnas exportadas (encabezado) y campos leídos con values_list, en el mismo orden.
+ENCABEZADOS_EXPORTACION = (
+    'ID', 'Nivel', 'N° Despacho', 'Tipo', 'Estado', 'Origen', 'Destino',
+    'Motorista', 'Usuario Responsable', 'Fecha', 'Observación',
+)
+CAMPOS_EXPORTACION = (
+    'id_movimiento', 'numero_despacho', 'tipo_movimiento__nombre', 'estado',
+    'origen', 'destino', 'motorista_asignado__nombres',
+    'motorista_asignado__apellido_paterno', 'usuario_responsable__first_name',
+    'usuario_responsable__last_name', 'fecha_movimiento', 'observacion',
+)
+ESTADOS = dict(Movimiento.ESTADO_CHOICES)
+
+
+# --- FILAS ---
+
+def _nombre(*partes):
+    return " ".join(parte for parte in partes if parte)
+
+
+def _formatear(nivel, fila, numero_despacho):
+    (pk, _, tipo, estado, origen, destino, mot_nombres, mot_apellido,
+     usr_nombre, usr_apellido, fecha, observacion) = fila
+    return (
+        pk, nivel, numero_despacho or '', tipo, ESTADOS.get(estado, estado),
+        origen, destino, _nombre(mot_nombres, mot_apellido),
+        _nombre(usr_nombre, usr_apellido),
+        timezone.localtime(fecha).strftime('%d-%m-%Y %H:%M'), observacion or '',
+    )
+
+
+def _con_tramos(despachos):
+    """Emite cada despacho del lote seguido de todos sus tramos (una sola consulta por lote)."""
+    tramos = defaultdict(list)
+    consulta = Movimiento.objects.filter(
+        despacho_raiz_id__in=[fila[0] for fila in despachos]
+    ).order_by('despacho_raiz_id', 'fecha_movimiento', 'pk').values_list('despacho_raiz_id', *CAMPOS_EXPORTACION)
+    for fila in consulta.iterator():
+        tramos[fila[0]].append(fila[1:])
+
+    for despacho in despachos:
+        yield _formatear('Despacho', despacho, despacho[1])
+        for tramo in tramos.get(despacho[0], ()):
+            yield _formatear('Tramo', tramo, despacho[1])
+
+
+def filas_movimientos(despachos, tamano_lote=TAMANO_LOTE_EXPORTACION):
+    """
+    Recorre el queryset de despachos (ya filtrado y ordenado) con un iterador y
+    genera las filas de exportación, con los tramos aplanados bajo su despacho.
+    Sólo hay en memoria un lote de despachos y sus tramos a la vez.
+    """
+    lote = []
+    for fila in despachos.values_list(*CAMPOS_EXPORTACION).iterator(chunk_size=tamano_lote):
+        lote.append(fila)
+        if len(lote) >= tamano_lote:
+            yield from _con_tramos(lote)
+            lote = []
+    if lote:
+        yield from _con_tramos(lote)
+
+
+# --- CSV ---
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve lo escrito en vez de guardarlo."""
+    def write(self, valor):
+        return valor
+
+
+def exportar_csv(filas):
+    """Genera el CSV línea a línea (con BOM para que Excel reconozca UTF-8)."""
+    escritor = csv.writer(_Eco())
+    yield '\ufeff' + escritor.writerow(ENCABEZADOS_EXPORTACION)
+    for fila in filas:
+        yield escritor.writerow(fila)
+
+
+# --- XLSX ---
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Movimientos" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_CARACTERES_INVALIDOS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class _Salida:
+    """Destino no posicionable para ZipFile: acumula bytes hasta que se retiran."""
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+def _celda(valor):
+    if isinstance(valor, int):
+        return f'<c t="n"><v>{valor}</v></c>'
+    texto = escape(_CARACTERES_INVALIDOS.sub('', str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila_xml(valores):
+    return '<row>' + ''.join(_celda(valor) for valor in valores) + '</row>'
+
+
+def exportar_xlsx(filas, tamano_lote=TAMANO_LOTE_EXPORTACION):
+    """
+    Genera un libro XLSX mínimo (una hoja, cadenas en línea) en trozos. El ZIP se
+    escribe sobre un destino no posicionable, así que cada trozo comprimido se
+    entrega apenas está listo y el archivo nunca existe completo en memoria.
+    """
+    salida = _Salida()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as libro:
+        libro.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        libro.writestr('_rels/.rels', _RELS)
+        libro.writestr('xl/workbook.xml', _WORKBOOK)
+        libro.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        yield salida.retirar()
+
+        with libro.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja:
+            hoja.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            hoja.write(_fila_xml(ENCABEZADOS_EXPORTACION).encode('utf-8'))
+            pendientes = 0
+            for fila in filas:
+                hoja.write(_fila_xml(fila).encode('utf-8'))
+                pendientes += 1
+                if pendientes >= tamano_lote:
+                    pendientes = 0
+                    yield salida.retirar()
+            hoja.write(b'</sheetData></worksheet>')
+        yield salida.retirar()
+    yield salida.retirar()
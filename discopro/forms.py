@@ -2,12 +2,18 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm, AuthenticationForm
 from django.contrib.auth.password_validation import validate_password, password_validators_help_text_html
 from django.core.exceptions import ValidationError
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from . import despachos
+from .geografia import arbol_geografico
 from .models import (
     Farmacia, Motorista, Moto, ContactoEmergencia, 
     AsignacionFarmacia, AsignacionMoto, Documentacion, DocumentacionMoto,
     Mantenimiento, TipoMovimiento, Movimiento,
-    Usuario, Rol, Region, Provincia, Comuna
+    Usuario, Rol
 )
+from .reportes import GRANULARIDADES, DIMENSIONES
+
 
 # --- WIDGETS NATIVOS ---
 class NativeDateInput(forms.DateInput):
@@ -31,6 +37,56 @@ class NativeDateTimeInput(forms.DateTimeInput):
         super().__init__(attrs, format=format)
         self.attrs['class'] = 'form-control'
 
+
+class AutocompletarSelect(forms.Select):
+    """
+    Select de una FK que sólo renderiza la opción seleccionada (no toda la tabla).
+    El resto se busca desde el navegador contra el endpoint JSON `autocompletar`
+    (ver `discopro.autocompletar` y main.js).
+    """
+    def __init__(self, fuente, attrs=None):
+        attrs = {'class': 'form-select', **(attrs or {})}
+        attrs['data-autocompletar'] = reverse_lazy('autocompletar', kwargs={'fuente': fuente})
+        super().__init__(attrs)
+        self.fuente = fuente
+
+    def optgroups(self, name, value, attrs=None):
+        seleccionados = [str(v) for v in value if v not in (None, '')]
+        opciones = []
+        if getattr(self.choices, 'field', None) is not None and self.choices.field.empty_label is not None:
+            opciones.append(('', self.choices.field.empty_label))
+        validos = self._valores_validos(seleccionados)
+        if validos:
+            campo = getattr(self.choices, 'field', None)
+            clave = (campo.to_field_name if campo is not None else None) or 'pk'
+            opciones.extend(
+                self.choices.choice(obj) for obj in self.choices.queryset.filter(**{f'{clave}__in': validos})
+            )
+
+        grupos = []
+        for indice, (valor, etiqueta) in enumerate(opciones):
+            seleccionado = str(valor) in seleccionados or (not seleccionados and valor == '')
+            grupos.append((None, [self.create_option(name, valor, etiqueta, seleccionado, indice, attrs=attrs)], indice))
+        return grupos
+
+    def _valores_validos(self, seleccionados):
+        """
+        Los valores enviados convertidos con el campo de la clave; los que no
+        corresponden (p. ej. texto en una clave numérica) se descartan: el
+        formulario ya informa el error y no deben romper la consulta.
+        """
+        campo = getattr(self.choices, 'field', None)
+        modelo = self.choices.queryset.model
+        campo_clave = modelo._meta.get_field(campo.to_field_name) if campo and campo.to_field_name else modelo._meta.pk
+        validos = []
+        for valor in seleccionados:
+            try:
+                validos.append(campo_clave.to_python(valor))
+            except (ValueError, ValidationError):
+                continue
+        return validos
+
+
 # --- FORMULARIOS DE AUTENTICACIÓN ---
 
 class CustomLoginForm(AuthenticationForm):
@@ -171,21 +227,69 @@ class UsuarioUpdateForm(forms.ModelForm):
                     self.fields[campo].widget.attrs['placeholder'] += ' *'
 
 # --- FORMULARIOS MODULOS ---
-# --- Farmacia ---
-class FarmaciaForm(forms.ModelForm):
-    region = forms.ModelChoiceField(
-        queryset=Region.objects.all(),
-        label="Región",
-        widget=forms.Select(attrs={'class': 'form-select'}),
-        required=False
+# --- Ubicación (Región -> Provincia -> Comuna) ---
+def _opciones(pares):
+    return [('', '---------')] + list(pares)
+
+
+class UbicacionFormMixin(forms.Form):
+    """
+    Selects dependientes Región -> Provincia -> Comuna armados y validados
+    contra el árbol geográfico en memoria (`discopro.geografia`), sin consultas.
+    El navegador filtra las opciones desde el JSON versionado `ajax_geografia`,
+    cuya URL viaja en el atributo data-geografia del select de región.
+    """
+    region = forms.TypedChoiceField(
+        coerce=int, empty_value=None, label="Región",
+        widget=forms.Select(attrs={'class': 'form-select'}), required=False
     )
-    provincia = forms.ModelChoiceField(
-        queryset=Provincia.objects.none(),
-        label="Provincia",
-        widget=forms.Select(attrs={'class': 'form-select'}),
-        required=False
+    provincia = forms.TypedChoiceField(
+        coerce=int, empty_value=None, label="Provincia",
+        widget=forms.Select(attrs={'class': 'form-select'}), required=False
+    )
+    comuna = forms.TypedChoiceField(
+        coerce=int, empty_value=None, label="Comuna",
+        widget=forms.Select(attrs={'class': 'form-select'})
     )
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        arbol = self.arbol = arbol_geografico.vigente()
+
+        if self.instance.pk and self.instance.comuna_id:
+            region_id, provincia_id = arbol.ruta(self.instance.comuna_id)
+            self.initial.update(region=region_id, provincia=provincia_id, comuna=self.instance.comuna_id)
+
+        if self.is_bound:
+            region_id = self._entero(self.data.get(self.add_prefix('region')))
+            provincia_id = self._entero(self.data.get(self.add_prefix('provincia')))
+        else:
+            region_id, provincia_id = self.initial.get('region'), self.initial.get('provincia')
+
+        self.fields['region'].choices = _opciones(arbol.regiones)
+        self.fields['region'].widget.attrs['data-geografia'] = reverse('ajax_geografia', kwargs={'version': arbol.etag})
+        self.fields['provincia'].choices = _opciones(arbol.provincias_de.get(region_id, []))
+        self.fields['comuna'].choices = _opciones(arbol.comunas_de.get(provincia_id, []))
+
+    @staticmethod
+    def _entero(valor):
+        try:
+            return int(valor)
+        except (TypeError, ValueError):
+            return None
+
+    def clean_comuna(self):
+        return self.arbol.comuna(self.cleaned_data['comuna'])
+
+    def _get_validation_exclusions(self):
+        # La comuna ya se validó contra el árbol: se evita la consulta de existencia de la FK.
+        exclusiones = super()._get_validation_exclusions()
+        exclusiones.add('comuna')
+        return exclusiones
+
+
+# --- Farmacia ---
+class FarmaciaForm(UbicacionFormMixin, forms.ModelForm):
     class Meta:
         model = Farmacia
         fields = [
@@ -196,7 +300,6 @@ class FarmaciaForm(forms.ModelForm):
         widgets = {
             'nombre': forms.TextInput(attrs={'class': 'form-control'}),
             'direccion': forms.TextInput(attrs={'class': 'form-control'}),
-            'comuna': forms.Select(attrs={'class': 'form-select'}),
             'telefono': forms.TextInput(attrs={'class': 'form-control'}),
             'latitud': forms.NumberInput(attrs={'class': 'form-control'}),
             'longitud': forms.NumberInput(attrs={'class': 'form-control'}),
@@ -204,47 +307,7 @@ class FarmaciaForm(forms.ModelForm):
             'horario_cierre': NativeTimeInput(),
         }
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        
-        self.fields['comuna'].queryset = Comuna.objects.none()
-
-        if 'region' in self.data:
-            try:
-                region_id = int(self.data.get('region'))
-                self.fields['provincia'].queryset = Provincia.objects.filter(region_id=region_id).order_by('nombreProvincia')
-            except (ValueError, TypeError):
-                pass
-        
-        if 'provincia' in self.data:
-            try:
-                provincia_id = int(self.data.get('provincia'))
-                self.fields['comuna'].queryset = Comuna.objects.filter(provincia_id=provincia_id).order_by('nombreComuna')
-            except (ValueError, TypeError):
-                pass
-
-        if self.instance.pk and self.instance.comuna:
-            self.fields['comuna'].queryset = Comuna.objects.filter(provincia=self.instance.comuna.provincia)
-            self.fields['provincia'].queryset = Provincia.objects.filter(region=self.instance.comuna.provincia.region)
-        
-            self.initial['comuna'] = self.instance.comuna
-            self.initial['provincia'] = self.instance.comuna.provincia
-            self.initial['region'] = self.instance.comuna.provincia.region
-
-class MotoristaForm(forms.ModelForm):
-    region = forms.ModelChoiceField(
-        queryset=Region.objects.all(),
-        label="Región",
-        widget=forms.Select(attrs={'class': 'form-select'}),
-        required=False
-    )
-    provincia = forms.ModelChoiceField(
-        queryset=Provincia.objects.none(),
-        label="Provincia",
-        widget=forms.Select(attrs={'class': 'form-select'}),
-        required=False
-    )
-
+class MotoristaForm(UbicacionFormMixin, forms.ModelForm):
     class Meta:
         model = Motorista
         fields = [
@@ -267,7 +330,6 @@ class MotoristaForm(forms.ModelForm):
             'direccion': forms.TextInput(attrs={'class': 'form-control'}),
             'telefono': forms.TextInput(attrs={'class': 'form-control'}),
             'correo': forms.EmailInput(attrs={'class': 'form-control'}),
-            'comuna': forms.Select(attrs={'class': 'form-select'}),
             'estado': forms.Select(attrs={'class': 'form-select'}),
             'incluye_moto_personal': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'licencia_conducir': forms.FileInput(attrs={'class': 'form-control'}),
@@ -276,34 +338,6 @@ class MotoristaForm(forms.ModelForm):
             'fecha_proximo_control': NativeDateInput(attrs={'class': 'form-control'}),
         }
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        
-
-        self.fields['comuna'].queryset = Comuna.objects.none()
-
-        if 'region' in self.data:
-            try:
-                region_id = int(self.data.get('region'))
-                self.fields['provincia'].queryset = Provincia.objects.filter(region_id=region_id).order_by('nombreProvincia')
-            except (ValueError, TypeError):
-                pass
-        
-        if 'provincia' in self.data:
-            try:
-                provincia_id = int(self.data.get('provincia'))
-                self.fields['comuna'].queryset = Comuna.objects.filter(provincia_id=provincia_id).order_by('nombreComuna')
-            except (ValueError, TypeError):
-                pass
-
-        if self.instance.pk and self.instance.comuna:
-            self.fields['comuna'].queryset = Comuna.objects.filter(provincia=self.instance.comuna.provincia)
-            self.fields['provincia'].queryset = Provincia.objects.filter(region=self.instance.comuna.provincia.region)
-            
-            self.initial['comuna'] = self.instance.comuna
-            self.initial['provincia'] = self.instance.comuna.provincia
-            self.initial['region'] = self.instance.comuna.provincia.region
-
 class MotoForm(forms.ModelForm):
     """Formulario para la gestión de Motos."""
     class Meta:
@@ -387,9 +421,9 @@ class MovimientoForm(forms.ModelForm):
         widgets = {
             'numero_despacho': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ej: 12345678'}),
             'fecha_movimiento': NativeDateTimeInput(),
-            'tipo_movimiento': forms.Select(attrs={'class': 'form-select'}),
-            'usuario_responsable': forms.Select(attrs={'class': 'form-select'}),
-            'motorista_asignado': forms.Select(attrs={'class': 'form-select'}),
+            'tipo_movimiento': AutocompletarSelect('tipos_movimiento'),
+            'usuario_responsable': AutocompletarSelect('usuarios'),
+            'motorista_asignado': AutocompletarSelect('motoristas'),
             'observacion': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'estado': forms.Select(attrs={'class': 'form-select'}),
             'origen': forms.TextInput(attrs={'class': 'form-control'}),
@@ -418,25 +452,12 @@ class MovimientoForm(forms.ModelForm):
 
         if not motorista or estado != 'pendiente':
             return cleaned_data
-        conflictos = Movimiento.objects.filter(
-            motorista_asignado=motorista,
-            estado='pendiente'
-        )
-        if self.instance.pk:
-            conflictos = conflictos.exclude(pk=self.instance.pk)
-        if movimiento_padre:
-            conflictos = conflictos.exclude(pk=movimiento_padre.pk)
-            conflictos = conflictos.exclude(movimiento_padre=movimiento_padre)
-
-        if conflictos.exists():
-            ocupado_en = conflictos.first()
-            nro = ocupado_en.numero_despacho
-            if not nro and ocupado_en.movimiento_padre:
-                nro = f"{ocupado_en.movimiento_padre.numero_despacho} (Tramo)"
-            
-            raise forms.ValidationError(
-                f"El motorista {motorista} ya tiene un despacho pendiente activo ({nro}). Termine ese trabajo antes de asignarle uno nuevo distinto."
-            )
+        # Una lectura por clave primaria de DespachoActivo; la restricción de la
+        # tabla vuelve a comprobarlo al guardar (ver despachos.ocupar).
+        despacho = despachos.raiz(movimiento_padre) if movimiento_padre else self.instance.pk
+        ocupado_en = despachos.despacho_que_ocupa(motorista.pk, excepto=despacho)
+        if ocupado_en is not None:
+            raise despachos.MotoristaOcupado(motorista, ocupado_en)
 
         return cleaned_data
 
@@ -467,7 +488,7 @@ class TramoForm(MovimientoForm):
     farmacia_origen = forms.ModelChoiceField(
         queryset=Farmacia.objects.all().order_by('nombre'),
         label="Farmacia de Origen",
-        widget=forms.Select(attrs={'class': 'form-select'}),
+        widget=AutocompletarSelect('farmacias'),
         empty_label="Seleccione Farmacia..."
     )
 
@@ -495,6 +516,72 @@ class TramoForm(MovimientoForm):
         
         return cleaned_data
 
+
+# --- IMPORTACIÓN ---
+
+class ImportacionForm(forms.Form):
+    """Archivo CSV de farmacias, motoristas o motos para importar (ver discopro.importacion)."""
+    tipo = forms.ChoiceField(
+        choices=[('farmacias', 'Farmacias'), ('motoristas', 'Motoristas'), ('motos', 'Motos')],
+        label="Qué importar", widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    archivo = forms.FileField(
+        label="Archivo CSV (UTF-8)", widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv'})
+    )
+    delimitador = forms.ChoiceField(
+        choices=[(',', 'Coma (,)'), (';', 'Punto y coma (;)')], label="Separador",
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    simular = forms.BooleanField(
+        required=False, initial=True, label="Sólo simular (revisar errores sin guardar)",
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
+
+# --- REPORTES ---
+class ReportePeriodoForm(forms.Form):
+    """Filtros del reporte por período personalizado (fechas inclusivas)."""
+    desde = forms.DateField(label="Desde", widget=NativeDateInput())
+    hasta = forms.DateField(label="Hasta", widget=NativeDateInput())
+    granularidad = forms.ChoiceField(
+        label="Agrupar por período",
+        choices=list(GRANULARIDADES.items()),
+        initial='mes',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    dimension = forms.ChoiceField(
+        label="Desglosar por",
+        choices=list(DIMENSIONES.items()),
+        initial='estado',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        desde = cleaned_data.get('desde')
+        hasta = cleaned_data.get('hasta')
+        if desde and hasta and desde > hasta:
+            raise forms.ValidationError("La fecha 'Desde' no puede ser posterior a 'Hasta'.")
+        return cleaned_data
+
+
+class ReporteReferenciaForm(forms.Form):
+    """Día de referencia de los reportes diario, mensual y anual (hoy por defecto)."""
+    fecha = forms.DateField(label="Reportar al día", required=False, widget=NativeDateInput())
+
+    def clean_fecha(self):
+        fecha = self.cleaned_data.get('fecha')
+        if fecha and fecha > timezone.localdate():
+            raise forms.ValidationError("La fecha de referencia no puede ser futura.")
+        return fecha
+
+    def referencia(self):
+        """El día validado, u hoy si no se indicó o no es válido."""
+        if self.is_bound and self.is_valid() and self.cleaned_data['fecha']:
+            return self.cleaned_data['fecha']
+        return timezone.localdate()
+
+
 # --- ASIGNACIONES ---
 class AsignacionFarmaciaForm(forms.ModelForm):
     """Formulario para asignar una Farmacia a un Motorista."""
@@ -502,7 +589,7 @@ class AsignacionFarmaciaForm(forms.ModelForm):
         model = AsignacionFarmacia
         fields = ['farmacia', 'observaciones']
         widgets = {
-            'farmacia': forms.Select(attrs={'class': 'form-select'}),
+            'farmacia': AutocompletarSelect('farmacias'),
             'observaciones': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         }
 
@@ -512,7 +599,7 @@ class AsignacionMotoForm(forms.ModelForm):
         model = AsignacionMoto
         fields = ['motorista', 'estado']
         widgets = {
-            'motorista': forms.Select(attrs={'class': 'form-select'}),
+            'motorista': AutocompletarSelect('motoristas'),
             'estado': forms.TextInput(attrs={'class': 'form-control'}),
         }
     
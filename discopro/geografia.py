@@ -0,0 +1,206 @@
+"""
+Jerarquía geográfica de Chile (regiones, provincias y comunas): árbol en
+memoria para formularios y el navegador, y carga de los datos de referencia
+(junto a los tipos de movimiento) desde el archivo incluido datos/referencia.json.
+"""
+import hashlib
+import json
+import threading
+from pathlib import Path
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from . import contadores, versiones
+from .autocompletar import FUENTES, normalizar
+from .models import Comuna, Provincia, Region, TipoMovimiento
+
+ARCHIVO_REFERENCIA = Path(__file__).resolve().parent / 'datos' / 'referencia.json'
+CLAVE_VERSION = 'geografia'
+
+
+# --- ÁRBOL EN MEMORIA ---
+
+class ArbolGeografico:
+    """
+    Región -> Provincia -> Comuna en memoria (por proceso), construido con
+    tres consultas y reconstruido sólo cuando cambia su versión (un contador
+    que las señales incrementan al guardar/eliminar filas geográficas).
+    También guarda el árbol serializado en JSON (`paquete`) con su `etag`,
+    un hash del contenido que sirve además de versión en la URL.
+    """
+    def __init__(self):
+        self.version = None
+        self.regiones = []
+        self.provincias = {}
+        self.comunas = {}
+        self.provincias_de = {}
+        self.comunas_de = {}
+        self.paquete = b''
+        self.etag = ''
+        self._candado = threading.Lock()
+
+    def construir(self, version):
+        regiones = list(Region.objects.order_by('pk').values_list('pk', 'nombreRegion'))
+        provincias = {pk: (nombre, padre) for pk, nombre, padre in Provincia.objects.values_list('pk', 'nombreProvincia', 'region_id')}
+        comunas = {pk: (nombre, padre) for pk, nombre, padre in Comuna.objects.values_list('pk', 'nombreComuna', 'provincia_id')}
+
+        provincias_de, comunas_de = {}, {}
+        for hijos, destino in ((provincias, provincias_de), (comunas, comunas_de)):
+            for pk, (nombre, padre) in sorted(hijos.items(), key=lambda item: normalizar(item[1][0])):
+                destino.setdefault(padre, []).append((pk, nombre))
+
+        arbol = {'regiones': [
+            {'id': region_id, 'nombre': region, 'provincias': [
+                {'id': provincia_id, 'nombre': provincia, 'comunas': [
+                    {'id': comuna_id, 'nombre': comuna} for comuna_id, comuna in comunas_de.get(provincia_id, [])
+                ]} for provincia_id, provincia in provincias_de.get(region_id, [])
+            ]} for region_id, region in regiones
+        ]}
+        paquete = json.dumps(arbol, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+        self.regiones = regiones
+        self.provincias, self.comunas = provincias, comunas
+        self.provincias_de, self.comunas_de = provincias_de, comunas_de
+        self.paquete = paquete
+        self.etag = hashlib.sha1(paquete).hexdigest()[:16]
+        self.version = version
+
+    def vigente(self):
+        """Reconstruye el árbol si otro proceso (o este) modificó la geografía."""
+        version = contadores.obtener(CLAVE_VERSION)
+        if version != self.version:
+            with self._candado:
+                if version != self.version:
+                    self.construir(version)
+        return self
+
+    def ruta(self, comuna_id):
+        """(region_id, provincia_id) de la comuna, o (None, None) si no existe."""
+        if comuna_id not in self.comunas:
+            return None, None
+        provincia_id = self.comunas[comuna_id][1]
+        return self.provincias[provincia_id][1], provincia_id
+
+    def comuna(self, comuna_id):
+        """Instancia de Comuna armada desde el árbol (sin consultar la base), o None."""
+        if comuna_id not in self.comunas:
+            return None
+        nombre, provincia_id = self.comunas[comuna_id]
+        comuna = Comuna(idComuna=comuna_id, nombreComuna=nombre, provincia_id=provincia_id)
+        comuna._state.adding = False
+        return comuna
+
+
+arbol_geografico = ArbolGeografico()
+
+
+def _invalidar(**kwargs):
+    contadores.incrementar(CLAVE_VERSION)
+
+
+def conectar_senales():
+    for modelo in (Region, Provincia, Comuna):
+        uid = f'geografia_{modelo.__name__}'
+        post_save.connect(_invalidar, sender=modelo, dispatch_uid=f'{uid}_guardar')
+        post_delete.connect(_invalidar, sender=modelo, dispatch_uid=f'{uid}_eliminar')
+
+
+# --- CARGA DE DATOS DE REFERENCIA ---
+
+def leer_referencia(ruta=ARCHIVO_REFERENCIA):
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def _clave(nombre):
+    return nombre.strip().casefold()
+
+
+def _por_nombre(queryset, campo):
+    """{nombre normalizado: objeto}; ante nombres repetidos se conserva el de menor PK."""
+    indice = {}
+    for objeto in queryset.order_by('-pk'):
+        indice[_clave(getattr(objeto, campo))] = objeto
+    return indice
+
+
+def _sincronizar(modelo, campo, padre, esperados, existentes):
+    """
+    Diferencia en memoria un nivel de la jerarquía. `esperados` es
+    [(nombre, id del padre)] y `existentes` {nombre normalizado: objeto}.
+    Crea los que faltan y mueve de padre los que cambiaron (p. ej. comunas que
+    pasaron a la Región de Ñuble), con un bulk_create y un bulk_update.
+    Devuelve (creados, actualizados).
+    """
+    nuevos, movidos = [], []
+    for nombre, padre_id in esperados:
+        objeto = existentes.get(_clave(nombre))
+        if objeto is None:
+            nuevos.append(modelo(**{campo: nombre, f'{padre}_id': padre_id} if padre else {campo: nombre}))
+        elif padre and getattr(objeto, f'{padre}_id') != padre_id:
+            setattr(objeto, f'{padre}_id', padre_id)
+            movidos.append(objeto)
+    modelo.objects.bulk_create(nuevos)
+    if movidos:
+        modelo.objects.bulk_update(movidos, [padre])
+    return len(nuevos), len(movidos)
+
+
+@transaction.atomic
+def cargar_referencia(datos=None):
+    """
+    Carga (o completa) regiones, provincias, comunas y tipos de movimiento en
+    una sola transacción. Los nombres se comparan sin distinguir mayúsculas, y
+    las filas existentes no se duplican: volver a ejecutarla no escribe nada.
+    Los tipos de movimiento existentes sólo reciben la descripción si no tenían.
+    Devuelve {modelo: (creados, actualizados)}.
+    """
+    datos = datos or leer_referencia()
+    resultado = {}
+
+    regiones = datos['regiones']
+    resultado['regiones'] = _sincronizar(
+        Region, 'nombreRegion', None, [(r['nombre'], None) for r in regiones],
+        _por_nombre(Region.objects.all(), 'nombreRegion'),
+    )
+    # Se releen tras cada nivel: en MySQL bulk_create no devuelve las PKs.
+    ids_region = {_clave(n): pk for pk, n in Region.objects.values_list('pk', 'nombreRegion').order_by('-pk')}
+
+    resultado['provincias'] = _sincronizar(
+        Provincia, 'nombreProvincia', 'region',
+        [(p['nombre'], ids_region[_clave(r['nombre'])]) for r in regiones for p in r['provincias']],
+        _por_nombre(Provincia.objects.all(), 'nombreProvincia'),
+    )
+    ids_provincia = {_clave(n): pk for pk, n in Provincia.objects.values_list('pk', 'nombreProvincia').order_by('-pk')}
+
+    resultado['comunas'] = _sincronizar(
+        Comuna, 'nombreComuna', 'provincia',
+        [(c, ids_provincia[_clave(p['nombre'])]) for r in regiones for p in r['provincias'] for c in p['comunas']],
+        _por_nombre(Comuna.objects.all(), 'nombreComuna'),
+    )
+
+    existentes = _por_nombre(TipoMovimiento.objects.all(), 'nombre')
+    nuevos, completados = [], []
+    for tipo in datos.get('tipos_movimiento', []):
+        objeto = existentes.get(_clave(tipo['nombre']))
+        if objeto is None:
+            nuevos.append(TipoMovimiento(nombre=tipo['nombre'], descripcion=tipo.get('descripcion')))
+        elif not objeto.descripcion and tipo.get('descripcion'):
+            objeto.descripcion = tipo['descripcion']
+            completados.append(objeto)
+    TipoMovimiento.objects.bulk_create(nuevos)
+    if completados:
+        TipoMovimiento.objects.bulk_update(completados, ['descripcion'])
+    resultado['tipos_movimiento'] = (len(nuevos), len(completados))
+
+    # bulk_create/bulk_update no emiten señales: se invalidan a mano el árbol, el
+    # autocompletado y las versiones de las páginas condicionales.
+    if any(resultado[nivel] != (0, 0) for nivel in ('regiones', 'provincias', 'comunas')):
+        contadores.incrementar(CLAVE_VERSION)
+        versiones.incrementar(Region, Provincia, Comuna)
+    if nuevos:
+        contadores.incrementar(FUENTES['tipos_movimiento'].clave_version)
+    if nuevos or completados:
+        versiones.incrementar(TipoMovimiento)
+    return resultado
@@ -0,0 +1,633 @@
+"""
+Cargas masivas desde archivos:
+
+- Despachos (con sus tramos) desde JSON o CSV. Todo el lote se valida con unas
+  pocas consultas por conjunto (tipos, motoristas, farmacias, números ya usados
+  y motoristas ocupados) y se inserta con bulk_create en una sola transacción,
+  con un informe de errores por fila.
+- Farmacias, motoristas y motos desde CSV, leídos por streaming y guardados
+  (upsert) por lotes, con simulación previa.
+"""
+import abc
+import copy
+import csv
+import datetime
+import io
+import json
+import re
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import busqueda, contadores, versiones
+from .autocompletar import FUENTES, normalizar
+from .despachos import calcular_avance
+from .geografia import arbol_geografico
+from .models import DespachoActivo, Farmacia, Motorista, Moto, Movimiento, TipoMovimiento
+from .reportes import ajustar_resumen, clave_resumen_de, invalidar_reportes
+from .rut import compactar_rut, normalizar_rut, variantes_rut
+
+TAMANO_LOTE_CARGA = 1000
+MAX_DESPACHOS_LOTE = 5000
+
+# Una fila por movimiento; las de tramo indican en `tramo_de` el número de su despacho.
+COLUMNAS_CSV_DESPACHOS = (
+    'numero_despacho', 'tramo_de', 'tipo_movimiento', 'fecha_movimiento', 'estado',
+    'origen', 'destino', 'motorista', 'observacion',
+)
+COLUMNAS_CSV_OBLIGATORIAS = ('numero_despacho', 'tipo_movimiento', 'destino')
+
+ESTADOS = dict(Movimiento.ESTADO_CHOICES)
+
+
+class ErrorLectura(ValueError):
+    """El contenido no se puede leer como un lote de despachos."""
+
+
+def _texto(valor):
+    return '' if valor is None else str(valor).strip()
+
+
+def _lotes(valores, tamano=TAMANO_LOTE_CARGA):
+    valores = list(valores)
+    for inicio in range(0, len(valores), tamano):
+        yield valores[inicio:inicio + tamano]
+
+
+# --- LECTURA ---
+
+def leer_despachos_json(texto):
+    """
+    Lista de despachos `[{..., "tramos": [{...}]}]` (o `{"despachos": [...]}`)
+    con los campos de COLUMNAS_CSV_DESPACHOS; cada uno recibe su etiqueta `fila`.
+    """
+    try:
+        datos = json.loads(texto)
+    except ValueError as error:
+        raise ErrorLectura(f"JSON inválido: {error}")
+    if isinstance(datos, dict):
+        datos = datos.get('despachos')
+    if not isinstance(datos, list):
+        raise ErrorLectura('Se esperaba una lista de despachos o {"despachos": [...]}.')
+
+    despachos = []
+    for i, despacho in enumerate(datos, 1):
+        tramos = (despacho.get('tramos') or []) if isinstance(despacho, dict) else None
+        if not isinstance(tramos, list) or not all(isinstance(tramo, dict) for tramo in tramos):
+            raise ErrorLectura(f"El despacho {i} debe ser un objeto y sus tramos una lista de objetos.")
+        despachos.append({
+            **despacho, 'fila': f"despacho {i}",
+            'tramos': [{**tramo, 'fila': f"despacho {i}, tramo {j}"} for j, tramo in enumerate(tramos, 1)],
+        })
+    return despachos
+
+
+def leer_despachos_csv(archivo, delimitador=','):
+    """
+    Despachos de un CSV con las columnas de COLUMNAS_CSV_DESPACHOS (una fila
+    por movimiento). Los tramos se agrupan bajo su despacho aunque aparezcan
+    antes que él; los de un despacho que no está en el archivo quedan con error.
+    """
+    lector = csv.DictReader(archivo, delimiter=delimitador)
+    columnas = {normalizar(columna).strip() for columna in lector.fieldnames or []}
+    faltantes = [columna for columna in COLUMNAS_CSV_OBLIGATORIAS if columna not in columnas]
+    if faltantes:
+        raise ErrorLectura(f"Faltan columnas: {', '.join(faltantes)}.")
+
+    despachos, por_numero, tramos = [], {}, []
+    for fila in lector:
+        datos = {normalizar(columna).strip(): _texto(valor) for columna, valor in fila.items() if columna}
+        datos['fila'] = f"fila {lector.line_num}"
+        padre = datos.pop('tramo_de', '')
+        if padre:
+            tramos.append((padre, datos))
+        else:
+            datos['tramos'] = []
+            despachos.append(datos)
+            por_numero.setdefault(datos.get('numero_despacho'), datos)
+    for padre, tramo in tramos:
+        despacho = por_numero.get(padre)
+        if despacho is None:
+            despachos.append({
+                'fila': tramo['fila'], 'numero_despacho': padre, 'tramos': [],
+                'error': f"Tramo de un despacho que no está en el archivo ({padre}).",
+            })
+        else:
+            despacho['tramos'].append(tramo)
+    return despachos
+
+
+def formato_lote(nombre='', content_type=''):
+    """'json' o 'csv' según la extensión del archivo o el Content-Type."""
+    return 'json' if nombre.lower().endswith('.json') or 'json' in (content_type or '') else 'csv'
+
+
+def texto_csv(archivo):
+    """Lectura como texto, sin cargarlo completo, de un CSV binario (subido o abierto en modo 'rb')."""
+    return io.TextIOWrapper(getattr(archivo, 'file', archivo), encoding='utf-8-sig', newline='')
+
+
+def leer_despachos(archivo, formato, delimitador=','):
+    """Despachos de un archivo binario (subido, cuerpo de la petición o abierto en modo 'rb')."""
+    try:
+        if formato == 'json':
+            return leer_despachos_json(archivo.read().decode('utf-8-sig'))
+        return leer_despachos_csv(texto_csv(archivo), delimitador)
+    except (UnicodeDecodeError, csv.Error) as error:
+        raise ErrorLectura(f"No se pudo leer el archivo: {error}")
+
+
+# --- VALIDACIÓN ---
+
+class _Referencias:
+    """Tablas relacionadas del lote, leídas con una consulta por conjunto (o por cada 1000 valores)."""
+
+    def __init__(self, despachos):
+        movimientos = [movimiento for despacho in despachos for movimiento in (despacho, *despacho['tramos'])]
+        ruts = {_texto(m.get('motorista')).upper() for m in movimientos} - {''}
+        numeros = {_texto(despacho.get('numero_despacho')) for despacho in despachos} - {''}
+        farmacias = {normalizar(_texto(tramo.get('origen'))) for d in despachos for tramo in d['tramos']} - {''}
+
+        self.tipos = {normalizar(nombre): pk for pk, nombre in TipoMovimiento.objects.values_list('pk', 'nombre')}
+        # RUT exacto (usa el índice único), aceptando el dígito verificador K en minúscula.
+        self.motoristas = {}
+        for lote in _lotes(ruts):
+            variantes = lote + [rut.replace('K', 'k') for rut in lote if 'K' in rut]
+            self.motoristas.update(
+                (rut.upper(), pk) for rut, pk in Motorista.objects.filter(rut__in=variantes).values_list('rut', 'pk')
+            )
+        self.numeros_usados = set()
+        for lote in _lotes(numeros):
+            self.numeros_usados.update(
+                Movimiento.objects.filter(numero_despacho__in=lote).values_list('numero_despacho', flat=True)
+            )
+        # Las farmacias se comparan sin distinguir mayúsculas ni tildes (Lower() en SQL conserva
+        # las tildes), contra el índice en memoria del autocompletado; ante nombres repetidos, la de menor PK.
+        nombres = {}
+        for _, nombre in sorted(FUENTES['farmacias'].vigente().etiquetas.items(), reverse=True):
+            nombres[normalizar(nombre).strip()] = nombre
+        self.farmacias = {clave: nombres[clave] for clave in farmacias if clave in nombres}
+
+
+def _fecha(valor):
+    if not valor:
+        return timezone.now()
+    fecha = parse_datetime(valor)
+    if fecha is None:
+        dia = parse_date(valor)
+        fecha = datetime.datetime.combine(dia, datetime.time.min) if dia else None
+    if fecha is None:
+        raise ValueError(f'fecha_movimiento: "{valor}" no es una fecha ISO (AAAA-MM-DD o AAAA-MM-DDTHH:MM).')
+    return timezone.make_aware(fecha) if timezone.is_naive(fecha) else fecha
+
+
+def _construir(datos, referencias, usuario, despacho=None):
+    """Movimiento (sin guardar) a partir de una fila, y la lista de errores de esa fila."""
+    errores = []
+    # Los tramos heredan del despacho el tipo, el motorista y el destino (como TramoCreateView).
+    tipo = _texto(datos.get('tipo_movimiento'))
+    tipo_id = referencias.tipos.get(normalizar(tipo)) if tipo else getattr(despacho, 'tipo_movimiento_id', None)
+    if tipo_id is None and (tipo or despacho is None):
+        # Si el tramo lo hereda, el error ya está en la fila del despacho.
+        errores.append(f'tipo_movimiento: "{tipo}" no existe.' if tipo else "tipo_movimiento: obligatorio.")
+
+    rut = _texto(datos.get('motorista')).upper()
+    motorista_id = referencias.motoristas.get(rut) if rut else getattr(despacho, 'motorista_asignado_id', None)
+    if rut and motorista_id is None:
+        errores.append(f'motorista: no hay un motorista con RUT "{rut}".')
+
+    estado = _texto(datos.get('estado')).lower() or 'pendiente'
+    if estado not in ESTADOS:
+        errores.append(f'estado: "{estado}" no es válido ({", ".join(ESTADOS)}).')
+
+    try:
+        fecha = _fecha(_texto(datos.get('fecha_movimiento')))
+    except ValueError as error:
+        fecha = None
+        errores.append(str(error))
+
+    origen = _texto(datos.get('origen'))
+    destino = _texto(datos.get('destino')) or (despacho.destino if despacho else '')
+    if despacho is not None:
+        # El origen de un tramo es siempre una farmacia (como en TramoForm).
+        nombre = referencias.farmacias.get(normalizar(origen))
+        if nombre is None:
+            errores.append(f'origen: no hay una farmacia llamada "{origen}".' if origen else "origen: obligatorio (farmacia).")
+        origen = nombre or origen
+    for campo, valor in (('origen', origen), ('destino', destino)):
+        if not valor:
+            errores.append(f"{campo}: obligatorio.")
+        elif len(valor) > Movimiento._meta.get_field(campo).max_length:
+            errores.append(f"{campo}: demasiado largo.")
+
+    movimiento = Movimiento(
+        numero_despacho=None, tipo_movimiento_id=tipo_id, fecha_movimiento=fecha,
+        usuario_responsable=usuario, observacion=_texto(datos.get('observacion')) or None,
+        estado=estado, origen=origen, destino=destino, motorista_asignado_id=motorista_id,
+    )
+    return movimiento, errores
+
+
+def validar_despachos(despachos, usuario):
+    """
+    Arma los movimientos del lote y los valida. Devuelve (validos, errores):
+    validos es [(despacho, [tramos])] con instancias sin guardar, y errores
+    [{'fila', 'numero_despacho', 'errores': [...]}] por cada fila con problemas.
+    Un despacho con errores (propios o de alguno de sus tramos) no es válido.
+    """
+    referencias = _Referencias(despachos)
+    vistos = Counter(_texto(despacho.get('numero_despacho')) for despacho in despachos)
+    candidatos, errores = [], []
+
+    for datos in despachos:
+        numero = _texto(datos.get('numero_despacho'))
+        if datos.get('error'):
+            errores.append({'fila': datos['fila'], 'numero_despacho': numero, 'errores': [datos['error']]})
+            continue
+        despacho, propios = _construir(datos, referencias, usuario)
+        despacho.numero_despacho = numero
+        if not numero:
+            propios.insert(0, "numero_despacho: obligatorio.")
+        elif len(numero) > Movimiento._meta.get_field('numero_despacho').max_length:
+            propios.insert(0, "numero_despacho: demasiado largo.")
+        elif numero in referencias.numeros_usados:
+            propios.insert(0, f"numero_despacho: {numero} ya existe.")
+        elif vistos[numero] > 1:
+            propios.insert(0, f"numero_despacho: {numero} está repetido en el lote.")
+
+        filas = [(datos['fila'], propios)]
+        tramos = []
+        for datos_tramo in datos['tramos']:
+            tramo, errores_tramo = _construir(datos_tramo, referencias, usuario, despacho=despacho)
+            tramos.append(tramo)
+            filas.append((datos_tramo['fila'], errores_tramo))
+
+        filas_con_error = [(fila, mensajes) for fila, mensajes in filas if mensajes]
+        errores += [{'fila': fila, 'numero_despacho': numero, 'errores': mensajes} for fila, mensajes in filas_con_error]
+        if not filas_con_error:
+            candidatos.append((datos['fila'], despacho, tramos))
+
+    # Un motorista con movimientos pendientes en un despacho del lote queda
+    # ocupado por él: no puede tener ya un despacho activo ni otro en el lote.
+    ocupan = [(fila, despacho, tramos, _ocupados(despacho, tramos)) for fila, despacho, tramos in candidatos]
+    activos = {}
+    for lote in _lotes({motorista for *_, motoristas in ocupan for motorista in motoristas}):
+        activos.update(
+            DespachoActivo.objects.filter(motorista_id__in=lote).values_list('motorista_id', 'despacho__numero_despacho')
+        )
+    validos = []
+    for fila, despacho, tramos, motoristas in ocupan:
+        conflictos = [
+            f"motorista: el motorista {motorista} ya tiene un despacho pendiente activo ({activos[motorista]})."
+            for motorista in sorted(motoristas) if motorista in activos
+        ]
+        if conflictos:
+            errores.append({'fila': fila, 'numero_despacho': despacho.numero_despacho, 'errores': conflictos})
+            continue
+        activos.update((motorista, despacho.numero_despacho) for motorista in motoristas)
+        validos.append((despacho, tramos))
+    return validos, errores
+
+
+def _ocupados(despacho, tramos):
+    """Motoristas con algún movimiento pendiente en el despacho (lo que tomarán en DespachoActivo)."""
+    return {
+        movimiento.motorista_asignado_id for movimiento in (despacho, *tramos)
+        if movimiento.estado == 'pendiente' and movimiento.motorista_asignado_id is not None
+    }
+
+
+# --- INSERCIÓN ---
+
+def _insertar(validos):
+    """Inserta despachos (con su avance), tramos y ocupaciones; devuelve los PKs de los despachos."""
+    despachos = [despacho for despacho, _ in validos]
+    for despacho, tramos in validos:
+        calcular_avance(despacho, tramos)
+    for movimiento in (m for despacho, tramos in validos for m in (despacho, *tramos)):
+        movimiento.actualizar_claves_orden()
+    Movimiento.objects.bulk_create(despachos, batch_size=TAMANO_LOTE_CARGA)
+
+    # En MySQL bulk_create no devuelve las PKs: se releen por número de despacho.
+    ids = {}
+    for lote in _lotes(despacho.numero_despacho for despacho in despachos):
+        ids.update(Movimiento.objects.filter(numero_despacho__in=lote).values_list('numero_despacho', 'pk'))
+    for despacho, tramos in validos:
+        despacho.pk = ids[despacho.numero_despacho]
+        for tramo in tramos:
+            tramo.ubicar_bajo(despacho)
+    Movimiento.objects.bulk_create([tramo for _, tramos in validos for tramo in tramos], batch_size=TAMANO_LOTE_CARGA)
+
+    DespachoActivo.objects.bulk_create(
+        [
+            DespachoActivo(motorista_id=motorista, despacho_id=despacho.pk)
+            for despacho, tramos in validos for motorista in _ocupados(despacho, tramos)
+        ],
+        batch_size=TAMANO_LOTE_CARGA,
+    )
+    return list(ids.values())
+
+
+def _registrar_altas(movimientos, raices):
+    """bulk_create no emite señales: se aplica a mano lo que hacen las de Movimiento al crear."""
+    for clave, total in sorted(Counter(clave_resumen_de(m) for m in movimientos).items(), key=str):
+        ajustar_resumen(clave, total)
+    contadores.traspasar([], [
+        clave for m in movimientos
+        for clave in contadores.claves_movimiento(m.movimiento_padre_id, m.estado, m.motorista_asignado_id)
+    ])
+    for lote in _lotes(raices):
+        busqueda.indexar(Movimiento.objects.filter(Q(pk__in=lote) | Q(despacho_raiz_id__in=lote)))
+    invalidar_reportes(*{timezone.localdate(m.fecha_movimiento) for m in movimientos})
+    versiones.incrementar(Movimiento)
+
+
+def cargar_despachos(despachos, usuario, parcial=False, aplicar=True):
+    """
+    Valida y crea un lote de despachos (ver leer_despachos_json/_csv) a nombre
+    de `usuario`. Si hay errores no se crea nada, salvo con `parcial`, que
+    crea los despachos válidos. Con `aplicar=False` sólo valida.
+    Devuelve {'despachos', 'tramos', 'creados', 'errores'}: los válidos, si se
+    crearon y el detalle de errores por fila.
+    """
+    if len(despachos) > MAX_DESPACHOS_LOTE:
+        raise ErrorLectura(f"El lote supera el máximo de {MAX_DESPACHOS_LOTE} despachos.")
+    validos, errores = validar_despachos(despachos, usuario)
+    resultado = {
+        'despachos': len(validos), 'tramos': sum(len(tramos) for _, tramos in validos),
+        'creados': False, 'errores': errores,
+    }
+    if not aplicar or not validos or (errores and not parcial):
+        return resultado
+
+    try:
+        with transaction.atomic():
+            raices = _insertar(validos)
+            _registrar_altas([m for despacho, tramos in validos for m in (despacho, *tramos)], raices)
+    except IntegrityError:
+        # Otro guardado usó el mismo número o tomó a un motorista entre la validación y la inserción.
+        resultado['errores'] = errores + [{
+            'fila': None, 'numero_despacho': None,
+            'errores': ["Otro usuario modificó despachos durante la carga; no se guardó nada. Vuelva a intentarlo."],
+        }]
+        return resultado
+    resultado['creados'] = True
+    return resultado
+
+
+# --- IMPORTACIÓN DE FARMACIAS, MOTORISTAS Y MOTOS ---
+
+def compactar(texto):
+    """Sólo letras y dígitos, en mayúsculas: AB-CD-12 -> ABCD12."""
+    return re.sub(r'[^0-9A-Z]', '', normalizar(texto).upper())
+
+
+def variantes_patente(patente):
+    compacta = compactar(patente)
+    formas = {patente, compacta}
+    if len(compacta) == 6:
+        formas.add(f"{compacta[:2]}-{compacta[2:4]}-{compacta[4:]}")
+    elif len(compacta) == 5:
+        formas |= {f"{compacta[:3]}-{compacta[3:]}", f"{compacta[:2]}-{compacta[2:]}"}
+    return formas
+
+
+VALORES_SI = {'si', 's', 'true', '1', 'x'}
+
+
+class ImportadorMaestro(abc.ABC):
+    """
+    Importa (upsert) un CSV de `modelo` por streaming: lee de a
+    TAMANO_LOTE_CARGA filas y valida cada una con los campos del modelo
+    (clean_fields, sin consultas) resolviendo la comuna por nombre en el
+    árbol geográfico en memoria. Por lote, una consulta trae las filas ya
+    existentes por su clave y se escriben sólo las nuevas y las que cambian,
+    con un bulk_create y un bulk_update en su propia transacción.
+
+    Cada subclase define `modelo`, `columnas` y `obligatorias` e implementa
+    `clave_de` y `buscar_existentes`; `normalizar_clave` y
+    `despues_de_actualizar` son opcionales.
+    """
+    modelo = None
+    columnas = ()
+    obligatorias = ()
+
+    def __init__(self, tamano_lote=TAMANO_LOTE_CARGA):
+        self.tamano_lote = tamano_lote
+        self.comunas = {normalizar(nombre): pk for pk, (nombre, _) in arbol_geografico.vigente().comunas.items()}
+
+    # Clave natural de cada modelo: la forma canónica guardada y la usada para comparar.
+    def normalizar_clave(self, valores, errores):
+        return None
+
+    @abc.abstractmethod
+    def clave_de(self, instancia):
+        """Clave con que se compara la instancia con las guardadas y con las demás filas del archivo."""
+
+    @abc.abstractmethod
+    def buscar_existentes(self, instancias):
+        """{clave: instancia guardada} de las filas del lote que ya existen (una consulta)."""
+
+    def despues_de_actualizar(self, anteriores, actualizadas):
+        """Para derivados que las señales mantendrían al guardar (p. ej. el índice de búsqueda)."""
+
+    def _valores(self, datos, presentes, errores):
+        valores = {}
+        for columna in presentes:
+            valor = datos.get(columna, '')
+            campo = self.modelo._meta.get_field(columna)
+            if columna == 'comuna':
+                comuna_id = self.comunas.get(normalizar(valor))
+                if not valor:
+                    errores.append("comuna: obligatoria.")
+                elif comuna_id is None:
+                    errores.append(f'comuna: "{valor}" no existe.')
+                valores['comuna_id'] = comuna_id
+            elif isinstance(campo, models.BooleanField):
+                valores[columna] = normalizar(valor) in VALORES_SI
+            else:
+                valores[columna] = None if valor == '' and campo.null else valor
+        return valores
+
+    def construir(self, datos, presentes):
+        """Instancia sin guardar de una fila (con sus valores convertidos) y sus errores."""
+        errores = []
+        valores = self._valores(datos, presentes, errores)
+        self.normalizar_clave(valores, errores)
+        instancia = self.modelo(**valores)
+        excluir = [campo.name for campo in self.modelo._meta.concrete_fields if campo.name not in presentes]
+        try:
+            # 'comuna' se validó contra el árbol; clean_fields la consultaría fila por fila.
+            instancia.clean_fields(exclude=excluir + ['comuna'])
+        except ValidationError as error:
+            errores += [f"{campo}: {' '.join(mensajes)}" for campo, mensajes in error.message_dict.items()]
+        return instancia, errores
+
+    def importar(self, archivo, aplicar=True, delimitador=','):
+        """
+        Importa el CSV (texto). Las filas con errores se omiten. Con
+        `aplicar=False` sólo valida y cuenta (simulación). Devuelve
+        {'filas', 'creados', 'actualizados', 'sin_cambios', 'errores'}.
+        """
+        lector = csv.DictReader(archivo, delimiter=delimitador)
+        encabezado = [normalizar(columna).strip() for columna in lector.fieldnames or []]
+        faltantes = [columna for columna in self.obligatorias if columna not in encabezado]
+        if faltantes:
+            raise ErrorLectura(f"Faltan columnas: {', '.join(faltantes)}.")
+        presentes = [columna for columna in self.columnas if columna in encabezado]
+
+        resultado = {'filas': 0, 'creados': 0, 'actualizados': 0, 'sin_cambios': 0, 'errores': []}
+        vistas, lote = {}, []
+        try:
+            for fila in lector:
+                resultado['filas'] += 1
+                datos = {normalizar(columna).strip(): _texto(valor) for columna, valor in fila.items() if columna}
+                instancia, errores = self.construir(datos, presentes)
+                clave = None if errores else self.clave_de(instancia)
+                if clave in vistas:
+                    errores.append(f"Repetida en el archivo (fila {vistas[clave]}).")
+                if errores:
+                    resultado['errores'].append({'fila': lector.line_num, 'errores': errores})
+                    continue
+                vistas[clave] = lector.line_num
+                lote.append(instancia)
+                if len(lote) >= self.tamano_lote:
+                    self._guardar(lote, presentes, aplicar, resultado)
+                    lote = []
+        except (UnicodeDecodeError, csv.Error) as error:
+            raise ErrorLectura(f"No se pudo leer la fila {lector.line_num}: {error}")
+        if lote:
+            self._guardar(lote, presentes, aplicar, resultado)
+        if aplicar and (resultado['creados'] or resultado['actualizados']):
+            self._invalidar(resultado['creados'])
+        return resultado
+
+    def _guardar(self, lote, presentes, aplicar, resultado):
+        existentes = self.buscar_existentes(lote)
+        # El campo clave de las existentes se conserva (una PK como la patente no se actualiza).
+        campos = [
+            self.modelo._meta.get_field(columna).attname for columna in presentes
+            if not self.modelo._meta.get_field(columna).primary_key
+        ]
+        nuevas, anteriores, actualizadas, cambiados = [], [], [], set()
+        for instancia in lote:
+            guardada = existentes.get(self.clave_de(instancia))
+            if guardada is None:
+                instancia.actualizar_claves_orden()
+                nuevas.append(instancia)
+                continue
+            cambios = [campo for campo in campos if getattr(guardada, campo) != getattr(instancia, campo)]
+            if not cambios:
+                resultado['sin_cambios'] += 1
+                continue
+            anteriores.append(copy.copy(guardada))
+            for campo in cambios:
+                setattr(guardada, campo, getattr(instancia, campo))
+            guardada.actualizar_claves_orden()
+            actualizadas.append(guardada)
+            cambiados.update(cambios)
+
+        resultado['creados'] += len(nuevas)
+        resultado['actualizados'] += len(actualizadas)
+        if not aplicar:
+            return
+        with transaction.atomic():
+            self.modelo.objects.bulk_create(nuevas, batch_size=self.tamano_lote)
+            if actualizadas:
+                campos_orden = [f'orden_{campo}' for campo in self.modelo.CAMPOS_ORDEN_NATURAL]
+                self.modelo.objects.bulk_update(actualizadas, sorted(cambiados) + campos_orden, batch_size=self.tamano_lote)
+                self.despues_de_actualizar(anteriores, actualizadas)
+
+    def _invalidar(self, creados):
+        """bulk_create/bulk_update no emiten señales: totales, autocompletado y versiones a mano."""
+        if creados:
+            contadores.incrementar(contadores.TOTALES_POR_MODELO[self.modelo], creados)
+        for fuente in FUENTES.values():
+            if fuente.modelo is self.modelo:
+                contadores.incrementar(fuente.clave_version)
+        versiones.incrementar(self.modelo)
+
+
+class ImportadorFarmacias(ImportadorMaestro):
+    """Farmacias, identificadas por nombre y comuna (sin distinguir mayúsculas ni tildes)."""
+    modelo = Farmacia
+    columnas = ('nombre', 'direccion', 'comuna', 'horario_apertura', 'horario_cierre', 'telefono', 'latitud', 'longitud')
+    obligatorias = ('nombre', 'direccion', 'comuna', 'horario_apertura', 'horario_cierre', 'telefono')
+
+    def clave_de(self, instancia):
+        return normalizar(instancia.nombre).strip(), instancia.comuna_id
+
+    def buscar_existentes(self, instancias):
+        # Se traen las farmacias de las comunas del lote (pocas por comuna) y se comparan
+        # en Python; ante nombres repetidos en una comuna se actualiza la de menor PK.
+        existentes = {}
+        comunas = {instancia.comuna_id for instancia in instancias}
+        for farmacia in Farmacia.objects.filter(comuna_id__in=comunas).order_by('-pk'):
+            existentes[self.clave_de(farmacia)] = farmacia
+        return existentes
+
+
+class ImportadorMotoristas(ImportadorMaestro):
+    """Motoristas, identificados por RUT (validado con su dígito verificador)."""
+    modelo = Motorista
+    columnas = (
+        'rut', 'pasaporte', 'nombres', 'apellido_paterno', 'apellido_materno', 'fecha_nacimiento',
+        'direccion', 'comuna', 'telefono', 'correo', 'incluye_moto_personal', 'estado',
+    )
+    obligatorias = (
+        'rut', 'nombres', 'apellido_paterno', 'apellido_materno', 'fecha_nacimiento',
+        'direccion', 'comuna', 'telefono', 'correo',
+    )
+
+    def normalizar_clave(self, valores, errores):
+        rut = normalizar_rut(valores.get('rut'))
+        if rut is None:
+            errores.append(f'rut: "{valores.get("rut")}" no es un RUT válido.')
+        valores['rut'] = rut or valores.get('rut')
+
+    def clave_de(self, instancia):
+        return compactar_rut(instancia.rut)
+
+    def buscar_existentes(self, instancias):
+        variantes = set().union(*(variantes_rut(instancia.rut) for instancia in instancias))
+        return {self.clave_de(motorista): motorista for motorista in Motorista.objects.filter(rut__in=variantes)}
+
+    def despues_de_actualizar(self, anteriores, actualizadas):
+        # Como reindexar_por_motorista: el índice de búsqueda guarda el nombre del motorista.
+        renombrados = [
+            nueva.pk for anterior, nueva in zip(anteriores, actualizadas)
+            if (anterior.nombres, anterior.apellido_paterno) != (nueva.nombres, nueva.apellido_paterno)
+        ]
+        if renombrados:
+            busqueda.indexar(Movimiento.objects.filter(motorista_asignado_id__in=renombrados))
+
+
+class ImportadorMotos(ImportadorMaestro):
+    """Motos, identificadas por patente (sin distinguir guiones, puntos ni espacios)."""
+    modelo = Moto
+    columnas = ('patente', 'marca', 'modelo', 'color', 'anio', 'numero_chasis', 'motor', 'propietario')
+    obligatorias = ('patente', 'marca', 'modelo', 'color', 'anio')
+
+    def normalizar_clave(self, valores, errores):
+        patente = re.sub(r'[\s.]', '', valores.get('patente') or '').upper()
+        if len(compactar(patente)) < 5:
+            errores.append(f'patente: "{valores.get("patente")}" no es una patente válida.')
+        valores['patente'] = patente
+
+    def clave_de(self, instancia):
+        return compactar(instancia.patente)
+
+    def buscar_existentes(self, instancias):
+        variantes = set().union(*(variantes_patente(instancia.patente) for instancia in instancias))
+        return {self.clave_de(moto): moto for moto in Moto.objects.filter(patente__in=variantes)}
+
+
+IMPORTADORES = {
+    'farmacias': ImportadorFarmacias,
+    'motoristas': ImportadorMotoristas,
+    'motos': ImportadorMotos,
+}
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from discopro.geografia import ARCHIVO_REFERENCIA, cargar_referencia, leer_referencia
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga o completa las regiones, provincias y comunas de Chile y los tipos de movimiento "
+        "desde el archivo de referencia incluido."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archivo', default=ARCHIVO_REFERENCIA, help="Archivo JSON alternativo con el mismo formato.")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        try:
+            datos = leer_referencia(options['archivo'])
+        except (OSError, ValueError) as error:
+            raise CommandError(f"No se pudo leer {options['archivo']}: {error}")
+
+        resultado = cargar_referencia(datos)
+        for nombre, (creados, actualizados) in resultado.items():
+            self.stdout.write(f"  {nombre}: {creados} creados, {actualizados} actualizados")
+        self.stdout.write(self.style.SUCCESS(f"Datos de referencia cargados en {time.perf_counter() - inicio:.2f} s."))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from discopro.importacion import ErrorLectura, cargar_despachos, formato_lote, leer_despachos
+from discopro.models import Usuario
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea un lote de despachos con sus tramos desde un archivo JSON o CSV, validándolo completo "
+        "antes de insertar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--usuario', required=True, help="Username del usuario responsable de los despachos.")
+        parser.add_argument('--formato', choices=('json', 'csv'), help="Por defecto, según la extensión del archivo.")
+        parser.add_argument('--delimitador', default=',', help="Separador de columnas del CSV.")
+        parser.add_argument('--parcial', action='store_true', help="Crea los despachos válidos aunque otros tengan errores.")
+        parser.add_argument('--validar', action='store_true', help="Sólo valida; no crea nada.")
+
+    def handle(self, *args, **options):
+        usuario = Usuario.objects.filter(username=options['usuario']).first()
+        if usuario is None:
+            raise CommandError(f"No existe el usuario {options['usuario']}.")
+        inicio = time.perf_counter()
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                despachos = leer_despachos(
+                    archivo, options['formato'] or formato_lote(options['archivo']), options['delimitador']
+                )
+            resultado = cargar_despachos(
+                despachos, usuario, parcial=options['parcial'], aplicar=not options['validar']
+            )
+        except (OSError, ErrorLectura) as error:
+            raise CommandError(str(error))
+
+        for error in resultado['errores']:
+            fila = f"{error['fila']} ({error['numero_despacho']})" if error['fila'] else "Lote"
+            for mensaje in error['errores']:
+                self.stdout.write(self.style.WARNING(f"  {fila}: {mensaje}"))
+        accion = "creados" if resultado['creados'] else "válidos (no se creó nada)"
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['despachos']} despachos y {resultado['tramos']} tramos {accion}; "
+            f"{len(resultado['errores'])} filas con errores ({time.perf_counter() - inicio:.2f} s)."
+        ))
@@ -0,0 +1,30 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from discopro import vencimientos
+from discopro.models import Vencimiento
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula las alertas del índice de vencimientos (vencidos y por vencer) para el día de hoy. "
+        "Pensado para ejecutarse una vez al día (cron o tarea programada)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fecha', type=datetime.date.fromisoformat,
+            help="Día de referencia (AAAA-MM-DD); por defecto, hoy."
+        )
+
+    def handle(self, *args, **options):
+        cambios = vencimientos.generar_alertas(options['fecha'])
+        totales = vencimientos.totales()
+        for nivel, etiqueta in Vencimiento.NIVEL_CHOICES:
+            if cambios[nivel]:
+                self.stdout.write(f"  {cambios[nivel]} pasaron a {etiqueta.lower()}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Alertas de vencimiento: {totales.get(Vencimiento.NIVEL_VENCIDO, 0)} vencidos, "
+            f"{totales.get(Vencimiento.NIVEL_POR_VENCER, 0)} por vencer en {vencimientos.DIAS_AVISO} días."
+        ))
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from discopro import asignaciones, contadores, despachos, vencimientos
+from discopro.busqueda import reconstruir_indice
+from discopro.datos_sinteticos import TAMANO_LOTE, GeneradorDatos
+from discopro.reportes import reconstruir_resumen
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera datos sintéticos reproducibles para pruebas de carga (usuarios, farmacias, motoristas, "
+        "motos, asignaciones y movimientos) y recalcula los datos derivados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=20)
+        parser.add_argument('--farmacias', type=int, default=200)
+        parser.add_argument('--motoristas', type=int, default=500)
+        parser.add_argument('--motos', type=int, help="Por defecto, el 80%% de los motoristas.")
+        parser.add_argument('--movimientos', type=int, default=20000, help="Total de movimientos, contando los tramos.")
+        parser.add_argument('--anios', type=float, default=3, help="Años hacia atrás que cubren los movimientos.")
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE)
+        parser.add_argument('--clave', help="Contraseña de los usuarios generados. Por defecto no pueden iniciar sesión.")
+        parser.add_argument(
+            '--sin-derivados', action='store_true',
+            help="No recalcula asignaciones actuales, despachos activos, resumen diario, índices de búsqueda y vencimientos ni contadores."
+        )
+
+    def handle(self, *args, **options):
+        motos = options['motos'] if options['motos'] is not None else options['motoristas'] * 4 // 5
+        if min(options['usuarios'], options['farmacias'], options['motoristas']) < 1 and options['movimientos']:
+            raise CommandError("Para generar movimientos se necesita al menos un usuario, una farmacia y un motorista.")
+        inicio = time.perf_counter()
+        try:
+            generador = GeneradorDatos(
+                semilla=options['semilla'], tamano_lote=options['lote'], informar=self.stdout.write
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        tipos = generador.tipos_movimiento()
+        usuarios = generador.usuarios(options['usuarios'], clave=options['clave'])
+        farmacias = generador.farmacias(options['farmacias'])
+        motoristas = generador.motoristas(options['motoristas'])
+        patentes = generador.motos(motos)
+        if motoristas and farmacias:
+            generador.asignaciones(motoristas, farmacias, patentes, options['anios'])
+        if options['movimientos']:
+            generador.movimientos(options['movimientos'], options['anios'], motoristas, farmacias, usuarios, tipos)
+
+        if not options['sin_derivados']:
+            self.stdout.write(f"Asignaciones actuales corregidas: {len(asignaciones.reparar())}")
+            self.stdout.write(f"Despachos activos corregidos: {len(despachos.reparar()[0])}")
+            self.stdout.write(f"Resumen diario: {reconstruir_resumen()} filas")
+            self.stdout.write(f"Índice de búsqueda: {reconstruir_indice()} documentos")
+            self.stdout.write(f"Vencimientos indexados: {len(vencimientos.reparar())}")
+            self.stdout.write(f"Contadores corregidos: {len(contadores.reconciliar())}")
+        generador.invalidar_caches(options['anios'])
+
+        self.stdout.write(self.style.SUCCESS(f"Datos sintéticos generados en {time.perf_counter() - inicio:.1f} s."))
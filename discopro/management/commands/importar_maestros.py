@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from discopro.importacion import IMPORTADORES, TAMANO_LOTE_CARGA, ErrorLectura, texto_csv
+
+
+class Command(BaseCommand):
+    help = "Importa (crea o actualiza) farmacias, motoristas o motos desde un archivo CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=sorted(IMPORTADORES))
+        parser.add_argument('archivo')
+        parser.add_argument('--delimitador', default=',', help="Separador de columnas del CSV.")
+        parser.add_argument('--simular', action='store_true', help="Sólo valida e informa; no guarda nada.")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE_CARGA)
+
+    def handle(self, *args, **options):
+        importador = IMPORTADORES[options['tipo']](tamano_lote=options['lote'])
+        inicio = time.perf_counter()
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importador.importar(
+                    texto_csv(archivo), aplicar=not options['simular'], delimitador=options['delimitador']
+                )
+        except (OSError, ErrorLectura) as error:
+            raise CommandError(str(error))
+
+        for error in resultado['errores']:
+            self.stdout.write(self.style.WARNING(f"  Fila {error['fila']}: {' '.join(error['errores'])}"))
+        prefijo = "Simulación" if options['simular'] else "Importación"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefijo}: {resultado['filas']} filas, {resultado['creados']} nuevas, {resultado['actualizados']} "
+            f"actualizadas, {resultado['sin_cambios']} sin cambios, {len(resultado['errores'])} con errores "
+            f"({time.perf_counter() - inicio:.2f} s)."
+        ))
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from discopro.reportes import (
+    liberar_trabajos_colgados, procesar_trabajo, purgar_pdf_cache, purgar_trabajos, tomar_siguiente_trabajo
+)
+
+
+class Command(BaseCommand):
+    help = "Worker local que genera en segundo plano los reportes PDF solicitados desde la web."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez', action='store_true',
+            help="Procesa los trabajos pendientes y termina (útil para cron)."
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help="Segundos de espera entre consultas cuando la cola está vacía."
+        )
+        parser.add_argument(
+            '--conservar-dias', type=int, default=7,
+            help="Días que se conservan los reportes ya generados antes de purgarlos."
+        )
+
+    def handle(self, *args, **options):
+        liberados = liberar_trabajos_colgados()
+        purgados = purgar_trabajos(options['conservar_dias'])
+        pdf_purgados = purgar_pdf_cache(options['conservar_dias'])
+        if liberados or purgados or pdf_purgados:
+            self.stdout.write(
+                f"Trabajos reencolados: {liberados}. Trabajos purgados: {purgados}. "
+                f"PDF personalizados purgados: {pdf_purgados}."
+            )
+
+        self.stdout.write(self.style.SUCCESS("Worker de reportes iniciado."))
+        try:
+            while True:
+                trabajo = tomar_siguiente_trabajo()
+                if trabajo is None:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+
+                self.stdout.write(f"Procesando {trabajo}...")
+                procesar_trabajo(trabajo)
+                if trabajo.estado == trabajo.ESTADO_COMPLETADO:
+                    self.stdout.write(self.style.SUCCESS(f"  Listo: {trabajo.archivo.name}"))
+                else:
+                    self.stdout.write(self.style.ERROR(f"  Error: {trabajo.error}"))
+        except KeyboardInterrupt:
+            self.stdout.write("Worker detenido.")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from discopro.contadores import reconciliar
+
+
+class Command(BaseCommand):
+    help = "Recalcula los contadores del dashboard desde las tablas y corrige los que se hayan desviado."
+
+    def handle(self, *args, **options):
+        diferencias = reconciliar()
+        for clave, anterior, correcto in diferencias:
+            self.stdout.write(f"  {clave}: {anterior} -> {correcto}")
+        self.stdout.write(self.style.SUCCESS(f"Contadores reconciliados: {len(diferencias)} corregidos."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from discopro.busqueda import reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = "Regenera el índice de texto completo de movimientos (despachos y tramos)."
+
+    def handle(self, *args, **options):
+        total = reconstruir_indice()
+        self.stdout.write(self.style.SUCCESS(f"Índice de búsqueda reconstruido: {total} documentos."))
@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from discopro.reportes import reconstruir_resumen
+
+
+class Command(BaseCommand):
+    help = "Reconstruye (o carga por primera vez) el resumen diario de movimientos usado por los reportes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            help="Fecha local (AAAA-MM-DD) desde la cual reconstruir. Por defecto se reconstruye todo."
+        )
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['desde']:
+            try:
+                desde = date.fromisoformat(options['desde'])
+            except ValueError:
+                raise CommandError("La fecha --desde debe tener formato AAAA-MM-DD.")
+
+        filas = reconstruir_resumen(desde=desde)
+        self.stdout.write(self.style.SUCCESS(f"Resumen diario reconstruido: {filas} filas."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from discopro.asignaciones import reparar
+
+
+class Command(BaseCommand):
+    help = "Recalcula la farmacia actual de cada motorista y el motorista actual de cada moto desde sus asignaciones."
+
+    def handle(self, *args, **options):
+        diferencias = reparar()
+        for modelo, pk, anterior, correcto in diferencias:
+            self.stdout.write(f"  {modelo} {pk}: {anterior} -> {correcto}")
+        self.stdout.write(self.style.SUCCESS(f"Asignaciones actuales reparadas: {len(diferencias)} corregidas."))
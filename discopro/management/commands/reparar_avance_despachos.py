@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from discopro.despachos import reparar_avance
+
+
+class Command(BaseCommand):
+    help = "Recalcula el avance de cada despacho (tramos por estado, último tramo y motorista actual) desde sus tramos."
+
+    def handle(self, *args, **options):
+        corregidos = reparar_avance()
+        self.stdout.write(self.style.SUCCESS(f"Avance de despachos reparado: {len(corregidos)} despachos corregidos."))
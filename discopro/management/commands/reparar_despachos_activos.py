@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from discopro.despachos import reparar
+
+
+class Command(BaseCommand):
+    help = "Recalcula el despacho pendiente que ocupa a cada motorista desde los movimientos."
+
+    def handle(self, *args, **options):
+        diferencias, conflictos = reparar()
+        for motorista_id, anterior, correcto in diferencias:
+            self.stdout.write(f"  Motorista {motorista_id}: {anterior} -> {correcto}")
+        for motorista_id, despachos in conflictos.items():
+            self.stdout.write(self.style.WARNING(
+                f"  Motorista {motorista_id} tiene pendientes en {len(despachos)} despachos: {despachos}"
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Despachos activos reparados: {len(diferencias)} corregidos, {len(conflictos)} motoristas en conflicto."
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from discopro.vencimientos import reparar
+
+
+class Command(BaseCommand):
+    help = "Recalcula el índice de vencimientos (y sus alertas) desde la documentación de motos y motoristas."
+
+    def handle(self, *args, **options):
+        diferencias = reparar()
+        for clave, anterior, correcto in diferencias:
+            self.stdout.write(f"  {clave}: {anterior} -> {correcto}")
+        self.stdout.write(self.style.SUCCESS(f"Índice de vencimientos reparado: {len(diferencias)} filas corregidas."))
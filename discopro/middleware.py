@@ -0,0 +1,79 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger('discopro.rendimiento')
+
+# Sobre este número de consultas por petición el registro pasa de INFO a WARNING.
+LIMITE_CONSULTAS_AVISO = 50
+
+
+class MedicionConsultas:
+    """Wrapper de ejecución (connection.execute_wrapper) que cuenta las consultas y suma su duración."""
+    def __init__(self):
+        self.total = 0
+        self.duracion = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duracion += time.perf_counter() - inicio
+            self.total += 1
+
+
+def _ms(segundos):
+    return f"{segundos * 1000:.1f}"
+
+
+class ServerTimingMiddleware:
+    """
+    Mide cada petición: número de consultas y tiempo en la base de datos,
+    tiempo de renderizado de la plantilla y tiempo total. Los expone en la
+    cabecera `Server-Timing` (visible en la pestaña Red del navegador) y los
+    registra en el logger `discopro.rendimiento`.
+
+    El tiempo de plantilla se mide para las respuestas TemplateResponse (las
+    vistas basadas en clases); en las vistas que usan render() queda incluido
+    en el tiempo total. En respuestas en streaming sólo se cuenta hasta que la
+    vista entrega la respuesta.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicion = MedicionConsultas()
+        request.tiempo_plantilla = None
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(medicion):
+            response = self.get_response(request)
+        total = time.perf_counter() - inicio
+
+        metricas = [f'db;dur={_ms(medicion.duracion)};desc="{medicion.total} consultas"']
+        if request.tiempo_plantilla is not None:
+            metricas.append(f'tpl;dur={_ms(request.tiempo_plantilla)};desc="Plantilla"')
+        metricas.append(f'total;dur={_ms(total)}')
+        if getattr(settings, 'SERVER_TIMING', True):
+            response['Server-Timing'] = ', '.join(metricas)
+
+        nivel = logging.WARNING if medicion.total > LIMITE_CONSULTAS_AVISO else logging.INFO
+        logger.log(
+            nivel, "%s %s %s total=%sms db=%sms consultas=%d plantilla=%sms",
+            request.method, request.path, response.status_code, _ms(total), _ms(medicion.duracion),
+            medicion.total, _ms(request.tiempo_plantilla) if request.tiempo_plantilla is not None else '-'
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        # Es el último process_template_response en ejecutarse (middleware externo),
+        # justo antes de que el handler renderice la respuesta.
+        inicio = time.perf_counter()
+
+        def medir(respuesta):
+            request.tiempo_plantilla = time.perf_counter() - inicio
+
+        response.add_post_render_callback(medir)
+        return response
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:54
+
+import django.db.models.deletion
+from collections import Counter
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def poblar_resumen(apps, schema_editor):
+    Movimiento = apps.get_model('discopro', 'Movimiento')
+    ResumenDiarioMovimiento = apps.get_model('discopro', 'ResumenDiarioMovimiento')
+    conteo = Counter()
+    filas = Movimiento.objects.values_list('fecha_movimiento', 'estado', 'tipo_movimiento_id', 'motorista_asignado_id')
+    for fecha, estado, tipo_id, motorista_id in filas.iterator(chunk_size=5000):
+        conteo[(timezone.localdate(fecha), estado, tipo_id, motorista_id)] += 1
+    ResumenDiarioMovimiento.objects.bulk_create(
+        [
+            ResumenDiarioMovimiento(fecha=fecha, estado=estado, tipo_movimiento_id=tipo_id, motorista_id=motorista_id, total=total)
+            for (fecha, estado, tipo_id, motorista_id), total in conteo.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discopro', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiarioMovimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Día (hora local)')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('completado', 'Completado'), ('anulado', 'Anulado')], max_length=20, verbose_name='Estado')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Cantidad')),
+                ('motorista', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='discopro.motorista', verbose_name='Motorista')),
+                ('tipo_movimiento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='discopro.tipomovimiento', verbose_name='Tipo de Movimiento')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Movimientos',
+                'verbose_name_plural': 'Resúmenes Diarios de Movimientos',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'estado', 'tipo_movimiento', 'motorista'), name='resumen_diario_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 05:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discopro', '0002_resumen_diario_movimiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoReporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=20, verbose_name='Tipo de Reporte')),
+                ('desde', models.DateField(verbose_name='Desde')),
+                ('hasta', models.DateField(verbose_name='Hasta (exclusivo)')),
+                ('dimension', models.CharField(default='estado', max_length=30, verbose_name='Dimensión')),
+                ('clave', models.CharField(db_index=True, max_length=64, verbose_name='Clave de Solicitud')),
+                ('estado', models.CharField(choices=[('pendiente', 'En cola'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('progreso', models.PositiveSmallIntegerField(default=0, verbose_name='Progreso (%)')),
+                ('archivo', models.FileField(blank=True, null=True, upload_to='reportes/', verbose_name='Archivo PDF')),
+                ('error', models.TextField(blank=True, null=True, verbose_name='Detalle del Error')),
+                ('fecha_solicitud', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Solicitud')),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Inicio de Proceso')),
+                ('fecha_termino', models.DateTimeField(blank=True, null=True, verbose_name='Término de Proceso')),
+                ('solicitado_por', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trabajos_reporte', to=settings.AUTH_USER_MODEL, verbose_name='Solicitado por')),
+            ],
+            options={
+                'verbose_name': 'Trabajo de Reporte',
+                'verbose_name_plural': 'Trabajos de Reporte',
+                'indexes': [models.Index(fields=['estado', 'fecha_solicitud'], name='trabajo_reporte_cola_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def poblar_contadores(apps, schema_editor):
+    Contador = apps.get_model('discopro', 'Contador')
+    Movimiento = apps.get_model('discopro', 'Movimiento')
+    valores = {
+        f'total:{nombre}': apps.get_model('discopro', modelo).objects.count()
+        for nombre, modelo in (('farmacias', 'Farmacia'), ('motoristas', 'Motorista'), ('motos', 'Moto'), ('usuarios', 'Usuario'))
+    }
+    despachos = Movimiento.objects.filter(movimiento_padre__isnull=True)
+    valores['total:despachos'] = despachos.count()
+    for fila in despachos.values('estado').annotate(total=Count('pk')).order_by():
+        valores[f'despachos:estado:{fila["estado"]}'] = fila['total']
+    pendientes = despachos.filter(estado='pendiente', motorista_asignado__isnull=False)
+    for fila in pendientes.values('motorista_asignado').annotate(total=Count('pk')).order_by():
+        valores[f'pendientes:motorista:{fila["motorista_asignado"]}'] = fila['total']
+
+    Contador.objects.filter(clave__in=valores).delete()
+    Contador.objects.bulk_create([Contador(clave=clave, valor=valor) for clave, valor in valores.items()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discopro', '0004_contador'),
+    ]
+
+    operations = [
+        migrations.RunPython(poblar_contadores, migrations.RunPython.noop),
+    ]
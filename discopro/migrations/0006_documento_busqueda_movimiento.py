@@ -0,0 +1,98 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# El SQL y el texto de los documentos se copian aquí (no se importan de
+# discopro.busqueda) para que la migración no cambie si ese módulo cambia.
+TABLA_DOCUMENTOS = 'discopro_documentobusquedamovimiento'
+TABLA_FTS = 'discopro_movimiento_fts'
+INDICE_FULLTEXT = 'discopro_busqueda_contenido_ft'
+
+
+def componer_contenido(pk, numero_despacho, origen, destino, *nombres):
+    partes = [str(pk), numero_despacho, origen, destino, *nombres]
+    return " ".join(parte for parte in partes if parte)
+
+
+def crear_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        sentencias = [
+            f"CREATE VIRTUAL TABLE {TABLA_FTS} USING fts5(contenido, content='{TABLA_DOCUMENTOS}', "
+            f"content_rowid='movimiento_id', tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')",
+            f"CREATE TRIGGER {TABLA_FTS}_ai AFTER INSERT ON {TABLA_DOCUMENTOS} BEGIN "
+            f"INSERT INTO {TABLA_FTS}(rowid, contenido) VALUES (new.movimiento_id, new.contenido); END",
+            f"CREATE TRIGGER {TABLA_FTS}_ad AFTER DELETE ON {TABLA_DOCUMENTOS} BEGIN "
+            f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, contenido) VALUES ('delete', old.movimiento_id, old.contenido); END",
+            f"CREATE TRIGGER {TABLA_FTS}_au AFTER UPDATE ON {TABLA_DOCUMENTOS} BEGIN "
+            f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, contenido) VALUES ('delete', old.movimiento_id, old.contenido); "
+            f"INSERT INTO {TABLA_FTS}(rowid, contenido) VALUES (new.movimiento_id, new.contenido); END",
+        ]
+    elif vendor == 'mysql':
+        sentencias = [f"ALTER TABLE {TABLA_DOCUMENTOS} ADD FULLTEXT INDEX {INDICE_FULLTEXT} (contenido)"]
+    else:
+        sentencias = []
+    for sentencia in sentencias:
+        schema_editor.execute(sentencia)
+
+
+def eliminar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        sentencias = [
+            f"DROP TRIGGER IF EXISTS {TABLA_FTS}_ai",
+            f"DROP TRIGGER IF EXISTS {TABLA_FTS}_ad",
+            f"DROP TRIGGER IF EXISTS {TABLA_FTS}_au",
+            f"DROP TABLE IF EXISTS {TABLA_FTS}",
+        ]
+    elif vendor == 'mysql':
+        sentencias = [f"ALTER TABLE {TABLA_DOCUMENTOS} DROP INDEX {INDICE_FULLTEXT}"]
+    else:
+        sentencias = []
+    for sentencia in sentencias:
+        schema_editor.execute(sentencia)
+
+
+def poblar_documentos(apps, schema_editor):
+    Movimiento = apps.get_model('discopro', 'Movimiento')
+    DocumentoBusquedaMovimiento = apps.get_model('discopro', 'DocumentoBusquedaMovimiento')
+    filas = Movimiento.objects.values_list(
+        'pk', 'movimiento_padre_id', 'numero_despacho', 'origen', 'destino',
+        'usuario_responsable__first_name', 'usuario_responsable__last_name',
+        'motorista_asignado__nombres', 'motorista_asignado__apellido_paterno',
+    )
+    lote = []
+    for pk, padre_id, numero, origen, destino, *nombres in filas.iterator(chunk_size=1000):
+        lote.append(DocumentoBusquedaMovimiento(
+            movimiento_id=pk, raiz_id=padre_id or pk,
+            contenido=componer_contenido(pk, numero, origen, destino, *nombres)
+        ))
+        if len(lote) >= 1000:
+            DocumentoBusquedaMovimiento.objects.bulk_create(lote)
+            lote = []
+    DocumentoBusquedaMovimiento.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discopro', '0005_poblar_contadores_dashboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusquedaMovimiento',
+            fields=[
+                ('movimiento', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='documento_busqueda', serialize=False, to='discopro.movimiento', verbose_name='Movimiento')),
+                ('contenido', models.TextField(verbose_name='Contenido')),
+                ('raiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='discopro.movimiento', verbose_name='Despacho')),
+            ],
+            options={
+                'verbose_name': 'Documento de Búsqueda',
+                'verbose_name_plural': 'Documentos de Búsqueda',
+            },
+        ),
+        migrations.RunPython(crear_indice, eliminar_indice),
+        migrations.RunPython(poblar_documentos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:12
+
+from django.db import migrations, models
+
+
+CAMPOS_ORDEN_NATURAL = {
+    'Usuario': ('first_name', 'username', 'rut'),
+    'Farmacia': ('nombre', 'direccion'),
+    'Motorista': ('nombres', 'rut'),
+    'Moto': ('patente', 'marca', 'modelo'),
+    'Movimiento': ('numero_despacho', 'origen', 'destino'),
+}
+
+
+def clave_orden_natural(valor):
+    if valor is None:
+        return None
+    valor = str(valor)
+    return f"{len(valor):04d}{valor}"
+
+
+def poblar_claves(apps, schema_editor):
+    for nombre_modelo, campos in CAMPOS_ORDEN_NATURAL.items():
+        modelo = apps.get_model('discopro', nombre_modelo)
+        claves = [f'orden_{campo}' for campo in campos]
+        lote = []
+        for objeto in modelo.objects.only('pk', *campos).iterator(chunk_size=2000):
+            for campo, clave in zip(campos, claves):
+                setattr(objeto, clave, clave_orden_natural(getattr(objeto, campo)))
+            lote.append(objeto)
+            if len(lote) >= 2000:
+                modelo.objects.bulk_update(lote, claves)
+                lote = []
+        modelo.objects.bulk_update(lote, claves)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discopro', '0006_documento_busqueda_movimiento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmacia',
+            name='orden_direccion',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=204, null=True, verbose_name='Clave de orden'),
+        ),
+        migrations.AddField(
+            model_name='farmacia',
+            name='orden_nombre',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=154, null=True, verbose_name='Clave de orden'),
+        ),
+        migrations.AddField(
+            model_name='moto',
+            name='orden_marca',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=54, null=True, verbose_name='Clave de orden'),
+        ),
+        migrations.AddField(
+            model_name='moto',
+            name='orden_modelo',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=54, null=True, verbose_name='Clave de orden'),
+        ),
+        migrations.AddField(
+            model_name='moto',
+            name='orden_patente',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=19, null=True, verbose_name='Clave de orden'),
+        ),
+        migrations.AddField(
+            model_name='motorista',
+            name='orden_nombres',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=104, null=True, verbose_name='Clave de orden'),
+        ),
+        migrations.AddField(
+            model_name='motorista',
+            name='orden_rut',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16, null=True, verbose_name='Clave de orden'),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='orden_destino',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=259, null=True, verbose_name='Clave de orden'),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='orden_numero_despacho',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=54, null=True, verbose_name='Clave de orden'),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='orden_origen',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=259, null=True, verbose_name='Clave de orden'),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='orden_first_name',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=154, null=True, verbose_name='Clave de orden'),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='orden_rut',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16, null=True, verbose_name='Clave de orden'),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='orden_username',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=154, null=True, verbose_name='Clave de orden'),
+        ),
+        migrations.RunPython(poblar_claves, migrations.RunPython.noop),
+    ]
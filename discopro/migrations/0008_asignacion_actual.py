@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def poblar_asignacion_actual(apps, schema_editor):
+    Motorista = apps.get_model('discopro', 'Motorista')
+    Moto = apps.get_model('discopro', 'Moto')
+    AsignacionFarmacia = apps.get_model('discopro', 'AsignacionFarmacia')
+    AsignacionMoto = apps.get_model('discopro', 'AsignacionMoto')
+    Motorista.objects.update(farmacia_actual=Subquery(
+        AsignacionFarmacia.objects.filter(motorista=OuterRef('pk'), fechaTermino__isnull=True)
+        .order_by('-fechaAsignacion', '-idAsignacionFarmacia').values('farmacia')[:1]
+    ))
+    Moto.objects.update(motorista_actual=Subquery(
+        AsignacionMoto.objects.filter(moto=OuterRef('pk'), fechaTermino__isnull=True)
+        .order_by('-fechaAsignacion', '-idAsignacionMoto').values('motorista')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discopro', '0007_claves_orden_natural'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='moto',
+            name='motorista_actual',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='motos_actuales', to='discopro.motorista', verbose_name='Motorista actual'),
+        ),
+        migrations.AddField(
+            model_name='motorista',
+            name='farmacia_actual',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='motoristas_actuales', to='discopro.farmacia', verbose_name='Farmacia actual'),
+        ),
+        migrations.RunPython(poblar_asignacion_actual, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discopro', '0008_asignacion_actual'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='asignacionfarmacia',
+            index=models.Index(fields=['motorista', 'fechaAsignacion'], name='asig_farmacia_motorista_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asignacionmoto',
+            index=models.Index(fields=['moto', 'fechaAsignacion'], name='asig_moto_moto_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='asignacionmoto',
+            index=models.Index(fields=['motorista', 'fechaAsignacion'], name='asig_moto_motorista_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['estado', 'fecha_movimiento'], name='movimiento_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['motorista_asignado', 'estado'], name='movimiento_motorista_est_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['movimiento_padre', 'fecha_movimiento'], name='movimiento_padre_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def poblar_despachos_activos(apps, schema_editor):
+    # Si un motorista tiene pendientes en varios despachos, se queda con el más antiguo.
+    Movimiento = apps.get_model('discopro', 'Movimiento')
+    DespachoActivo = apps.get_model('discopro', 'DespachoActivo')
+    filas = Movimiento.objects.filter(estado='pendiente', motorista_asignado__isnull=False).annotate(
+        despacho=Coalesce('movimiento_padre_id', 'pk')
+    ).values_list('motorista_asignado_id', 'despacho').order_by('-despacho')
+    ocupados = dict(filas)
+    DespachoActivo.objects.bulk_create(
+        [DespachoActivo(motorista_id=motorista_id, despacho_id=despacho_id) for motorista_id, despacho_id in ocupados.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discopro', '0009_indices_consultas_frecuentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DespachoActivo',
+            fields=[
+                ('motorista', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='despacho_activo', serialize=False, to='discopro.motorista', verbose_name='Motorista')),
+                ('desde', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Ocupado desde')),
+                ('despacho', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='motoristas_ocupados', to='discopro.movimiento', verbose_name='Despacho')),
+            ],
+            options={
+                'verbose_name': 'Despacho Activo',
+                'verbose_name_plural': 'Despachos Activos',
+            },
+        ),
+        migrations.RunPython(poblar_despachos_activos, migrations.RunPython.noop),
+    ]
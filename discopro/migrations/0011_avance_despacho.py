@@ -0,0 +1,98 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+ESTADOS = {'pendiente': 'tramos_pendientes', 'completado': 'tramos_completados', 'anulado': 'tramos_anulados'}
+
+
+def poblar_avance(apps, schema_editor):
+    # Recorre los tramos en orden (por despacho y fecha) y guarda el avance por lotes de despachos.
+    Movimiento = apps.get_model('discopro', 'Movimiento')
+    Movimiento.objects.filter(movimiento_padre__isnull=True).update(motorista_actual=F('motorista_asignado'))
+    motoristas = dict(Movimiento.objects.filter(movimiento_padre__isnull=True).values_list('pk', 'motorista_asignado_id'))
+    campos = ['avance', 'motorista_actual', 'total_tramos', *ESTADOS.values(), 'ultimo_tramo']
+
+    def guardar(lote):
+        for despacho in lote:
+            vigentes = despacho.total_tramos - despacho.tramos_anulados
+            despacho.avance = despacho.tramos_completados * 100 // vigentes if vigentes > 0 else 0
+        Movimiento.objects.bulk_update(lote, campos)
+
+    lote, despacho = [], None
+    tramos = Movimiento.objects.filter(movimiento_padre__isnull=False).order_by(
+        'movimiento_padre_id', 'fecha_movimiento', 'pk'
+    ).values_list('movimiento_padre_id', 'estado', 'fecha_movimiento', 'motorista_asignado_id')
+    for padre_id, estado, fecha, motorista_id in tramos.iterator(chunk_size=1000):
+        if despacho is None or despacho.pk != padre_id:
+            if len(lote) >= 1000:
+                guardar(lote)
+                lote = []
+            despacho = Movimiento(pk=padre_id)
+            lote.append(despacho)
+        despacho.total_tramos += 1
+        if estado in ESTADOS:
+            setattr(despacho, ESTADOS[estado], getattr(despacho, ESTADOS[estado]) + 1)
+        despacho.ultimo_tramo = fecha
+        despacho.motorista_actual_id = motorista_id or motoristas.get(padre_id)
+    if lote:
+        guardar(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discopro', '0010_despacho_activo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimiento',
+            name='avance',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='Tramos completados sobre los no anulados.', verbose_name='Avance (%)'),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='motorista_actual',
+            field=models.ForeignKey(blank=True, editable=False, help_text='El del último tramo o, si no tiene, el del despacho.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='discopro.motorista', verbose_name='Motorista actual'),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='total_tramos',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Tramos'),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='tramos_anulados',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Tramos anulados'),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='tramos_completados',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Tramos completados'),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='tramos_pendientes',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Tramos pendientes'),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='ultimo_tramo',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Último tramo'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['movimiento_padre', 'avance'], name='movimiento_padre_avance_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['movimiento_padre', 'tramos_pendientes'], name='movimiento_padre_pend_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['movimiento_padre', 'ultimo_tramo'], name='movimiento_padre_ultimo_idx'),
+        ),
+        migrations.RunPython(poblar_avance, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import CharField, Count, F, Max, Q, Value
+from django.db.models.functions import Cast, Concat, LPad
+
+DIGITOS_RUTA = 10
+ESTADOS = {'pendiente': 'tramos_pendientes', 'completado': 'tramos_completados', 'anulado': 'tramos_anulados'}
+
+
+def poblar_arbol(apps, schema_editor):
+    Movimiento = apps.get_model('discopro', 'Movimiento')
+    # Los tramos directos (casi todos) con un solo UPDATE.
+    Movimiento.objects.filter(movimiento_padre__isnull=False).update(
+        despacho_raiz=F('movimiento_padre'), profundidad=1,
+        ruta=Concat(LPad(Cast('movimiento_padre', CharField()), DIGITOS_RUTA, Value('0')), Value('/')),
+    )
+    # Tramos de tramos: cada nivel se ubica bajo su padre, ya corregido en la vuelta anterior.
+    nivel, raices = 1, set()
+    while True:
+        anidados = list(Movimiento.objects.filter(
+            movimiento_padre__movimiento_padre__isnull=False, movimiento_padre__profundidad=nivel
+        ).select_related('movimiento_padre'))
+        if not anidados:
+            break
+        for tramo in anidados:
+            padre = tramo.movimiento_padre
+            tramo.despacho_raiz_id = padre.despacho_raiz_id
+            tramo.ruta = padre.ruta + f"{padre.pk:0{DIGITOS_RUTA}d}/"
+            tramo.profundidad = padre.profundidad + 1
+            raices.add(padre.despacho_raiz_id)
+        Movimiento.objects.bulk_update(anidados, ['despacho_raiz', 'ruta', 'profundidad'], batch_size=1000)
+        nivel += 1
+
+    # El avance de esos despachos pasa a contar todos sus tramos (y no el del tramo intermedio).
+    if raices:
+        Movimiento.objects.filter(movimiento_padre__isnull=False).exclude(total_tramos=0).update(
+            total_tramos=0, tramos_pendientes=0, tramos_completados=0, tramos_anulados=0, avance=0,
+            ultimo_tramo=None, motorista_actual=None,
+        )
+        conteos = Movimiento.objects.filter(despacho_raiz_id__in=raices).values('despacho_raiz_id').annotate(
+            total=Count('pk'), ultimo=Max('fecha_movimiento'),
+            **{campo: Count('pk', filter=Q(estado=estado)) for estado, campo in ESTADOS.items()},
+        ).order_by()
+        for fila in conteos:
+            vigentes = fila['total'] - fila['tramos_anulados']
+            ultimo = Movimiento.objects.filter(despacho_raiz_id=fila['despacho_raiz_id']).order_by(
+                '-fecha_movimiento', '-pk'
+            ).values_list('motorista_asignado_id', flat=True).first()
+            despacho = Movimiento.objects.get(pk=fila['despacho_raiz_id'])
+            Movimiento.objects.filter(pk=despacho.pk).update(
+                total_tramos=fila['total'], ultimo_tramo=fila['ultimo'],
+                avance=fila['tramos_completados'] * 100 // vigentes if vigentes > 0 else 0,
+                motorista_actual=ultimo or despacho.motorista_asignado_id,
+                **{campo: fila[campo] for campo in ESTADOS.values()},
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discopro', '0011_avance_despacho'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimiento',
+            name='despacho_raiz',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_del_despacho', to='discopro.movimiento', verbose_name='Despacho (raíz)'),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='profundidad',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Profundidad'),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='ruta',
+            field=models.CharField(blank=True, default='', editable=False, help_text="PKs de los ancestros, desde la raíz ('0000000012/0000000015/').", max_length=255, verbose_name='Ruta'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['despacho_raiz', 'fecha_movimiento'], name='movimiento_raiz_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['ruta'], name='movimiento_ruta_idx'),
+        ),
+        migrations.RunPython(poblar_arbol, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:58
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+CAMPOS_MOTO = (
+    ('permiso_circulacion', 'permiso_circulacion_vencimiento'),
+    ('seguro_obligatorio', 'seguro_obligatorio_vencimiento'),
+    ('revision_tecnica', 'revision_tecnica_vencimiento'),
+)
+
+
+def poblar_vencimientos(apps, schema_editor):
+    # Una fila por fecha de vencimiento, con el nivel de alerta de hoy (vencido 0, por vencer 1, vigente 2).
+    Vencimiento = apps.get_model('discopro', 'Vencimiento')
+    hoy = timezone.localdate()
+    limite = hoy + datetime.timedelta(days=30)
+
+    def fila(clave, fecha, **campos):
+        nivel = 0 if fecha < hoy else 1 if fecha <= limite else 2
+        return Vencimiento(clave=clave, fecha=fecha, nivel=nivel, **campos)
+
+    def filas():
+        documentaciones = apps.get_model('discopro', 'DocumentacionMoto').objects.values_list(
+            'pk', 'moto_id', *(campo for _, campo in CAMPOS_MOTO)
+        )
+        for pk, moto_id, *fechas in documentaciones.iterator(chunk_size=1000):
+            for (tipo, _), fecha in zip(CAMPOS_MOTO, fechas):
+                if fecha is not None:
+                    yield fila(f'documentacion_moto:{pk}:{tipo}', fecha, tipo=tipo, moto_id=moto_id)
+        documentos = apps.get_model('discopro', 'Documentacion').objects.filter(
+            fechaVencimiento__isnull=False
+        ).values_list('pk', 'motorista_id', 'fechaVencimiento')
+        for pk, motorista_id, fecha in documentos.iterator(chunk_size=1000):
+            yield fila(f'documento:{pk}', fecha, tipo='documento', motorista_id=motorista_id, documento_id=pk)
+        controles = apps.get_model('discopro', 'Motorista').objects.filter(
+            fecha_proximo_control__isnull=False
+        ).values_list('pk', 'fecha_proximo_control')
+        for pk, fecha in controles.iterator(chunk_size=1000):
+            yield fila(f'motorista:{pk}:control', fecha, tipo='control', motorista_id=pk)
+
+    lote = []
+    for vencimiento in filas():
+        lote.append(vencimiento)
+        if len(lote) >= 1000:
+            Vencimiento.objects.bulk_create(lote)
+            lote = []
+    Vencimiento.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discopro', '0012_arbol_despacho'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Vencimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=60, unique=True, verbose_name='Clave')),
+                ('tipo', models.CharField(choices=[('permiso_circulacion', 'Permiso de Circulación'), ('seguro_obligatorio', 'Seguro Obligatorio'), ('revision_tecnica', 'Revisión Técnica'), ('documento', 'Documento del Motorista'), ('control', 'Próximo Control')], max_length=20, verbose_name='Tipo de Documento')),
+                ('fecha', models.DateField(verbose_name='Vencimiento')),
+                ('nivel', models.PositiveSmallIntegerField(choices=[(0, 'Vencido'), (1, 'Por vencer'), (2, 'Vigente')], default=2, verbose_name='Alerta')),
+                ('documento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='discopro.documentacion', verbose_name='Documento')),
+                ('moto', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='vencimientos', to='discopro.moto', verbose_name='Moto')),
+                ('motorista', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='vencimientos', to='discopro.motorista', verbose_name='Motorista')),
+            ],
+            options={
+                'verbose_name': 'Vencimiento',
+                'verbose_name_plural': 'Vencimientos',
+                'indexes': [models.Index(fields=['nivel', 'fecha'], name='vencimiento_nivel_fecha_idx'), models.Index(fields=['fecha'], name='vencimiento_fecha_idx'), models.Index(fields=['moto', 'fecha'], name='vencimiento_moto_fecha_idx'), models.Index(fields=['motorista', 'fecha'], name='vencimiento_motorista_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_vencimientos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:15
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def poblar_clave_activa(apps, schema_editor):
+    # Si ya hay trabajos activos repetidos, la clave queda en el más antiguo;
+    # los demás se procesan igual, pero dejan de recibir solicitudes nuevas.
+    TrabajoReporte = apps.get_model('discopro', 'TrabajoReporte')
+    primeros = TrabajoReporte.objects.filter(estado__in=('pendiente', 'procesando')).values('clave').annotate(
+        primero=Min('pk')
+    ).values_list('primero', flat=True)
+    for trabajo in TrabajoReporte.objects.filter(pk__in=list(primeros)).only('pk', 'clave'):
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(clave_activa=trabajo.clave)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discopro', '0013_indice_vencimientos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoreporte',
+            name='clave_activa',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True, verbose_name='Clave Activa'),
+        ),
+        migrations.RunPython(poblar_clave_activa, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:44
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Sum
+
+
+def poblar_motorista_clave(apps, schema_editor):
+    # Las filas "sin motorista" repetidas (la restricción anterior no las impedía)
+    # se funden en la de menor PK antes de crear la nueva restricción.
+    ResumenDiarioMovimiento = apps.get_model('discopro', 'ResumenDiarioMovimiento')
+    repetidas = ResumenDiarioMovimiento.objects.filter(motorista__isnull=True).values(
+        'fecha', 'estado', 'tipo_movimiento'
+    ).annotate(primera=Min('pk'), suma=Sum('total'), filas=Count('pk')).filter(filas__gt=1)
+    for grupo in repetidas:
+        del grupo['filas']
+        primera, suma = grupo.pop('primera'), grupo.pop('suma')
+        ResumenDiarioMovimiento.objects.filter(motorista__isnull=True, **grupo).exclude(pk=primera).delete()
+        ResumenDiarioMovimiento.objects.filter(pk=primera).update(total=suma)
+    ResumenDiarioMovimiento.objects.filter(motorista__isnull=False).update(motorista_clave=F('motorista'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discopro', '0014_trabajo_reporte_clave_activa'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='resumendiariomovimiento',
+            name='resumen_diario_unico',
+        ),
+        migrations.AddField(
+            model_name='resumendiariomovimiento',
+            name='motorista_clave',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Clave del Motorista'),
+        ),
+        migrations.RunPython(poblar_motorista_clave, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='resumendiariomovimiento',
+            constraint=models.UniqueConstraint(fields=('fecha', 'estado', 'tipo_movimiento', 'motorista_clave'), name='resumen_diario_unico'),
+        ),
+    ]
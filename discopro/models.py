@@ -1,8 +1,60 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth.models import AbstractUser
 
+
+# --- Orden Natural ---
+def clave_orden_natural(valor):
+    """
+    Clave persistida equivalente a ordenar por (largo, texto): el largo con 4
+    dígitos antepuesto al valor. Así "A-2" < "A-10", como con order_by(Length(campo), campo),
+    pero se puede indexar y recorrer con un rango del índice.
+    """
+    if valor is None:
+        return None
+    valor = str(valor)
+    return f"{len(valor):04d}{valor}"
+
+
+def campo_orden_natural(largo_maximo):
+    """Columna indexada para la clave de orden natural de un campo de `largo_maximo` caracteres."""
+    return models.CharField(
+        max_length=largo_maximo + 4, null=True, blank=True, editable=False,
+        db_index=True, verbose_name="Clave de orden"
+    )
+
+
+class OrdenNaturalMixin:
+    """
+    Mantiene al guardar las columnas `orden_<campo>` de los campos listados en
+    CAMPOS_ORDEN_NATURAL. Las cargas masivas (bulk_create/bulk_update) deben
+    llamar a `actualizar_claves_orden()` antes de insertar.
+    """
+    CAMPOS_ORDEN_NATURAL = ()
+
+    def actualizar_claves_orden(self):
+        for campo in self.CAMPOS_ORDEN_NATURAL:
+            setattr(self, f'orden_{campo}', clave_orden_natural(getattr(self, campo)))
+
+    def save(self, *args, **kwargs):
+        self.actualizar_claves_orden()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            claves = [f'orden_{campo}' for campo in self.CAMPOS_ORDEN_NATURAL if campo in update_fields]
+            kwargs['update_fields'] = list(update_fields) + claves
+        super().save(*args, **kwargs)
+
+
+# Ruta materializada de Movimiento: el PK de cada ancestro con ancho fijo.
+DIGITOS_RUTA = 10
+
+
+def segmento_ruta(pk):
+    return f"{pk:0{DIGITOS_RUTA}d}/"
+
+
 # ---  Modelos Geográficos ---
 class Region(models.Model):
     idRegion = models.AutoField(primary_key=True)
@@ -38,10 +90,15 @@ class Rol(models.Model):
     def __str__(self):
         return self.nombreRol
 
-class Usuario(AbstractUser):
+class Usuario(OrdenNaturalMixin, AbstractUser):
+    CAMPOS_ORDEN_NATURAL = ('first_name', 'username', 'rut')
+
     rut = models.CharField(max_length=12, unique=True, null=True, blank=True)
     telefono = models.CharField(max_length=20, null=True, blank=True)
     rol = models.ForeignKey(Rol, on_delete=models.PROTECT, null=True, blank=True)
+    orden_first_name = campo_orden_natural(150)
+    orden_username = campo_orden_natural(150)
+    orden_rut = campo_orden_natural(12)
 
     class Meta:
         verbose_name = 'Usuario'
@@ -51,7 +108,9 @@ class Usuario(AbstractUser):
         return f"{self.first_name} {self.last_name} ({self.username})"
 
 # --- Modelos Principales ---
-class Farmacia(models.Model):
+class Farmacia(OrdenNaturalMixin, models.Model):
+    CAMPOS_ORDEN_NATURAL = ('nombre', 'direccion')
+
     codigo = models.AutoField(primary_key=True)
     nombre = models.CharField(max_length=150, verbose_name="Nombre de Farmacia")
     direccion = models.CharField(max_length=200, verbose_name="Dirección")
@@ -61,12 +120,16 @@ class Farmacia(models.Model):
     telefono = models.CharField(max_length=20, verbose_name="Teléfono")
     latitud = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitud = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    orden_nombre = campo_orden_natural(150)
+    orden_direccion = campo_orden_natural(200)
     def __str__(self):
         return self.nombre
     def get_absolute_url(self): 
         return reverse('detalle_farmacia', kwargs={'pk': self.pk})
 
-class Motorista(models.Model):
+class Motorista(OrdenNaturalMixin, models.Model):
+    CAMPOS_ORDEN_NATURAL = ('nombres', 'rut')
+
     ESTADO_ACTIVO = 'activo'
     ESTADO_INACTIVO = 'inactivo'
     ESTADO_LICENCIA = 'licencia'
@@ -91,12 +154,21 @@ class Motorista(models.Model):
     fecha_ultimo_control = models.DateField(null=True, blank=True)
     fecha_proximo_control = models.DateField(null=True, blank=True)
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default=ESTADO_ACTIVO, verbose_name="Estado")
+    # Farmacia de su asignación vigente; la mantienen las señales de AsignacionFarmacia.
+    farmacia_actual = models.ForeignKey(
+        Farmacia, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+        related_name='motoristas_actuales', verbose_name="Farmacia actual"
+    )
+    orden_nombres = campo_orden_natural(100)
+    orden_rut = campo_orden_natural(12)
     def __str__(self):
         return f"{self.nombres} {self.apellido_paterno}"
     def get_absolute_url(self): 
         return reverse('detalle_motorista', kwargs={'pk': self.pk})
 
-class Moto(models.Model):
+class Moto(OrdenNaturalMixin, models.Model):
+    CAMPOS_ORDEN_NATURAL = ('patente', 'marca', 'modelo')
+
     PROPIETARIO_EMPRESA = 'Empresa'
     PROPIETARIO_MOTORISTA = 'Motorista'
     PROPIETARIO_CHOICES = [
@@ -111,6 +183,14 @@ class Moto(models.Model):
     numero_chasis = models.CharField(max_length=50, blank=True, null=True)
     motor = models.CharField(max_length=50, blank=True, null=True)
     propietario = models.CharField(max_length=20, choices=PROPIETARIO_CHOICES, default=PROPIETARIO_EMPRESA, verbose_name="Propietario")
+    # Motorista de su asignación vigente; la mantienen las señales de AsignacionMoto.
+    motorista_actual = models.ForeignKey(
+        Motorista, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+        related_name='motos_actuales', verbose_name="Motorista actual"
+    )
+    orden_patente = campo_orden_natural(15)
+    orden_marca = campo_orden_natural(50)
+    orden_modelo = campo_orden_natural(50)
     def __str__(self):
         return f"{self.patente} - {self.marca} {self.modelo}"
     def get_absolute_url(self): 
@@ -182,6 +262,12 @@ class AsignacionFarmacia(models.Model):
     observaciones = models.TextField(blank=True, null=True)
     fechaTermino = models.DateField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Historial y asignación vigente de un motorista, de la más reciente a la más antigua.
+            models.Index(fields=['motorista', 'fechaAsignacion'], name='asig_farmacia_motorista_idx'),
+        ]
+
     def __str__(self):
         return f"{self.motorista} asignado a {self.farmacia}"
 
@@ -193,6 +279,13 @@ class AsignacionMoto(models.Model):
     estado = models.CharField(max_length=50, default="Asignada")
     fechaTermino = models.DateField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Historial y asignación vigente de una moto, y motos asignadas a un motorista.
+            models.Index(fields=['moto', 'fechaAsignacion'], name='asig_moto_moto_idx'),
+            models.Index(fields=['motorista', 'fechaAsignacion'], name='asig_moto_motorista_idx'),
+        ]
+
     def __str__(self):
         return f"{self.moto} asignada a {self.motorista}"
 
@@ -210,7 +303,7 @@ class TipoMovimiento(models.Model):
     def __str__(self):
         return self.nombre
 
-class Movimiento(models.Model):
+class Movimiento(OrdenNaturalMixin, models.Model):
     """
     Implementa la lógica de "movimientos anidados" (padre/hijo).
     Un "Movimiento Padre" es un "Despacho" (identificado por numero_despacho).
@@ -282,19 +375,355 @@ class Movimiento(models.Model):
         verbose_name="Movimiento Padre"
     )
 
+    # Árbol del despacho (ver `ubicar_bajo`): la raíz y la ruta de ancestros se
+    # calculan del padre al guardar, así que todo el despacho (también los tramos
+    # de tramos reenviados o traspasados) se obtiene con una consulta por índice.
+    despacho_raiz = models.ForeignKey(
+        'self', on_delete=models.CASCADE, null=True, blank=True, editable=False, db_index=False,
+        related_name='movimientos_del_despacho', verbose_name="Despacho (raíz)"
+    )
+    ruta = models.CharField(
+        max_length=255, blank=True, default='', editable=False, verbose_name="Ruta",
+        help_text="PKs de los ancestros, desde la raíz ('0000000012/0000000015/')."
+    )
+    profundidad = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name="Profundidad")
+
+    CAMPOS_ORDEN_NATURAL = ('numero_despacho', 'origen', 'destino')
+    orden_numero_despacho = campo_orden_natural(50)
+    orden_origen = campo_orden_natural(255)
+    orden_destino = campo_orden_natural(255)
+
+    # Avance del despacho (sólo en los padres; en los tramos quedan en cero). Lo
+    # mantienen las señales de sus tramos (ver despachos.ajustar_avance) y el
+    # guardado normal no lo escribe, para no pisarlo con una instancia antigua.
+    CAMPOS_AVANCE = (
+        'total_tramos', 'tramos_pendientes', 'tramos_completados', 'tramos_anulados',
+        'avance', 'ultimo_tramo', 'motorista_actual',
+    )
+    total_tramos = models.PositiveIntegerField(default=0, editable=False, verbose_name="Tramos")
+    tramos_pendientes = models.PositiveIntegerField(default=0, editable=False, verbose_name="Tramos pendientes")
+    tramos_completados = models.PositiveIntegerField(default=0, editable=False, verbose_name="Tramos completados")
+    tramos_anulados = models.PositiveIntegerField(default=0, editable=False, verbose_name="Tramos anulados")
+    avance = models.PositiveSmallIntegerField(
+        default=0, editable=False, verbose_name="Avance (%)",
+        help_text="Tramos completados sobre los no anulados."
+    )
+    ultimo_tramo = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Último tramo")
+    motorista_actual = models.ForeignKey(
+        Motorista, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+        related_name='+', verbose_name="Motorista actual",
+        help_text="El del último tramo o, si no tiene, el del despacho."
+    )
+
     class Meta:
         verbose_name = "Movimiento"
         verbose_name_plural = "Movimientos"
+        indexes = [
+            # Reportes por estado en un rango de fechas.
+            models.Index(fields=['estado', 'fecha_movimiento'], name='movimiento_estado_fecha_idx'),
+            # Pendientes de un motorista (liberar su DespachoActivo, contadores).
+            models.Index(fields=['motorista_asignado', 'estado'], name='movimiento_motorista_est_idx'),
+            # Listado de despachos (padre NULL) por fecha y tramos de un despacho en orden.
+            models.Index(fields=['movimiento_padre', 'fecha_movimiento'], name='movimiento_padre_fecha_idx'),
+            # Listado de despachos filtrado u ordenado por su avance.
+            models.Index(fields=['movimiento_padre', 'avance'], name='movimiento_padre_avance_idx'),
+            models.Index(fields=['movimiento_padre', 'tramos_pendientes'], name='movimiento_padre_pend_idx'),
+            models.Index(fields=['movimiento_padre', 'ultimo_tramo'], name='movimiento_padre_ultimo_idx'),
+            # Todos los movimientos de un despacho, por fecha, y subárboles por prefijo de ruta.
+            models.Index(fields=['despacho_raiz', 'fecha_movimiento'], name='movimiento_raiz_fecha_idx'),
+            models.Index(fields=['ruta'], name='movimiento_ruta_idx'),
+        ]
 
     def __str__(self):
-        if self.movimiento_padre:
-            # Si es hijo, mostramos a qué despacho pertenece
-            return f"Tramo del Despacho #{self.movimiento_padre.numero_despacho}"
+        if self.movimiento_padre_id:
+            # Si es tramo, mostramos a qué despacho pertenece (los listados de
+            # tramos traen la raíz con select_related('despacho_raiz')).
+            despacho = self.despacho_raiz if self.despacho_raiz_id else self.movimiento_padre
+            return f"Tramo del Despacho #{despacho.numero_despacho}"
         else:
             # Si es padre, mostramos su número oficial
             return f"Despacho #{self.numero_despacho}"
 
     def get_absolute_url(self):
-        if self.movimiento_padre:
-            return reverse('movimiento_detalle', kwargs={'pk': self.movimiento_padre.pk})
-        return reverse('movimiento_detalle', kwargs={'pk': self.pk})
\ No newline at end of file
+        # Los tramos se ven en el detalle de su despacho; no consulta la base.
+        return reverse('movimiento_detalle', kwargs={'pk': self.despacho_raiz_id or self.movimiento_padre_id or self.pk})
+
+    def ubicar_bajo(self, padre):
+        """
+        Cuelga el movimiento de `padre` (o lo deja como despacho si es None) y
+        fija desde él la raíz, la ruta y la profundidad, sin consultar la base.
+        Las cargas masivas lo llaman antes de bulk_create.
+        """
+        if padre is None:
+            self.movimiento_padre = None
+            self.despacho_raiz_id, self.ruta, self.profundidad = None, '', 0
+            return
+        self.movimiento_padre = padre
+        self.despacho_raiz_id = padre.despacho_raiz_id or padre.pk
+        self.ruta = padre.ruta + segmento_ruta(padre.pk)
+        self.profundidad = padre.profundidad + 1
+        if len(self.ruta) > self._meta.get_field('ruta').max_length:
+            raise ValidationError("El despacho no admite más niveles de tramos.", code='profundidad')
+
+    def _ubicar(self):
+        padre = None
+        if self.movimiento_padre_id is not None:
+            if Movimiento.movimiento_padre.is_cached(self):
+                padre = self.movimiento_padre
+            else:
+                padre = Movimiento.objects.only('ruta', 'despacho_raiz', 'profundidad').get(pk=self.movimiento_padre_id)
+            if self.pk is not None and (padre.pk == self.pk or segmento_ruta(self.pk) in padre.ruta):
+                raise ValidationError("Un movimiento no puede colgar de sí mismo ni de sus tramos.", code='ciclo')
+        self.ubicar_bajo(padre)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        # Al actualizar no se escriben los campos de avance: sólo los cambian las
+        # señales de los tramos, con UPDATE atómicos.
+        if not self._state.adding and update_fields is None:
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in self.CAMPOS_AVANCE
+            ]
+        elif update_fields is not None and 'movimiento_padre' in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['despacho_raiz', 'ruta', 'profundidad']
+        # Las señales (resumen diario, etc.) se ejecutan dentro de la misma
+        # transacción que el guardado del movimiento.
+        with transaction.atomic():
+            if update_fields is None or 'movimiento_padre' in update_fields:
+                self._ubicar()
+            super().save(*args, **kwargs)
+
+
+class DespachoActivo(models.Model):
+    """
+    Despacho pendiente que ocupa a cada motorista: a lo más uno, garantizado
+    por la clave primaria. Las señales de Movimiento toman la fila cuando el
+    motorista queda con un movimiento pendiente del despacho (el padre o
+    alguno de sus tramos) y la liberan cuando ya no le quedan; se recalcula
+    con `manage.py reparar_despachos_activos`.
+    """
+    motorista = models.OneToOneField(
+        Motorista, on_delete=models.CASCADE, primary_key=True,
+        related_name='despacho_activo', verbose_name="Motorista"
+    )
+    despacho = models.ForeignKey(
+        Movimiento, on_delete=models.CASCADE, related_name='motoristas_ocupados',
+        verbose_name="Despacho"
+    )
+    desde = models.DateTimeField(default=timezone.now, verbose_name="Ocupado desde")
+
+    class Meta:
+        verbose_name = "Despacho Activo"
+        verbose_name_plural = "Despachos Activos"
+
+    def __str__(self):
+        return f"{self.motorista} -> Despacho #{self.despacho_id}"
+
+
+class ResumenDiarioMovimiento(models.Model):
+    """
+    Resumen pre-agregado de movimientos: una fila por día (hora local) x estado
+    x tipo de movimiento x motorista. Se mantiene desde las señales de Movimiento
+    y se reconstruye con `manage.py reconstruir_resumen_movimientos`.
+    """
+    fecha = models.DateField(verbose_name="Día (hora local)")
+    estado = models.CharField(max_length=20, choices=Movimiento.ESTADO_CHOICES, verbose_name="Estado")
+    tipo_movimiento = models.ForeignKey(TipoMovimiento, on_delete=models.CASCADE, verbose_name="Tipo de Movimiento")
+    motorista = models.ForeignKey(Motorista, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Motorista")
+    # El motorista para la unicidad, con 0 en vez de NULL: las bases tratan los NULL como
+    # distintos, así que con `motorista` la fila "sin motorista" se podía insertar dos veces.
+    motorista_clave = models.PositiveIntegerField(default=0, editable=False, verbose_name="Clave del Motorista")
+    total = models.PositiveIntegerField(default=0, verbose_name="Cantidad")
+
+    class Meta:
+        verbose_name = "Resumen Diario de Movimientos"
+        verbose_name_plural = "Resúmenes Diarios de Movimientos"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'estado', 'tipo_movimiento', 'motorista_clave'],
+                name='resumen_diario_unico'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.estado} ({self.total})"
+
+    def save(self, *args, **kwargs):
+        self.motorista_clave = self.motorista_id or 0
+        super().save(*args, **kwargs)
+
+
+class Contador(models.Model):
+    """
+    Contadores y versiones de datos persistentes (clave -> valor entero).
+    Se leen a través de la caché con `discopro.contadores`.
+    """
+    clave = models.CharField(max_length=150, unique=True, verbose_name="Clave")
+    valor = models.BigIntegerField(default=0, verbose_name="Valor")
+    actualizado = models.DateTimeField(auto_now=True, verbose_name="Última Actualización")
+
+    class Meta:
+        verbose_name = "Contador"
+        verbose_name_plural = "Contadores"
+
+    def __str__(self):
+        return f"{self.clave} = {self.valor}"
+
+
+class TrabajoReporte(models.Model):
+    """
+    Solicitud de generación de un reporte PDF en segundo plano.
+    La procesa el worker `manage.py procesar_reportes`; la vista sólo la encola.
+    """
+    ESTADO_PENDIENTE = 'pendiente'
+    ESTADO_PROCESANDO = 'procesando'
+    ESTADO_COMPLETADO = 'completado'
+    ESTADO_ERROR = 'error'
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, 'En cola'),
+        (ESTADO_PROCESANDO, 'Procesando'),
+        (ESTADO_COMPLETADO, 'Completado'),
+        (ESTADO_ERROR, 'Error'),
+    ]
+    ESTADOS_ACTIVOS = (ESTADO_PENDIENTE, ESTADO_PROCESANDO)
+
+    tipo = models.CharField(max_length=20, verbose_name="Tipo de Reporte")
+    desde = models.DateField(verbose_name="Desde")
+    hasta = models.DateField(verbose_name="Hasta (exclusivo)")
+    dimension = models.CharField(max_length=30, default='estado', verbose_name="Dimensión")
+    clave = models.CharField(max_length=64, db_index=True, verbose_name="Clave de Solicitud")
+    # Igual a `clave` mientras el trabajo está activo y NULL al terminar: el índice
+    # único impide dos trabajos activos idénticos (MySQL no tiene índices parciales).
+    clave_activa = models.CharField(max_length=64, null=True, blank=True, unique=True, editable=False, verbose_name="Clave Activa")
+    solicitado_por = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='trabajos_reporte', verbose_name="Solicitado por")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default=ESTADO_PENDIENTE, verbose_name="Estado")
+    progreso = models.PositiveSmallIntegerField(default=0, verbose_name="Progreso (%)")
+    archivo = models.FileField(upload_to="reportes/", null=True, blank=True, verbose_name="Archivo PDF")
+    error = models.TextField(blank=True, null=True, verbose_name="Detalle del Error")
+    fecha_solicitud = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Solicitud")
+    fecha_inicio = models.DateTimeField(null=True, blank=True, verbose_name="Inicio de Proceso")
+    fecha_termino = models.DateTimeField(null=True, blank=True, verbose_name="Término de Proceso")
+
+    class Meta:
+        verbose_name = "Trabajo de Reporte"
+        verbose_name_plural = "Trabajos de Reporte"
+        indexes = [
+            models.Index(fields=['estado', 'fecha_solicitud'], name='trabajo_reporte_cola_idx'),
+        ]
+
+    def __str__(self):
+        return f"Reporte {self.tipo} ({self.desde} - {self.hasta}) [{self.get_estado_display()}]"
+
+    def get_absolute_url(self):
+        return reverse('reporte_trabajo_detalle', kwargs={'pk': self.pk})
+
+    def save(self, *args, **kwargs):
+        self.clave_activa = None if self.terminado else self.clave
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'estado' in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['clave_activa']
+        super().save(*args, **kwargs)
+
+    @property
+    def terminado(self):
+        return self.estado not in self.ESTADOS_ACTIVOS
+
+
+class DocumentoBusquedaMovimiento(models.Model):
+    """
+    Texto de búsqueda desnormalizado de un movimiento (despacho o tramo). Sobre
+    esta tabla se mantiene el índice de texto completo: FTS5 en SQLite y un
+    índice FULLTEXT en MySQL/MariaDB (ver `discopro.busqueda`).
+    """
+    movimiento = models.OneToOneField(
+        Movimiento, on_delete=models.CASCADE, primary_key=True,
+        related_name='documento_busqueda', verbose_name="Movimiento"
+    )
+    raiz = models.ForeignKey(
+        Movimiento, on_delete=models.CASCADE, related_name='+',
+        verbose_name="Despacho"
+    )
+    contenido = models.TextField(verbose_name="Contenido")
+
+    class Meta:
+        verbose_name = "Documento de Búsqueda"
+        verbose_name_plural = "Documentos de Búsqueda"
+
+    def __str__(self):
+        return f"{self.movimiento_id}: {self.contenido[:60]}"
+
+
+class Vencimiento(models.Model):
+    """
+    Índice de vencimientos: una fila por fecha de vencimiento de un documento
+    (permiso, seguro y revisión técnica de cada moto, documentos del motorista
+    y su próximo control). Lo mantienen las señales al guardar los documentos;
+    `nivel` es la alerta de la fila, que `manage.py generar_alertas_vencimiento`
+    recalcula cada día (ver `discopro.vencimientos`).
+    """
+    TIPO_PERMISO = 'permiso_circulacion'
+    TIPO_SEGURO = 'seguro_obligatorio'
+    TIPO_REVISION = 'revision_tecnica'
+    TIPO_DOCUMENTO = 'documento'
+    TIPO_CONTROL = 'control'
+    TIPO_CHOICES = [
+        (TIPO_PERMISO, 'Permiso de Circulación'),
+        (TIPO_SEGURO, 'Seguro Obligatorio'),
+        (TIPO_REVISION, 'Revisión Técnica'),
+        (TIPO_DOCUMENTO, 'Documento del Motorista'),
+        (TIPO_CONTROL, 'Próximo Control'),
+    ]
+
+    # Ordenados por urgencia: el índice (nivel, fecha) entrega las alertas ya ordenadas.
+    NIVEL_VENCIDO = 0
+    NIVEL_POR_VENCER = 1
+    NIVEL_VIGENTE = 2
+    NIVEL_CHOICES = [
+        (NIVEL_VENCIDO, 'Vencido'),
+        (NIVEL_POR_VENCER, 'Por vencer'),
+        (NIVEL_VIGENTE, 'Vigente'),
+    ]
+
+    clave = models.CharField(max_length=60, unique=True, verbose_name="Clave")
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, verbose_name="Tipo de Documento")
+    moto = models.ForeignKey(
+        Moto, on_delete=models.CASCADE, null=True, blank=True, db_index=False,
+        related_name='vencimientos', verbose_name="Moto"
+    )
+    motorista = models.ForeignKey(
+        Motorista, on_delete=models.CASCADE, null=True, blank=True, db_index=False,
+        related_name='vencimientos', verbose_name="Motorista"
+    )
+    documento = models.ForeignKey(
+        Documentacion, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='+', verbose_name="Documento"
+    )
+    fecha = models.DateField(verbose_name="Vencimiento")
+    nivel = models.PositiveSmallIntegerField(choices=NIVEL_CHOICES, default=NIVEL_VIGENTE, verbose_name="Alerta")
+
+    class Meta:
+        verbose_name = "Vencimiento"
+        verbose_name_plural = "Vencimientos"
+        indexes = [
+            models.Index(fields=['nivel', 'fecha'], name='vencimiento_nivel_fecha_idx'),
+            models.Index(fields=['fecha'], name='vencimiento_fecha_idx'),
+            models.Index(fields=['moto', 'fecha'], name='vencimiento_moto_fecha_idx'),
+            models.Index(fields=['motorista', 'fecha'], name='vencimiento_motorista_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} - {self.titular} ({self.fecha})"
+
+    @property
+    def titular(self):
+        return self.moto if self.moto_id else self.motorista
+
+    @property
+    def nombre(self):
+        if self.tipo == self.TIPO_DOCUMENTO and self.documento_id:
+            return self.documento.nombreDocumento
+        return self.get_tipo_display()
+
+    def dias_restantes(self, hoy=None):
+        return (self.fecha - (hoy or timezone.localdate())).days
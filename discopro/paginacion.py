@@ -0,0 +1,317 @@
+import datetime
+from decimal import Decimal
+
+from django.core import signing
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from django.db.models.expressions import Col, OrderBy
+
+SALT_CURSOR = 'discopro.paginacion.cursor'
+
+# Sobre este número de filas el conteo deja de ser exacto (ver PaginadorAcotado).
+LIMITE_CONTEO_EXACTO = 1000
+
+
+def _miles(numero):
+    return f"{numero:,}".replace(',', '.')
+
+
+def conteo_estimado(modelo, using='default'):
+    """
+    Filas de la tabla según las estadísticas del motor (sin recorrerla), o None
+    si el motor no las ofrece (SQLite) o aún no existen.
+    """
+    conexion = connections[using]
+    tabla = modelo._meta.db_table
+    with conexion.cursor() as cursor:
+        if conexion.vendor == 'mysql':
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [tabla]
+            )
+        elif conexion.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", [tabla])
+        else:
+            return None
+        fila = cursor.fetchone()
+    if not fila or fila[0] is None or fila[0] < 0:
+        return None
+    return int(fila[0])
+
+
+class PaginadorAcotado(Paginator):
+    """
+    Paginator que evita el COUNT exacto en listados grandes:
+
+    - Con filtros (búsqueda `q`, etc.) cuenta a lo más LIMITE_CONTEO_EXACTO + 1
+      filas (`COUNT(*)` sobre un subquery de PKs con LIMIT). Si hay más, el total queda
+      acotado en el límite y `aproximado` vale 'cota' ("más de 1.000 resultados").
+    - Sin filtros usa el número de filas estimado por el motor; si la tabla es
+      pequeña (o no hay estimación) cuenta de forma exacta.
+
+    El total aproximado sólo sirve de rótulo: no limita la navegación. Con él,
+    cada página trae una fila de más para saber si existe la siguiente, y las
+    páginas más allá de la cota (o de una estimación baja) siguen disponibles.
+    """
+    limite = LIMITE_CONTEO_EXACTO
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.aproximado = None
+        self.pagina_conocida = 0
+
+    @cached_property
+    def count(self):
+        consulta = getattr(self.object_list, 'query', None)
+        if consulta is None:
+            return super().count
+
+        if not consulta.where and not consulta.distinct:
+            estimado = conteo_estimado(self.object_list.model, self.object_list.db)
+            if estimado is not None and estimado > self.limite:
+                self.aproximado = 'estimado'
+                return estimado
+
+        # Sólo la PK: las anotaciones (subconsultas) de la lista no se evalúan al contar.
+        acotado = self.object_list.order_by().values('pk')[:self.limite + 1].count()
+        if acotado > self.limite:
+            self.aproximado = 'cota'
+            return self.limite
+        return acotado
+
+    @property
+    def num_pages(self):
+        paginas = super().num_pages
+        # Con total aproximado hay al menos hasta la página pedida (y la siguiente, si tiene filas).
+        return max(paginas, self.pagina_conocida) if self.aproximado else paginas
+
+    def validate_number(self, number):
+        if not (self.count and self.aproximado):
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.aproximado:
+            return super().page(number)
+        inicio = (number - 1) * self.per_page
+        filas = list(self.object_list[inicio:inicio + self.per_page + 1])
+        if not filas and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        hay_siguiente = len(filas) > self.per_page
+        self.pagina_conocida = number + 1 if hay_siguiente else number
+        return PaginaAcotada(filas[:self.per_page], number, self, hay_siguiente)
+
+    @property
+    def descripcion_total(self):
+        total = self.count
+        if self.aproximado == 'cota':
+            return f"Más de {_miles(total)} resultados"
+        if self.aproximado == 'estimado':
+            return f"Aprox. {_miles(total)} resultados"
+        return f"{_miles(total)} resultado{'' if total == 1 else 's'}"
+
+
+class PaginaAcotada(Page):
+    """Página de un PaginadorAcotado con total aproximado: la siguiente existe si la consulta trajo una fila de más."""
+    def __init__(self, object_list, number, paginator, hay_siguiente):
+        super().__init__(object_list, number, paginator)
+        self.hay_siguiente = hay_siguiente
+
+    def has_next(self):
+        return self.hay_siguiente
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1
+
+
+class PaginaCursor:
+    """
+    Página de una paginación por cursor (keyset). Expone lo mismo que usan las
+    plantillas de una página normal (`has_next`, `has_previous`, iteración),
+    más los cursores para construir los enlaces Anterior/Siguiente.
+    """
+    def __init__(self, object_list, cursor_anterior=None, cursor_siguiente=None):
+        self.object_list = object_list
+        self.cursor_anterior = cursor_anterior
+        self.cursor_siguiente = cursor_siguiente
+
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _claves_orden(queryset):
+    """
+    Convierte el orden del queryset en [(expresión, descendente)], con la clave
+    primaria al final como desempate para que el orden sea total.
+    """
+    orden = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+    claves = []
+    for item in orden:
+        if isinstance(item, str):
+            claves.append((F(item.lstrip('-')), item.startswith('-')))
+        elif isinstance(item, OrderBy):
+            claves.append((item.expression, item.descending))
+        else:
+            claves.append((item, False))
+    descendente = claves[0][1] if claves else False
+    claves.append((F('pk'), descendente))
+    return claves
+
+
+def _admite_nulos(queryset, alias):
+    """
+    Indica si la columna de orden puede valer NULL: usa una columna nula o de
+    una tabla unida (LEFT JOIN). Sólo esas necesitan tratar los NULL aparte,
+    lo que en MySQL impide usar el índice para ordenar.
+    """
+    tabla_base = queryset.query.get_initial_alias()
+    for expresion in queryset.query.annotations[alias].flatten():
+        if isinstance(expresion, Col) and (expresion.alias != tabla_base or expresion.target.null):
+            return True
+    return False
+
+
+def _serializar(valor):
+    # Se conserva la fecha completa (con microsegundos): el cursor debe ser exacto.
+    if isinstance(valor, (datetime.datetime, datetime.date, datetime.time)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def _posterior(alias, valor, descendente, nulos):
+    """
+    Filas estrictamente después de `valor`. Si la columna admite nulos, se
+    ordena con los NULL como el valor más pequeño (primeros en ASC, últimos en DESC).
+    """
+    if not nulos:
+        return Q(**{f'{alias}__lt' if descendente else f'{alias}__gt': valor})
+    if descendente:
+        if valor is None:
+            return Q(pk__in=[])
+        return Q(**{f'{alias}__lt': valor}) | Q(**{f'{alias}__isnull': True})
+    if valor is None:
+        return Q(**{f'{alias}__isnull': False})
+    return Q(**{f'{alias}__gt': valor})
+
+
+def _igual(alias, valor):
+    if valor is None:
+        return Q(**{f'{alias}__isnull': True})
+    return Q(**{alias: valor})
+
+
+def paginar_por_cursor(queryset, tamano, cursor=None):
+    """
+    Paginación keyset: en vez de OFFSET, cada página se pide "a partir de" los
+    valores de orden de la última fila vista, así que una página profunda cuesta
+    lo mismo que la primera y no se cuenta el total. `cursor` es el valor firmado
+    recibido por GET (o None para la primera página); si es inválido o
+    corresponde a otro orden, se vuelve a la primera página.
+    """
+    claves = _claves_orden(queryset)
+    firma_orden = repr([(str(expresion), descendente) for expresion, descendente in claves])
+    alias = [f'_cursor_{i}' for i in range(len(claves))]
+    queryset = queryset.annotate(**{nombre: expresion for nombre, (expresion, _) in zip(alias, claves)})
+
+    datos = None
+    if cursor:
+        try:
+            datos = signing.loads(cursor, salt=SALT_CURSOR)
+        except signing.BadSignature:
+            datos = None
+        if not datos or datos.get('orden') != firma_orden or len(datos.get('valores', ())) != len(claves):
+            datos = None
+
+    hacia_atras = bool(datos) and datos['sentido'] == 'anterior'
+    direcciones = [descendente != hacia_atras for _, descendente in claves]
+    nulos = [_admite_nulos(queryset, nombre) for nombre in alias]
+
+    if datos:
+        condicion = Q(pk__in=[])
+        iguales = Q()
+        for nombre, valor, descendente, admite in zip(alias, datos['valores'], direcciones, nulos):
+            condicion |= iguales & _posterior(nombre, valor, descendente, admite)
+            iguales &= _igual(nombre, valor)
+        queryset = queryset.filter(condicion)
+
+    orden = []
+    for nombre, descendente, admite in zip(alias, direcciones, nulos):
+        if not admite:
+            orden.append(OrderBy(F(nombre), descending=descendente))
+        elif descendente:
+            orden.append(OrderBy(F(nombre), descending=True, nulls_last=True))
+        else:
+            orden.append(OrderBy(F(nombre), nulls_first=True))
+    queryset = queryset.order_by(*orden)
+
+    filas = list(queryset[:tamano + 1])
+    hay_mas = len(filas) > tamano
+    filas = filas[:tamano]
+    if hacia_atras:
+        filas.reverse()
+
+    def crear_cursor(fila, sentido):
+        valores = [_serializar(getattr(fila, nombre)) for nombre in alias]
+        return signing.dumps({'orden': firma_orden, 'sentido': sentido, 'valores': valores}, salt=SALT_CURSOR, compress=True)
+
+    cursor_anterior = cursor_siguiente = None
+    if filas:
+        if (hacia_atras and hay_mas) or (not hacia_atras and datos):
+            cursor_anterior = crear_cursor(filas[0], 'anterior')
+        if hacia_atras or hay_mas:
+            cursor_siguiente = crear_cursor(filas[-1], 'siguiente')
+    return PaginaCursor(filas, cursor_anterior, cursor_siguiente)
+
+
+class PaginacionMixin:
+    """
+    Paginación de los ListView del proyecto.
+
+    - Por defecto, paginación numerada con una barra elidida (1 … 4 5 6 … 40)
+      en el contexto como `paginas`, en vez de recorrer todo `page_range`, y
+      con el total acotado/estimado de PaginadorAcotado.
+    - Con `paginacion_cursor = True` la vista usa paginación por cursor
+      (parámetro GET `cursor`): sin COUNT(*) ni OFFSET, con enlaces
+      Anterior/Siguiente. Pensado para listados que crecen sin límite.
+    """
+    paginacion_cursor = False
+    paginator_class = PaginadorAcotado
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.paginacion_cursor:
+            return super().paginate_queryset(queryset, page_size)
+        pagina = paginar_por_cursor(queryset, page_size, self.request.GET.get('cursor'))
+        return (None, pagina, pagina.object_list, pagina.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['paginacion_cursor'] = self.paginacion_cursor
+        paginator, pagina = context.get('paginator'), context.get('page_obj')
+        if paginator is not None and pagina is not None:
+            context['paginas'] = paginator.get_elided_page_range(pagina.number, on_each_side=2, on_ends=1)
+        return context
@@ -0,0 +1,706 @@
+import hashlib
+import logging
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DateField, F, Sum, Value, When
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from . import contadores, versiones
+from .models import Movimiento, ResumenDiarioMovimiento, TrabajoReporte
+from .utils import render_to_pdf_por_lotes
+
+logger = logging.getLogger(__name__)
+
+PLANTILLA_REPORTE_PDF = 'discopro/Movimiento/reporte_pdf.html'
+
+
+# --- RESUMEN DIARIO (ROLLUP) ---
+
+def clave_resumen(fecha_movimiento, estado, tipo_movimiento_id, motorista_id):
+    """Clave de la fila de resumen a la que pertenece un movimiento."""
+    return (timezone.localdate(fecha_movimiento), estado, tipo_movimiento_id, motorista_id)
+
+
+def clave_resumen_de(movimiento):
+    return clave_resumen(
+        movimiento.fecha_movimiento, movimiento.estado,
+        movimiento.tipo_movimiento_id, movimiento.motorista_asignado_id
+    )
+
+
+def ajustar_resumen(clave, delta):
+    """Suma `delta` (positivo o negativo) a la fila de resumen indicada por `clave`."""
+    if not delta:
+        return
+    fecha, estado, tipo_id, motorista_id = clave
+    filtro = {
+        'fecha': fecha, 'estado': estado,
+        'tipo_movimiento_id': tipo_id, 'motorista_id': motorista_id,
+    }
+    with transaction.atomic():
+        actualizadas = ResumenDiarioMovimiento.objects.filter(**filtro).update(total=F('total') + delta)
+        if actualizadas or delta < 0:
+            return
+        try:
+            # Savepoint propio: si otro proceso creó la fila primero, reintentamos el UPDATE.
+            with transaction.atomic():
+                ResumenDiarioMovimiento.objects.create(total=delta, **filtro)
+        except IntegrityError:
+            ResumenDiarioMovimiento.objects.filter(**filtro).update(total=F('total') + delta)
+
+
+def inicio_dia_local(fecha):
+    """Convierte una fecha (día local) en el datetime aware de su medianoche."""
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def reconstruir_resumen(desde=None, lote=1000):
+    """
+    Recalcula el resumen diario desde la tabla de movimientos.
+    Si se indica `desde` (fecha local) sólo se reconstruyen los días posteriores.
+    Devuelve la cantidad de filas de resumen generadas.
+    """
+    movimientos = Movimiento.objects.all()
+    resumenes = ResumenDiarioMovimiento.objects.all()
+    if desde:
+        movimientos = movimientos.filter(fecha_movimiento__gte=inicio_dia_local(desde))
+        resumenes = resumenes.filter(fecha__gte=desde)
+
+    conteo = Counter()
+    filas = movimientos.order_by().values_list(
+        'fecha_movimiento', 'estado', 'tipo_movimiento_id', 'motorista_asignado_id'
+    )
+    with transaction.atomic():
+        for fila in filas.iterator(chunk_size=5000):
+            conteo[clave_resumen(*fila)] += 1
+
+        resumenes.delete()
+        ResumenDiarioMovimiento.objects.bulk_create(
+            [
+                ResumenDiarioMovimiento(
+                    fecha=fecha, estado=estado, tipo_movimiento_id=tipo_id,
+                    motorista_id=motorista_id, motorista_clave=motorista_id or 0, total=total
+                )
+                for (fecha, estado, tipo_id, motorista_id), total in conteo.items()
+            ],
+            batch_size=lote
+        )
+        # Las páginas condicionales (ETag) del reporte dependen de la versión de Movimiento.
+        versiones.incrementar(Movimiento)
+    return len(conteo)
+
+
+# --- PERÍODOS DE REPORTE ---
+
+TIPOS_REPORTE = ('diario', 'mensual', 'anual')
+
+
+def periodo_reporte(tipo, referencia=None):
+    """
+    Devuelve el rango (desde, hasta) en fechas locales para un reporte fijo.
+    `hasta` es exclusivo. `referencia` es el día local a reportar (hoy por defecto).
+    """
+    hoy = referencia or timezone.localdate()
+    if tipo == 'diario':
+        return hoy, hoy + timedelta(days=1)
+    if tipo == 'mensual':
+        desde = hoy.replace(day=1)
+        return desde, (desde + timedelta(days=32)).replace(day=1)
+    if tipo == 'anual':
+        desde = hoy.replace(month=1, day=1)
+        return desde, desde.replace(year=desde.year + 1)
+    raise ValueError(f"Tipo de reporte desconocido: {tipo}")
+
+
+def filtrar_periodo(queryset, desde=None, hasta=None, campo='fecha_movimiento'):
+    """Filtra un queryset de movimientos por un rango de fechas locales [desde, hasta)."""
+    if desde:
+        queryset = queryset.filter(**{f'{campo}__gte': inicio_dia_local(desde)})
+    if hasta:
+        queryset = queryset.filter(**{f'{campo}__lt': inicio_dia_local(hasta)})
+    return queryset
+
+
+# --- MOTOR DE CONSULTAS (CUBO DE DATOS) ---
+
+GRANULARIDADES = {
+    'hora': 'Hora',
+    'dia': 'Día',
+    'semana': 'Semana',
+    'mes': 'Mes',
+    'anio': 'Año',
+}
+
+DIMENSIONES = {
+    'estado': 'Estado',
+    'tipo_movimiento': 'Tipo de Movimiento',
+    'motorista': 'Motorista',
+    'origen': 'Origen',
+}
+
+_KIND_TRUNC = {'hora': 'hour', 'dia': 'day', 'semana': 'week', 'mes': 'month', 'anio': 'year'}
+
+# Dimensión -> (campos en Movimiento, campos en ResumenDiarioMovimiento).
+# None significa que el resumen diario no tiene esa dimensión.
+_CAMPOS_DIMENSION = {
+    'estado': (('estado',), ('estado',)),
+    'tipo_movimiento': (('tipo_movimiento__nombre',), ('tipo_movimiento__nombre',)),
+    'motorista': (
+        ('motorista_asignado_id', 'motorista_asignado__nombres', 'motorista_asignado__apellido_paterno'),
+        ('motorista_id', 'motorista__nombres', 'motorista__apellido_paterno'),
+    ),
+    'origen': (('origen',), None),
+}
+
+# Filtro por dimensión -> (lookup en Movimiento, lookup en ResumenDiarioMovimiento).
+_FILTROS_DIMENSION = {
+    'estado': ('estado', 'estado'),
+    'tipo_movimiento': ('tipo_movimiento_id', 'tipo_movimiento_id'),
+    'motorista': ('motorista_asignado_id', 'motorista_id'),
+    'origen': ('origen', None),
+}
+
+ETIQUETAS_ESTADO = dict(Movimiento.ESTADO_CHOICES)
+
+
+def etiqueta(dimension, fila):
+    """Texto legible del valor de una dimensión en una fila del cubo."""
+    valor = fila.get(dimension)
+    if dimension == 'estado':
+        return ETIQUETAS_ESTADO.get(valor, valor)
+    if dimension == 'motorista' and not valor:
+        return "Sin asignar"
+    return valor
+
+
+class CuboReporte:
+    """
+    Resultado del motor de reportes: filas con `periodo` (si hay granularidad),
+    una clave por dimensión y `total`. Permite re-agrupar en memoria, ya que
+    el cubo tiene a lo más unas cuantas cientos de filas.
+    """
+
+    def __init__(self, filas, granularidad=None, dimensiones=(), fuente=''):
+        self.filas = filas
+        self.granularidad = granularidad
+        self.dimensiones = tuple(dimensiones)
+        self.fuente = fuente
+
+    def __iter__(self):
+        return iter(self.filas)
+
+    def __len__(self):
+        return len(self.filas)
+
+    @property
+    def total(self):
+        return sum(fila['total'] for fila in self.filas)
+
+    def agrupar(self, *dimensiones):
+        """Totales por las dimensiones (y/o 'periodo') indicadas, en el orden de aparición."""
+        totales = {}
+        for fila in self.filas:
+            clave = tuple(fila.get(d) for d in dimensiones)
+            if clave not in totales:
+                totales[clave] = dict(zip(dimensiones, clave), total=0)
+                for dimension in dimensiones:
+                    if dimension == 'motorista':
+                        totales[clave]['motorista_id'] = fila.get('motorista_id')
+            totales[clave]['total'] += fila['total']
+        return list(totales.values())
+
+    def serie(self):
+        """Totales por período, ordenados cronológicamente."""
+        return sorted(self.agrupar('periodo'), key=lambda fila: fila['periodo'])
+
+
+def _usa_resumen(granularidad, dimensiones, filtros):
+    if granularidad == 'hora':
+        return False
+    return all(_CAMPOS_DIMENSION[d][1] is not None for d in dimensiones) and \
+        all(_FILTROS_DIMENSION[f][1] is not None for f in filtros)
+
+
+def consultar_movimientos(desde=None, hasta=None, granularidad=None, dimensiones=(), filtros=None):
+    """
+    Cubo de movimientos en el rango de fechas locales [desde, hasta), agrupado por
+    período (`granularidad`: hora/dia/semana/mes/anio) y por `dimensiones`
+    (estado, tipo_movimiento, motorista, origen), filtrado por `filtros`
+    ({dimensión: valor}). Se resuelve con una sola consulta agrupada: contra el
+    resumen diario cuando basta, o contra Movimiento truncando en la zona horaria local.
+    """
+    filtros = filtros or {}
+    if granularidad and granularidad not in GRANULARIDADES:
+        raise ValueError(f"Granularidad desconocida: {granularidad}")
+    for dimension in list(dimensiones) + list(filtros):
+        if dimension not in DIMENSIONES:
+            raise ValueError(f"Dimensión desconocida: {dimension}")
+
+    if _usa_resumen(granularidad, dimensiones, filtros):
+        fuente, indice = 'resumen', 1
+        queryset = ResumenDiarioMovimiento.objects.all()
+        if desde:
+            queryset = queryset.filter(fecha__gte=desde)
+        if hasta:
+            queryset = queryset.filter(fecha__lt=hasta)
+        agregado = Sum('total')
+        if granularidad == 'dia':
+            periodo = F('fecha')
+        elif granularidad:
+            periodo = Trunc('fecha', _KIND_TRUNC[granularidad], output_field=DateField())
+    else:
+        fuente, indice = 'movimientos', 0
+        queryset = filtrar_periodo(Movimiento.objects.all(), desde, hasta)
+        agregado = Count('pk')
+        if granularidad:
+            periodo = Trunc('fecha_movimiento', _KIND_TRUNC[granularidad], tzinfo=timezone.get_default_timezone())
+
+    queryset = queryset.filter(**{
+        _FILTROS_DIMENSION[dimension][indice]: valor for dimension, valor in filtros.items()
+    })
+
+    if not granularidad and not dimensiones:
+        # Sin nada que agrupar basta el total: values() sin campos agruparía por todas las columnas.
+        total = queryset.aggregate(total=agregado)['total'] or 0
+        return CuboReporte([{'total': total}] if total else [], granularidad, dimensiones, fuente)
+
+    campos = []
+    for dimension in dimensiones:
+        campos.extend(_CAMPOS_DIMENSION[dimension][indice])
+    valores = {'periodo': periodo} if granularidad else {}
+    orden = (['periodo'] if granularidad else []) + campos
+
+    consulta = queryset.values(*campos, **valores).annotate(total=agregado).order_by(*orden)
+
+    filas = []
+    for registro in consulta:
+        fila = {'total': registro['total']}
+        if granularidad:
+            fila['periodo'] = _normalizar_periodo(registro['periodo'], granularidad)
+        for dimension in dimensiones:
+            valores_dim = [registro[campo] for campo in _CAMPOS_DIMENSION[dimension][indice]]
+            if dimension == 'motorista':
+                fila['motorista_id'] = valores_dim[0]
+                fila['motorista'] = " ".join(v for v in valores_dim[1:] if v) or None
+            else:
+                fila[dimension] = valores_dim[0]
+        filas.append(fila)
+    return CuboReporte(filas, granularidad, dimensiones, fuente)
+
+
+_FORMATOS_PERIODO = {
+    'hora': '%d-%m-%Y %H:00',
+    'dia': '%d-%m-%Y',
+    'semana': 'Semana del %d-%m-%Y',
+    'mes': '%m-%Y',
+    'anio': '%Y',
+}
+
+
+def formato_periodo(valor, granularidad):
+    """Texto del período de una fila del cubo según su granularidad."""
+    return valor.strftime(_FORMATOS_PERIODO[granularidad])
+
+
+def _normalizar_periodo(valor, granularidad):
+    """Los períodos de día o más se devuelven como fecha local; las horas como datetime local."""
+    if isinstance(valor, datetime):
+        valor = timezone.localtime(valor) if timezone.is_aware(valor) else valor
+        return valor if granularidad == 'hora' else valor.date()
+    return valor
+
+
+# --- REPORTES PDF ---
+
+def datos_reporte(tipo, desde, hasta, dimension='estado'):
+    """
+    Título, cuadro resumen y queryset base de movimientos de un reporte PDF.
+    `tipo` es diario/mensual/anual o 'personalizado' (desglosado por `dimension`).
+    """
+    if tipo == 'diario':
+        titulo = f"Reporte Diario ({desde.strftime('%d-%m-%Y')})"
+        dimension, columnas, orden = 'estado', ['Estado', 'Cantidad'], '-fecha_movimiento'
+    elif tipo == 'mensual':
+        titulo = f"Reporte Mensual ({desde.strftime('%B %Y')})"
+        dimension, columnas, orden = 'tipo_movimiento', ['Tipo de Movimiento', 'Cantidad'], '-fecha_movimiento'
+    elif tipo == 'anual':
+        titulo = f"Reporte Anual ({desde.year})"
+        columnas, orden = ['Mes', 'Cantidad (Completados)'], 'fecha_movimiento'
+    else:
+        ultimo_dia = hasta - timedelta(days=1)
+        titulo = f"Reporte del {desde.strftime('%d-%m-%Y')} al {ultimo_dia.strftime('%d-%m-%Y')}"
+        columnas, orden = [DIMENSIONES[dimension], 'Cantidad'], '-fecha_movimiento'
+
+    if tipo == 'anual':
+        # Tendencia mensual de productividad: sólo los completados.
+        cubo = consultar_movimientos(desde, hasta, granularidad='mes', filtros={'estado': 'completado'})
+        detalles = [{'nombre': fila['periodo'].strftime('%B'), 'total': fila['total']} for fila in cubo.serie()]
+        total_general = consultar_movimientos(desde, hasta).total
+    else:
+        cubo = consultar_movimientos(desde, hasta, dimensiones=(dimension,))
+        detalles = [{'nombre': etiqueta(dimension, fila), 'total': fila['total']} for fila in cubo.agrupar(dimension)]
+        total_general = cubo.total
+
+    # NOTA: el listado incluye todos los estados (también en el anual) para separarlos en el detalle.
+    movimientos = filtrar_periodo(Movimiento.objects.all(), desde, hasta).order_by(orden)
+    return {
+        'titulo': titulo,
+        'data': {'detalles': detalles, 'columnas': columnas},
+        'total_general': total_general,
+        'movimientos': movimientos,
+    }
+
+
+# Secciones del detalle del PDF, en el orden en que se listan.
+SECCIONES_PDF = {
+    'completado': {
+        'titulo': 'Movimientos Completados', 'clase': 'bg-success',
+        'col_persona': 'Motorista', 'col_ruta': 'Ruta (Origen -> Destino)', 'col_fecha': 'Fecha',
+        'campo_persona': 'motorista_asignado__nombres', 'persona_vacia': '--',
+    },
+    'pendiente': {
+        'titulo': 'Movimientos Pendientes', 'clase': 'bg-warning',
+        'col_persona': 'Motorista', 'col_ruta': 'Ruta', 'col_fecha': 'Fecha Ingreso',
+        'campo_persona': 'motorista_asignado__nombres', 'persona_vacia': 'Sin asignar',
+    },
+    'anulado': {
+        'titulo': 'Movimientos Anulados', 'clase': 'bg-danger',
+        'col_persona': 'Responsable', 'col_ruta': 'Ruta', 'col_fecha': 'Fecha',
+        'campo_persona': 'usuario_responsable__first_name', 'persona_vacia': '',
+    },
+}
+
+TAMANO_LOTE_PDF = 400
+
+
+def lotes_reporte_pdf(movimientos, totales_estado, tamano_lote=TAMANO_LOTE_PDF, progreso=None):
+    """
+    Recorre los movimientos UNA sola vez (con `.iterator()`), ordenados por estado,
+    y produce contextos parciales con a lo más `tamano_lote` filas cada uno.
+    El primer lote incluye el cuadro resumen. `progreso(filas_procesadas)` es opcional.
+    """
+    orden_estado = Case(
+        *[When(estado=estado, then=Value(i)) for i, estado in enumerate(SECCIONES_PDF)],
+        default=Value(len(SECCIONES_PDF)),
+    )
+    campos = (
+        'estado', 'numero_despacho', 'tipo_movimiento__nombre', 'origen', 'destino', 'fecha_movimiento',
+        'motorista_asignado__nombres', 'usuario_responsable__first_name',
+    )
+    filas = movimientos.filter(estado__in=SECCIONES_PDF).order_by(
+        orden_estado, *movimientos.query.order_by
+    ).values(*campos)
+
+    secciones, seccion, en_lote, procesadas = [], None, 0, 0
+    primero = True
+    for mov in filas.iterator(chunk_size=2000):
+        if seccion is None or seccion['estado'] != mov['estado']:
+            seccion = dict(SECCIONES_PDF[mov['estado']], estado=mov['estado'],
+                           total=totales_estado.get(mov['estado'], 0), continuacion=False, filas=[])
+            secciones.append(seccion)
+        config = SECCIONES_PDF[mov['estado']]
+        seccion['filas'].append({
+            'numero_despacho': mov['numero_despacho'],
+            'tipo': mov['tipo_movimiento__nombre'],
+            'persona': mov[config['campo_persona']] or config['persona_vacia'],
+            'origen': mov['origen'],
+            'destino': mov['destino'],
+            'fecha': mov['fecha_movimiento'],
+        })
+        en_lote += 1
+        procesadas += 1
+        if en_lote >= tamano_lote:
+            yield {'incluir_resumen': primero, 'secciones': [sec for sec in secciones if sec['filas']]}
+            if progreso:
+                progreso(procesadas)
+            primero, en_lote = False, 0
+            # La sección continúa en el siguiente lote con el mismo estado.
+            seccion = dict(seccion, continuacion=True, filas=[])
+            secciones = [seccion]
+
+    secciones = [sec for sec in secciones if sec['filas']]
+    if primero or secciones:
+        yield {'incluir_resumen': primero, 'secciones': secciones}
+
+
+def generar_reporte_pdf(tipo, desde, hasta, dimension, usuario, fecha_impresion=None, progreso=None):
+    """
+    Genera el PDF del reporte por lotes (memoria acotada) y devuelve un archivo
+    temporal con el documento. `progreso(porcentaje)` se invoca a medida que avanza.
+    """
+    reporte = datos_reporte(tipo, desde, hasta, dimension)
+    totales_estado = {
+        fila['estado']: fila['total']
+        for fila in consultar_movimientos(desde, hasta, dimensiones=('estado',)).agrupar('estado')
+    }
+    total_filas = sum(totales_estado.get(estado, 0) for estado in SECCIONES_PDF)
+
+    avance = None
+    if progreso:
+        def avance(procesadas):
+            progreso(10 + int(80 * procesadas / max(total_filas, 1)))
+
+    contexto_base = {
+        'titulo': reporte['titulo'],
+        'fecha_impresion': fecha_impresion or timezone.localtime(),
+        'usuario': usuario,
+        'data': reporte['data'],
+        'total_general': reporte['total_general'],
+        'paginado_externo': True,
+    }
+    lotes = lotes_reporte_pdf(reporte['movimientos'], totales_estado, progreso=avance)
+    return render_to_pdf_por_lotes(PLANTILLA_REPORTE_PDF, contexto_base, lotes)
+
+
+# --- VERSIONES DE DATOS Y CACHÉ DE REPORTES ---
+
+VERSION_MOVIMIENTOS = 'movimientos'
+DIRECTORIO_CACHE_PDF = 'reportes/cache'
+TIMEOUT_CACHE_CONTEXTO = 60 * 60 * 24
+
+
+def claves_version_fecha(fecha):
+    """Claves de versión afectadas por un movimiento del día local `fecha`."""
+    return [
+        f'{VERSION_MOVIMIENTOS}:dia:{fecha:%Y-%m-%d}',
+        f'{VERSION_MOVIMIENTOS}:mes:{fecha:%Y-%m}',
+        f'{VERSION_MOVIMIENTOS}:anio:{fecha:%Y}',
+    ]
+
+
+def invalidar_reportes(*fechas):
+    """
+    Incrementa, al confirmar la transacción, las versiones de los días/meses/años
+    locales indicados (una vez cada una aunque varios movimientos las toquen).
+    """
+    claves = set()
+    for fecha in fechas:
+        if fecha:
+            claves.update(claves_version_fecha(fecha))
+    if claves:
+        contadores.incrementar_al_confirmar(*claves)
+
+
+def claves_version_periodo(desde, hasta):
+    """
+    Claves de versión que cubren el rango local [desde, hasta): años completos,
+    luego meses completos y el resto día a día. Un reporte diario, mensual o
+    anual depende así de una sola clave, y uno personalizado sólo de los
+    períodos que abarca.
+    """
+    claves, fecha = [], desde
+    while fecha < hasta:
+        siguiente_anio = fecha.replace(year=fecha.year + 1)
+        siguiente_mes = (fecha + timedelta(days=32)).replace(day=1)
+        if fecha.month == 1 and fecha.day == 1 and siguiente_anio <= hasta:
+            claves.append(f'{VERSION_MOVIMIENTOS}:anio:{fecha:%Y}')
+            fecha = siguiente_anio
+        elif fecha.day == 1 and siguiente_mes <= hasta:
+            claves.append(f'{VERSION_MOVIMIENTOS}:mes:{fecha:%Y-%m}')
+            fecha = siguiente_mes
+        else:
+            claves.append(f'{VERSION_MOVIMIENTOS}:dia:{fecha:%Y-%m-%d}')
+            fecha += timedelta(days=1)
+    return claves
+
+
+def versiones_periodos(periodos):
+    """
+    {(desde, hasta): versión} de varios rangos con una sola lectura de contadores.
+    La versión es la suma de las de sus claves: sólo crecen, así que cambia
+    con cualquier movimiento dentro del rango.
+    """
+    claves = {periodo: claves_version_periodo(*periodo) for periodo in periodos}
+    valores = contadores.obtener_varios({clave for lista in claves.values() for clave in lista})
+    return {periodo: sum(valores[clave] for clave in lista) for periodo, lista in claves.items()}
+
+
+def version_reporte(desde, hasta):
+    return versiones_periodos([(desde, hasta)])[(desde, hasta)]
+
+
+def _prefijo_pdf_cache(tipo, desde, hasta, dimension, usuario_id):
+    return f"{DIRECTORIO_CACHE_PDF}/{tipo}_{desde:%Y%m%d}_{hasta:%Y%m%d}_{dimension}_u{usuario_id}_"
+
+
+def nombre_pdf_cache(tipo, desde, hasta, dimension, usuario_id, version):
+    return f"{_prefijo_pdf_cache(tipo, desde, hasta, dimension, usuario_id)}v{version}.pdf"
+
+
+def buscar_pdf_cache(tipo, desde, hasta, dimension, usuario_id):
+    """Nombre (en el storage) del PDF ya generado para la versión vigente de los datos, o None."""
+    nombre = nombre_pdf_cache(tipo, desde, hasta, dimension, usuario_id, version_reporte(desde, hasta))
+    return nombre if default_storage.exists(nombre) else None
+
+
+def guardar_pdf_cache(tipo, desde, hasta, dimension, usuario_id, version, archivo):
+    """
+    Guarda el PDF en disco bajo su versión y elimina las versiones anteriores
+    del mismo reporte. Los reportes de períodos cerrados quedan así en disco
+    de forma indefinida; los del período en curso se reemplazan al cambiar.
+    """
+    nombre = nombre_pdf_cache(tipo, desde, hasta, dimension, usuario_id, version)
+    if not default_storage.exists(nombre):
+        nombre = default_storage.save(nombre, File(archivo))
+    prefijo = _prefijo_pdf_cache(tipo, desde, hasta, dimension, usuario_id)
+    try:
+        _, archivos = default_storage.listdir(DIRECTORIO_CACHE_PDF)
+    except FileNotFoundError:
+        archivos = []
+    for existente in archivos:
+        ruta = f"{DIRECTORIO_CACHE_PDF}/{existente}"
+        if ruta.startswith(prefijo) and ruta != nombre:
+            default_storage.delete(ruta)
+    return nombre
+
+
+def contexto_cacheado(clave, periodos, calcular):
+    """
+    Devuelve `calcular()` desde la caché, con una clave que incluye las versiones
+    de los rangos de fechas de los que depende (`periodos`: [(desde, hasta), ...]).
+    """
+    versiones_actuales = versiones_periodos(periodos)
+    clave_cache = f"reporte:{clave}:" + ":".join(str(versiones_actuales[periodo]) for periodo in periodos)
+    valor = cache.get(clave_cache)
+    if valor is None:
+        valor = calcular()
+        cache.set(clave_cache, valor, TIMEOUT_CACHE_CONTEXTO)
+    return valor
+
+
+# --- TRABAJOS DE REPORTE EN SEGUNDO PLANO ---
+
+INTENTOS_SOLICITUD = 3
+
+
+def clave_trabajo(tipo, desde, hasta, dimension, usuario_id):
+    """Identifica solicitudes idénticas para no encolar el mismo reporte dos veces."""
+    texto = f"{tipo}|{desde.isoformat()}|{hasta.isoformat()}|{dimension}|{usuario_id}"
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def solicitar_reporte(tipo, desde, hasta, dimension, usuario):
+    """
+    Encola un reporte PDF. Si ya hay un trabajo idéntico en cola o en proceso,
+    devuelve ese mismo. Retorna (trabajo, creado).
+
+    El índice único de `clave_activa` garantiza un solo trabajo activo por
+    clave aunque lleguen dos solicitudes a la vez: get_or_create relee el de
+    la otra si su INSERT choca. Si ese trabajo termina justo entre medio, la
+    relectura falla y se vuelve a intentar.
+    """
+    clave = clave_trabajo(tipo, desde, hasta, dimension, usuario.pk)
+    for intento in range(INTENTOS_SOLICITUD):
+        try:
+            return TrabajoReporte.objects.get_or_create(clave_activa=clave, defaults={
+                'tipo': tipo, 'desde': desde, 'hasta': hasta, 'dimension': dimension,
+                'clave': clave, 'solicitado_por': usuario,
+            })
+        except IntegrityError:
+            if intento == INTENTOS_SOLICITUD - 1:
+                raise
+
+
+def tomar_siguiente_trabajo():
+    """Reserva el trabajo pendiente más antiguo (sin bloquear a otros workers)."""
+    with transaction.atomic():
+        trabajo = TrabajoReporte.objects.select_for_update(skip_locked=True).filter(
+            estado=TrabajoReporte.ESTADO_PENDIENTE
+        ).order_by('fecha_solicitud').first()
+        if trabajo is None:
+            return None
+        trabajo.estado = TrabajoReporte.ESTADO_PROCESANDO
+        trabajo.progreso = 0
+        trabajo.fecha_inicio = timezone.now()
+        trabajo.save(update_fields=['estado', 'progreso', 'fecha_inicio'])
+    return trabajo
+
+
+def marcar_progreso(trabajo, progreso):
+    trabajo.progreso = progreso
+    TrabajoReporte.objects.filter(pk=trabajo.pk).update(progreso=progreso)
+
+
+def procesar_trabajo(trabajo):
+    """Genera el PDF de un trabajo ya reservado y lo deja disponible para descarga."""
+    parametros = (trabajo.tipo, trabajo.desde, trabajo.hasta, trabajo.dimension, trabajo.solicitado_por_id)
+    try:
+        marcar_progreso(trabajo, 5)
+        nombre = f"reporte_{trabajo.tipo}_{trabajo.desde:%Y%m%d}_{trabajo.pk}.pdf"
+        # La versión se lee antes de generar: si los datos cambian mientras tanto,
+        # la próxima solicitud no encontrará este PDF y se volverá a generar.
+        version = version_reporte(trabajo.desde, trabajo.hasta)
+        en_cache = nombre_pdf_cache(*parametros, version)
+
+        if default_storage.exists(en_cache):
+            with default_storage.open(en_cache, 'rb') as pdf:
+                trabajo.archivo.save(nombre, File(pdf), save=False)
+        else:
+            pdf = generar_reporte_pdf(
+                trabajo.tipo, trabajo.desde, trabajo.hasta, trabajo.dimension,
+                trabajo.solicitado_por, timezone.localtime(trabajo.fecha_solicitud),
+                progreso=lambda porcentaje: marcar_progreso(trabajo, porcentaje)
+            )
+            marcar_progreso(trabajo, 95)
+            with pdf:
+                trabajo.archivo.save(nombre, File(pdf), save=False)
+                pdf.seek(0)
+                guardar_pdf_cache(*parametros, version, pdf)
+        trabajo.estado = TrabajoReporte.ESTADO_COMPLETADO
+        trabajo.progreso = 100
+    except Exception as error:
+        logger.exception("Error generando el trabajo de reporte %s", trabajo.pk)
+        trabajo.estado = TrabajoReporte.ESTADO_ERROR
+        trabajo.error = str(error)
+    trabajo.fecha_termino = timezone.now()
+    trabajo.save(update_fields=['archivo', 'estado', 'progreso', 'error', 'fecha_termino'])
+    return trabajo
+
+
+def liberar_trabajos_colgados(minutos=30):
+    """Devuelve a la cola los trabajos que quedaron 'procesando' por la caída de un worker."""
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return TrabajoReporte.objects.filter(
+        estado=TrabajoReporte.ESTADO_PROCESANDO, fecha_inicio__lt=limite
+    ).update(estado=TrabajoReporte.ESTADO_PENDIENTE, progreso=0)
+
+
+def purgar_trabajos(dias=7):
+    """Elimina los trabajos terminados (y sus archivos) con más de `dias` de antigüedad."""
+    limite = timezone.now() - timedelta(days=dias)
+    antiguos = TrabajoReporte.objects.filter(
+        fecha_solicitud__lt=limite
+    ).exclude(estado__in=TrabajoReporte.ESTADOS_ACTIVOS)
+    cantidad = 0
+    for trabajo in antiguos.iterator():
+        if trabajo.archivo:
+            trabajo.archivo.delete(save=False)
+        trabajo.delete()
+        cantidad += 1
+    return cantidad
+
+
+def purgar_pdf_cache(dias=7):
+    """
+    Elimina los PDF cacheados de períodos personalizados con más de `dias` sin
+    regenerarse: cada rango distinto deja su propio archivo y rara vez se vuelve
+    a pedir. Los de reportes diarios, mensuales y anuales se conservan.
+    """
+    limite = timezone.now() - timedelta(days=dias)
+    try:
+        _, archivos = default_storage.listdir(DIRECTORIO_CACHE_PDF)
+    except FileNotFoundError:
+        return 0
+    cantidad = 0
+    for archivo in archivos:
+        ruta = f"{DIRECTORIO_CACHE_PDF}/{archivo}"
+        if archivo.startswith('personalizado_') and default_storage.get_modified_time(ruta) < limite:
+            default_storage.delete(ruta)
+            cantidad += 1
+    return cantidad
@@ -0,0 +1,41 @@
+"""
+RUT chileno: dígito verificador (módulo 11), formato canónico con puntos
+(12.345.678-5) y las variantes con que puede estar guardado.
+"""
+import re
+
+
+def digito_verificador(numero):
+    """Dígito verificador del RUT `numero` ('0'-'9' o 'K')."""
+    suma, factor = 0, 2
+    for digito in reversed(str(numero)):
+        suma += int(digito) * factor
+        factor = 2 if factor == 7 else factor + 1
+    dv = 11 - suma % 11
+    return {11: '0', 10: 'K'}.get(dv, str(dv))
+
+
+def formatear_rut(numero):
+    """RUT con puntos y dígito verificador (módulo 11): 12.345.678-5."""
+    return f"{numero:,}".replace(',', '.') + f"-{digito_verificador(numero)}"
+
+
+def compactar_rut(texto):
+    """Sólo dígitos y K, en mayúsculas: 12.345.678-k -> 12345678K."""
+    return re.sub(r'[^0-9K]', '', str(texto or '').upper())
+
+
+def normalizar_rut(texto):
+    """RUT con puntos y dígito verificador (12.345.678-5), o None si el dígito no corresponde."""
+    compacto = compactar_rut(texto)
+    if len(compacto) < 2 or not compacto[:-1].isdigit():
+        return None
+    rut = formatear_rut(int(compacto[:-1]))
+    return rut if rut.endswith(f"-{compacto[-1]}") else None
+
+
+def variantes_rut(rut):
+    """Formas en que puede estar guardado un RUT (con o sin puntos, K mayúscula o minúscula)."""
+    sin_puntos = rut.replace('.', '')
+    formas = {rut, sin_puntos, sin_puntos.replace('-', '')}
+    return formas | {forma.lower() for forma in formas}
@@ -0,0 +1,301 @@
+from django.db.models.signals import pre_save, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import asignaciones, autocompletar, busqueda, contadores, despachos, geografia, vencimientos, versiones
+from .models import (
+    AsignacionFarmacia, AsignacionMoto, Documentacion, DocumentacionMoto, Movimiento, Motorista,
+    ResumenDiarioMovimiento, Usuario,
+)
+from .reportes import ajustar_resumen, clave_resumen, clave_resumen_de, invalidar_reportes
+
+
+# --- RESUMEN DIARIO DE MOVIMIENTOS ---
+
+@receiver(pre_save, sender=Movimiento)
+def recordar_clave_resumen(sender, instance, **kwargs):
+    """
+    Guarda la clave de resumen, los contadores y la ocupación del motorista
+    previos para poder descontarlos al actualizar.
+    """
+    instance._clave_resumen_anterior = None
+    instance._claves_contador_anteriores = []
+    instance._ocupacion_anterior = None
+    instance._avance_anterior = None
+    instance._ubicacion_anterior = None
+    if instance._state.adding or instance.pk is None:
+        return
+    anterior = Movimiento.objects.filter(pk=instance.pk).values_list(
+        'fecha_movimiento', 'estado', 'tipo_movimiento_id', 'motorista_asignado_id', 'movimiento_padre_id',
+        'despacho_raiz_id', 'ruta',
+    ).first()
+    if anterior:
+        fecha, estado, tipo_id, motorista_id, padre_id, raiz_id, ruta = anterior
+        instance._clave_resumen_anterior = clave_resumen(fecha, estado, tipo_id, motorista_id)
+        instance._claves_contador_anteriores = contadores.claves_movimiento(padre_id, estado, motorista_id)
+        instance._ocupacion_anterior = despachos.ocupacion(motorista_id, raiz_id or instance.pk, estado)
+        instance._avance_anterior = (raiz_id, estado, fecha, motorista_id)
+        instance._ubicacion_anterior = (ruta, raiz_id or instance.pk)
+
+
+@receiver(post_save, sender=Movimiento)
+def actualizar_resumen_al_guardar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    nueva = clave_resumen_de(instance)
+    anterior = getattr(instance, '_clave_resumen_anterior', None)
+    if anterior == nueva:
+        return
+    if anterior:
+        ajustar_resumen(anterior, -1)
+    ajustar_resumen(nueva, 1)
+
+
+@receiver(post_delete, sender=Movimiento)
+def actualizar_resumen_al_eliminar(sender, instance, **kwargs):
+    ajustar_resumen(clave_resumen_de(instance), -1)
+
+
+# --- VERSIONES DE REPORTES (CACHÉ) ---
+
+@receiver(post_save, sender=Movimiento)
+def invalidar_reportes_al_guardar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_clave_resumen_anterior', None)
+    invalidar_reportes(timezone.localdate(instance.fecha_movimiento), anterior[0] if anterior else None)
+
+
+@receiver(post_delete, sender=Movimiento)
+def invalidar_reportes_al_eliminar(sender, instance, **kwargs):
+    invalidar_reportes(timezone.localdate(instance.fecha_movimiento))
+
+
+# --- CONTADORES DEL DASHBOARD ---
+
+def claves_contador_de(movimiento):
+    return contadores.claves_movimiento(
+        movimiento.movimiento_padre_id, movimiento.estado, movimiento.motorista_asignado_id
+    )
+
+
+@receiver(post_save, sender=Movimiento)
+def actualizar_contadores_al_guardar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    contadores.traspasar(getattr(instance, '_claves_contador_anteriores', []), claves_contador_de(instance))
+
+
+@receiver(post_delete, sender=Movimiento)
+def actualizar_contadores_al_eliminar(sender, instance, **kwargs):
+    contadores.traspasar(claves_contador_de(instance), [])
+
+
+def contar_alta(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        contadores.incrementar(contadores.TOTALES_POR_MODELO[sender])
+
+
+def contar_baja(sender, instance, **kwargs):
+    contadores.incrementar(contadores.TOTALES_POR_MODELO[sender], -1)
+
+
+for modelo in contadores.TOTALES_POR_MODELO:
+    post_save.connect(contar_alta, sender=modelo, dispatch_uid=f'contar_alta_{modelo.__name__}')
+    post_delete.connect(contar_baja, sender=modelo, dispatch_uid=f'contar_baja_{modelo.__name__}')
+
+
+@receiver(pre_delete, sender=Motorista)
+def descartar_pendientes_motorista(sender, instance, **kwargs):
+    """Sus despachos quedan sin motorista (SET_NULL, sin señales): su contador se descarta."""
+    contadores.eliminar(contadores.clave_pendientes_motorista(instance.pk))
+
+
+@receiver(pre_delete, sender=Motorista)
+def traspasar_resumen_motorista(sender, instance, **kwargs):
+    """
+    Los movimientos de un motorista eliminado quedan con motorista NULL (SET_NULL),
+    así que sus filas de resumen se traspasan al grupo "sin motorista".
+    """
+    for fila in ResumenDiarioMovimiento.objects.filter(motorista=instance):
+        ajustar_resumen((fila.fecha, fila.estado, fila.tipo_movimiento_id, None), fila.total)
+        fila.delete()
+
+
+# --- ÍNDICE DE BÚSQUEDA DE MOVIMIENTOS ---
+
+@receiver(post_save, sender=Movimiento)
+def indexar_movimiento(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    busqueda.indexar(Movimiento.objects.filter(pk=instance.pk))
+
+
+def _recordar_nombres(sender, instance, campos):
+    instance._nombres_anteriores = None
+    if not instance._state.adding and instance.pk is not None:
+        instance._nombres_anteriores = sender.objects.filter(pk=instance.pk).values_list(*campos).first()
+
+
+def _nombres_cambiaron(instance, campos):
+    anteriores = getattr(instance, '_nombres_anteriores', None)
+    return anteriores is not None and anteriores != tuple(getattr(instance, campo) for campo in campos)
+
+
+CAMPOS_NOMBRE_MOTORISTA = ('nombres', 'apellido_paterno')
+CAMPOS_NOMBRE_USUARIO = ('first_name', 'last_name')
+
+
+@receiver(pre_save, sender=Motorista)
+def recordar_nombre_motorista(sender, instance, **kwargs):
+    _recordar_nombres(sender, instance, CAMPOS_NOMBRE_MOTORISTA)
+
+
+@receiver(post_save, sender=Motorista)
+def reindexar_por_motorista(sender, instance, raw=False, **kwargs):
+    if not raw and _nombres_cambiaron(instance, CAMPOS_NOMBRE_MOTORISTA):
+        busqueda.indexar(Movimiento.objects.filter(motorista_asignado=instance))
+
+
+@receiver(pre_save, sender=Usuario)
+def recordar_nombre_usuario(sender, instance, **kwargs):
+    _recordar_nombres(sender, instance, CAMPOS_NOMBRE_USUARIO)
+
+
+@receiver(post_save, sender=Usuario)
+def reindexar_por_usuario(sender, instance, raw=False, **kwargs):
+    if not raw and _nombres_cambiaron(instance, CAMPOS_NOMBRE_USUARIO):
+        busqueda.indexar(Movimiento.objects.filter(usuario_responsable=instance))
+
+
+@receiver(pre_delete, sender=Motorista)
+def recordar_movimientos_motorista(sender, instance, **kwargs):
+    """Sus movimientos quedan sin motorista (SET_NULL, sin señales): se reindexan al eliminarlo."""
+    instance._movimientos_a_reindexar = list(
+        Movimiento.objects.filter(motorista_asignado=instance).values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Motorista)
+def reindexar_movimientos_motorista(sender, instance, **kwargs):
+    pks = getattr(instance, '_movimientos_a_reindexar', [])
+    for inicio in range(0, len(pks), busqueda.TAMANO_LOTE_INDEXACION):
+        busqueda.indexar(Movimiento.objects.filter(pk__in=pks[inicio:inicio + busqueda.TAMANO_LOTE_INDEXACION]))
+
+# --- DESPACHO ACTIVO POR MOTORISTA ---
+# Corren dentro de la transacción de Movimiento.save(): si otro despacho ya
+# ocupa al motorista, MotoristaOcupado revierte el guardado completo.
+
+
+@receiver(post_save, sender=Movimiento)
+def ocupar_motorista(sender, instance, raw=False, **kwargs):
+    if not raw:
+        despachos.traspasar(getattr(instance, '_ocupacion_anterior', None), despachos.ocupacion_de(instance))
+
+
+@receiver(post_delete, sender=Movimiento)
+def liberar_motorista(sender, instance, **kwargs):
+    ocupacion = despachos.ocupacion_de(instance)
+    if ocupacion:
+        despachos.liberar(*ocupacion)
+
+# --- AVANCE DEL DESPACHO ---
+# Los tramos (a cualquier nivel) suman a los contadores de su despacho; la fecha
+# del último tramo y el motorista actual se recalculan en los despachos afectados.
+
+
+def datos_avance_de(movimiento):
+    return (movimiento.despacho_raiz_id, movimiento.estado, movimiento.fecha_movimiento, movimiento.motorista_asignado_id)
+
+
+@receiver(post_save, sender=Movimiento)
+def actualizar_avance_al_guardar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anteriores = getattr(instance, '_avance_anterior', None)
+    if anteriores == datos_avance_de(instance):
+        return
+    despachos.ajustar_avance(despachos.aporte(*anteriores[:2]) if anteriores else None, despachos.aporte_de(instance))
+    afectados = {despachos.raiz(instance), anteriores[0] if anteriores else None} - {None}
+    for despacho_id in sorted(afectados):
+        despachos.refrescar_avance(despacho_id)
+
+
+@receiver(post_delete, sender=Movimiento)
+def actualizar_avance_al_eliminar(sender, instance, **kwargs):
+    aporte = despachos.aporte_de(instance)
+    if aporte:
+        despachos.ajustar_avance(aporte, None)
+        despachos.refrescar_avance(aporte[0])
+
+# --- ÁRBOL DEL DESPACHO ---
+# Después del avance: si el movimiento cambió de padre, sus descendientes se
+# mueven con él y se recalcula el avance de los despachos afectados.
+
+
+@receiver(post_save, sender=Movimiento)
+def mover_descendientes(sender, instance, raw=False, **kwargs):
+    anterior = getattr(instance, '_ubicacion_anterior', None)
+    if not raw and anterior and anterior[0] != instance.ruta:
+        despachos.mover_descendientes(instance, *anterior)
+
+
+# --- ASIGNACIÓN ACTUAL (farmacia_actual / motorista_actual) ---
+
+def _recordar_titular(sender, instance, campo):
+    """Guarda el titular previo (motorista o moto) por si la asignación cambia de titular."""
+    instance._titular_anterior = None
+    if not instance._state.adding and instance.pk is not None:
+        instance._titular_anterior = sender.objects.filter(pk=instance.pk).values_list(campo, flat=True).first()
+
+
+def _titulares(instance, campo):
+    return {getattr(instance, campo), getattr(instance, '_titular_anterior', None)}
+
+
+@receiver(pre_save, sender=AsignacionFarmacia)
+def recordar_motorista_asignacion(sender, instance, **kwargs):
+    _recordar_titular(sender, instance, 'motorista_id')
+
+
+@receiver(post_save, sender=AsignacionFarmacia)
+@receiver(post_delete, sender=AsignacionFarmacia)
+def actualizar_farmacia_actual(sender, instance, raw=False, **kwargs):
+    if not raw:
+        asignaciones.actualizar_farmacia_actual(_titulares(instance, 'motorista_id'))
+
+
+@receiver(pre_save, sender=AsignacionMoto)
+def recordar_moto_asignacion(sender, instance, **kwargs):
+    _recordar_titular(sender, instance, 'moto_id')
+
+
+@receiver(post_save, sender=AsignacionMoto)
+@receiver(post_delete, sender=AsignacionMoto)
+def actualizar_motorista_actual(sender, instance, raw=False, **kwargs):
+    if not raw:
+        asignaciones.actualizar_motorista_actual(_titulares(instance, 'moto_id'))
+
+# --- ÍNDICE DE VENCIMIENTOS ---
+# Las filas de motoristas, motos y documentos de motorista se borran en cascada;
+# la documentación de la moto no es su clave foránea y se borra aquí.
+
+
+@receiver(post_save, sender=DocumentacionMoto)
+@receiver(post_save, sender=Documentacion)
+@receiver(post_save, sender=Motorista)
+def indexar_vencimientos(sender, instance, raw=False, **kwargs):
+    if not raw:
+        vencimientos.sincronizar([instance])
+
+
+@receiver(post_delete, sender=DocumentacionMoto)
+def eliminar_vencimientos(sender, instance, **kwargs):
+    vencimientos.eliminar(instance)
+
+
+# --- ÍNDICES DE AUTOCOMPLETADO ---
+
+autocompletar.conectar_senales()
+geografia.conectar_senales()
+versiones.conectar_senales()
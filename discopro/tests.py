@@ -1,3 +1,1746 @@
-from django.test import TestCase
+import csv
+import datetime
+import functools
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.paginator import EmptyPage
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, QuerySet
+from django.db.models.constants import OnConflict
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from pypdf import PdfReader
+
+from . import asignaciones, busqueda, contadores, despachos, exportacion, reportes, utils, vencimientos, views
+from .autocompletar import FUENTES
+from .forms import FarmaciaForm, MovimientoForm
+from .geografia import arbol_geografico, cargar_referencia
+from .paginacion import PaginadorAcotado, paginar_por_cursor
+from .datos_sinteticos import GeneradorDatos
+from .importacion import ImportadorFarmacias, ImportadorMaestro, ImportadorMotoristas, cargar_despachos, leer_despachos_json
+from .models import (
+    AsignacionFarmacia, AsignacionMoto, Comuna, Contador, DespachoActivo, Documentacion, DocumentacionMoto,
+    DocumentoBusquedaMovimiento, Farmacia, Motorista, Moto, Movimiento, Provincia, Region, ResumenDiarioMovimiento,
+    TipoMovimiento, TrabajoReporte, Usuario, Vencimiento, clave_orden_natural,
+)
+from .rut import formatear_rut, normalizar_rut, variantes_rut
+
+
+# --- PLANES DE CONSULTA ---
+
+# Tablas de catálogo (pocas filas y acotadas): recorrerlas completas es aceptable.
+TABLAS_CATALOGO = {
+    Region._meta.db_table, Provincia._meta.db_table, Comuna._meta.db_table,
+    TipoMovimiento._meta.db_table, 'discopro_rol', 'django_content_type',
+}
+
+
+TABLAS_GEOGRAFIA = {Region._meta.db_table, Provincia._meta.db_table, Comuna._meta.db_table}
+
+
+def tablas_consulta(sql):
+    """Tablas leídas por una consulta, citadas con comillas (SQLite, PostgreSQL) o backticks (MySQL)."""
+    return set(re.findall(r'(?:FROM|JOIN) ["`](\w+)["`]', sql))
+
+
+def alias_tablas(sql):
+    """Alias de subconsultas y uniones de Django ("discopro_moto" U0) -> nombre de la tabla."""
+    return {alias: tabla for tabla, alias in re.findall(r'["`]?(\w+)["`]? (U\d+|T\d+)\b', sql)}
+
+
+def _tabla_sqlite(detalle):
+    # "SCAN discopro_moto", "SCAN U0 USING INDEX ..." (o "SCAN TABLE ..." en SQLite < 3.36)
+    partes = detalle.replace('SCAN TABLE ', 'SCAN ').split()
+    return partes[1] if len(partes) > 1 else ''
+
+
+def problemas_sqlite(sql, params, alias, agrupada):
+    """Recorridos completos de tablas no catalogadas y ordenamientos en B-tree temporal."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        filas = cursor.fetchall()
+    problemas = []
+    for fila in filas:
+        detalle = fila[-1]
+        if detalle.startswith('SCAN '):
+            tabla = alias.get(_tabla_sqlite(detalle), _tabla_sqlite(detalle))
+            if 'INDEX' not in detalle and tabla not in TABLAS_CATALOGO and tabla != 'subquery':
+                problemas.append(detalle)
+        elif detalle.startswith('USE TEMP B-TREE FOR ORDER BY') and not agrupada:
+            problemas.append(detalle)
+    return problemas
+
+
+def problemas_mysql(sql, params, alias, agrupada):
+    """Filas de EXPLAIN con acceso ALL sobre tablas no catalogadas o con filesort/temporal."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN {sql}", params)
+        columnas = [columna[0] for columna in cursor.description]
+        filas = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+    problemas = []
+    for fila in filas:
+        tabla = alias.get(fila.get('table'), fila.get('table'))
+        extra = fila.get('Extra') or ''
+        if fila.get('type') == 'ALL' and tabla not in TABLAS_CATALOGO and not str(tabla).startswith('<derived'):
+            problemas.append(f"ALL {tabla}")
+        if ('Using temporary' in extra or 'Using filesort' in extra) and not agrupada:
+            problemas.append(f"{tabla}: {extra}")
+    return problemas
+
+
+class RegistroConsultas:
+    """Guarda (sql, params) de cada SELECT ejecutado mientras está activo."""
+    def __init__(self):
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            self.consultas.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+# Sin caché: cada petición ejecuta todas sus consultas, siempre las mismas.
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class VistasFrecuentesTestCase(TestCase):
+    """Datos de prueba y URLs de las vistas frecuentes, compartidos por las pruebas de consultas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Las versiones de datos se suman al confirmar la transacción, como en producción.
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.crear_datos()
+
+    @classmethod
+    def crear_datos(cls):
+        region = Region.objects.create(nombreRegion='Metropolitana')
+        provincia = Provincia.objects.create(nombreProvincia='Santiago', region=region)
+        comuna = Comuna.objects.create(nombreComuna='Ñuñoa', provincia=provincia)
+        cls.usuario = Usuario.objects.create_superuser('admin', 'admin@discopro.cl', 'clave12345', first_name='Ana')
+        tipos = [TipoMovimiento.objects.create(nombre=nombre) for nombre in ('Directo', 'Reenvío')]
+        farmacias = [
+            Farmacia.objects.create(
+                nombre=f'Farmacia {i}', direccion=f'Calle {i}', comuna=comuna,
+                horario_apertura='09:00', horario_cierre='20:00', telefono='221234567'
+            ) for i in range(5)
+        ]
+        motoristas = [
+            Motorista.objects.create(
+                rut=f'1{i:07d}-K', nombres=f'Juan {i}', apellido_paterno='Pérez', apellido_materno='Soto',
+                fecha_nacimiento=datetime.date(1990, 1, 1), direccion='Calle 1', comuna=comuna,
+                telefono='912345678', correo=f'juan{i}@discopro.cl'
+            ) for i in range(5)
+        ]
+        motos = [
+            Moto.objects.create(patente=f'AB-CD-{i:02d}', marca='Honda', modelo='CG', color='Rojo', anio=2020)
+            for i in range(5)
+        ]
+        # Cada motorista y moto con un historial de dos asignaciones.
+        for i, (motorista, moto) in enumerate(zip(motoristas, motos)):
+            for j in range(2):
+                AsignacionFarmacia.objects.create(motorista=motorista, farmacia=farmacias[(i + j) % 5])
+                AsignacionMoto.objects.create(moto=moto, motorista=motoristas[(i + j) % 5])
+
+        ahora = timezone.now()
+        estados = ('pendiente', 'completado', 'anulado')
+        for i in range(30):
+            # Un motorista tiene a lo más un despacho pendiente: los pendientes más antiguos van sin motorista.
+            pendiente_ocupado = estados[i % 3] == 'pendiente' and i >= 15
+            despacho = Movimiento.objects.create(
+                numero_despacho=str(1000 + i), tipo_movimiento=tipos[i % 2], usuario_responsable=cls.usuario,
+                origen='Farmacia 1', destino=f'Calle {i}', estado=estados[i % 3],
+                motorista_asignado=None if pendiente_ocupado else motoristas[i % 5],
+                fecha_movimiento=ahora - datetime.timedelta(days=i * 7)
+            )
+            for j in range(2):
+                Movimiento.objects.create(
+                    tipo_movimiento=tipos[j], usuario_responsable=cls.usuario, origen='Farmacia 2',
+                    destino=f'Calle {i}', estado='completado', motorista_asignado=motoristas[(i + j) % 5],
+                    movimiento_padre=despacho, fecha_movimiento=despacho.fecha_movimiento + datetime.timedelta(hours=j + 1)
+                )
+        cls.motorista, cls.moto, cls.farmacia = motoristas[0], motos[0], farmacias[0]
+        cls.despacho = Movimiento.objects.filter(movimiento_padre__isnull=True).first()
+        cls.region, cls.provincia, cls.comuna = region, provincia, comuna
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        # Sin el registro por petición de ServerTimingMiddleware en la salida de las pruebas.
+        registro = logging.getLogger('discopro.rendimiento')
+        self.addCleanup(registro.setLevel, registro.level)
+        registro.setLevel(logging.WARNING)
+        # Los índices de autocompletado y el árbol geográfico cargan sus tablas completas
+        # a propósito (una vez por proceso). Entre clases de prueba los contadores de versión
+        # vuelven atrás con el rollback, así que el árbol se reconstruye en cada prueba.
+        for fuente in FUENTES.values():
+            fuente.vigente()
+        arbol_geografico.version = None
+        arbol_geografico.vigente()
+
+    def urls(self):
+        """
+        Consultas frecuentes: el orden por defecto y por clave natural de cada
+        listado, los filtros y búsqueda de despachos, detalles, reportes,
+        exportación y AJAX. Los órdenes secundarios (teléfono, comuna, etc.) de
+        las tablas maestras no se exigen, ni el orden por relevancia de una
+        búsqueda sin orden elegido: ése ordena sólo las coincidencias.
+        """
+        hoy = timezone.localdate()
+        periodo = f"desde={hoy - datetime.timedelta(days=365)}&hasta={hoy}&granularidad=mes&dimension=estado"
+        urls = [reverse('index')]
+        for nombre, campos in (
+            ('usuario_lista', ('username', 'nombres', 'rut')),
+            ('farmacia_lista', ('nombre', 'direccion')),
+            ('motorista_lista', ('nombres', 'rut')),
+            ('moto_lista', ('patente', 'marca', 'modelo')),
+            ('movimiento_lista', ('fecha_movimiento', 'avance', 'ultimo_tramo')),
+        ):
+            urls.append(reverse(nombre))
+            for campo in campos:
+                urls += [f"{reverse(nombre)}?sort={campo}", f"{reverse(nombre)}?sort=-{campo}"]
+        urls += [
+            f"{reverse('movimiento_lista')}?q=1005&sort=-fecha_movimiento",
+            f"{reverse('movimiento_lista')}?estado=pendiente",
+            f"{reverse('movimiento_lista')}?avance=con_pendientes",
+            f"{reverse('movimiento_exportar')}?formato=csv",
+            reverse('motorista_detalle', args=[self.motorista.pk]),
+            reverse('moto_detalle', args=[self.moto.pk]),
+            reverse('movimiento_detalle', args=[self.despacho.pk]),
+            reverse('reporte_movimientos'),
+            f"{reverse('reporte_movimientos')}?{periodo}",
+            f"{reverse('ajax_load_provincias')}?region={self.region.pk}",
+            f"{reverse('ajax_load_comunas')}?provincia={self.provincia.pk}",
+            reverse('farmacia_editar', args=[self.farmacia.pk]),
+        ]
+        for fuente in FUENTES:
+            urls += [reverse('autocompletar', args=[fuente]), f"{reverse('autocompletar', args=[fuente])}?q=ju"]
+        return urls
+
+    def capturar(self, url):
+        registro = RegistroConsultas()
+        with connection.execute_wrapper(registro):
+            respuesta = self.client.get(url)
+            if hasattr(respuesta, 'streaming_content'):
+                b''.join(respuesta.streaming_content)
+        self.assertEqual(respuesta.status_code, 200, url)
+        return registro.consultas
+
+
+@unittest.skipUnless(connection.vendor in ('sqlite', 'mysql'), "EXPLAIN sólo se interpreta en SQLite y MySQL.")
+class PlanesConsultaTests(VistasFrecuentesTestCase):
+    """
+    Ejecuta las vistas de listado, detalle, reportes y AJAX sobre datos de
+    prueba, captura su SQL y revisa el plan (EXPLAIN) de cada consulta: falla
+    si alguna recorre completa una tabla que crece o si ordena con un archivo
+    o árbol temporal en vez de un índice.
+    """
+
+    def test_consultas_sin_recorridos_completos_ni_ordenamientos_temporales(self):
+        analizar = problemas_sqlite if connection.vendor == 'sqlite' else problemas_mysql
+        fallas = {}
+        for url in self.urls():
+            for sql, params in self.capturar(url):
+                if tablas_consulta(sql) <= TABLAS_CATALOGO:
+                    continue
+                # En una agregación se ordenan los grupos, no las filas de la tabla.
+                problemas = analizar(sql, params, alias_tablas(sql), ' GROUP BY ' in sql)
+                if problemas:
+                    fallas.setdefault((sql, '; '.join(problemas)), []).append(url)
+        self.assertFalse(fallas, "Consultas sin índice:\n" + "\n".join(
+            f"{urls[0]} (+{len(urls) - 1} más)\n    {sql}\n    -> {problemas}"
+            for (sql, problemas), urls in fallas.items()
+        ))
+
+
+# --- PRESUPUESTO DE CONSULTAS ---
+
+# Máximo de consultas SQL por petición de cada vista (por nombre de URL). Incluye
+# las 5 de toda petición autenticada: sesión, usuario y el guardado de la sesión
+# (SESSION_SAVE_EVERY_REQUEST, con su savepoint). Un N+1 lo supera en cuanto hay
+# varias filas; si un cambio necesita más consultas a propósito, se sube aquí.
+# Las vistas con respuesta condicional (ETag) suman la lectura de sus versiones:
+# con la DummyCache de las pruebas es siempre una consulta (en producción, caché).
+PRESUPUESTO_CONSULTAS = {
+    'index': 7,
+    'usuario_lista': 8,
+    'farmacia_lista': 8,
+    'motorista_lista': 8,
+    'moto_lista': 8,
+    'movimiento_lista': 7,
+    'movimiento_exportar': 7,
+    'motorista_detalle': 11,
+    'moto_detalle': 9,
+    'movimiento_detalle': 8,
+    'reporte_movimientos': 12,
+    'ajax_load_provincias': 6,
+    'ajax_load_comunas': 6,
+    'farmacia_editar': 7,
+    'autocompletar': 6,
+}
+
+
+class PresupuestoConsultasMixin:
+    """
+    `assertPresupuestoConsultas(url)` falla si la petición ejecuta más consultas
+    que las asignadas en PRESUPUESTO_CONSULTAS al nombre de su URL.
+    """
+    presupuestos = PRESUPUESTO_CONSULTAS
+
+    def assertPresupuestoConsultas(self, url):
+        nombre = resolve(url.split('?')[0]).url_name
+        self.assertIn(nombre, self.presupuestos, f"La vista '{nombre}' no tiene presupuesto de consultas.")
+        with CaptureQueriesContext(connection) as capturadas:
+            respuesta = self.client.get(url)
+            if hasattr(respuesta, 'streaming_content'):
+                b''.join(respuesta.streaming_content)
+        self.assertEqual(respuesta.status_code, 200, url)
+        self.assertLessEqual(
+            len(capturadas), self.presupuestos[nombre],
+            f"{url} ejecutó {len(capturadas)} consultas (presupuesto: {self.presupuestos[nombre]}):\n"
+            + "\n".join(consulta['sql'] for consulta in capturadas.captured_queries)
+        )
+        return respuesta
+
+
+class PresupuestoConsultasTests(PresupuestoConsultasMixin, VistasFrecuentesTestCase):
+
+    def test_vistas_dentro_de_su_presupuesto(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                self.assertPresupuestoConsultas(url)
+
+    def test_cabecera_server_timing(self):
+        respuesta = self.client.get(reverse('motorista_lista'))
+        metricas = respuesta['Server-Timing']
+        self.assertRegex(metricas, r'db;dur=[\d.]+;desc="\d+ consultas"')
+        self.assertRegex(metricas, r'tpl;dur=[\d.]+')
+        self.assertRegex(metricas, r'total;dur=[\d.]+')
+
+
+# --- ÁRBOL GEOGRÁFICO ---
+
+class GeografiaTests(VistasFrecuentesTestCase):
+
+    def test_paquete_versionado_y_cacheable(self):
+        etag = arbol_geografico.vigente().etag
+        url = reverse('ajax_geografia', args=[etag])
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('immutable', respuesta['Cache-Control'])
+        self.assertEqual(respuesta['ETag'], f'"{etag}"')
+        region = respuesta.json()['regiones'][0]
+        self.assertEqual(region['provincias'][0]['comunas'], [{'id': self.comuna.pk, 'nombre': 'Ñuñoa'}])
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+        # Una versión vieja redirige a la vigente; al cambiar la geografía cambia la versión.
+        self.assertRedirects(self.client.get(reverse('ajax_geografia', args=['antigua'])), url)
+        Comuna.objects.create(nombreComuna='Providencia', provincia=self.provincia)
+        self.assertNotEqual(arbol_geografico.vigente().etag, etag)
+
+    def test_formulario_valida_contra_el_arbol(self):
+        datos = {
+            'nombre': 'Farmacia Nueva', 'direccion': 'Calle 9', 'region': self.region.pk,
+            'provincia': self.provincia.pk, 'comuna': self.comuna.pk, 'horario_apertura': '09:00',
+            'horario_cierre': '20:00', 'telefono': '221234567',
+        }
+        arbol_geografico.vigente()
+        with CaptureQueriesContext(connection) as capturadas:
+            formulario = FarmaciaForm(data=datos)
+            self.assertTrue(formulario.is_valid(), formulario.errors)
+        geograficas = [c['sql'] for c in capturadas.captured_queries if tablas_consulta(c['sql']) & TABLAS_GEOGRAFIA]
+        self.assertEqual(geograficas, [])
+        self.assertEqual(formulario.save().comuna_id, self.comuna.pk)
+
+        otra = Provincia.objects.create(nombreProvincia='Cordillera', region=self.region)
+        formulario = FarmaciaForm(data={**datos, 'provincia': otra.pk})
+        self.assertIn('comuna', formulario.errors)
+
+
+# --- DATOS DE REFERENCIA ---
+
+class DatosReferenciaTests(TestCase):
+
+    def test_carga_completa_e_idempotente(self):
+        # Una comuna cargada en la provincia equivocada se mueve en vez de duplicarse.
+        region = Region.objects.create(nombreRegion='Región del Biobío')
+        provincia = Provincia.objects.create(nombreProvincia='Biobío', region=region)
+        Comuna.objects.create(nombreComuna='Chillán', provincia=provincia)
+
+        resultado = cargar_referencia()
+        self.assertEqual(resultado['comunas'], (345, 1))
+        self.assertEqual(
+            (Region.objects.count(), Provincia.objects.count(), Comuna.objects.count()), (16, 56, 346)
+        )
+        self.assertEqual(Comuna.objects.get(nombreComuna='Chillán').provincia.nombreProvincia, 'Diguillín')
+        self.assertEqual(TipoMovimiento.objects.count(), 5)
+
+        # Repetir la carga sólo lee: una consulta por tabla, sin escrituras.
+        with CaptureQueriesContext(connection) as capturadas:
+            resultado = cargar_referencia()
+        self.assertTrue(all(creados == actualizados == 0 for creados, actualizados in resultado.values()))
+        escrituras = [
+            c['sql'] for c in capturadas.captured_queries
+            if not c['sql'].startswith(('SELECT', 'SAVEPOINT', 'RELEASE'))
+        ]
+        self.assertEqual(escrituras, [])
+
+
+# --- GET CONDICIONAL ---
+
+class RespuestaCondicionalTests(VistasFrecuentesTestCase):
+
+    def test_no_modificada_sin_consultar_la_vista(self):
+        url = reverse('movimiento_lista')
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('no-cache', respuesta['Cache-Control'])
+        self.assertIn('Last-Modified', respuesta)
+        etag = respuesta['ETag']
+
+        with CaptureQueriesContext(connection) as capturadas:
+            respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta['ETag'], etag)
+        tablas = set().union(*(tablas_consulta(c['sql']) for c in capturadas.captured_queries))
+        self.assertNotIn(Movimiento._meta.db_table, tablas)
+
+        # Otra página del listado u otro usuario tienen su propio ETag.
+        self.assertEqual(self.client.get(f'{url}?estado=pendiente', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        otro = Usuario.objects.create_user('operador', 'operador@discopro.cl', 'clave12345')
+        self.client.force_login(otro)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cambia_al_modificar_un_modelo_del_que_depende(self):
+        url = reverse('motorista_detalle', args=[self.motorista.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.motorista.telefono = '987654321'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.motorista.save()
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, '987654321')
+
+
+# --- DESPACHO ACTIVO POR MOTORISTA ---
+
+class DespachoActivoTests(VistasFrecuentesTestCase):
+
+    def datos_despacho(self, numero, **extra):
+        return {
+            'numero_despacho': numero, 'fecha_movimiento': timezone.localtime().strftime('%Y-%m-%dT%H:%M'),
+            'tipo_movimiento': self.despacho.tipo_movimiento_id, 'usuario_responsable': self.usuario.pk,
+            'motorista_asignado': self.motorista.pk, 'estado': 'pendiente', 'origen': 'Farmacia 0',
+            'destino': 'Calle 9', **extra,
+        }
+
+    def test_formulario_consulta_solo_la_fila_del_motorista(self):
+        self.assertEqual(DespachoActivo.objects.get(motorista=self.motorista).despacho, self.despacho)
+
+        with CaptureQueriesContext(connection) as capturadas:
+            formulario = MovimientoForm(data=self.datos_despacho('9001'))
+            self.assertFalse(formulario.is_valid())
+        self.assertIn(self.despacho.numero_despacho, str(formulario.non_field_errors()))
+        # Ninguna búsqueda de pendientes del motorista en movimientos (sólo la unicidad del número).
+        pendientes = [
+            c['sql'] for c in capturadas.captured_queries
+            if re.search(r'WHERE .*"discopro_movimiento"\."motorista_asignado_id" =', c['sql'])
+        ]
+        self.assertEqual(pendientes, [])
+
+        # Editar el mismo despacho (o sus tramos) no choca consigo mismo.
+        formulario = MovimientoForm(data=self.datos_despacho(self.despacho.numero_despacho), instance=self.despacho)
+        self.assertTrue(formulario.is_valid(), formulario.errors)
+
+    def test_guardado_concurrente_lo_decide_la_restriccion(self):
+        # Como si otro operador guardara después de que ambos pasaran la validación.
+        otro = Movimiento(
+            numero_despacho='9002', tipo_movimiento=self.despacho.tipo_movimiento, usuario_responsable=self.usuario,
+            origen='Farmacia 0', destino='Calle 9', motorista_asignado=self.motorista,
+        )
+        with self.assertRaises(despachos.MotoristaOcupado):
+            otro.save()
+        self.assertFalse(Movimiento.objects.filter(numero_despacho='9002').exists())
+
+        # La vista muestra el conflicto en el formulario aunque la validación no lo haya visto.
+        with mock.patch.object(despachos, 'despacho_que_ocupa', return_value=None):
+            respuesta = self.client.post(reverse('movimiento_crear'), self.datos_despacho('9003'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('motorista_asignado', respuesta.context['form'].errors)
+        self.assertFalse(Movimiento.objects.filter(numero_despacho='9003').exists())
+
+    def test_se_libera_al_completar_y_se_repara(self):
+        self.despacho.estado = 'completado'
+        self.despacho.save()
+        self.assertFalse(DespachoActivo.objects.filter(motorista=self.motorista).exists())
+
+        nuevo = Movimiento.objects.create(
+            numero_despacho='9004', tipo_movimiento=self.despacho.tipo_movimiento, usuario_responsable=self.usuario,
+            origen='Farmacia 0', destino='Calle 9', motorista_asignado=self.motorista,
+        )
+        self.assertEqual(DespachoActivo.objects.get(motorista=self.motorista).despacho, nuevo)
+
+        # Cambios directos en la base (sin señales) se corrigen con reparar().
+        Movimiento.objects.filter(pk=nuevo.pk).update(estado='anulado')
+        DespachoActivo.objects.filter(motorista=self.motorista).delete()
+        Movimiento.objects.filter(pk=self.despacho.pk).update(estado='pendiente')
+        diferencias, conflictos = despachos.reparar()
+        self.assertEqual(diferencias, [(self.motorista.pk, None, self.despacho.pk)])
+        self.assertEqual(conflictos, {})
+        self.assertEqual(despachos.reparar(), ([], {}))
+
+    def test_ocupar_y_liberar_bloquean_la_fila_antes_de_decidir(self):
+        bloquear = QuerySet.select_for_update
+        bloqueadas = []
+
+        def registrar(queryset, *args, **kwargs):
+            bloqueadas.append(queryset.model)
+            return bloquear(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=registrar):
+            despachos.ocupar(self.motorista.pk, self.despacho.pk)
+            self.assertEqual(bloqueadas, [DespachoActivo])
+            bloqueadas.clear()
+            despachos.liberar(self.motorista.pk, self.despacho.pk)
+            # Sigue pendiente: la fila bloqueada se conserva.
+            self.assertEqual(bloqueadas, [DespachoActivo, Movimiento])
+            self.assertTrue(DespachoActivo.objects.filter(motorista=self.motorista).exists())
+            bloqueadas.clear()
+            despachos.liberar(self.motorista.pk, self.despacho.pk + 1)
+            self.assertEqual(bloqueadas, [DespachoActivo])
+
+
+# --- AVANCE DEL DESPACHO ---
+
+class AvanceDespachoTests(VistasFrecuentesTestCase):
+    CAMPOS = ('total_tramos', 'tramos_pendientes', 'tramos_completados', 'tramos_anulados', 'avance', 'motorista_actual_id')
+
+    def avance(self, despacho):
+        return Movimiento.objects.filter(pk=despacho.pk).values(*self.CAMPOS, 'ultimo_tramo').get()
+
+    def assertAvanceConsistente(self):
+        self.assertEqual(despachos.reparar_avance(), [])
+
+    def test_tramos_actualizan_su_despacho(self):
+        # Cada despacho de prueba tiene dos tramos completados; el último con el motorista siguiente.
+        inicial = self.avance(self.despacho)
+        self.assertEqual(
+            [inicial[campo] for campo in self.CAMPOS],
+            [2, 0, 2, 0, 100, Motorista.objects.get(rut='10000001-K').pk],
+        )
+        self.assertAvanceConsistente()
+
+        tramo = Movimiento.objects.create(
+            tipo_movimiento=self.despacho.tipo_movimiento, usuario_responsable=self.usuario, origen='Farmacia 0',
+            destino='Calle 0', motorista_asignado=self.motorista, movimiento_padre=self.despacho,
+            fecha_movimiento=self.despacho.fecha_movimiento + datetime.timedelta(hours=5),
+        )
+        avance = self.avance(self.despacho)
+        self.assertEqual((avance['total_tramos'], avance['tramos_pendientes'], avance['avance']), (3, 1, 66))
+        self.assertEqual((avance['ultimo_tramo'], avance['motorista_actual_id']), (tramo.fecha_movimiento, self.motorista.pk))
+
+        tramo.estado = 'anulado'
+        tramo.save()
+        avance = self.avance(self.despacho)
+        self.assertEqual((avance['tramos_pendientes'], avance['tramos_anulados'], avance['avance']), (0, 1, 100))
+
+        # Guardar una instancia antigua del despacho no pisa su avance.
+        self.despacho.observacion = 'Revisado'
+        self.despacho.save()
+        self.assertEqual(self.avance(self.despacho)['total_tramos'], 3)
+
+        otro = Movimiento.objects.filter(movimiento_padre__isnull=True).exclude(pk=self.despacho.pk).first()
+        tramo.movimiento_padre = otro
+        tramo.save()
+        self.assertEqual(self.avance(self.despacho), inicial)
+        self.assertEqual(self.avance(otro)['total_tramos'], 3)
+        self.assertAvanceConsistente()
+
+        tramo.delete()
+        self.assertEqual(self.avance(otro)['total_tramos'], 2)
+        self.assertAvanceConsistente()
+
+    def test_reparar_y_filtrar(self):
+        Movimiento.objects.filter(pk=self.despacho.pk).update(total_tramos=0, tramos_completados=0, avance=0)
+        self.assertEqual(despachos.reparar_avance(), [self.despacho.pk])
+        self.assertEqual(self.avance(self.despacho)['avance'], 100)
+
+        Movimiento.objects.create(
+            tipo_movimiento=self.despacho.tipo_movimiento, usuario_responsable=self.usuario, origen='Farmacia 0',
+            destino='Calle 0', movimiento_padre=self.despacho,
+        )
+        respuesta = self.client.get(f"{reverse('movimiento_lista')}?avance=con_pendientes")
+        self.assertEqual([m.pk for m in respuesta.context['movimientos']], [self.despacho.pk])
+        respuesta = self.client.get(f"{reverse('movimiento_lista')}?sort=avance")
+        self.assertEqual(respuesta.context['movimientos'][0].pk, self.despacho.pk)
+
+
+# --- ÁRBOL DEL DESPACHO ---
+
+class ArbolDespachoTests(VistasFrecuentesTestCase):
+
+    def tramo(self, padre, **extra):
+        return Movimiento.objects.create(
+            tipo_movimiento=self.despacho.tipo_movimiento, usuario_responsable=self.usuario, origen='Farmacia 0',
+            destino='Calle 0', movimiento_padre=padre, **extra,
+        )
+
+    def test_tramos_de_tramos(self):
+        primero = self.despacho.tramos_hijos.order_by('fecha_movimiento').first()
+        reenvio = self.tramo(primero, fecha_movimiento=primero.fecha_movimiento + datetime.timedelta(hours=5))
+        self.assertEqual((reenvio.despacho_raiz_id, reenvio.profundidad), (self.despacho.pk, 2))
+        self.assertEqual(reenvio.ruta, f"{self.despacho.pk:010d}/{primero.pk:010d}/")
+
+        # Raíz, URL y nombre sin consultas; el despacho completo en una, en profundidad.
+        tramo = Movimiento.objects.select_related('despacho_raiz').get(pk=reenvio.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(tramo.get_absolute_url(), reverse('movimiento_detalle', args=[self.despacho.pk]))
+            self.assertEqual(str(tramo), f"Tramo del Despacho #{self.despacho.numero_despacho}")
+        with self.assertNumQueries(1):
+            arbol = despachos.tramos_de(self.despacho)
+        self.assertEqual([t.pk for t in arbol][:2], [primero.pk, reenvio.pk])
+        self.assertEqual(len(arbol), 3)
+        self.assertEqual([t.pk for t in despachos.subarbol(primero)], [reenvio.pk])
+        self.assertEqual(Movimiento.objects.get(pk=self.despacho.pk).total_tramos, 3)
+
+        with self.assertRaises(ValidationError):
+            primero.movimiento_padre = reenvio
+            primero.save()
+
+    def test_mover_un_tramo_arrastra_sus_descendientes(self):
+        libre = Motorista.objects.create(
+            rut='20000000-5', nombres='Libre', apellido_paterno='Rojas', apellido_materno='Soto',
+            fecha_nacimiento=datetime.date(1990, 1, 1), direccion='Calle 1', comuna=self.comuna,
+            telefono='912345678', correo='libre@discopro.cl'
+        )
+        primero = self.despacho.tramos_hijos.order_by('fecha_movimiento').first()
+        reenvio = self.tramo(primero, motorista_asignado=libre)
+        otro = Movimiento.objects.filter(
+            movimiento_padre__isnull=True, estado='pendiente', motorista_asignado__isnull=True
+        ).first()
+
+        primero = Movimiento.objects.get(pk=primero.pk)
+        primero.movimiento_padre = otro
+        primero.save()
+        reenvio.refresh_from_db()
+        self.assertEqual((reenvio.despacho_raiz_id, reenvio.ruta), (otro.pk, f"{otro.pk:010d}/{primero.pk:010d}/"))
+        self.assertEqual(DespachoActivo.objects.get(motorista=libre).despacho_id, otro.pk)
+        self.assertEqual(busqueda.buscar_despachos(str(reenvio.pk)), [otro.pk])
+        self.assertEqual(despachos.reparar_avance(), [])
+        self.assertEqual(despachos.reparar(), ([], {}))
+
+    def test_admin_sin_consultas_por_fila(self):
+        # Las mismas consultas con 10 filas (despachos anulados) que con 20 (tramos completados).
+        consultas = []
+        self.client.get(reverse('admin:discopro_movimiento_changelist'))
+        for estado in ('anulado', 'completado'):
+            with CaptureQueriesContext(connection) as capturadas:
+                respuesta = self.client.get(f"{reverse('admin:discopro_movimiento_changelist')}?estado__exact={estado}")
+            self.assertEqual(respuesta.status_code, 200)
+            consultas.append(len(capturadas))
+        self.assertEqual(consultas[0], consultas[1])
+
+
+# --- CARGA DE DESPACHOS POR LOTES ---
+
+class CargaDespachosTests(VistasFrecuentesTestCase):
+
+    def lote(self, cantidad, motoristas=()):
+        return [
+            {
+                'numero_despacho': f'L{i:04d}', 'tipo_movimiento': 'directo', 'origen': 'Farmacia 0',
+                'destino': f'Calle {i}', 'fecha_movimiento': '2026-10-01T09:30',
+                'motorista': motoristas[i].rut if i < len(motoristas) else '',
+                'tramos': [{'origen': 'farmacia 1', 'estado': 'completado'}, {'origen': 'Farmacia 2'}],
+            } for i in range(cantidad)
+        ]
+
+    def test_consultas_constantes_y_registro_manual_de_altas(self):
+        libres = [
+            Motorista.objects.create(
+                rut=f'2{i:07d}-K', nombres=f'Pedro {i}', apellido_paterno='Rojas', apellido_materno='Soto',
+                fecha_nacimiento=datetime.date(1990, 1, 1), direccion='Calle 1', comuna=self.comuna,
+                telefono='912345678', correo=f'pedro{i}@discopro.cl'
+            ) for i in range(40)
+        ]
+        total_despachos = contadores.obtener(contadores.TOTAL_DESPACHOS)
+        with CaptureQueriesContext(connection) as pocas:
+            self.assertEqual(cargar_despachos(leer_despachos_json(json.dumps(self.lote(2, libres))), self.usuario, aplicar=False)['errores'], [])
+        with CaptureQueriesContext(connection) as muchas:
+            resultado = cargar_despachos(leer_despachos_json(json.dumps(self.lote(40, libres))), self.usuario, aplicar=False)
+        self.assertEqual(len(muchas), len(pocas))
+
+        resultado = cargar_despachos(leer_despachos_json(json.dumps(self.lote(40, libres))), self.usuario)
+        self.assertEqual((resultado['despachos'], resultado['tramos'], resultado['creados']), (40, 80, True))
+        tramo = Movimiento.objects.get(movimiento_padre__numero_despacho='L0000', estado='completado')
+        self.assertEqual((tramo.origen, tramo.motorista_asignado, tramo.destino), ('Farmacia 1', libres[0], 'Calle 0'))
+        # Lo que harían las señales: ocupación, contadores, resumen diario e índice de búsqueda.
+        self.assertEqual(DespachoActivo.objects.get(motorista=libres[0]).despacho.numero_despacho, 'L0000')
+        self.assertEqual(contadores.obtener(contadores.TOTAL_DESPACHOS), total_despachos + 40)
+        self.assertEqual(despachos.reparar(), ([], {}))
+        self.assertEqual(despachos.reparar_avance(), [])
+        self.assertEqual(contadores.reconciliar(), [])
+        self.assertEqual(busqueda.buscar_despachos('L0007'), [Movimiento.objects.get(numero_despacho='L0007').pk])
+
+    def test_farmacias_con_tildes_y_enie(self):
+        Farmacia.objects.create(
+            nombre='Farmacia Ñuñoa Central', direccion='Irarrázaval 1', comuna=self.comuna,
+            horario_apertura='09:00', horario_cierre='20:00', telefono='221234567'
+        )
+        lote = self.lote(1)
+        lote[0]['tramos'] = [{'origen': 'Farmacia Ñuñoa Central'}, {'origen': 'farmacia ñuñoa central'}, {'origen': 'FARMACIA NUNOA CENTRAL'}]
+        resultado = cargar_despachos(leer_despachos_json(json.dumps(lote)), self.usuario)
+        self.assertEqual(resultado['errores'], [])
+        self.assertEqual(
+            set(Movimiento.objects.filter(movimiento_padre__numero_despacho='L0000').values_list('origen', flat=True)),
+            {'Farmacia Ñuñoa Central'},
+        )
+
+    def test_errores_por_fila_sin_crear_nada(self):
+        lote = self.lote(3)
+        lote[0]['numero_despacho'] = '1000'
+        lote[1]['motorista'] = self.motorista.rut
+        lote[2]['tramos'][1]['origen'] = 'Farmacia inexistente'
+        lote.append({**self.lote(4)[3], 'tipo_movimiento': 'Otro', 'estado': 'listo'})
+        resultado = cargar_despachos(leer_despachos_json(json.dumps(lote)), self.usuario)
+        errores = {error['fila']: error['errores'] for error in resultado['errores']}
+        self.assertEqual(sorted(errores), ['despacho 1', 'despacho 2', 'despacho 3, tramo 2', 'despacho 4'])
+        self.assertIn('ya existe', errores['despacho 1'][0])
+        self.assertIn('despacho pendiente activo (1000)', errores['despacho 2'][0])
+        self.assertEqual(len(errores['despacho 4']), 2)
+        self.assertFalse(resultado['creados'])
+        self.assertFalse(Movimiento.objects.filter(numero_despacho__startswith='L').exists())
+
+        # Con parcial se crean los válidos.
+        valido = self.lote(6)[5]
+        resultado = cargar_despachos(leer_despachos_json(json.dumps(lote + [valido])), self.usuario, parcial=True)
+        self.assertTrue(resultado['creados'])
+        self.assertEqual(list(Movimiento.objects.filter(numero_despacho__startswith='L').values_list('numero_despacho', flat=True)), ['L0005'])
+
+    def test_csv_por_la_vista(self):
+        contenido = (
+            "numero_despacho;tramo_de;tipo_movimiento;origen;destino;motorista\n"
+            ";C1;;Farmacia 3;;\n"
+            "C1;;Reenvío;Farmacia 0;Calle 1;\n"
+            ";C9;;Farmacia 3;;\n"
+        ).encode('utf-8')
+        archivo = SimpleUploadedFile('lote.csv', contenido, content_type='text/csv')
+        respuesta = self.client.post(f"{reverse('movimiento_lote')}?delimitador=;&parcial=1", {'archivo': archivo})
+        self.assertEqual(respuesta.status_code, 201)
+        datos = respuesta.json()
+        self.assertEqual((datos['despachos'], datos['tramos']), (1, 1))
+        self.assertEqual([error['fila'] for error in datos['errores']], ['fila 4'])
+        despacho = Movimiento.objects.get(numero_despacho='C1')
+        self.assertEqual(despacho.usuario_responsable, self.usuario)
+        self.assertEqual(despacho.tramos_hijos.get().origen, 'Farmacia 3')
+
+    def test_vista_responde_json_sin_sesion_o_sin_token_csrf(self):
+        url = f"{reverse('movimiento_lote')}?validar=1"
+        cuerpo = json.dumps(self.lote(1))
+        cliente = Client(enforce_csrf_checks=True)
+
+        respuesta = cliente.post(url, cuerpo, content_type='application/json')
+        self.assertEqual((respuesta.status_code, respuesta['Content-Type']), (401, 'application/json'))
+        self.assertIn('error', respuesta.json())
+
+        cliente.force_login(self.usuario)
+        respuesta = cliente.post(url, cuerpo, content_type='application/json')
+        self.assertEqual((respuesta.status_code, respuesta['Content-Type']), (403, 'application/json'))
+        self.assertIn('CSRF', respuesta.json()['error'])
+
+        # Con la cookie `csrftoken` repetida en la cabecera X-CSRFToken se acepta.
+        cliente.get(reverse('movimiento_crear'))
+        respuesta = cliente.post(
+            url, cuerpo, content_type='application/json', HTTP_X_CSRFTOKEN=cliente.cookies['csrftoken'].value
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['errores'], [])
+        self.assertFalse(Movimiento.objects.filter(numero_despacho='L0000').exists())
+
+
+# --- IMPORTACIÓN DE FARMACIAS, MOTORISTAS Y MOTOS ---
+
+class ImportacionMaestrosTests(VistasFrecuentesTestCase):
+    ENCABEZADO_MOTORISTAS = 'rut;nombres;apellido_paterno;apellido_materno;fecha_nacimiento;direccion;comuna;telefono;correo\n'
+
+    def csv_motoristas(self, cantidad, desde=30000000):
+        filas = [
+            f"{formatear_rut(desde + i)};Nombre {i};Pérez;Soto;1990-05-01;Calle {i};ñuñoa;912345678;m{i}@discopro.cl\n"
+            for i in range(cantidad)
+        ]
+        return io.StringIO(self.ENCABEZADO_MOTORISTAS + ''.join(filas))
+
+    def test_consultas_por_lote_y_upsert(self):
+        importador = ImportadorMotoristas()
+        with CaptureQueriesContext(connection) as pocas:
+            importador.importar(self.csv_motoristas(2), aplicar=False, delimitador=';')
+        with CaptureQueriesContext(connection) as muchas:
+            resultado = importador.importar(self.csv_motoristas(50), aplicar=False, delimitador=';')
+        self.assertEqual(len(muchas), len(pocas))
+        self.assertEqual(resultado['creados'], 50)
+        self.assertFalse(Motorista.objects.filter(nombres='Nombre 0').exists())
+
+        # El RUT guardado sin puntos se reconoce y se actualiza en vez de duplicarse.
+        existente = Motorista.objects.create(
+            rut=formatear_rut(30000000).replace('.', ''), nombres='Antiguo', apellido_paterno='Pérez',
+            apellido_materno='Soto', fecha_nacimiento=datetime.date(1990, 5, 1), direccion='Calle 0',
+            comuna=self.comuna, telefono='912345678', correo='m0@discopro.cl'
+        )
+        total = contadores.obtener(contadores.TOTAL_MOTORISTAS)
+        resultado = importador.importar(self.csv_motoristas(3), delimitador=';')
+        self.assertEqual((resultado['creados'], resultado['actualizados'], resultado['errores']), (2, 1, []))
+        existente.refresh_from_db()
+        self.assertEqual((existente.nombres, existente.rut), ('Nombre 0', formatear_rut(30000000)))
+        self.assertEqual(contadores.obtener(contadores.TOTAL_MOTORISTAS), total + 2)
+        self.assertEqual(importador.importar(self.csv_motoristas(3), delimitador=';')['sin_cambios'], 3)
+
+    def test_errores_por_fila(self):
+        contenido = self.ENCABEZADO_MOTORISTAS + (
+            "12.345.678-0;Malo;X;Y;1990-01-01;Calle;Ñuñoa;1;malo@discopro.cl\n"
+            f"{formatear_rut(30000001)};Bueno;X;Y;01/01/1990;Calle;Atlantis;1;correo\n"
+        )
+        resultado = ImportadorMotoristas().importar(io.StringIO(contenido), delimitador=';')
+        errores = {error['fila']: ' '.join(error['errores']) for error in resultado['errores']}
+        self.assertIn('rut', errores[2])
+        for campo in ('fecha_nacimiento', 'comuna', 'correo'):
+            self.assertIn(campo, errores[3])
+        self.assertEqual(resultado['creados'], 0)
+
+    def test_motos_y_farmacias_desde_la_vista(self):
+        contenido = "patente,marca,modelo,color,anio\nab cd 00,Honda,CG,Azul,2021\nXY-ZW-99,Yamaha,YBR,Negro,2022\n"
+        datos = {'tipo': 'motos', 'delimitador': ',', 'archivo': SimpleUploadedFile('motos.csv', contenido.encode())}
+        respuesta = self.client.post(reverse('importar_maestros'), {**datos, 'simular': 'on'})
+        self.assertContains(respuesta, 'Simulación')
+        self.assertEqual(respuesta.context['resultado']['creados'], 1)
+        self.assertFalse(Moto.objects.filter(patente='XY-ZW-99').exists())
+
+        datos['archivo'] = SimpleUploadedFile('motos.csv', contenido.encode())
+        self.client.post(reverse('importar_maestros'), datos)
+        self.assertEqual(Moto.objects.get(patente='AB-CD-00').color, 'Azul')
+        self.assertTrue(Moto.objects.filter(patente='XY-ZW-99').exists())
+
+        contenido = (
+            "nombre,direccion,comuna,horario_apertura,horario_cierre,telefono\n"
+            "farmacia 0,Calle 0,Ñuñoa,08:00,20:00,221234567\n"
+        )
+        resultado = ImportadorFarmacias().importar(io.StringIO(contenido))
+        self.assertEqual((resultado['creados'], resultado['actualizados']), (0, 1))
+        self.assertEqual(Farmacia.objects.get(pk=self.farmacia.pk).horario_apertura, datetime.time(8, 0))
+
+    def test_rut(self):
+        self.assertEqual(formatear_rut(12345678), '12.345.678-5')
+        self.assertEqual(normalizar_rut('12345678-5'), '12.345.678-5')
+        self.assertEqual(normalizar_rut(' 6.000.000-k '), formatear_rut(6000000))
+        self.assertTrue(formatear_rut(6000000).endswith('-K'))
+        self.assertIsNone(normalizar_rut('12.345.678-4'))
+        self.assertIsNone(normalizar_rut('K'))
+        self.assertIn('6000000-k', variantes_rut(formatear_rut(6000000)))
+
+    def test_importador_sin_clave_no_se_instancia(self):
+        class SinClave(ImportadorMaestro):
+            modelo = Moto
+
+        with self.assertRaises(TypeError):
+            SinClave()
+
+
+# --- ÍNDICE DE VENCIMIENTOS ---
+
+class VencimientosTests(VistasFrecuentesTestCase):
+
+    def test_indice_se_mantiene_al_guardar(self):
+        hoy = timezone.localdate()
+        documentacion = DocumentacionMoto.objects.create(
+            moto=self.moto, permiso_circulacion_vencimiento=hoy - datetime.timedelta(days=1),
+            seguro_obligatorio_vencimiento=hoy + datetime.timedelta(days=10),
+        )
+        niveles = dict(Vencimiento.objects.filter(moto=self.moto).values_list('tipo', 'nivel'))
+        self.assertEqual(niveles, {
+            Vencimiento.TIPO_PERMISO: Vencimiento.NIVEL_VENCIDO, Vencimiento.TIPO_SEGURO: Vencimiento.NIVEL_POR_VENCER,
+        })
+
+        # Al renovar el permiso y quitar la fecha del seguro la fila se actualiza y la otra se borra.
+        documentacion.permiso_circulacion_vencimiento = hoy + datetime.timedelta(days=365)
+        documentacion.seguro_obligatorio_vencimiento = None
+        documentacion.save()
+        self.assertEqual(
+            list(Vencimiento.objects.filter(moto=self.moto).values_list('tipo', 'nivel')),
+            [(Vencimiento.TIPO_PERMISO, Vencimiento.NIVEL_VIGENTE)],
+        )
+        documentacion.delete()
+        self.assertFalse(Vencimiento.objects.filter(moto=self.moto).exists())
+
+        self.motorista.fecha_proximo_control = hoy + datetime.timedelta(days=5)
+        self.motorista.save()
+        Documentacion.objects.create(
+            motorista=self.motorista, nombreDocumento='Licencia Clase C', archivo='licencia.pdf', fechaVencimiento=hoy,
+        )
+        self.assertEqual(
+            sorted(Vencimiento.objects.filter(motorista=self.motorista).values_list('tipo', flat=True)),
+            [Vencimiento.TIPO_CONTROL, Vencimiento.TIPO_DOCUMENTO],
+        )
+        self.assertEqual(vencimientos.reparar(), [])
+
+    def test_alertas_diarias_y_reparacion(self):
+        hoy = timezone.localdate()
+        DocumentacionMoto.objects.create(moto=self.moto, revision_tecnica_vencimiento=hoy + datetime.timedelta(days=40))
+        revision = Vencimiento.objects.get(moto=self.moto)
+        self.assertEqual(revision.nivel, Vencimiento.NIVEL_VIGENTE)
+
+        # Con el paso de los días la misma fila pasa a por vencer y luego a vencida.
+        cambios = vencimientos.generar_alertas(hoy + datetime.timedelta(days=15))
+        self.assertEqual(cambios[Vencimiento.NIVEL_POR_VENCER], 1)
+        cambios = vencimientos.generar_alertas(hoy + datetime.timedelta(days=41))
+        self.assertEqual(cambios[Vencimiento.NIVEL_VENCIDO], 1)
+        self.assertEqual(vencimientos.generar_alertas(hoy + datetime.timedelta(days=41)), {0: 0, 1: 0, 2: 0})
+        self.assertEqual(
+            contadores.obtener(contadores.REVISION_VENCIMIENTOS), (hoy + datetime.timedelta(days=41)).toordinal()
+        )
+
+        # Cambios directos en la base (sin señales) se corrigen con reparar().
+        Motorista.objects.filter(pk=self.motorista.pk).update(fecha_proximo_control=hoy)
+        diferencias = vencimientos.reparar()
+        self.assertEqual([clave for clave, _, _ in diferencias], [revision.clave, f'motorista:{self.motorista.pk}:control'])
+        self.assertEqual(Vencimiento.objects.get(clave=revision.clave).nivel, Vencimiento.NIVEL_VIGENTE)
+        self.assertEqual(vencimientos.reparar(), [])
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', "Emula en SQLite el upsert de MySQL.")
+    def test_upsert_sin_clave_de_conflicto(self):
+        # Como en MySQL/MariaDB (sin unique_fields): guardar dos veces actualiza la misma fila.
+        hoy = timezone.localdate()
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                mock.patch.object(connection.ops, 'on_conflict_suffix_sql', side_effect=sufijo_sin_objetivo):
+            self.motorista.fecha_proximo_control = hoy
+            self.motorista.save()
+            self.motorista.fecha_proximo_control = hoy + datetime.timedelta(days=90)
+            self.motorista.save()
+            Vencimiento.objects.filter(motorista=self.motorista).update(fecha=hoy)
+            self.assertEqual(len(vencimientos.reparar()), 1)
+        fila = Vencimiento.objects.get(motorista=self.motorista)
+        self.assertEqual((fila.fecha, fila.nivel), (hoy + datetime.timedelta(days=90), Vencimiento.NIVEL_VIGENTE))
+
+    def test_widget_del_dashboard(self):
+        hoy = timezone.localdate()
+        for i, moto in enumerate(Moto.objects.order_by('pk')):
+            DocumentacionMoto.objects.create(moto=moto, seguro_obligatorio_vencimiento=hoy + datetime.timedelta(days=i * 20 - 15))
+        vencimientos.generar_alertas(hoy)
+
+        with CaptureQueriesContext(connection) as capturadas:
+            respuesta = self.client.get(reverse('index'))
+        alertas = respuesta.context['alertas_vencimiento']
+        self.assertEqual([alerta.nivel for alerta in alertas], [0, 1, 1])
+        self.assertEqual(alertas[0].fecha, hoy - datetime.timedelta(days=15))
+        self.assertEqual(respuesta.context['revision_vencimientos'], hoy)
+        self.assertContains(respuesta, alertas[0].moto.patente)
+        self.assertEqual(sum('discopro_vencimiento' in consulta['sql'] for consulta in capturadas.captured_queries), 1)
+
+
+# --- ÍNDICE DE BÚSQUEDA ---
+
+def sufijo_sin_objetivo(fields, on_conflict, update_fields, unique_fields):
+    """ON DUPLICATE KEY UPDATE de MySQL emulado en SQLite: sin clave de conflicto, reacciona a cualquier índice único."""
+    if on_conflict != OnConflict.UPDATE:
+        return ''
+    campos = ", ".join(f"{campo} = EXCLUDED.{campo}" for campo in map(connection.ops.quote_name, update_fields))
+    return f"ON CONFLICT DO UPDATE SET {campos}"
+
+
+class BusquedaTests(VistasFrecuentesTestCase):
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', "Emula en SQLite el upsert de MySQL.")
+    def test_upsert_sin_clave_de_conflicto(self):
+        # MySQL/MariaDB no aceptan unique_fields en bulk_create: el índice se mantiene igual sin ellos.
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                mock.patch.object(connection.ops, 'on_conflict_suffix_sql', side_effect=sufijo_sin_objetivo):
+            despacho = Movimiento.objects.create(
+                numero_despacho='X900', tipo_movimiento=self.despacho.tipo_movimiento, usuario_responsable=self.usuario,
+                origen='Farmacia 0', destino='Calle Larga', estado='completado',
+            )
+            despacho.destino = 'Avenida Grecia'
+            despacho.save()
+        self.assertEqual(busqueda.buscar_despachos('grecia'), [despacho.pk])
+        self.assertEqual(busqueda.buscar_despachos('larga'), [])
+
+    def test_coincide_por_los_tramos_y_por_prefijo(self):
+        tramo = Movimiento.objects.filter(movimiento_padre=self.despacho).first()
+        tramo.destino = 'Pasaje Ñandú Azul'
+        tramo.save()
+
+        self.assertEqual(busqueda.buscar_despachos('ñandú'), [self.despacho.pk])
+        # Todas las palabras deben coincidir, como prefijo y sin importar tildes en SQLite.
+        self.assertEqual(busqueda.buscar_despachos('pasa azu'), [self.despacho.pk])
+        self.assertEqual(busqueda.buscar_despachos('pasaje rojo'), [])
+        if connection.vendor == 'sqlite':
+            self.assertEqual(busqueda.buscar_despachos('nandu'), [self.despacho.pk])
+
+        respuesta = self.client.get(reverse('movimiento_lista'), {'q': 'ñandú'})
+        self.assertEqual([m.pk for m in respuesta.context['movimientos']], [self.despacho.pk])
+
+        tramo.delete()
+        self.assertEqual(busqueda.buscar_despachos('ñandú'), [])
+
+    def test_listado_ordena_por_relevancia_sin_orden_elegido(self):
+        def crear(numero, origen, destino, dias):
+            return Movimiento.objects.create(
+                numero_despacho=numero, tipo_movimiento=self.despacho.tipo_movimiento, usuario_responsable=self.usuario,
+                origen=origen, destino=destino, estado='completado',
+                fecha_movimiento=timezone.now() - datetime.timedelta(days=dias)
+            )
+        reciente = crear('Z100', 'Farmacia 0', 'Avenida Grecia', 1)
+        relevante = crear('Z200', 'Grecia', 'Grecia', 2)
+
+        def listado(**params):
+            respuesta = self.client.get(reverse('movimiento_lista'), params)
+            return [m.pk for m in respuesta.context['movimientos']]
+
+        self.assertEqual(listado(q='grecia'), [relevante.pk, reciente.pk])
+        self.assertEqual(listado(q='grecia', sort='-fecha_movimiento'), [reciente.pk, relevante.pk])
+        self.assertEqual(busqueda.buscar_despachos('grecia'), [relevante.pk, reciente.pk])
+
+        # El cursor de la página siguiente conserva el orden por relevancia.
+        pagina = paginar_por_cursor(views.filtrar_despachos({'q': 'grecia'}), 1)
+        self.assertEqual([m.pk for m in pagina], [relevante.pk])
+        pagina = paginar_por_cursor(views.filtrar_despachos({'q': 'grecia'}), 1, pagina.cursor_siguiente)
+        self.assertEqual([m.pk for m in pagina], [reciente.pk])
+        self.assertFalse(pagina.has_next())
+
+    def test_reconstruir_indice(self):
+        numero = self.despacho.numero_despacho
+        DocumentoBusquedaMovimiento.objects.all().delete()
+        self.assertEqual(busqueda.buscar_despachos(numero), [])
+        self.assertEqual(busqueda.reconstruir_indice(tamano_lote=7), Movimiento.objects.count())
+        self.assertEqual(busqueda.buscar_despachos(numero), [self.despacho.pk])
+
+
+# --- PAGINACIÓN ---
+
+class PaginacionTests(VistasFrecuentesTestCase):
+
+    def test_total_acotado_no_limita_la_navegacion(self):
+        class Paginador(PaginadorAcotado):
+            limite = 5
+
+        movimientos = Movimiento.objects.filter(pk__gt=0).order_by('pk')
+        paginador = Paginador(movimientos, 4)
+        self.assertEqual((paginador.count, paginador.aproximado), (5, 'cota'))
+        self.assertEqual(paginador.descripcion_total, "Más de 5 resultados")
+
+        # Más allá de la cota: la página existe y sabe si hay otra después.
+        pagina = paginador.page(10)
+        self.assertEqual([m.pk for m in pagina], list(movimientos.values_list('pk', flat=True)[36:40]))
+        self.assertTrue(pagina.has_next())
+        self.assertGreaterEqual(paginador.num_pages, 11)
+        self.assertEqual(list(paginador.get_elided_page_range(10, on_each_side=1, on_ends=1))[-1], 11)
+
+        ultima = paginador.page(23)
+        self.assertEqual((len(ultima), ultima.has_next(), ultima.end_index()), (2, False, 90))
+        with self.assertRaises(EmptyPage):
+            paginador.page(24)
+
+        # Una estimación del motor por debajo del total tampoco corta el final del listado.
+        with mock.patch('discopro.paginacion.conteo_estimado', return_value=10):
+            paginador = Paginador(Movimiento.objects.order_by('pk'), 4)
+            self.assertEqual((paginador.count, paginador.aproximado), (10, 'estimado'))
+            self.assertEqual(len(paginador.page(23)), 2)
+
+    def test_pagina_del_listado_sobre_la_cota(self):
+        Moto.objects.bulk_create([
+            Moto(patente=f'ZZ-{i:04d}', marca='Honda', modelo='CG', color='Negro', anio=2021) for i in range(50)
+        ])
+        with mock.patch.object(PaginadorAcotado, 'limite', 5):
+            respuesta = self.client.get(f"{reverse('moto_lista')}?q=honda&page=2")
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertTrue(respuesta.context['page_obj'].has_next())
+            respuesta = self.client.get(f"{reverse('moto_lista')}?q=honda&page=3")
+        self.assertEqual(len(respuesta.context['motos']), 15)
+        self.assertFalse(respuesta.context['page_obj'].has_next())
+
+    def test_conteo_exacto_bajo_la_cota(self):
+        with CaptureQueriesContext(connection) as capturadas:
+            paginador = PaginadorAcotado(Movimiento.objects.filter(estado='anulado').order_by('pk'), 4)
+            total = paginador.count
+        self.assertEqual(total, Movimiento.objects.filter(estado='anulado').count())
+        self.assertIsNone(paginador.aproximado)
+        self.assertEqual(paginador.descripcion_total, f"{total} resultados")
+        # El conteo recorre a lo más limite + 1 filas.
+        self.assertIn(f'LIMIT {PaginadorAcotado.limite + 1}', capturadas[0]['sql'])
+        self.assertEqual(paginador.num_pages, -(-total // 4))
+        with self.assertRaises(EmptyPage):
+            paginador.page(paginador.num_pages + 1)
+
+        uno = PaginadorAcotado(Movimiento.objects.filter(pk=self.despacho.pk), 4)
+        self.assertEqual(uno.descripcion_total, "1 resultado")
+
+    def recorrer(self, queryset, tamano):
+        """Pks de todas las páginas por cursor hacia adelante, y de vuelta hacia atrás desde la última."""
+        paginas, cursor = [], None
+        while True:
+            pagina = paginar_por_cursor(queryset, tamano, cursor)
+            paginas.append([m.pk for m in pagina])
+            if not pagina.has_next():
+                break
+            cursor = pagina.cursor_siguiente
+        hacia_atras = []
+        while pagina.has_previous():
+            pagina = paginar_por_cursor(queryset, tamano, pagina.cursor_anterior)
+            hacia_atras.insert(0, [m.pk for m in pagina])
+        return paginas, hacia_atras
+
+    def test_cursor_recorre_el_orden_completo(self):
+        despachos = Movimiento.objects.filter(movimiento_padre__isnull=True)
+        # Hay despachos sin motorista: el orden por su nombre pasa por valores NULL.
+        self.assertTrue(despachos.filter(motorista_asignado=None).exists())
+        for orden in ('-fecha_movimiento', 'origen', 'motorista_asignado__nombres', '-motorista_asignado__nombres'):
+            queryset = despachos.order_by(orden)
+            # Empates (todos los 'origen' son iguales) por clave primaria; NULL como el menor valor, igual que SQLite.
+            desempate = '-pk' if orden.startswith('-') else 'pk'
+            esperado = list(queryset.order_by(orden, desempate).values_list('pk', flat=True))
+            paginas, hacia_atras = self.recorrer(queryset, 7)
+            with self.subTest(orden=orden):
+                self.assertEqual(sum(paginas, []), esperado)
+                self.assertEqual(hacia_atras, paginas[:-1])
+
+    def test_cursor_invalido_vuelve_al_inicio(self):
+        queryset = Movimiento.objects.order_by('pk')
+        primera = paginar_por_cursor(queryset, 5)
+        self.assertFalse(primera.has_previous())
+        for cursor in ('alterado', primera.cursor_siguiente[:-2] + 'xx'):
+            self.assertEqual(list(paginar_por_cursor(queryset, 5, cursor)), list(primera))
+        # Un cursor de otro orden tampoco se aplica.
+        otro = paginar_por_cursor(Movimiento.objects.order_by('-pk'), 5).cursor_siguiente
+        self.assertEqual(list(paginar_por_cursor(queryset, 5, otro)), list(primera))
+
+    def test_listado_por_cursor_sin_count_ni_offset(self):
+        url = reverse('movimiento_lista')
+        respuesta = self.client.get(url)
+        pagina = respuesta.context['page_obj']
+        with CaptureQueriesContext(connection) as capturadas:
+            respuesta = self.client.get(url, {'cursor': pagina.cursor_siguiente})
+        self.assertTrue(respuesta.context['paginacion_cursor'])
+        self.assertTrue(respuesta.context['page_obj'].has_previous())
+        sql = " ".join(c['sql'] for c in capturadas.captured_queries if Movimiento._meta.db_table in c['sql'])
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+
+# --- CACHÉ DE REPORTES ---
+
+class MediaTemporalMixin:
+    """Los archivos que guardan las pruebas van a un MEDIA_ROOT temporal."""
+
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajuste = override_settings(MEDIA_ROOT=directorio.name)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+
+
+class VersionesReporteTests(MediaTemporalMixin, VistasFrecuentesTestCase):
+
+    def test_claves_de_un_rango(self):
+        dia = datetime.date
+        self.assertEqual(reportes.claves_version_periodo(dia(2024, 12, 30), dia(2026, 3, 3)), [
+            'movimientos:dia:2024-12-30', 'movimientos:dia:2024-12-31', 'movimientos:anio:2025',
+            'movimientos:mes:2026-01', 'movimientos:mes:2026-02',
+            'movimientos:dia:2026-03-01', 'movimientos:dia:2026-03-02',
+        ])
+        for tipo, clave in (('diario', 'dia:2025-03-15'), ('mensual', 'mes:2025-03'), ('anual', 'anio:2025')):
+            periodo = reportes.periodo_reporte(tipo, dia(2025, 3, 15))
+            self.assertEqual(reportes.claves_version_periodo(*periodo), [f'movimientos:{clave}'])
+
+    def test_un_incremento_por_clave_al_confirmar(self):
+        hoy = timezone.localdate()
+        dia_hoy = reportes.periodo_reporte('diario', hoy)
+        mes_pasado = reportes.periodo_reporte('mensual', hoy.replace(day=1) - datetime.timedelta(days=1))
+        antes = reportes.versiones_periodos([dia_hoy, mes_pasado])
+        with self.captureOnCommitCallbacks(execute=True):
+            for numero in ('9001', '9002'):
+                Movimiento.objects.create(
+                    numero_despacho=numero, tipo_movimiento=self.despacho.tipo_movimiento,
+                    usuario_responsable=self.usuario, origen='Farmacia 1', destino='Calle 1',
+                )
+            # Dentro de la transacción las versiones aún no cambian.
+            self.assertEqual(reportes.version_reporte(*dia_hoy), antes[dia_hoy])
+        despues = reportes.versiones_periodos([dia_hoy, mes_pasado])
+        self.assertEqual(despues[dia_hoy], antes[dia_hoy] + 1)
+        self.assertEqual(despues[mes_pasado], antes[mes_pasado])
+        self.assertFalse(contadores.obtener(reportes.VERSION_MOVIMIENTOS))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_contexto_se_recalcula_solo_si_cambia_su_periodo(self):
+        hoy = timezone.localdate()
+        ayer = hoy - datetime.timedelta(days=1)
+        calcular = mock.Mock(side_effect=lambda: {'total': calcular.call_count})
+        periodos = [(ayer, hoy)]
+        self.assertEqual(reportes.contexto_cacheado('prueba', periodos, calcular), {'total': 1})
+        self.assertEqual(reportes.contexto_cacheado('prueba', periodos, calcular), {'total': 1})
+
+        # Un movimiento de hoy no toca el rango de ayer; uno de ayer sí.
+        with self.captureOnCommitCallbacks(execute=True):
+            reportes.invalidar_reportes(hoy)
+        self.assertEqual(reportes.contexto_cacheado('prueba', periodos, calcular), {'total': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            reportes.invalidar_reportes(ayer)
+        self.assertEqual(reportes.contexto_cacheado('prueba', periodos, calcular), {'total': 2})
+
+    def test_pdf_de_un_periodo_cerrado_se_sirve_desde_disco(self):
+        referencia = timezone.localdate().replace(day=1) - datetime.timedelta(days=1)
+        desde, hasta = reportes.periodo_reporte('mensual', referencia)
+        nombre = reportes.nombre_pdf_cache(
+            'mensual', desde, hasta, 'estado', self.usuario.pk, reportes.version_reporte(desde, hasta)
+        )
+        default_storage.save(nombre, ContentFile(b'%PDF-1.4 cacheado'))
+
+        respuesta = self.client.get(reverse('reporte_pdf'), {'tipo': 'mensual', 'fecha': referencia.isoformat()})
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        self.assertEqual(b''.join(respuesta.streaming_content), b'%PDF-1.4 cacheado')
+        self.assertFalse(TrabajoReporte.objects.exists())
+
+        # Sin fecha se reporta el mes en curso, que no está en disco: se encola.
+        self.assertEqual(self.client.get(reverse('reporte_pdf'), {'tipo': 'mensual'}).status_code, 302)
+        self.assertEqual(TrabajoReporte.objects.get().desde, timezone.localdate().replace(day=1))
+
+    def test_purga_los_pdf_personalizados_antiguos(self):
+        dia = datetime.date(2025, 3, 1)
+        personalizado = reportes.nombre_pdf_cache('personalizado', dia, dia, 'estado', self.usuario.pk, 1)
+        mensual = reportes.nombre_pdf_cache('mensual', dia, dia, 'estado', self.usuario.pk, 1)
+        for nombre in (personalizado, mensual):
+            default_storage.save(nombre, ContentFile(b'%PDF'))
+            antiguo = (timezone.now() - datetime.timedelta(days=10)).timestamp()
+            os.utime(default_storage.path(nombre), (antiguo, antiguo))
+
+        self.assertEqual(reportes.purgar_pdf_cache(dias=7), 1)
+        self.assertFalse(default_storage.exists(personalizado))
+        self.assertTrue(default_storage.exists(mensual))
+
+
+# --- MOTOR DE REPORTES ---
+
+class CuboReportesTests(VistasFrecuentesTestCase):
+
+    def test_total_sin_agrupar_con_un_agregado(self):
+        desde, hasta = reportes.periodo_reporte('anual')
+        en_rango = reportes.filtrar_periodo(Movimiento.objects.all(), desde, hasta)
+        for filtros, fuente, esperado in (
+            ({}, 'resumen', en_rango.count()),
+            ({'origen': 'Farmacia 1'}, 'movimientos', en_rango.filter(origen='Farmacia 1').count()),
+        ):
+            with CaptureQueriesContext(connection) as capturadas:
+                cubo = reportes.consultar_movimientos(desde, hasta, filtros=filtros)
+            self.assertEqual(cubo.fuente, fuente)
+            self.assertEqual(cubo.total, esperado)
+            self.assertEqual(len(cubo), 1)
+            self.assertEqual(len(capturadas), 1)
+            self.assertNotIn('GROUP BY', capturadas[0]['sql'])
+
+        vacio = reportes.consultar_movimientos(hasta, hasta + datetime.timedelta(days=1))
+        self.assertEqual((vacio.total, len(vacio)), (0, 0))
+
+    def test_agrupa_por_periodo_y_dimension_en_ambas_fuentes(self):
+        desde, hasta = reportes.periodo_reporte('anual')
+        movimientos = list(reportes.filtrar_periodo(Movimiento.objects.all(), desde, hasta))
+        esperado = {}
+        for movimiento in movimientos:
+            clave = (timezone.localtime(movimiento.fecha_movimiento).date().replace(day=1), movimiento.estado)
+            esperado[clave] = esperado.get(clave, 0) + 1
+
+        # El resumen diario responde por mes; con la dimensión 'origen' (que no tiene) se va a Movimiento.
+        for dimensiones, fuente in ((('estado',), 'resumen'), (('estado', 'origen'), 'movimientos')):
+            cubo = reportes.consultar_movimientos(desde, hasta, granularidad='mes', dimensiones=dimensiones)
+            self.assertEqual(cubo.fuente, fuente)
+            self.assertEqual({(f['periodo'], f['estado']): f['total'] for f in cubo.agrupar('periodo', 'estado')}, esperado)
+            self.assertEqual(cubo.total, len(movimientos))
+
+        por_hora = reportes.consultar_movimientos(desde, hasta, granularidad='hora', filtros={'estado': 'completado'})
+        self.assertEqual(por_hora.fuente, 'movimientos')
+        self.assertEqual(por_hora.total, sum(1 for m in movimientos if m.estado == 'completado'))
+
+        with self.assertRaises(ValueError):
+            reportes.consultar_movimientos(desde, hasta, dimensiones=('comuna',))
+
+
+# --- COLA DE REPORTES ---
+
+class TrabajosReporteTests(MediaTemporalMixin, VistasFrecuentesTestCase):
+
+    def solicitar(self):
+        desde, hasta = reportes.periodo_reporte('mensual')
+        return reportes.solicitar_reporte('mensual', desde, hasta, 'estado', self.usuario)
+
+    def test_un_solo_trabajo_activo_por_clave(self):
+        trabajo, creado = self.solicitar()
+        self.assertTrue(creado)
+        self.assertEqual(self.solicitar(), (trabajo, False))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TrabajoReporte.objects.create(
+                tipo='mensual', desde=trabajo.desde, hasta=trabajo.hasta, clave=trabajo.clave, solicitado_por=self.usuario
+            )
+
+        # Terminado, libera la clave: la siguiente solicitud encola un trabajo nuevo.
+        trabajo.estado = TrabajoReporte.ESTADO_COMPLETADO
+        trabajo.save(update_fields=['estado'])
+        trabajo.refresh_from_db()
+        self.assertIsNone(trabajo.clave_activa)
+        nuevo, creado = self.solicitar()
+        self.assertTrue(creado)
+        self.assertNotEqual(nuevo.pk, trabajo.pk)
+
+    def test_de_la_solicitud_a_la_descarga(self):
+        respuesta = self.client.get(reverse('reporte_pdf'), {'tipo': 'anual'})
+        trabajo = TrabajoReporte.objects.get()
+        self.assertRedirects(respuesta, trabajo.get_absolute_url())
+        url_estado = reverse('reporte_trabajo_estado', args=[trabajo.pk])
+        self.assertEqual(self.client.get(url_estado).json()['estado'], TrabajoReporte.ESTADO_PENDIENTE)
+
+        self.assertEqual(reportes.tomar_siguiente_trabajo(), trabajo)
+        self.assertIsNone(reportes.tomar_siguiente_trabajo())
+        trabajo.refresh_from_db()
+        reportes.procesar_trabajo(trabajo)
+        self.assertEqual((trabajo.estado, trabajo.progreso), (TrabajoReporte.ESTADO_COMPLETADO, 100))
+
+        estado = self.client.get(url_estado).json()
+        self.assertTrue(estado['terminado'])
+        descarga = self.client.get(estado['url_descarga'])
+        self.assertEqual(descarga['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(descarga.streaming_content).startswith(b'%PDF'))
+
+        # Sólo quien lo pidió puede verlo; la siguiente solicitud idéntica sale del PDF cacheado.
+        otro = Usuario.objects.create_user('operador', 'operador@discopro.cl', 'clave12345')
+        self.client.force_login(otro)
+        self.assertEqual(self.client.get(url_estado).status_code, 404)
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get(reverse('reporte_pdf'), {'tipo': 'anual'})['Content-Type'], 'application/pdf')
+        self.assertEqual(TrabajoReporte.objects.count(), 1)
+
+    def test_trabajos_colgados_y_antiguos(self):
+        trabajo, _ = self.solicitar()
+        reportes.tomar_siguiente_trabajo()
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(fecha_inicio=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(reportes.liberar_trabajos_colgados(minutos=30), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, TrabajoReporte.ESTADO_PENDIENTE)
+
+        # Los activos no se purgan; los terminados antiguos sí, con su archivo.
+        antiguos = TrabajoReporte.objects.filter(pk=trabajo.pk)
+        antiguos.update(fecha_solicitud=timezone.now() - datetime.timedelta(days=10))
+        self.assertEqual(reportes.purgar_trabajos(dias=7), 0)
+        trabajo.archivo.save('viejo.pdf', ContentFile(b'%PDF'), save=False)
+        ruta = trabajo.archivo.name
+        antiguos.update(estado=TrabajoReporte.ESTADO_ERROR, archivo=ruta)
+        self.assertEqual(reportes.purgar_trabajos(dias=7), 1)
+        self.assertFalse(TrabajoReporte.objects.exists())
+        self.assertFalse(default_storage.exists(ruta))
+
+    def test_solicitudes_simultaneas(self):
+        trabajo, _ = self.solicitar()
+        buscar = QuerySet.get
+
+        def lecturas(*pasos):
+            """QuerySet.get que ejecuta antes de cada lectura un paso de la solicitud concurrente."""
+            pendientes = list(pasos)
+
+            def get(queryset, *args, **kwargs):
+                if pendientes:
+                    pendientes.pop(0)()
+                return buscar(queryset, *args, **kwargs)
+            return mock.patch.object(QuerySet, 'get', autospec=True, side_effect=get)
+
+        def ocultar():
+            raise TrabajoReporte.DoesNotExist
+
+        # La otra solicitud no ve el trabajo al buscarlo y choca con él al insertar: se relee.
+        with lecturas(ocultar):
+            self.assertEqual(self.solicitar(), (trabajo, False))
+
+        # Si el trabajo termina entre el INSERT fallido y la relectura, se reintenta y se encola uno nuevo.
+        def terminar():
+            trabajo.estado = TrabajoReporte.ESTADO_COMPLETADO
+            trabajo.save(update_fields=['estado'])
+        with lecturas(ocultar, terminar):
+            nuevo, creado = self.solicitar()
+        self.assertTrue(creado)
+        self.assertEqual(TrabajoReporte.objects.get(clave_activa=trabajo.clave), nuevo)
+
+
+# --- RESUMEN DIARIO ---
+
+def resumen_diario():
+    return {
+        (fecha, estado, tipo_id, motorista_id): total
+        for fecha, estado, tipo_id, motorista_id, total in ResumenDiarioMovimiento.objects.filter(
+            total__gt=0
+        ).values_list('fecha', 'estado', 'tipo_movimiento_id', 'motorista_id', 'total')
+    }
+
+
+def resumen_esperado():
+    """El resumen diario contado desde la tabla de movimientos."""
+    conteo = {}
+    for fila in Movimiento.objects.values_list('fecha_movimiento', 'estado', 'tipo_movimiento_id', 'motorista_asignado_id'):
+        clave = reportes.clave_resumen(*fila)
+        conteo[clave] = conteo.get(clave, 0) + 1
+    return conteo
+
+
+class ResumenDiarioTests(VistasFrecuentesTestCase):
+
+    def test_se_mantiene_al_guardar_y_eliminar(self):
+        self.assertEqual(resumen_diario(), resumen_esperado())
+
+        tramo = Movimiento.objects.filter(movimiento_padre=self.despacho).first()
+        tramo.estado = 'anulado'
+        tramo.fecha_movimiento -= datetime.timedelta(days=40)
+        tramo.save()
+        self.assertEqual(resumen_diario(), resumen_esperado())
+
+        tramo.delete()
+        self.assertEqual(resumen_diario(), resumen_esperado())
+
+    def test_reconstruir_desde_un_dia(self):
+        esperado = resumen_esperado()
+        desde = timezone.localdate() - datetime.timedelta(days=60)
+        ResumenDiarioMovimiento.objects.all().update(total=99)
+        ResumenDiarioMovimiento.objects.filter(fecha__gte=desde).delete()
+
+        reportes.reconstruir_resumen(desde)
+        reconstruido = resumen_diario()
+        for clave, total in reconstruido.items():
+            # Los días anteriores a `desde` no se tocan.
+            self.assertEqual(total, esperado[clave] if clave[0] >= desde else 99)
+        self.assertEqual(
+            {clave for clave in reconstruido if clave[0] >= desde}, {clave for clave in esperado if clave[0] >= desde}
+        )
+
+        reportes.reconstruir_resumen()
+        self.assertEqual(resumen_diario(), esperado)
+
+    def test_una_sola_fila_sin_motorista(self):
+        clave = (timezone.localdate(), 'completado', self.despacho.tipo_movimiento_id, None)
+        reportes.ajustar_resumen(clave, 2)
+        filtro = dict(zip(('fecha', 'estado', 'tipo_movimiento_id', 'motorista_id'), clave))
+        # Los NULL no chocan en una restricción única: la clave del motorista usa 0.
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ResumenDiarioMovimiento.objects.create(total=1, **filtro)
+
+        # Aunque otro proceso la cree entre el UPDATE y el INSERT, se suma a la misma fila.
+        with mock.patch.object(QuerySet, 'update', side_effect=[0, 1], autospec=True) as actualizar:
+            reportes.ajustar_resumen(clave, 3)
+        self.assertEqual(actualizar.call_count, 2)
+        self.assertEqual(ResumenDiarioMovimiento.objects.filter(**filtro).count(), 1)
+
+
+# --- PDF POR LOTES ---
+
+class ReportePdfPorLotesTests(VistasFrecuentesTestCase):
+
+    def test_lotes_acotados_en_una_pasada(self):
+        desde, hasta = reportes.periodo_reporte('anual')
+        movimientos = reportes.filtrar_periodo(Movimiento.objects.all(), desde, hasta).order_by('-fecha_movimiento')
+        totales = dict(movimientos.order_by().values_list('estado').annotate(total=Count('pk')))
+        avances = []
+        with CaptureQueriesContext(connection) as capturadas:
+            lotes = list(reportes.lotes_reporte_pdf(movimientos, totales, tamano_lote=7, progreso=avances.append))
+        self.assertEqual(len(capturadas), 1)
+
+        self.assertEqual([lote['incluir_resumen'] for lote in lotes], [True] + [False] * (len(lotes) - 1))
+        filas_por_lote = [sum(len(seccion['filas']) for seccion in lote['secciones']) for lote in lotes]
+        self.assertTrue(all(filas <= 7 for filas in filas_por_lote))
+        self.assertEqual(sum(filas_por_lote), sum(totales.values()))
+        self.assertEqual(avances, [7 * i for i in range(1, len(avances) + 1)])
+
+        # Las secciones salen en el orden de SECCIONES_PDF; la que cruza un lote sigue como continuación.
+        estados = []
+        for lote in lotes:
+            for seccion in lote['secciones']:
+                self.assertEqual(seccion['continuacion'], bool(estados) and estados[-1] == seccion['estado'])
+                estados.append(seccion['estado'])
+        self.assertEqual(list(dict.fromkeys(estados)), [e for e in reportes.SECCIONES_PDF if e in totales])
+
+    def test_pdf_unido_y_numerado(self):
+        desde, hasta = reportes.periodo_reporte('anual')
+        filas = reportes.filtrar_periodo(Movimiento.objects.all(), desde, hasta).count()
+        with mock.patch.object(
+            reportes, 'lotes_reporte_pdf', functools.partial(reportes.lotes_reporte_pdf, tamano_lote=30)
+        ), mock.patch.object(utils, 'render_pdf_archivo', wraps=utils.render_pdf_archivo) as renderizar:
+            pdf = reportes.generar_reporte_pdf('anual', desde, hasta, 'estado', self.usuario)
+        # Un documento xhtml2pdf por lote, unidos en uno solo.
+        self.assertEqual(renderizar.call_count, -(-filas // 30))
+        with pdf:
+            paginas = PdfReader(pdf, strict=True).pages
+            self.assertGreaterEqual(len(paginas), renderizar.call_count)
+            self.assertIn(f'Página 1 de {len(paginas)}', paginas[0].extract_text())
+            self.assertIn(f'Página {len(paginas)} de {len(paginas)}', paginas[-1].extract_text())
+
+
+# --- EXPORTACIÓN ---
+
+class ExportacionTests(VistasFrecuentesTestCase):
+
+    def test_csv_con_tramos_bajo_su_despacho(self):
+        respuesta = self.client.get(reverse('movimiento_exportar'), {'formato': 'csv', 'sort': 'numero_despacho'})
+        self.assertTrue(respuesta.streaming)
+        self.assertIn('attachment;', respuesta['Content-Disposition'])
+        contenido = b''.join(respuesta.streaming_content).decode('utf-8-sig')
+        encabezado, *filas = csv.reader(io.StringIO(contenido))
+        self.assertEqual(tuple(encabezado), exportacion.ENCABEZADOS_EXPORTACION)
+        self.assertEqual(len(filas), Movimiento.objects.count())
+
+        numeros = [fila[2] for fila in filas if fila[1] == 'Despacho']
+        self.assertEqual(numeros, sorted(numeros))
+        for posicion, fila in enumerate(filas):
+            if fila[1] == 'Despacho':
+                # Sus dos tramos lo siguen, con el número del despacho.
+                self.assertEqual([tramo[1:3] for tramo in filas[posicion + 1:posicion + 3]], [['Tramo', fila[2]]] * 2)
+
+    def test_lotes_con_una_consulta_de_tramos_cada_uno(self):
+        despachos = Movimiento.objects.filter(movimiento_padre__isnull=True).order_by('pk')
+        with CaptureQueriesContext(connection) as capturadas:
+            filas = list(exportacion.filas_movimientos(despachos, tamano_lote=4))
+        self.assertEqual(len(filas), Movimiento.objects.count())
+        self.assertEqual(len(capturadas), 1 + -(-despachos.count() // 4))
+
+    def test_xlsx_valido_en_trozos(self):
+        respuesta = self.client.get(reverse('movimiento_exportar'), {'formato': 'xlsx', 'q': 'Calle 1'})
+        trozos = list(respuesta.streaming_content)
+        self.assertGreater(len(trozos), 1)
+        with zipfile.ZipFile(io.BytesIO(b''.join(trozos))) as libro:
+            self.assertIsNone(libro.testzip())
+            hoja = libro.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        despachos = views.filtrar_despachos({'q': 'Calle 1'})
+        esperadas = despachos.count() + Movimiento.objects.filter(despacho_raiz__in=despachos).count()
+        self.assertGreater(esperadas, 0)
+        self.assertEqual(hoja.count('<row>'), 1 + esperadas)
+
+
+# --- CONTADORES DEL DASHBOARD ---
+
+class ContadoresTests(VistasFrecuentesTestCase):
+
+    def assertContadoresAlDia(self):
+        correctos = contadores.calcular_contadores()
+        self.assertEqual(contadores.obtener_varios(correctos), correctos)
+
+    def test_las_senales_los_mantienen(self):
+        self.assertContadoresAlDia()
+        pendiente = Movimiento.objects.filter(
+            movimiento_padre__isnull=True, estado='pendiente', motorista_asignado__isnull=False
+        ).first()
+        pendiente.estado = 'completado'
+        pendiente.save()
+        Movimiento.objects.filter(movimiento_padre__isnull=True, estado='anulado').first().delete()
+        Farmacia.objects.create(
+            nombre='Farmacia Nueva', direccion='Calle 9', comuna=self.comuna,
+            horario_apertura='09:00', horario_cierre='20:00', telefono='221234567'
+        )
+        self.motorista.delete()
+        self.assertContadoresAlDia()
+        self.assertEqual(contadores.reconciliar(), [])
+
+    def test_reconciliar_corrige_desvios(self):
+        Contador.objects.filter(clave=contadores.TOTAL_DESPACHOS).update(valor=1)
+        Contador.objects.create(clave=contadores.clave_pendientes_motorista(999), valor=3)
+        correcto = contadores.calcular_contadores()[contadores.TOTAL_DESPACHOS]
+        self.assertEqual(contadores.reconciliar(), [
+            (contadores.clave_pendientes_motorista(999), 3, 0), (contadores.TOTAL_DESPACHOS, 1, correcto),
+        ])
+        self.assertContadoresAlDia()
+        self.assertFalse(Contador.objects.filter(clave=contadores.clave_pendientes_motorista(999)).exists())
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_el_dashboard_los_lee_de_la_cache(self):
+        cifras = contadores.dashboard()
+        self.assertEqual(cifras['total_movimientos'], Movimiento.objects.filter(movimiento_padre__isnull=True).count())
+        with self.assertNumQueries(0):
+            self.assertEqual(contadores.dashboard(), cifras)
+
+        # Un incremento confirmado invalida su entrada.
+        with self.captureOnCommitCallbacks(execute=True):
+            contadores.incrementar(contadores.TOTAL_USUARIOS)
+        self.assertEqual(contadores.dashboard()['total_usuarios'], cifras['total_usuarios'] + 1)
+
+
+# --- AUTOCOMPLETADO ---
+
+class AutocompletarTests(VistasFrecuentesTestCase):
+
+    def buscar(self, fuente, **params):
+        return self.client.get(reverse('autocompletar', args=[fuente]), params).json()
+
+    def test_busca_por_prefijos_sin_tildes_y_pagina(self):
+        datos = self.buscar('motoristas', q='juan PEREZ')
+        self.assertEqual(len(datos['resultados']), 5)
+        self.assertFalse(datos['mas'])
+        self.assertEqual(
+            self.buscar('motoristas', q=self.motorista.rut.replace('-', ''))['resultados'],
+            [{'id': self.motorista.pk, 'texto': 'Juan 0 Pérez'}],
+        )
+        self.assertEqual(self.buscar('motos', q='ab-cd-03')['resultados'][0]['texto'], 'AB-CD-03 - Honda CG')
+
+        # Páginas ordenadas por etiqueta.
+        farmacias = FUENTES['farmacias']
+        paginas = [farmacias.buscar('farm', pagina, por_pagina=2) for pagina in (1, 2, 3)]
+        self.assertEqual([hay_mas for _, hay_mas in paginas], [True, True, False])
+        self.assertEqual([texto for resultados, _ in paginas for _, texto in resultados], [f'Farmacia {i}' for i in range(5)])
+
+        self.assertEqual(self.buscar('farmacias', q='farm', pagina=2), {'resultados': [], 'mas': False})
+        self.assertEqual(self.client.get(reverse('autocompletar', args=['comunas'])).status_code, 404)
+
+    def test_el_indice_se_reconstruye_al_cambiar_la_tabla(self):
+        self.assertEqual(self.buscar('farmacias', q='cruz')['resultados'], [])
+        farmacia = Farmacia.objects.create(
+            nombre='Cruz Verde', direccion='Calle 9', comuna=self.comuna,
+            horario_apertura='09:00', horario_cierre='20:00', telefono='221234567'
+        )
+        self.assertEqual(self.buscar('farmacias', q='cruz')['resultados'], [{'id': farmacia.pk, 'texto': 'Cruz Verde'}])
+
+    def test_el_select_solo_trae_la_opcion_elegida(self):
+        with CaptureQueriesContext(connection) as capturadas:
+            html = str(MovimientoForm(instance=self.despacho)['motorista_asignado'])
+        self.assertEqual(html.count('<option'), 2)
+        self.assertIn(f'value="{self.despacho.motorista_asignado_id}" selected', html)
+        self.assertIn(reverse('autocompletar', args=['motoristas']), html)
+        self.assertEqual(len(capturadas), 1)
+
+    def test_valor_invalido_se_informa_sin_romper_el_select(self):
+        datos = {
+            'numero_despacho': '9100', 'tipo_movimiento': self.despacho.tipo_movimiento_id,
+            'usuario_responsable': self.usuario.pk, 'motorista_asignado': 'abc', 'estado': 'pendiente',
+            'origen': 'Farmacia 0', 'destino': 'Calle 9',
+        }
+        formulario = MovimientoForm(data=datos)
+        self.assertFalse(formulario.is_valid())
+        self.assertIn('motorista_asignado', formulario.errors)
+        html = str(formulario['motorista_asignado'])
+        self.assertEqual(html.count('<option'), 1)
+
+        respuesta = self.client.post(reverse('movimiento_crear'), datos)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('motorista_asignado', respuesta.context['form'].errors)
+
+
+# --- ORDEN NATURAL ---
+
+class OrdenNaturalTests(VistasFrecuentesTestCase):
+
+    def test_claves_y_listado(self):
+        self.assertLess(clave_orden_natural('A-2'), clave_orden_natural('A-10'))
+        self.assertIsNone(clave_orden_natural(None))
+
+        for numero in ('9', '10', '100'):
+            Movimiento.objects.create(
+                numero_despacho=numero, tipo_movimiento=self.despacho.tipo_movimiento,
+                usuario_responsable=self.usuario, origen='Farmacia 1', destino='Calle 1', estado='completado',
+            )
+        respuesta = self.client.get(reverse('movimiento_lista'), {'sort': 'numero_despacho'})
+        numeros = [m.numero_despacho for m in respuesta.context['movimientos']]
+        self.assertEqual(numeros[:4], ['9', '10', '100', '1000'])
+
+    def test_guardado_parcial_actualiza_la_clave(self):
+        self.despacho.numero_despacho = '77'
+        self.despacho.save(update_fields=['numero_despacho'])
+        self.assertEqual(
+            Movimiento.objects.values_list('orden_numero_despacho', flat=True).get(pk=self.despacho.pk),
+            clave_orden_natural('77'),
+        )
+
+
+# --- ASIGNACIÓN ACTUAL ---
+
+class AsignacionActualTests(VistasFrecuentesTestCase):
+
+    def farmacia_actual(self, motorista):
+        return Motorista.objects.values_list('farmacia_actual', flat=True).get(pk=motorista.pk)
+
+    def test_el_puntero_sigue_a_la_asignacion_abierta_mas_reciente(self):
+        historial = list(AsignacionFarmacia.objects.filter(motorista=self.motorista).order_by('fechaAsignacion', 'pk'))
+        self.assertEqual(self.farmacia_actual(self.motorista), historial[-1].farmacia_id)
+
+        # Al cerrar la más reciente vuelve a la anterior; sin asignaciones abiertas queda vacío.
+        historial[-1].fechaTermino = timezone.localdate()
+        historial[-1].save()
+        self.assertEqual(self.farmacia_actual(self.motorista), historial[0].farmacia_id)
+        historial[0].delete()
+        self.assertIsNone(self.farmacia_actual(self.motorista))
+
+        # Traspasar una asignación a otro motorista recalcula a ambos.
+        otro = Motorista.objects.exclude(pk=self.motorista.pk).first()
+        historial[-1].fechaTermino = None
+        historial[-1].fechaAsignacion = timezone.now()
+        historial[-1].motorista = otro
+        historial[-1].save()
+        self.assertEqual(self.farmacia_actual(otro), historial[-1].farmacia_id)
+        self.assertIsNone(self.farmacia_actual(self.motorista))
+
+    def test_reparar_corrige_punteros_desviados(self):
+        self.assertEqual(asignaciones.reparar(), [])
+        correcto = Moto.objects.values_list('motorista_actual', flat=True).get(pk=self.moto.pk)
+        self.assertIsNotNone(correcto)
+        Moto.objects.filter(pk=self.moto.pk).update(motorista_actual=None)
+        self.assertEqual(asignaciones.reparar(), [('Moto', self.moto.pk, None, correcto)])
+        self.assertEqual(asignaciones.reparar(), [])
+
+
+# --- DATOS SINTÉTICOS ---
+
+class DatosSinteticosTests(VistasFrecuentesTestCase):
+
+    def generar(self, semilla):
+        """Genera un conjunto pequeño y lo deshace; devuelve lo que se generó."""
+        with transaction.atomic():
+            generador = GeneradorDatos(semilla=semilla, tamano_lote=50)
+            tipos = generador.tipos_movimiento()
+            usuarios = generador.usuarios(2)
+            farmacias = generador.farmacias(3)
+            motoristas = generador.motoristas(4)
+            generador.motos(3)
+            totales = generador.movimientos(120, 0.5, motoristas, farmacias, usuarios, tipos)
+            generados = (
+                totales,
+                list(Motorista.objects.filter(pk__in=motoristas).values_list('rut', 'nombres', 'estado').order_by('pk')),
+                list(Movimiento.objects.filter(usuario_responsable__in=usuarios).values_list(
+                    'numero_despacho', 'fecha_movimiento', 'estado', 'tipo_movimiento', 'motorista_asignado', 'origen',
+                ).order_by('pk')),
+            )
+            transaction.set_rollback(True)
+        return generados
+
+    def test_reproducible_con_la_misma_semilla(self):
+        generados = self.generar(7)
+        (despachos, tramos), motoristas, movimientos = generados
+        self.assertEqual(despachos + tramos, len(movimientos))
+        self.assertLessEqual(len(movimientos), 120)
+        self.assertEqual(len({rut for rut, *_ in motoristas}), 4)
+        self.assertEqual(self.generar(7), generados)
+        self.assertNotEqual(self.generar(8)[2], movimientos)
+
+    def test_comando_deja_consistentes_los_datos_derivados(self):
+        antes = Movimiento.objects.count()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                'generar_datos_sinteticos', usuarios=2, farmacias=3, motoristas=5, movimientos=150, anios=0.5,
+                semilla=3, lote=40, stdout=io.StringIO(),
+            )
+        self.assertGreater(Movimiento.objects.count(), antes)
+        self.assertEqual(contadores.reconciliar(), [])
+        self.assertEqual(asignaciones.reparar(), [])
+        self.assertEqual(despachos.reparar(), ([], {}))
+        self.assertEqual(despachos.reparar_avance(), [])
+        self.assertEqual(vencimientos.reparar(), [])
+        self.assertEqual(DocumentoBusquedaMovimiento.objects.count(), Movimiento.objects.count())
+        self.assertEqual(resumen_diario(), resumen_esperado())
@@ -1,13 +1,217 @@
+import os
+from array import array
+from collections import deque
 from io import BytesIO
+from itertools import zip_longest
+from tempfile import SpooledTemporaryFile, TemporaryDirectory
+from django.db import connection
 from django.http import HttpResponse
 from django.template.loader import get_template
+from pypdf import PdfReader
+from pypdf.generic import (
+    ArrayObject, DecodedStreamObject, DictionaryObject, IndirectObject, NameObject, NullObject, StreamObject,
+)
+from reportlab.pdfbase import pdfmetrics
 from xhtml2pdf import pisa
 
-def render_to_pdf(template_src, context_dict={}):
+
+def upsert(modelo, filas, clave, campos, batch_size=None):
+    """
+    Inserta `filas` o, si ya existe una con la misma `clave` (única), actualiza
+    sus `campos`. MySQL/MariaDB no aceptan indicar la clave del conflicto
+    (ON DUPLICATE KEY UPDATE reacciona a cualquier índice único): ahí se omite,
+    así que el modelo no debe tener otro índice único que pueda repetirse.
+    """
+    objetivo = [clave] if connection.features.supports_update_conflicts_with_target else None
+    return modelo.objects.bulk_create(
+        filas, batch_size=batch_size, update_conflicts=True, unique_fields=objetivo, update_fields=campos,
+    )
+
+
+def render_pdf_bytes(template_src, context_dict={}):
+    """Renderiza la plantilla a PDF y devuelve los bytes (o None si pisa falla)."""
     template = get_template(template_src)
     html  = template.render(context_dict)
     result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode("ISO-8859-1")), result)
+    pdf = pisa.pisaDocument(html, result, encoding='UTF-8')
     if not pdf.err:
-        return HttpResponse(result.getvalue(), content_type='application/pdf')
-    return None
\ No newline at end of file
+        return result.getvalue()
+    return None
+
+
+def render_to_pdf(template_src, context_dict={}):
+    contenido = render_pdf_bytes(template_src, context_dict)
+    if contenido is not None:
+        return HttpResponse(contenido, content_type='application/pdf')
+    return None
+
+
+def render_pdf_archivo(template_src, context_dict, destino):
+    """Como `render_pdf_bytes`, pero escribe el PDF en el archivo `destino`. Devuelve False si pisa falla."""
+    html = get_template(template_src).render(context_dict)
+    return not pisa.pisaDocument(html, destino, encoding='UTF-8').err
+
+
+class EscritorPdf:
+    """
+    Une PDF escribiendo directamente en `destino`: copia las páginas de cada
+    documento con sus objetos renumerados y los escribe apenas los copia. En
+    memoria sólo quedan el documento de origen en curso y las posiciones de
+    los objetos (xref), no las páginas ya escritas.
+    """
+    CATALOGO, PAGINAS, FUENTE = 1, 2, 3
+    MARGEN_PIE = 40
+
+    def __init__(self, destino):
+        self.destino = destino
+        self.escritos = 0
+        # Posición de cada objeto por número y números de las páginas, como enteros compactos.
+        self.posiciones = array('Q', [0] * (self.FUENTE + 1))
+        self.paginas = array('Q')
+        self._escribir(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self._objeto(self.FUENTE, DictionaryObject({
+            NameObject('/Type'): NameObject('/Font'), NameObject('/Subtype'): NameObject('/Type1'),
+            NameObject('/BaseFont'): NameObject('/Helvetica'), NameObject('/Encoding'): NameObject('/WinAnsiEncoding'),
+        }))
+
+    def _escribir(self, datos):
+        self.destino.write(datos)
+        self.escritos += len(datos)
+
+    def _referencia(self, numero):
+        # Las referencias del resultado apuntan al escritor; las del origen, a su PdfReader.
+        return IndirectObject(numero, 0, self)
+
+    def _reservar(self):
+        self.posiciones.append(0)
+        return len(self.posiciones) - 1
+
+    def _objeto(self, numero, objeto):
+        buffer = BytesIO()
+        objeto.write_to_stream(buffer)
+        self.posiciones[numero] = self.escritos
+        self._escribir(f'{numero} 0 obj\n'.encode() + buffer.getvalue() + b'\nendobj\n')
+        return self._referencia(numero)
+
+    def _flujo(self, contenido):
+        flujo = DecodedStreamObject()
+        flujo.set_data(contenido)
+        return self._objeto(self._reservar(), flujo)
+
+    def _pie(self, pagina, texto):
+        """Agrega `texto` abajo a la derecha (como el pie que dibujaba reportlab) sin tocar el contenido original."""
+        ancho = float(pagina.mediabox.width)
+        x = ancho - self.MARGEN_PIE - pdfmetrics.stringWidth(texto, 'Helvetica', 8)
+        literal = texto.encode('cp1252').replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+        contenidos = dict.get(pagina, '/Contents')
+        anteriores = list(contenidos) if isinstance(contenidos, ArrayObject) else [contenidos] if contenidos else []
+        return [self._flujo(b'q')], anteriores, [
+            self._flujo(b'Q BT /FNumPag 8 Tf 0.53 g %.2f 20 Td (' % x + literal + b') Tj ET')
+        ]
+
+    def agregar(self, lector, pies=()):
+        """Copia al final las páginas de `lector` (PdfReader); `pies` trae el texto del pie de cada una."""
+        nuevos, pendientes = {}, deque()
+
+        def referencia(indirecto):
+            clave = (indirecto.idnum, indirecto.generation)
+            if clave not in nuevos:
+                nuevos[clave] = self._reservar()
+                pendientes.append(indirecto)
+            return self._referencia(nuevos[clave])
+
+        def copiar(valor):
+            # Se reemplazan en el lugar las referencias del documento de origen, que se descarta después.
+            if isinstance(valor, IndirectObject):
+                return valor if valor.pdf is self else referencia(valor)
+            if isinstance(valor, StreamObject):
+                dict.pop(valor, '/Length', None)
+            if isinstance(valor, DictionaryObject):
+                for clave, item in list(dict.items(valor)):
+                    dict.__setitem__(valor, clave, copiar(item))
+            elif isinstance(valor, ArrayObject):
+                for i, item in enumerate(list(valor)):
+                    list.__setitem__(valor, i, copiar(item))
+            return valor
+
+        paginas = list(lector.pages)
+        numeros = [referencia(pagina.indirect_reference).idnum for pagina in paginas]
+        pendientes.clear()
+        for pagina, numero, pie in zip_longest(paginas, numeros, pies):
+            pagina[NameObject('/Parent')] = self._referencia(self.PAGINAS)
+            if pie is not None:
+                antes, anteriores, despues = self._pie(pagina, pie)
+                # Copias de los recursos (pueden ser compartidos por varias páginas) con la fuente del pie.
+                recursos = DictionaryObject(dict.items(pagina['/Resources'] if '/Resources' in pagina else {}))
+                fuentes = DictionaryObject(dict.items(recursos['/Font'] if '/Font' in recursos else {}))
+                recursos[NameObject('/Font')] = fuentes
+                pagina[NameObject('/Resources')] = recursos
+                pagina[NameObject('/Contents')] = ArrayObject(anteriores)
+            copiar(pagina)
+            if pie is not None:
+                fuentes[NameObject('/FNumPag')] = self._referencia(self.FUENTE)
+                pagina[NameObject('/Contents')] = ArrayObject(antes + list(pagina['/Contents']) + despues)
+            self._objeto(numero, pagina)
+            self.paginas.append(numero)
+        while pendientes:
+            indirecto = pendientes.popleft()
+            self._objeto(nuevos[(indirecto.idnum, indirecto.generation)], copiar(indirecto.get_object() or NullObject()))
+        # Los objetos del lector se referencian en ciclo con él: se sueltan ya, sin esperar al recolector.
+        lector.resolved_objects.clear()
+        lector.flattened_pages = None
+
+    def cerrar(self):
+        """Escribe el árbol de páginas, el catálogo y la tabla xref."""
+        self.posiciones[self.PAGINAS] = self.escritos
+        self._escribir(f'{self.PAGINAS} 0 obj\n<< /Type /Pages /Count {len(self.paginas)} /Kids ['.encode())
+        for inicio in range(0, len(self.paginas), 1000):
+            self._escribir(''.join(f' {numero} 0 R' for numero in self.paginas[inicio:inicio + 1000]).encode())
+        self._escribir(b' ] >>\nendobj\n')
+        self._objeto(self.CATALOGO, DictionaryObject({
+            NameObject('/Type'): NameObject('/Catalog'), NameObject('/Pages'): self._referencia(self.PAGINAS),
+        }))
+        inicio_xref = self.escritos
+        self._escribir(f'xref\n0 {len(self.posiciones)}\n0000000000 65535 f \n'.encode())
+        for numero in range(1, len(self.posiciones)):
+            self._escribir(f'{self.posiciones[numero]:010d} 00000 n \n'.encode())
+        self._escribir(
+            f'trailer\n<< /Size {len(self.posiciones)} /Root {self.CATALOGO} 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n'.encode()
+        )
+
+
+def render_to_pdf_por_lotes(template_src, context_dict, lotes, numerar_paginas=True, texto_pagina="Página {actual} de {total}"):
+    """
+    Modo por lotes de `render_to_pdf`: renderiza la plantilla una vez por cada
+    contexto parcial de `lotes` (un iterable/generador) y escribe el PDF de
+    cada lote en un archivo temporal apenas se genera. Después los une en una
+    pasada con EscritorPdf, que escribe cada página en el resultado al
+    copiarla y le estampa "Página X de N" (N se cuenta antes desde los
+    archivos). Así la memoria no crece con el largo del reporte: nunca existen
+    juntos el HTML, el layout de xhtml2pdf ni las páginas de todo el documento.
+
+    Devuelve un archivo temporal (posicionado al inicio) con el PDF resultante,
+    listo para `FileResponse` o para guardarse en un FileField.
+    """
+    resultado = SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+    with TemporaryDirectory() as directorio:
+        archivos, total = [], 0
+        for indice, contexto_lote in enumerate(lotes):
+            ruta = os.path.join(directorio, f'lote_{indice}.pdf')
+            with open(ruta, 'wb') as destino:
+                if not render_pdf_archivo(template_src, dict(context_dict, **contexto_lote), destino):
+                    raise RuntimeError("xhtml2pdf no pudo generar uno de los lotes del documento.")
+            total += len(PdfReader(ruta).pages)
+            archivos.append(ruta)
+
+        escritor = EscritorPdf(resultado)
+        for ruta in archivos:
+            with open(ruta, 'rb') as origen:
+                lector = PdfReader(origen)
+                inicio = len(escritor.paginas)
+                pies = [
+                    texto_pagina.format(actual=inicio + i, total=total) for i in range(1, len(lector.pages) + 1)
+                ] if numerar_paginas else ()
+                escritor.agregar(lector, pies)
+        escritor.cerrar()
+    resultado.seek(0)
+    return resultado
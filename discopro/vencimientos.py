@@ -0,0 +1,194 @@
+"""
+Índice de vencimientos de documentos (tabla Vencimiento) y sus alertas.
+
+Cada fecha de vencimiento de DocumentacionMoto (permiso, seguro y revisión
+técnica), de Documentacion y el próximo control de cada Motorista tiene una
+fila, que las señales crean, actualizan o borran al guardar el documento.
+El nivel de alerta (vencido / por vencer / vigente) depende del día: se
+calcula al guardar y se recalcula una vez al día con
+`manage.py generar_alertas_vencimiento`. Así el dashboard lee las alertas con
+una consulta por el índice (nivel, fecha), sin cargar los documentos.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import contadores
+from .models import Documentacion, DocumentacionMoto, Motorista, Vencimiento
+from .utils import upsert
+
+# Un documento pasa a "por vencer" cuando le quedan DIAS_AVISO días o menos.
+DIAS_AVISO = 30
+ALERTAS_DASHBOARD = 8
+TAMANO_LOTE = 1000
+
+CAMPOS_MOTO = (
+    (Vencimiento.TIPO_PERMISO, 'permiso_circulacion_vencimiento'),
+    (Vencimiento.TIPO_SEGURO, 'seguro_obligatorio_vencimiento'),
+    (Vencimiento.TIPO_REVISION, 'revision_tecnica_vencimiento'),
+)
+CAMPOS_FILA = ['tipo', 'moto', 'motorista', 'documento', 'fecha', 'nivel']
+CAMPOS_ESPERADOS = ('tipo', 'moto_id', 'motorista_id', 'documento_id', 'fecha', 'nivel')
+
+
+# --- NIVEL DE ALERTA ---
+
+def limite_aviso(hoy):
+    return hoy + datetime.timedelta(days=DIAS_AVISO)
+
+
+def nivel(fecha, hoy):
+    """Nivel de alerta de un vencimiento en `fecha` visto el día `hoy` (como is_permiso_vigente: vence al terminar el día)."""
+    if fecha < hoy:
+        return Vencimiento.NIVEL_VENCIDO
+    if fecha <= limite_aviso(hoy):
+        return Vencimiento.NIVEL_POR_VENCER
+    return Vencimiento.NIVEL_VIGENTE
+
+
+# --- FILAS DEL ÍNDICE ---
+
+def entradas(objeto):
+    """[(clave, campos)] de las fechas que un documento aporta al índice; la fecha puede ser None."""
+    if isinstance(objeto, DocumentacionMoto):
+        return [
+            (f'documentacion_moto:{objeto.pk}:{tipo}', {'tipo': tipo, 'moto_id': objeto.moto_id, 'fecha': getattr(objeto, campo)})
+            for tipo, campo in CAMPOS_MOTO
+        ]
+    if isinstance(objeto, Documentacion):
+        return [(f'documento:{objeto.pk}', {
+            'tipo': Vencimiento.TIPO_DOCUMENTO, 'motorista_id': objeto.motorista_id,
+            'documento_id': objeto.pk, 'fecha': objeto.fechaVencimiento,
+        })]
+    return [(f'motorista:{objeto.pk}:control', {
+        'tipo': Vencimiento.TIPO_CONTROL, 'motorista_id': objeto.pk, 'fecha': objeto.fecha_proximo_control,
+    })]
+
+
+def sincronizar(objetos, hoy=None):
+    """
+    Deja al día las filas de los documentos `objetos` (DocumentacionMoto,
+    Documentacion o Motorista): inserta o actualiza por `clave` las fechas
+    presentes, con su nivel de hoy, y borra las que quedaron vacías.
+    """
+    hoy = hoy or timezone.localdate()
+    filas, vacias = [], []
+    for objeto in objetos:
+        for clave, campos in entradas(objeto):
+            if campos['fecha'] is None:
+                vacias.append(clave)
+            else:
+                filas.append(Vencimiento(clave=clave, nivel=nivel(campos['fecha'], hoy), **campos))
+    if vacias:
+        Vencimiento.objects.filter(clave__in=vacias).delete()
+    if filas:
+        upsert(Vencimiento, filas, 'clave', CAMPOS_FILA, batch_size=TAMANO_LOTE)
+
+
+def eliminar(objeto):
+    """Borra las filas de un documento eliminado (las de motos y motoristas caen en cascada)."""
+    Vencimiento.objects.filter(clave__in=[clave for clave, _ in entradas(objeto)]).delete()
+
+
+# --- ALERTAS ---
+
+@transaction.atomic
+def generar_alertas(hoy=None):
+    """
+    Pasa cada fila al nivel que le corresponde `hoy`: un UPDATE por nivel sobre
+    el rango de fechas que lo define (índice por fecha), que sólo escribe las
+    filas que cambian. Registra el día de la revisión para el dashboard.
+    Devuelve {nivel: filas que pasaron a ese nivel}.
+    """
+    hoy = hoy or timezone.localdate()
+    limite = limite_aviso(hoy)
+    rangos = {
+        Vencimiento.NIVEL_VENCIDO: {'fecha__lt': hoy},
+        Vencimiento.NIVEL_POR_VENCER: {'fecha__gte': hoy, 'fecha__lte': limite},
+        Vencimiento.NIVEL_VIGENTE: {'fecha__gt': limite},
+    }
+    cambios = {
+        valor: Vencimiento.objects.filter(**rango).exclude(nivel=valor).update(nivel=valor)
+        for valor, rango in rangos.items()
+    }
+    contadores.fijar(contadores.REVISION_VENCIMIENTOS, hoy.toordinal())
+    return cambios
+
+
+def dia_revision(valor):
+    """Fecha de la última revisión desde el contador REVISION_VENCIMIENTOS (None si nunca se revisó)."""
+    return datetime.date.fromordinal(valor) if valor else None
+
+
+def alertas(limite=ALERTAS_DASHBOARD):
+    """
+    Las alertas más urgentes: vencidas y luego por vencer, cada grupo por fecha.
+    Una consulta que recorre el índice (nivel, fecha) desde su inicio. Trae
+    `limite` + 1 filas para saber si hay más de las que se muestran.
+    """
+    return list(
+        Vencimiento.objects.filter(nivel__lt=Vencimiento.NIVEL_VIGENTE)
+        .select_related('moto', 'motorista', 'documento')
+        .order_by('nivel', 'fecha')[:limite + 1]
+    )
+
+
+def totales():
+    """{nivel: filas} de las alertas vigentes (vencidas y por vencer)."""
+    filas = Vencimiento.objects.filter(nivel__lt=Vencimiento.NIVEL_VIGENTE).values('nivel').annotate(total=Count('pk'))
+    return {fila['nivel']: fila['total'] for fila in filas.order_by()}
+
+
+# --- REPARACIÓN ---
+
+def esperadas(hoy=None):
+    """{clave: (tipo, moto_id, motorista_id, documento_id, fecha, nivel)} calculado desde los documentos."""
+    hoy = hoy or timezone.localdate()
+    fuentes = (
+        DocumentacionMoto.objects.only('pk', 'moto', *(campo for _, campo in CAMPOS_MOTO)),
+        Documentacion.objects.filter(fechaVencimiento__isnull=False).only('pk', 'motorista', 'fechaVencimiento'),
+        Motorista.objects.filter(fecha_proximo_control__isnull=False).only('pk', 'fecha_proximo_control'),
+    )
+    filas = {}
+    for queryset in fuentes:
+        for objeto in queryset.order_by('pk').iterator(chunk_size=TAMANO_LOTE):
+            for clave, campos in entradas(objeto):
+                if campos['fecha'] is not None:
+                    filas[clave] = (
+                        campos['tipo'], campos.get('moto_id'), campos.get('motorista_id'),
+                        campos.get('documento_id'), campos['fecha'], nivel(campos['fecha'], hoy),
+                    )
+    return filas
+
+
+def reparar(hoy=None):
+    """
+    Recalcula el índice desde los documentos y corrige las filas que falten,
+    sobren o se hayan desviado (cargas masivas, cambios hechos directamente en
+    la base). Deja los niveles al día. Devuelve [(clave, anterior, correcto)].
+    """
+    hoy = hoy or timezone.localdate()
+    with transaction.atomic():
+        correctas = esperadas(hoy)
+        actuales = {
+            clave: tuple(resto) for clave, *resto in Vencimiento.objects.values_list(
+                'clave', *CAMPOS_ESPERADOS
+            ).iterator(chunk_size=TAMANO_LOTE)
+        }
+        diferencias = [
+            (clave, actuales.get(clave), correctas.get(clave))
+            for clave in sorted(set(correctas) | set(actuales))
+            if actuales.get(clave) != correctas.get(clave)
+        ]
+        sobrantes = [clave for clave, _, correcta in diferencias if correcta is None]
+        for inicio in range(0, len(sobrantes), TAMANO_LOTE):
+            Vencimiento.objects.filter(clave__in=sobrantes[inicio:inicio + TAMANO_LOTE]).delete()
+        filas = [
+            Vencimiento(clave=clave, **dict(zip(CAMPOS_ESPERADOS, correcta)))
+            for clave, _, correcta in diferencias if correcta is not None
+        ]
+        upsert(Vencimiento, filas, 'clave', CAMPOS_FILA, batch_size=TAMANO_LOTE)
+        contadores.fijar(contadores.REVISION_VENCIMIENTOS, hoy.toordinal())
+    return diferencias
@@ -0,0 +1,110 @@
+"""
+Versiones por modelo y respuestas condicionales (ETag / Last-Modified).
+
+Cada modelo tiene un contador `version:<app.modelo>` (ver `discopro.contadores`)
+que las señales incrementan al guardar/eliminar filas. Las vistas con
+RespuestaCondicionalMixin declaran de qué modelos depende su página; con una
+sola lectura de caché de esos contadores arman el ETag y el Last-Modified y,
+si el navegador ya tiene esa versión, responden 304 sin ejecutar la vista.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib import messages
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from . import contadores
+from .models import (
+    AsignacionFarmacia, AsignacionMoto, Comuna, ContactoEmergencia, Documentacion, DocumentacionMoto,
+    Farmacia, Mantenimiento, Motorista, Moto, Movimiento, Provincia, Region, Rol, TipoMovimiento, Usuario,
+)
+
+PREFIJO_VERSION = 'version:'
+
+# Se incrementa si cambian las plantillas o lo que muestran las vistas: invalida
+# las páginas que los navegadores tengan guardadas con un ETag anterior.
+VERSION_PAGINAS = 1
+
+MODELOS_VERSIONADOS = (
+    Usuario, Rol, Region, Provincia, Comuna, Farmacia, Motorista, ContactoEmergencia, Documentacion,
+    Moto, DocumentacionMoto, Mantenimiento, AsignacionFarmacia, AsignacionMoto, TipoMovimiento, Movimiento,
+)
+
+
+def clave_version(modelo):
+    return f'{PREFIJO_VERSION}{modelo._meta.label_lower}'
+
+
+def incrementar(*modelos):
+    """Para escrituras que no emiten señales (bulk_create, update(), cargas masivas)."""
+    for modelo in modelos:
+        contadores.incrementar(clave_version(modelo))
+
+
+def _invalidar(sender, **kwargs):
+    contadores.incrementar_al_confirmar(clave_version(sender))
+
+
+def conectar_senales():
+    for modelo in MODELOS_VERSIONADOS:
+        uid = f'version_{modelo._meta.label_lower}'
+        post_save.connect(_invalidar, sender=modelo, dispatch_uid=f'{uid}_guardar')
+        post_delete.connect(_invalidar, sender=modelo, dispatch_uid=f'{uid}_eliminar')
+
+
+def validadores(request, modelos):
+    """
+    (etag, last_modified) de la página pedida: las versiones de `modelos` (una
+    lectura de caché), la URL completa con su query string, el usuario (y los
+    datos suyos que muestra la plantilla base), la cookie CSRF y el día local.
+    `last_modified` es un timestamp, o None si ningún modelo tiene versión aún.
+    """
+    versiones = contadores.obtener_con_fecha(clave_version(modelo) for modelo in modelos)
+    usuario = request.user
+    partes = [
+        VERSION_PAGINAS, request.get_full_path(), usuario.pk, usuario.get_full_name(), usuario.email,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''), timezone.localdate().isoformat(),
+    ]
+    partes += [f'{clave}={valor}' for clave, (valor, _) in sorted(versiones.items())]
+    etag = hashlib.sha1('|'.join(map(str, partes)).encode('utf-8')).hexdigest()[:24]
+
+    fechas = [actualizado for _, actualizado in versiones.values() if actualizado]
+    return etag, int(max(fechas).timestamp()) if fechas else None
+
+
+def _cabeceras(response, etag, last_modified):
+    response['ETag'] = quote_etag(etag)
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Guardada sólo en el navegador del usuario, y revalidada en cada visita.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class RespuestaCondicionalMixin:
+    """
+    GET condicional para listados, detalles y reportes. `modelos_version` son
+    los modelos cuyos datos muestra la página: si ninguno cambió desde la
+    versión que tiene el navegador (If-None-Match / If-Modified-Since), se
+    responde 304 Not Modified sin consultar ni renderizar. Debe ir después de
+    LoginRequiredMixin.
+    """
+    modelos_version = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        # Los avisos pendientes (messages) se muestran en la página: hay que renderizarla.
+        if request.method not in ('GET', 'HEAD') or not self.modelos_version or len(messages.get_messages(request)):
+            return super().dispatch(request, *args, **kwargs)
+
+        etag, last_modified = validadores(request, self.modelos_version)
+        no_modificada = get_conditional_response(request, etag=quote_etag(etag), last_modified=last_modified)
+        if no_modificada is not None:
+            return _cabeceras(no_modificada, etag, last_modified)
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            _cabeceras(response, etag, last_modified)
+        return response
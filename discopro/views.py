@@ -1,14 +1,20 @@
 from django import forms
-from django.db.models import Count, Q, Subquery, OuterRef
-from django.db.models.functions import TruncMonth, Length
+from django.db.models import Q
 from django.views import View
-from django.views.generic import TemplateView, ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.views.generic import TemplateView, ListView, DetailView, CreateView, UpdateView, DeleteView, FormView
 from django.shortcuts import render, get_object_or_404, redirect
-from django.urls import reverse_lazy
-from django.http import HttpRequest, JsonResponse
+from django.urls import reverse, reverse_lazy
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from collections import defaultdict
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+from django.core.files.storage import default_storage
 from datetime import timedelta
+import io
+import os
 
 # --- MENSAJES ---
 from django.contrib import messages
@@ -21,18 +27,31 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from .forms import CustomLoginForm
 from django.contrib.auth.forms import SetPasswordForm
 
-from discopro.utils import render_to_pdf 
+from discopro.reportes import (
+    TIPOS_REPORTE, DIMENSIONES, periodo_reporte, consultar_movimientos, etiqueta, formato_periodo,
+    solicitar_reporte, buscar_pdf_cache, contexto_cacheado
+)
+from discopro import contadores, vencimientos
+from discopro.autocompletar import FUENTES as FUENTES_AUTOCOMPLETAR
+from discopro.busqueda import filtrar_por_texto, terminos
+from discopro.despachos import OcupacionMotoristaMixin, tramos_de
+from discopro.exportacion import exportar_csv, exportar_xlsx, filas_movimientos
+from discopro.geografia import arbol_geografico
+from discopro.importacion import IMPORTADORES, ErrorLectura, cargar_despachos, formato_lote, leer_despachos, texto_csv
+from discopro.paginacion import PaginacionMixin
+from discopro.versiones import RespuestaCondicionalMixin
 
 from .forms import (
     UsuarioForm, FarmaciaForm, MotoristaForm, MotoForm, 
     AsignacionFarmaciaForm, AsignacionMotoForm, DocumentacionMotoForm, MantenimientoForm,
-    ContactoEmergenciaForm, MovimientoForm, UsuarioUpdateForm, TramoForm
+    ContactoEmergenciaForm, MovimientoForm, UsuarioUpdateForm, TramoForm, ReportePeriodoForm, ReporteReferenciaForm, ImportacionForm
 )
 
 # Importamos Modelos
 from .models import (
     Farmacia, Motorista, Moto, AsignacionFarmacia, AsignacionMoto, DocumentacionMoto, Mantenimiento,
-    ContactoEmergencia, TipoMovimiento, Movimiento, Usuario, Rol, Provincia, Comuna
+    ContactoEmergencia, TipoMovimiento, Movimiento, Usuario, Rol, Comuna, Provincia, Region,
+    TrabajoReporte
 )
 
 # --- VISTAS DE LOGIN/LOGOUT ---
@@ -71,146 +90,166 @@ def logout_view(request):
 @login_required
 def index(request: HttpRequest):
     """Dashboard principal."""
-    total_farmacias = Farmacia.objects.count()
-    total_motoristas = Motorista.objects.count()
-    total_motos = Moto.objects.count()
-    total_usuarios = Usuario.objects.count()
-    total_movimientos = Movimiento.objects.filter(movimiento_padre__isnull=True).count()
-
-    context = {
-        'total_farmacias': total_farmacias,
-        'total_motoristas': total_motoristas,
-        'total_motos': total_motos,
-        'total_usuarios': total_usuarios,       
-        'total_movimientos': total_movimientos,
-        'usuario_logueado': request.user 
-    }
+    # Las cifras vienen de los contadores mantenidos por señales (una lectura de caché).
+    context = contadores.dashboard()
+    context['usuario_logueado'] = request.user
+    # Alertas de vencimiento precalculadas: una consulta por el índice (nivel, fecha).
+    alertas = vencimientos.alertas()
+    context['alertas_vencimiento'] = alertas[:vencimientos.ALERTAS_DASHBOARD]
+    context['hay_mas_alertas'] = len(alertas) > vencimientos.ALERTAS_DASHBOARD
+    context['revision_vencimientos'] = vencimientos.dia_revision(context['revision_vencimientos'])
+    context['hoy'] = timezone.localdate()
     return render(request, "discopro/Main/dashboard.html", context)
 
 # --- REPORTES ---
 
-class ReporteMovimientosView(LoginRequiredMixin, TemplateView):
+class ReporteMovimientosView(LoginRequiredMixin, RespuestaCondicionalMixin, TemplateView):
     template_name = 'discopro/Movimiento/reporte_general.html'
+    modelos_version = (Movimiento, TipoMovimiento, Motorista)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        ahora = timezone.now()
-        hoy_local = timezone.localtime(ahora)
-        
-        inicio_dia = hoy_local.replace(hour=0, minute=0, second=0, microsecond=0)
-        fin_dia = inicio_dia + timedelta(days=1)
-        inicio_mes = hoy_local.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        inicio_anio = hoy_local.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+        # Las cifras se cachean con la versión de datos de cada período (día, mes y año
+        # de referencia): los de períodos cerrados no cambian y se sirven siempre de la caché.
+        form_referencia = ReporteReferenciaForm(self.request.GET if 'fecha' in self.request.GET else None)
+        referencia = form_referencia.referencia()
+        context['form_referencia'] = form_referencia
+        context['referencia'] = referencia
+        periodos = {tipo: periodo_reporte(tipo, referencia) for tipo in TIPOS_REPORTE}
+        context.update(contexto_cacheado(
+            f"general:{referencia}",
+            list(periodos.values()),
+            lambda: self.get_estadisticas(periodos)
+        ))
+
+        # 4. Período personalizado (opcional, vía GET)
+        form = ReportePeriodoForm(self.request.GET if 'desde' in self.request.GET else None)
+        context['form_periodo'] = form
+        if form.is_valid():
+            datos = form.cleaned_data
+            desde, hasta = datos['desde'], datos['hasta'] + timedelta(days=1)
+            context.update(contexto_cacheado(
+                f"personalizado:{desde}:{hasta}:{datos['granularidad']}:{datos['dimension']}",
+                [(desde, hasta)],
+                lambda: self.get_periodo_personalizado(desde, hasta, datos['granularidad'], datos['dimension'])
+            ))
+        return context
+
+    def get_estadisticas(self, periodos):
+        estadisticas = {}
 
         # 1. Diario (Mantenemos todos para ver el flujo del día)
-        qs_hoy = Movimiento.objects.filter(fecha_movimiento__gte=inicio_dia, fecha_movimiento__lt=fin_dia)
-        context['total_hoy'] = qs_hoy.count()
-        context['estados_hoy'] = qs_hoy.values('estado').annotate(total=Count('estado'))
+        desde, hasta = periodos['diario']
+        cubo_hoy = consultar_movimientos(desde, hasta, dimensiones=('estado',))
+        estadisticas['total_hoy'] = cubo_hoy.total
+        estadisticas['estados_hoy'] = cubo_hoy.agrupar('estado')
 
         # 2. Mensual (Mantenemos todos para ver la carga total del mes)
-        qs_mes = Movimiento.objects.filter(fecha_movimiento__gte=inicio_mes)
-        context['total_mes'] = qs_mes.count()
-        context['tipos_mes'] = qs_mes.values('tipo_movimiento__nombre').annotate(total=Count('tipo_movimiento'))
+        desde, hasta = periodos['mensual']
+        cubo_mes = consultar_movimientos(desde, hasta, dimensiones=('tipo_movimiento',))
+        estadisticas['total_mes'] = cubo_mes.total
+        estadisticas['tipos_mes'] = [
+            {'tipo_movimiento__nombre': fila['tipo_movimiento'], 'total': fila['total']}
+            for fila in cubo_mes.agrupar('tipo_movimiento')
+        ]
 
         # 3. Anual ( Solo contamos los 'completado' para la tendencia de productividad)
-        qs_anio = Movimiento.objects.filter(
-            fecha_movimiento__gte=inicio_anio,
-            estado='completado'
-        ).order_by('fecha_movimiento')
-        
-        context['total_anio'] = qs_anio.count()
-        
-        datos_agrupados = defaultdict(int)
-        for mov in qs_anio:
-            fecha_local = timezone.localtime(mov.fecha_movimiento)
-            mes_key = fecha_local.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            datos_agrupados[mes_key] += 1
-            
-        evolucion_anual_lista = []
-        for fecha, cantidad in datos_agrupados.items():
-            evolucion_anual_lista.append({'mes': fecha, 'total': cantidad})
-        
-        evolucion_anual_lista.sort(key=lambda x: x['mes'])
-        context['evolucion_anual'] = evolucion_anual_lista
-        return context
+        desde, hasta = periodos['anual']
+        cubo_anio = consultar_movimientos(desde, hasta, granularidad='mes', filtros={'estado': 'completado'})
+        estadisticas['total_anio'] = cubo_anio.total
+        estadisticas['evolucion_anual'] = [{'mes': fila['periodo'], 'total': fila['total']} for fila in cubo_anio.serie()]
+        return estadisticas
+
+    def get_periodo_personalizado(self, desde, hasta, granularidad, dimension):
+        cubo = consultar_movimientos(desde, hasta, granularidad=granularidad, dimensiones=(dimension,))
+        return {
+            'cubo_personalizado': cubo,
+            'dimension_personalizada': DIMENSIONES[dimension],
+            'filas_personalizadas': [
+                {'periodo': formato_periodo(fila['periodo'], granularidad), 'valor': etiqueta(dimension, fila), 'total': fila['total']}
+                for fila in cubo
+            ],
+        }
 
 class ExportarReportePDFView(LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
         tipo = request.GET.get('tipo', 'diario')
-        ahora = timezone.now()
-        hoy_local = timezone.localtime(ahora)
-        
-        # Definición de fechas (Igual que antes)
-        inicio_dia = hoy_local.replace(hour=0, minute=0, second=0, microsecond=0)
-        fin_dia = inicio_dia + timedelta(days=1)
-        inicio_mes = hoy_local.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        inicio_anio = hoy_local.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-
-        data = {}
-        titulo = ""
-        movimientos = [] # QuerySet base
-
-        # 1. Determinar el rango de fechas y datos estadísticos
-        if tipo == 'diario':
-            titulo = f"Reporte Diario ({hoy_local.strftime('%d-%m-%Y')})"
-            movimientos = Movimiento.objects.filter(fecha_movimiento__gte=inicio_dia, fecha_movimiento__lt=fin_dia).order_by('-fecha_movimiento')
-            
-            # Estadísticas para el cuadro resumen
-            data['detalles'] = movimientos.values('estado').annotate(total=Count('estado'))
-            data['columnas'] = ['Estado', 'Cantidad']
+        dimension = 'estado'
+
+        # 1. Determinar el rango de fechas (hasta es exclusivo)
+        if tipo == 'personalizado':
+            form = ReportePeriodoForm(request.GET)
+            if not form.is_valid():
+                messages.error(request, "El período indicado para el reporte no es válido.")
+                return redirect('reporte_movimientos')
+            desde = form.cleaned_data['desde']
+            hasta = form.cleaned_data['hasta'] + timedelta(days=1)
+            dimension = form.cleaned_data['dimension']
+        else:
+            if tipo not in TIPOS_REPORTE:
+                tipo = 'diario'
+            desde, hasta = periodo_reporte(tipo, ReporteReferenciaForm(request.GET).referencia())
+
+        # 2. Si el PDF ya se generó para la versión vigente de los datos, se sirve desde disco.
+        en_cache = buscar_pdf_cache(tipo, desde, hasta, dimension, request.user.pk)
+        if en_cache:
+            return FileResponse(
+                default_storage.open(en_cache, 'rb'), content_type='application/pdf',
+                filename=f"reporte_{tipo}_{desde:%Y%m%d}.pdf"
+            )
+
+        # 3. Si no, la generación se encola; el worker `procesar_reportes` la realiza.
+        trabajo, creado = solicitar_reporte(tipo, desde, hasta, dimension, request.user)
+        if not creado:
+            messages.info(request, "Ya hay un reporte idéntico en preparación; se muestra su avance.")
+        return redirect(trabajo)
+
+
+class ReporteTrabajoDetailView(LoginRequiredMixin, DetailView):
+    """Página de espera de un reporte en segundo plano (consulta su avance vía AJAX)."""
+    model = TrabajoReporte
+    template_name = 'discopro/Movimiento/reporte_trabajo.html'
+    context_object_name = 'trabajo'
 
-        elif tipo == 'mensual':
-            titulo = f"Reporte Mensual ({hoy_local.strftime('%B %Y')})"
-            movimientos = Movimiento.objects.filter(fecha_movimiento__gte=inicio_mes).order_by('-fecha_movimiento')
-            
-            # Estadísticas
-            data['detalles'] = movimientos.values('tipo_movimiento__nombre').annotate(total=Count('tipo_movimiento'))
-            data['columnas'] = ['Tipo de Movimiento', 'Cantidad']
-
-        elif tipo == 'anual':
-            titulo = f"Reporte Anual ({hoy_local.year})"
-            # NOTA: Quitamos el filtro 'completado' para poder listar también los pendientes/anulados en el detalle
-            movimientos = Movimiento.objects.filter(fecha_movimiento__gte=inicio_anio).order_by('fecha_movimiento')
-            
-            # Estadísticas (Agrupado por mes)
-            datos_agrupados = defaultdict(int)
-            for mov in movimientos:
-                if mov.estado == 'completado': 
-                    fecha_local = timezone.localtime(mov.fecha_movimiento)
-                    mes_key = fecha_local.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                    datos_agrupados[mes_key] += 1
-            
-            lista_anual = []
-            for fecha, cantidad in datos_agrupados.items():
-                nombre_mes = fecha.strftime('%B')
-                lista_anual.append({'nombre': nombre_mes, 'total': cantidad})
-            
-            lista_anual.sort(key=lambda x: x['nombre'])
-            data['detalles'] = lista_anual
-            data['columnas'] = ['Mes', 'Cantidad (Completados)']
-            data['es_anual'] = True
-
-        # Separar los movimientos por estado para el listado detallado
-        movimientos_full = movimientos.select_related('tipo_movimiento', 'motorista_asignado', 'usuario_responsable')
-
-        context = {
-            'titulo': titulo,
-            'fecha_impresion': hoy_local,
-            'usuario': request.user,
-            'data': data,
-            'total_general': movimientos.count(),
-            # Listas separadas:
-            'movimientos_completados': movimientos_full.filter(estado='completado'),
-            'movimientos_pendientes': movimientos_full.filter(estado='pendiente'),
-            'movimientos_anulados': movimientos_full.filter(estado='anulado'),
-        }
-        
-        return render_to_pdf('discopro/Movimiento/reporte_pdf.html', context)
+    def get_queryset(self):
+        return TrabajoReporte.objects.filter(solicitado_por=self.request.user)
+
+
+@login_required
+def reporte_trabajo_estado(request, pk):
+    """Estado y progreso de un trabajo de reporte (JSON para el polling)."""
+    trabajo = get_object_or_404(TrabajoReporte, pk=pk, solicitado_por=request.user)
+    data = {
+        'estado': trabajo.estado,
+        'estado_display': trabajo.get_estado_display(),
+        'progreso': trabajo.progreso,
+        'terminado': trabajo.terminado,
+        'error': trabajo.error,
+        'url_descarga': None,
+    }
+    if trabajo.estado == TrabajoReporte.ESTADO_COMPLETADO:
+        data['url_descarga'] = reverse('reporte_trabajo_descargar', kwargs={'pk': trabajo.pk})
+    return JsonResponse(data)
+
+
+@login_required
+def reporte_trabajo_descargar(request, pk):
+    trabajo = get_object_or_404(
+        TrabajoReporte, pk=pk, solicitado_por=request.user, estado=TrabajoReporte.ESTADO_COMPLETADO
+    )
+    if not trabajo.archivo:
+        raise Http404("El archivo del reporte ya no está disponible.")
+    return FileResponse(
+        trabajo.archivo.open('rb'), content_type='application/pdf',
+        filename=os.path.basename(trabajo.archivo.name)
+    )
 
 # --- CRUD USUARIOS  ---
 
-class UsuarioListView(LoginRequiredMixin, ListView):
+class UsuarioListView(LoginRequiredMixin, RespuestaCondicionalMixin, PaginacionMixin, ListView):
     model = Usuario
+    modelos_version = (Usuario, Rol)
     template_name = 'discopro/Usuario/usuario_list.html'
     context_object_name = 'usuarios'
     paginate_by = 20
@@ -225,25 +264,19 @@ class UsuarioListView(LoginRequiredMixin, ListView):
                 Q(email__icontains=query) | Q(rol__nombreRol__icontains=query)
             ).distinct()
         
-        sort_by = self.request.GET.get('sort', 'first_name')
+        sort_by = self.request.GET.get('sort', 'nombres')
         if sort_by:
             direction = '-' if sort_by.startswith('-') else ''
             field_name = sort_by.lstrip('-')
             
+            # Nombres, usuario y RUT usan su clave de orden natural (largo + texto), indexada.
             mapping = {
-                'username': 'username', 'nombres': 'first_name', 
-                'rut': 'rut', 'email': 'email', 'estado': 'is_active', 'rol': 'rol__nombreRol'
+                'username': 'orden_username', 'nombres': 'orden_first_name', 
+                'rut': 'orden_rut', 'email': 'email', 'estado': 'is_active', 'rol': 'rol__nombreRol'
             }
             
             if field_name in mapping:
-                campo_bd = mapping[field_name]
-                if field_name in ['nombres', 'username', 'rut']:
-                    if direction == '-':
-                        queryset = queryset.order_by(Length(campo_bd).desc(), f'-{campo_bd}')
-                    else:
-                        queryset = queryset.order_by(Length(campo_bd), campo_bd)
-                else:
-                    queryset = queryset.order_by(f"{direction}{campo_bd}")
+                queryset = queryset.order_by(f"{direction}{mapping[field_name]}")
                 
         return queryset
 
@@ -316,10 +349,47 @@ class ConfiguracionView(LoginRequiredMixin, TemplateView):
     """Vista placeholder para configuración."""
     template_name = 'discopro/Usuario/configuracion.html'
 
+
+class ImportarMaestrosView(LoginRequiredMixin, FormView):
+    """
+    Importa (crea o actualiza) farmacias, motoristas o motos desde un CSV. Por
+    defecto sólo simula y muestra el informe; desmarcando "simular" se guarda.
+    """
+    template_name = 'discopro/Usuario/importar.html'
+    form_class = ImportacionForm
+    MAX_ERRORES_MOSTRADOS = 200
+
+    def get_initial(self):
+        initial = super().get_initial()
+        if self.request.GET.get('tipo') in IMPORTADORES:
+            initial['tipo'] = self.request.GET['tipo']
+        return initial
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['columnas'] = {tipo: importador.columnas for tipo, importador in IMPORTADORES.items()}
+        return context
+
+    def form_valid(self, form):
+        datos = form.cleaned_data
+        importador = IMPORTADORES[datos['tipo']]()
+        try:
+            resultado = importador.importar(
+                texto_csv(datos['archivo']), aplicar=not datos['simular'], delimitador=datos['delimitador']
+            )
+        except ErrorLectura as error:
+            form.add_error('archivo', str(error))
+            return self.form_invalid(form)
+        return self.render_to_response(self.get_context_data(
+            form=form, resultado=resultado, simulado=datos['simular'],
+            errores=resultado['errores'][:self.MAX_ERRORES_MOSTRADOS],
+        ))
+
 # --- CRUD FARMACIAS ---
 
-class FarmaciaListView(LoginRequiredMixin, ListView):
+class FarmaciaListView(LoginRequiredMixin, RespuestaCondicionalMixin, PaginacionMixin, ListView):
     model = Farmacia
+    modelos_version = (Farmacia, Comuna, Provincia, Region)
     template_name = 'discopro/Farmacia/farmacia_list.html'
     context_object_name = 'farmacias'
     paginate_by = 20
@@ -339,24 +409,16 @@ class FarmaciaListView(LoginRequiredMixin, ListView):
             field_name = sort_by.lstrip('-')
             
             mapping = {
-                'nombre': 'nombre', 
-                'direccion': 'direccion',
+                'nombre': 'orden_nombre', 
+                'direccion': 'orden_direccion',
                 'telefono': 'telefono', 'horario_apertura': 'horario_apertura',
                 'comuna': 'comuna__nombreComuna', 'provincia': 'comuna__provincia__nombreProvincia',
                 'region': 'comuna__provincia__region__nombreRegion'
             }
 
             if field_name in mapping:
-                campo_bd = mapping[field_name]
-                
-                # --- ORDENAMIENTO ---
-                if field_name in ['nombre', 'direccion']:
-                    if direction == '-':
-                        queryset = queryset.order_by(Length(campo_bd).desc(), f'-{campo_bd}')
-                    else:
-                        queryset = queryset.order_by(Length(campo_bd), campo_bd)
-                else:
-                    queryset = queryset.order_by(f"{direction}{campo_bd}")
+                # Nombre y dirección usan su clave de orden natural, indexada.
+                queryset = queryset.order_by(f"{direction}{mapping[field_name]}")
 
         return queryset
 
@@ -394,24 +456,23 @@ class FarmaciaDetailView(LoginRequiredMixin, DetailView):
 
 # --- CRUD MOTORISTAS ---
 
-class MotoristaListView(LoginRequiredMixin, ListView):
+class MotoristaListView(LoginRequiredMixin, RespuestaCondicionalMixin, PaginacionMixin, ListView):
     model = Motorista
+    modelos_version = (Motorista, Comuna, Provincia, Region, Farmacia, AsignacionFarmacia)
     template_name = 'discopro/Motorista/motorista_list.html'
     context_object_name = 'motoristas'
     paginate_by = 20
 
     def get_queryset(self):
-        queryset = super().get_queryset().select_related('comuna')
-        latest_farmacia = AsignacionFarmacia.objects.filter(motorista=OuterRef('pk')).order_by('-fechaAsignacion', '-idAsignacionFarmacia').values('farmacia__nombre')[:1]
-        queryset = queryset.annotate(farmacia_actual=Subquery(latest_farmacia))
+        queryset = super().get_queryset().select_related('comuna', 'farmacia_actual')
 
         query = self.request.GET.get('q')
         if query:
             queryset = queryset.filter(
                 Q(nombres__icontains=query) | Q(apellido_paterno__icontains=query) | 
                 Q(rut__icontains=query) | Q(telefono__icontains=query) |
-                Q(comuna__nombreComuna__icontains=query) | Q(asignacionfarmacia__farmacia__nombre__icontains=query)
-            ).distinct()
+                Q(comuna__nombreComuna__icontains=query) | Q(farmacia_actual__nombre__icontains=query)
+            )
             
         sort_by = self.request.GET.get('sort', 'nombres')
         if sort_by:
@@ -419,34 +480,34 @@ class MotoristaListView(LoginRequiredMixin, ListView):
             field_name = sort_by.lstrip('-')
             
             mapping = {
-                'nombres': 'nombres', 'rut': 'rut',
+                'nombres': 'orden_nombres', 'rut': 'orden_rut',
                 'telefono': 'telefono', 'estado': 'estado',
-                'comuna': 'comuna__nombreComuna', 'farmacia': 'farmacia_actual'
+                'comuna': 'comuna__nombreComuna', 'farmacia': 'farmacia_actual__nombre'
             }
 
             if field_name in mapping:
-                campo_bd = mapping[field_name]
-                if field_name in ['nombres', 'rut']:
-                    if direction == '-':
-                        queryset = queryset.order_by(Length(campo_bd).desc(), f'-{campo_bd}')
-                    else:
-                        queryset = queryset.order_by(Length(campo_bd), campo_bd)
-                else:
-                    queryset = queryset.order_by(f"{direction}{campo_bd}")
+                queryset = queryset.order_by(f"{direction}{mapping[field_name]}")
 
         return queryset
 
-class MotoristaDetailView(LoginRequiredMixin, DetailView):
+class MotoristaDetailView(LoginRequiredMixin, RespuestaCondicionalMixin, DetailView):
     model = Motorista
+    modelos_version = (
+        Motorista, Comuna, Provincia, Region, ContactoEmergencia, AsignacionFarmacia, AsignacionMoto, Farmacia, Moto, Movimiento
+    )
     template_name = 'discopro/Motorista/motorista_detail.html'
     context_object_name = 'motorista'
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('comuna__provincia__region')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        motorista = self.get_object()
+        motorista = self.object
         context['asignaciones_farmacia'] = AsignacionFarmacia.objects.filter(motorista=motorista).select_related('farmacia').order_by('-fechaAsignacion')
         context['asignaciones_moto'] = AsignacionMoto.objects.filter(motorista=motorista).select_related('moto').order_by('-fechaAsignacion')
         context['contactos'] = motorista.contactos_emergencia.all()
+        context['despachos_pendientes'] = contadores.pendientes_por_motorista([motorista.pk])[motorista.pk]
         return context
 
 class MotoristaCreateView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
@@ -474,24 +535,23 @@ class MotoristaDeleteView(LoginRequiredMixin, DeleteView):
 
 # --- CRUD MOTOS ---
 
-class MotoListView(LoginRequiredMixin, ListView):
+class MotoListView(LoginRequiredMixin, RespuestaCondicionalMixin, PaginacionMixin, ListView):
     model = Moto
+    modelos_version = (Moto, Motorista, AsignacionMoto)
     template_name = 'discopro/Moto/moto_list.html'
     context_object_name = 'motos'
     paginate_by = 20
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        latest_motorista = AsignacionMoto.objects.filter(moto=OuterRef('pk')).order_by('-fechaAsignacion', '-idAsignacionMoto').values('motorista__nombres')[:1]
-        queryset = queryset.annotate(motorista_actual=Subquery(latest_motorista))
-        
+        queryset = super().get_queryset().select_related('motorista_actual')
+
         query = self.request.GET.get('q')
         if query:
             queryset = queryset.filter(
                 Q(patente__icontains=query) | Q(marca__icontains=query) |
                 Q(modelo__icontains=query) | Q(anio__icontains=query) |
-                Q(asignacionmoto__motorista__nombres__icontains=query)
-            ).distinct()
+                Q(motorista_actual__nombres__icontains=query)
+            )
             
         sort_by = self.request.GET.get('sort', 'patente')
         if sort_by:
@@ -499,30 +559,27 @@ class MotoListView(LoginRequiredMixin, ListView):
             field_name = sort_by.lstrip('-')
             
             mapping = {
-                'patente': 'patente', 'marca': 'marca', 'modelo': 'modelo',
-                'anio': 'anio', 'propietario': 'propietario', 'motorista': 'motorista_actual'
+                'patente': 'orden_patente', 'marca': 'orden_marca', 'modelo': 'orden_modelo',
+                'anio': 'anio', 'propietario': 'propietario', 'motorista': 'motorista_actual__nombres'
             }
             if field_name in mapping:
-                campo_bd = mapping[field_name]
-                # Aplicamos a Patente, Marca y Modelo
-                if field_name in ['patente', 'marca', 'modelo']:
-                    if direction == '-':
-                        queryset = queryset.order_by(Length(campo_bd).desc(), f'-{campo_bd}')
-                    else:
-                        queryset = queryset.order_by(Length(campo_bd), campo_bd)
-                else:
-                    queryset = queryset.order_by(f"{direction}{campo_bd}")
+                # Patente, marca y modelo usan su clave de orden natural, indexada.
+                queryset = queryset.order_by(f"{direction}{mapping[field_name]}")
 
         return queryset
 
-class MotoDetailView(LoginRequiredMixin, DetailView):
+class MotoDetailView(LoginRequiredMixin, RespuestaCondicionalMixin, DetailView):
     model = Moto
+    modelos_version = (Moto, DocumentacionMoto, Mantenimiento, AsignacionMoto, Motorista)
     template_name = 'discopro/Moto/moto_detail.html'
     context_object_name = 'moto'
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('documentacion', 'motorista_actual')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        moto = self.get_object()
+        moto = self.object
         context['asignaciones_moto'] = AsignacionMoto.objects.filter(moto=moto).select_related('motorista').order_by('-fechaAsignacion')
         return context
 
@@ -602,7 +659,7 @@ class DocumentacionMotoUpdateView(LoginRequiredMixin, SuccessMessageMixin, Updat
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['moto'] = self.get_object().moto
+        context['moto'] = self.object.moto
         return context
 
     def get_success_url(self):
@@ -657,60 +714,161 @@ class ContactoEmergenciaDeleteView(LoginRequiredMixin, DeleteView):
 
 # --- CRUD MOVIMIENTOS ---
 
-class MovimientoListView(LoginRequiredMixin, ListView):
+FILTROS_AVANCE = {
+    'con_pendientes': ("Con tramos pendientes", {'tramos_pendientes__gt': 0}),
+    'sin_pendientes': ("Sin tramos pendientes", {'tramos_pendientes': 0}),
+    'completos': ("Completados (100%)", {'avance': 100}),
+}
+
+
+def filtrar_despachos(params, queryset=None):
+    """
+    Búsqueda (`q`) y orden (`sort`) del listado de despachos. La comparten el
+    listado paginado y la exportación, para que ambos muestren lo mismo. Al
+    buscar sin elegir un orden, los resultados van del más al menos relevante.
+    """
+    if queryset is None:
+        queryset = Movimiento.objects.all()
+    queryset = queryset.filter(movimiento_padre__isnull=True).select_related(
+        'tipo_movimiento', 'motorista_asignado', 'motorista_actual'
+    )
+
+    # Índice de texto completo: coincide por prefijo con los datos del despacho o de sus tramos.
+    query = params.get('q')
+    por_relevancia = bool(terminos(query)) and 'sort' not in params
+    if query:
+        queryset = filtrar_por_texto(queryset, query, por_relevancia=por_relevancia)
+
+    # Avance desde los contadores mantenidos en el despacho (columnas indexadas).
+    avance = FILTROS_AVANCE.get(params.get('avance'))
+    if avance:
+        queryset = queryset.filter(**avance[1])
+
+    sort_by = params.get('sort', '' if por_relevancia else '-fecha_movimiento')
+    if sort_by:
+        direction = '-' if sort_by.startswith('-') else ''
+        field_name = sort_by.lstrip('-')
+
+        mapping = {
+            'numero_despacho': 'orden_numero_despacho', 'fecha_movimiento': 'fecha_movimiento',
+            'estado': 'estado', 'tipo_movimiento': 'tipo_movimiento__nombre',
+            'origen': 'orden_origen', 'destino': 'orden_destino',
+            'motorista': 'motorista_asignado__orden_nombres',
+            'avance': 'avance', 'ultimo_tramo': 'ultimo_tramo',
+        }
+
+        if field_name in mapping:
+            # Despacho, origen, destino y motorista usan su clave de orden natural (largo + texto).
+            queryset = queryset.order_by(f"{direction}{mapping[field_name]}")
+
+    return queryset
+
+
+class MovimientoListView(LoginRequiredMixin, RespuestaCondicionalMixin, PaginacionMixin, ListView):
     model = Movimiento
+    modelos_version = (Movimiento, TipoMovimiento, Motorista)
     template_name = 'discopro/Movimiento/movimiento_list.html'
     context_object_name = 'movimientos'
     paginate_by = 20
-    
+    # El historial de despachos crece sin límite: se pagina por cursor (sin COUNT ni OFFSET).
+    paginacion_cursor = True
+
     def get_queryset(self):
-        queryset = super().get_queryset().filter(movimiento_padre__isnull=True).select_related('tipo_movimiento', 'motorista_asignado')
-        
-        query = self.request.GET.get('q')
-        if query:
-            queryset = queryset.filter(
-                Q(numero_despacho__icontains=query) | Q(id_movimiento__icontains=query) |
-                Q(origen__icontains=query) | Q(destino__icontains=query) |
-                Q(usuario_responsable__first_name__icontains=query) |
-                Q(motorista_asignado__nombres__icontains=query)
-            ).distinct()
-        
-        sort_by = self.request.GET.get('sort', '-fecha_movimiento')
-        if sort_by:
-            direction = '-' if sort_by.startswith('-') else ''
-            field_name = sort_by.lstrip('-')
-            
-            mapping = {
-                'numero_despacho': 'numero_despacho', 'fecha_movimiento': 'fecha_movimiento',
-                'estado': 'estado', 'tipo_movimiento': 'tipo_movimiento__nombre',
-                'origen': 'origen', 'destino': 'destino',
-                'motorista': 'motorista_asignado__nombres'
-            }
-            
-            if field_name in mapping:
-                campo_bd = mapping[field_name]
-                # Aplicamos a Despacho, Origen, Destino, Motorista
-                if field_name in ['numero_despacho', 'origen', 'destino', 'motorista']:
-                    if direction == '-':
-                        queryset = queryset.order_by(Length(campo_bd).desc(), f'-{campo_bd}')
-                    else:
-                        queryset = queryset.order_by(Length(campo_bd), campo_bd)
-                else:
-                    queryset = queryset.order_by(f"{direction}{campo_bd}")
-        
-        return queryset
+        return filtrar_despachos(self.request.GET, super().get_queryset())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['filtros_avance'] = [(clave, etiqueta) for clave, (etiqueta, _) in FILTROS_AVANCE.items()]
+        return context
+
+
+class ExportarMovimientosView(LoginRequiredMixin, View):
+    """
+    Exporta el listado de despachos (con los mismos `q`/`sort` del listado) y sus
+    tramos a CSV o XLSX. La respuesta se genera en streaming, por lotes.
+    """
+    FORMATOS = {
+        'csv': (exportar_csv, 'text/csv; charset=utf-8'),
+        'xlsx': (exportar_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    }
+
+    def get(self, request, *args, **kwargs):
+        formato = request.GET.get('formato', 'csv')
+        if formato not in self.FORMATOS:
+            formato = 'csv'
+        exportar, content_type = self.FORMATOS[formato]
+
+        filas = filas_movimientos(filtrar_despachos(request.GET))
+        response = StreamingHttpResponse(exportar(filas), content_type=content_type)
+        nombre = f"movimientos_{timezone.localtime():%Y%m%d_%H%M}.{formato}"
+        response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+        return response
+
+
+class _VerificacionCsrf(CsrfViewMiddleware):
+    """La verificación CSRF de Django, pero devolviendo el motivo del rechazo en vez de la página 403."""
+    def _reject(self, request, reason):
+        return reason
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class MovimientoLoteView(View):
+    """
+    Crea un lote de despachos con sus tramos, en JSON o CSV (en el cuerpo de la
+    petición o como archivo `archivo`), a nombre del usuario. `?validar=1` sólo
+    valida y `?parcial=1` crea los despachos válidos aunque otros tengan
+    errores. Responde el informe de errores por fila en JSON.
+
+    Es un endpoint para clientes, no un formulario: se autentica con la cookie
+    de sesión y el cliente debe enviar el valor de la cookie `csrftoken` en la
+    cabecera `X-CSRFToken`. Sin sesión responde 401 y sin token válido 403,
+    ambos en JSON (no la redirección al login ni la página de error CSRF).
+    """
+    http_method_names = ['post']
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': "Debe iniciar sesión."}, status=401)
+        motivo = _VerificacionCsrf(lambda request: None).process_view(request, None, (), {})
+        if motivo is not None:
+            return JsonResponse({'error': f"Verificación CSRF fallida: {motivo}"}, status=403)
+        return super().dispatch(request, *args, **kwargs)
 
-class MovimientoDetailView(LoginRequiredMixin, DetailView):
+    def post(self, request, *args, **kwargs):
+        archivo = request.FILES.get('archivo')
+        if archivo is not None:
+            formato = formato_lote(archivo.name, archivo.content_type)
+        else:
+            archivo, formato = io.BytesIO(request.body), formato_lote(content_type=request.content_type)
+        try:
+            despachos = leer_despachos(archivo, formato, request.GET.get('delimitador', ','))
+            resultado = cargar_despachos(
+                despachos, request.user,
+                parcial=request.GET.get('parcial') == '1', aplicar=request.GET.get('validar') != '1'
+            )
+        except ErrorLectura as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        if resultado['creados']:
+            return JsonResponse(resultado, status=201)
+        return JsonResponse(resultado, status=400 if resultado['errores'] else 200)
+
+
+class MovimientoDetailView(LoginRequiredMixin, RespuestaCondicionalMixin, DetailView):
     model = Movimiento
+    modelos_version = (Movimiento, TipoMovimiento, Motorista, Usuario)
     template_name = 'discopro/Movimiento/movimiento_detail.html'
     context_object_name = 'movimiento'
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('tipo_movimiento', 'motorista_asignado', 'usuario_responsable')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['tramos_hijos'] = Movimiento.objects.filter(movimiento_padre=self.object).order_by('fecha_movimiento')
+        # Todo el árbol del despacho (también tramos de tramos) en una consulta, en profundidad.
+        context['tramos_hijos'] = tramos_de(self.object, 'tipo_movimiento', 'motorista_asignado')
         return context
 
-class MovimientoCreateView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
+class MovimientoCreateView(LoginRequiredMixin, OcupacionMotoristaMixin, SuccessMessageMixin, CreateView):
     model = Movimiento
     form_class = MovimientoForm
     template_name = 'discopro/Movimiento/movimiento_padre_form.html'
@@ -734,7 +892,7 @@ class MovimientoCreateView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
     def get_success_url(self):
         return self.object.get_absolute_url()
 
-class MovimientoUpdateView(LoginRequiredMixin, SuccessMessageMixin, UpdateView):
+class MovimientoUpdateView(LoginRequiredMixin, OcupacionMotoristaMixin, SuccessMessageMixin, UpdateView):
     model = Movimiento
     form_class = MovimientoForm
     template_name = 'discopro/Movimiento/movimiento_padre_form.html'
@@ -757,7 +915,7 @@ class MovimientoDeleteView(LoginRequiredMixin, DeleteView):
         messages.success(self.request, "Movimiento eliminado exitosamente.")
         return super().form_valid(form)
 
-class TramoCreateView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
+class TramoCreateView(LoginRequiredMixin, OcupacionMotoristaMixin, SuccessMessageMixin, CreateView):
     model = Movimiento
     form_class = TramoForm
     template_name = 'discopro/Movimiento/tramo_form.html'
@@ -823,7 +981,7 @@ class TramoCreateView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
             form.instance.usuario_responsable = self.request.user
         return super().form_valid(form)
 
-class TramoUpdateView(LoginRequiredMixin, SuccessMessageMixin, UpdateView):
+class TramoUpdateView(LoginRequiredMixin, OcupacionMotoristaMixin, SuccessMessageMixin, UpdateView):
     model = Movimiento
     form_class = MovimientoForm
     template_name = 'discopro/Movimiento/tramo_form.html'
@@ -850,14 +1008,54 @@ class TramoDeleteView(LoginRequiredMixin, DeleteView):
 
 
 # --- VISTAS AJAX  ---
+def _entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
 @login_required
 def load_provincias(request):
-    region_id = request.GET.get('region')
-    provincias = Provincia.objects.filter(region_id=region_id).order_by('nombreProvincia')
-    return JsonResponse(list(provincias.values('idProvincia', 'nombreProvincia')), safe=False)
+    arbol = arbol_geografico.vigente()
+    provincias = arbol.provincias_de.get(_entero(request.GET.get('region')), [])
+    return JsonResponse([{'idProvincia': pk, 'nombreProvincia': nombre} for pk, nombre in provincias], safe=False)
 
 @login_required
 def load_comunas(request):
-    provincia_id = request.GET.get('provincia')
-    comunas = Comuna.objects.filter(provincia_id=provincia_id).order_by('nombreComuna')
-    return JsonResponse(list(comunas.values('idComuna', 'nombreComuna')), safe=False)
\ No newline at end of file
+    arbol = arbol_geografico.vigente()
+    comunas = arbol.comunas_de.get(_entero(request.GET.get('provincia')), [])
+    return JsonResponse([{'idComuna': pk, 'nombreComuna': nombre} for pk, nombre in comunas], safe=False)
+
+
+@login_required
+@condition(etag_func=lambda request, version: arbol_geografico.vigente().etag)
+def geografia_paquete(request, version):
+    """
+    Árbol Región -> Provincia -> Comuna completo en un JSON. La URL lleva la
+    versión (el ETag del contenido), así que el navegador lo guarda sin volver
+    a pedirlo hasta que la geografía cambie y los formularios apunten a otra URL.
+    """
+    arbol = arbol_geografico.vigente()
+    if version != arbol.etag:
+        return redirect('ajax_geografia', version=arbol.etag)
+    response = HttpResponse(arbol.paquete, content_type='application/json')
+    patch_cache_control(response, private=True, max_age=365 * 24 * 3600, immutable=True)
+    return response
+
+
+@login_required
+def autocompletar_busqueda(request, fuente):
+    """Resultados paginados del autocompletado de selects (ver AutocompletarSelect)."""
+    indice = FUENTES_AUTOCOMPLETAR.get(fuente)
+    if indice is None:
+        raise Http404("Fuente de autocompletado desconocida.")
+    try:
+        pagina = max(int(request.GET.get('pagina', 1)), 1)
+    except ValueError:
+        pagina = 1
+    resultados, hay_mas = indice.buscar(request.GET.get('q', ''), pagina)
+    return JsonResponse({
+        'resultados': [{'id': pk, 'texto': texto} for pk, texto in resultados],
+        'mas': hay_mas,
+    })
@@ -43,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero, para medir también las consultas de sesión y autenticación.
+    'discopro.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -101,6 +103,43 @@ DATABASES = {
 }
 
 
+# ==============================================================================
+# CACHÉ
+# ==============================================================================
+
+# Caché compartida entre los procesos web y el worker de reportes.
+# En producción puede apuntarse a Redis/Memcached desde el .env.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=os.path.join(BASE_DIR, 'cache')),
+    }
+}
+
+
+# ==============================================================================
+# RENDIMIENTO (Server-Timing y registro por petición)
+# ==============================================================================
+
+# Cabecera Server-Timing con consultas, tiempo de BD y de plantilla (ver discopro.middleware).
+SERVER_TIMING = config('SERVER_TIMING', default=True, cast=bool)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'discopro.rendimiento': {
+            'handlers': ['console'],
+            'level': config('LOG_RENDIMIENTO', default='INFO' if DEBUG else 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+
 # ==============================================================================
 # VALIDACIÓN DE CONTRASEÑAS
 # ==============================================================================
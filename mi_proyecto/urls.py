@@ -30,6 +30,7 @@ urlpatterns = [
     path('mi-cuenta/', views.MiCuentaView.as_view(), name='mi_cuenta'),
     path('mi-cuenta/editar/', views.MiCuentaUpdateView.as_view(), name='mi_cuenta_editar'),
     path('configuracion/', views.ConfiguracionView.as_view(), name='configuracion'),
+    path('configuracion/importar/', views.ImportarMaestrosView.as_view(), name='importar_maestros'),
     
     # --- CRUD FARMACIAS ---
     path('farmacias/', views.FarmaciaListView.as_view(), name='farmacia_lista'), 
@@ -62,7 +63,9 @@ urlpatterns = [
 
     # --- CRUD MOVIMIENTOS ---
     path('movimientos/', views.MovimientoListView.as_view(), name='movimiento_lista'),
+    path('movimientos/exportar/', views.ExportarMovimientosView.as_view(), name='movimiento_exportar'),
     path('movimientos/crear/', views.MovimientoCreateView.as_view(), name='movimiento_crear'),
+    path('movimientos/lote/', views.MovimientoLoteView.as_view(), name='movimiento_lote'),
     path('movimientos/detalle/<int:pk>/', views.MovimientoDetailView.as_view(), name='movimiento_detalle'),
     path('movimientos/editar/<int:pk>/', views.MovimientoUpdateView.as_view(), name='movimiento_editar'),
     path('movimientos/eliminar/<int:pk>/', views.MovimientoDeleteView.as_view(), name='movimiento_eliminar'),
@@ -79,10 +82,15 @@ urlpatterns = [
     # --- REPORTES ---
     path('movimientos/reportes/', views.ReporteMovimientosView.as_view(), name='reporte_movimientos'),
     path('movimientos/reportes/pdf/', views.ExportarReportePDFView.as_view(), name='reporte_pdf'),
+    path('movimientos/reportes/trabajos/<int:pk>/', views.ReporteTrabajoDetailView.as_view(), name='reporte_trabajo_detalle'),
+    path('movimientos/reportes/trabajos/<int:pk>/estado/', views.reporte_trabajo_estado, name='reporte_trabajo_estado'),
+    path('movimientos/reportes/trabajos/<int:pk>/descargar/', views.reporte_trabajo_descargar, name='reporte_trabajo_descargar'),
 
     # --- AJAX SELECTS DEPENDIENTES ---
     path('ajax/load-provincias/', views.load_provincias, name='ajax_load_provincias'),
     path('ajax/load-comunas/', views.load_comunas, name='ajax_load_comunas'),
+    path('ajax/geografia/<str:version>.json', views.geografia_paquete, name='ajax_geografia'),
+    path('ajax/autocompletar/<slug:fuente>/', views.autocompletar_busqueda, name='autocompletar'),
 ]
 
 if settings.DEBUG:
@@ -89,4 +89,90 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
-});
\ No newline at end of file
+    // =========================================================
+    // 5. SELECTS CON AUTOCOMPLETADO REMOTO
+    // =========================================================
+    // El <select> sólo trae la opción elegida; las demás se buscan en el servidor.
+    document.querySelectorAll('select[data-autocompletar]').forEach(select => {
+        const url = select.dataset.autocompletar;
+        const contenedor = document.createElement('div');
+        contenedor.className = 'position-relative';
+        const input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control';
+        input.placeholder = 'Escriba para buscar...';
+        input.autocomplete = 'off';
+        const lista = document.createElement('div');
+        lista.className = 'list-group position-absolute w-100 shadow-sm d-none';
+        lista.style.zIndex = 1050;
+        lista.style.maxHeight = '260px';
+        lista.style.overflowY = 'auto';
+
+        const actual = select.options[select.selectedIndex];
+        if (actual && actual.value) input.value = actual.text;
+        select.classList.add('d-none');
+        select.parentNode.insertBefore(contenedor, select.nextSibling);
+        contenedor.append(input, lista);
+
+        let pagina = 1;
+        let consulta = '';
+        let temporizador = null;
+
+        function elegir(id, texto) {
+            let opcion = Array.from(select.options).find(o => o.value === String(id));
+            if (!opcion) {
+                opcion = new Option(texto, id);
+                select.add(opcion);
+            }
+            select.value = String(id);
+            input.value = texto;
+            lista.classList.add('d-none');
+            select.dispatchEvent(new Event('change', { bubbles: true }));
+        }
+
+        function item(texto, clase) {
+            const boton = document.createElement('button');
+            boton.type = 'button';
+            boton.className = 'list-group-item list-group-item-action ' + (clase || '');
+            boton.textContent = texto;
+            lista.appendChild(boton);
+            return boton;
+        }
+
+        function cargar(reiniciar) {
+            if (reiniciar) pagina = 1;
+            fetch(`${url}?q=${encodeURIComponent(consulta)}&pagina=${pagina}`, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+                .then(response => response.json())
+                .then(data => {
+                    if (reiniciar) lista.innerHTML = '';
+                    const mas = lista.querySelector('.autocompletar-mas');
+                    if (mas) mas.remove();
+                    data.resultados.forEach(r => {
+                        item(r.texto).addEventListener('mousedown', e => { e.preventDefault(); elegir(r.id, r.texto); });
+                    });
+                    if (!data.resultados.length && pagina === 1) item('Sin resultados', 'disabled text-muted');
+                    if (data.mas) {
+                        item('Ver más...', 'autocompletar-mas text-primary small').addEventListener('mousedown', e => {
+                            e.preventDefault();
+                            pagina += 1;
+                            cargar(false);
+                        });
+                    }
+                    lista.classList.remove('d-none');
+                });
+        }
+
+        input.addEventListener('input', () => {
+            consulta = input.value;
+            if (!input.value) select.value = '';
+            clearTimeout(temporizador);
+            temporizador = setTimeout(() => cargar(true), 250);
+        });
+        input.addEventListener('focus', () => {
+            const elegida = select.options[select.selectedIndex];
+            consulta = (elegida && elegida.value && elegida.text === input.value) ? '' : input.value;
+            cargar(true);
+        });
+        input.addEventListener('blur', () => setTimeout(() => lista.classList.add('d-none'), 150));
+    });
+});